@@ -7,6 +7,8 @@ import os
 import json
 from flask import Blueprint, request, jsonify, current_app, render_template, send_from_directory
 
+import erik_tracing
+
 bp = Blueprint('erik', __name__)
 
 @bp.route('/mobile')
@@ -79,7 +81,8 @@ def get_erik_live_position():
                         'confidence': confidence,
                         'camera': match.get('camera', 'unknown'),
                         'timestamp': match.get('received_time'),
-                        'detection_id': match.get('detection_id')
+                        'detection_id': match.get('detection_id'),
+                        'trace_id': (match.get('trace') or {}).get('trace_id')
                     }
                     break
         
@@ -95,6 +98,22 @@ def get_erik_live_position():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@bp.route('/api/erik/latency', methods=['GET'])
+def get_erik_latency():
+    """Get end-to-end latency from Frigate detection to live position, per camera"""
+    try:
+        camera = request.args.get('camera')
+        mqtt_service = current_app.mqtt_service
+        
+        response = mqtt_service.get_latency_stats(camera)
+        response['stages'] = erik_tracing.STAGES
+        response['listener_running'] = bool(mqtt_service.is_running())
+        
+        return jsonify(response)
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @bp.route('/api/erik/position-history', methods=['GET'])
 def get_erik_position_history():
     """Get Erik's position history over time"""
@@ -4,9 +4,13 @@ Manual Camera Orientation Interface
 """
 
 import json
-import struct
 import logging
 
+import numpy as np
+
+from yard_map.ply_reader import PlyPointCloud
+from yard_map.point_cache import load_cached_points
+
 logger = logging.getLogger(__name__)
 
 def generate_manual_orient_interface(pose_data, point_cloud_path):
@@ -1123,49 +1127,23 @@ def generate_manual_orient_interface(pose_data, point_cloud_path):
 
 def load_point_cloud_sample(point_cloud_path, max_points=500000):
     """Load a sample of points from PLY file"""
-    sample_points = []
     try:
-        import struct
+        cached = load_cached_points(point_cloud_path)
+        if cached is not None:
+            stride = max(1, -(-len(cached) // max_points))
+            xyz = np.array(cached.xyz[::stride])
+            colors = None if cached.rgb is None else np.asarray(cached.rgb[::stride])
+        else:
+            cloud = PlyPointCloud(point_cloud_path)
+            records = cloud.strided(max_points)
+            xyz = cloud.xyz(records)
+            colors = cloud.colors(records)
+        if colors is None:
+            colors = np.full((len(xyz), 3), 128, dtype=np.uint8)
         
-        with open(point_cloud_path, 'rb') as f:
-            # Read header
-            header_lines = []
-            while True:
-                line = f.readline().decode('ascii').strip()
-                header_lines.append(line)
-                if line == 'end_header':
-                    break
-            
-            # Parse header
-            total_points = 0
-            is_binary = False
-            for line in header_lines:
-                if line.startswith('element vertex'):
-                    total_points = int(line.split()[-1])
-                elif 'binary_little_endian' in line:
-                    is_binary = True
-            
-            if not is_binary:
-                logger.warning("PLY file is not in binary format, using dummy points")
-                return [[0, 0, 0, 128, 128, 128] for _ in range(100)]
-            
-            # Sample points
-            sample_rate = max(1, total_points // max_points)
-            vertex_size = 27  # 6 floats + 3 uchars
-            header_end_pos = f.tell()
-            
-            for i in range(0, total_points, sample_rate):
-                if len(sample_points) >= max_points:
-                    break
-                
-                f.seek(header_end_pos + i * vertex_size)
-                vertex_data = f.read(vertex_size)
-                if len(vertex_data) < vertex_size:
-                    break
-                
-                x, y, z, nx, ny, nz, r, g, b = struct.unpack('<ffffffBBB', vertex_data)
-                # Flip X-axis and Y-axis to correct orientation for house layout
-                sample_points.append([-x, -y, z, r, g, b])
+        # Flip X-axis and Y-axis to correct orientation for house layout
+        xyz[:, :2] *= -1
+        sample_points = [p + c for p, c in zip(xyz.tolist(), colors.tolist())]
         
         logger.info(f"Successfully loaded {len(sample_points)} sample points from PLY file")
         
@@ -1174,4 +1152,4 @@ def load_point_cloud_sample(point_cloud_path, max_points=500000):
         # Generate dummy points
         sample_points = [[0, 0, 0, 128, 128, 128] for _ in range(100)]
     
-    return sample_points
\ No newline at end of file
+    return sample_points
@@ -318,22 +318,39 @@ def build_ground_height_map():
         data = request.json
         point_cloud_path = data.get('point_cloud_path')
         percentile = data.get('percentile', 20)
-        
-        # Load yard map configuration
-        yard_config_path = data.get('yard_config_path', 'config/yard_map_config.json')
-        pixel_service.load_yard_map_config(yard_config_path)
-        
-        # Check if point cloud exists
-        mesh_folder = os.environ.get('MESH_FOLDER', '/home/andrew/nvr/meshes')
-        if not point_cloud_path:
-            # Try to find the default reconstruction
-            point_cloud_path = os.path.join(mesh_folder, 'yard_reconstruction.ply')
-        
-        if not os.path.exists(point_cloud_path):
-            return jsonify({'error': f'Point cloud not found: {point_cloud_path}'}), 404
-        
-        # Build ground height map
-        ground_heights = pixel_service.build_ground_height_map(point_cloud_path, percentile)
+
+        # Ground raster rendered with the yard map: explicit, else the active map's
+        ground_raster = data.get('ground_raster')
+        yard_service = getattr(current_app, 'yard_service', None)
+        if not ground_raster and not point_cloud_path and yard_service is not None:
+            active_raster = yard_service.active_ground_raster_path()
+            ground_raster = active_raster if os.path.exists(active_raster) else None
+
+        if ground_raster:
+            if not os.path.exists(ground_raster):
+                return jsonify({'error': f'Ground raster not found: {ground_raster}'}), 404
+            ground_heights = pixel_service.load_ground_raster(ground_raster, data.get('min_points', 1))
+            # Keep the configuration the raster is aligned with for later mapping requests
+            yard_config_path = data.get('yard_config_path', 'config/yard_map_config.json')
+            os.makedirs(os.path.dirname(yard_config_path) or '.', exist_ok=True)
+            with open(yard_config_path, 'w') as f:
+                json.dump(pixel_service.yard_map_config, f, indent=2)
+        else:
+            # Load yard map configuration
+            yard_config_path = data.get('yard_config_path', 'config/yard_map_config.json')
+            pixel_service.load_yard_map_config(yard_config_path)
+
+            # Check if point cloud exists
+            mesh_folder = os.environ.get('MESH_FOLDER', '/home/andrew/nvr/meshes')
+            if not point_cloud_path:
+                # Try to find the default reconstruction
+                point_cloud_path = os.path.join(mesh_folder, 'yard_reconstruction.ply')
+
+            if not os.path.exists(point_cloud_path):
+                return jsonify({'error': f'Point cloud not found: {point_cloud_path}'}), 404
+
+            # Build ground height map
+            ground_heights = pixel_service.build_ground_height_map(point_cloud_path, percentile)
         
         # Save ground heights to file
         output_path = os.path.join('config', 'ground_heights.json')
@@ -79,43 +79,61 @@ def generate_yard_map():
         if not mesh_path or not os.path.exists(mesh_path):
             return jsonify({'error': 'Mesh file not found'}), 404
         
-        # Generate yard map based on type
+        # Generate yard map based on type (repeated requests are served from the result cache)
         if generation_type == 'raster':
             # Raster-specific parameters
-            max_points = data.get('max_points', 20000000)
-            height_window = data.get('height_window', 0.5)
-            custom_bounds = data.get('custom_bounds')
-            coloring = data.get('coloring', 'true_color')
-            output_width = data.get('output_width', 1280)
-            output_height = data.get('output_height', 720)
-            rotation = data.get('rotation', 0)
-            
-            image_data, log_output = yard_service.generate_raster_yard_map(
-                mesh_path, grid_resolution, max_points, projection,
-                height_window, custom_bounds, coloring, 
-                output_width, output_height, rotation
-            )
+            parameters = {
+                'grid_resolution': grid_resolution,
+                'max_points': data.get('max_points', 20000000),
+                'projection': projection,
+                'height_window': data.get('height_window', 0.5),
+                'custom_bounds': data.get('custom_bounds'),
+                'coloring': data.get('coloring', 'true_color'),
+                'output_width': data.get('output_width', 1280),
+                'output_height': data.get('output_height', 720),
+                'rotation': data.get('rotation', 0)
+            }
         else:
             # Standard yard map parameters
-            max_points = data.get('max_points', 50000)
-            point_size = data.get('point_size', 0.1)
-            algorithm = data.get('algorithm', 'kmeans')
-            custom_bounds = data.get('custom_bounds')
-            height_window = data.get('height_window', 0.5)
-            rotation = data.get('rotation', 0)
-            
-            image_data, log_output = yard_service.generate_yard_map(
-                mesh_path, grid_resolution, max_points, point_size, projection, algorithm, custom_bounds, height_window, rotation
-            )
+            parameters = {
+                'grid_resolution': grid_resolution,
+                'max_points': data.get('max_points', 50000),
+                'point_size': data.get('point_size', 0.1),
+                'projection': projection,
+                'algorithm': data.get('algorithm', 'kmeans'),
+                'custom_bounds': data.get('custom_bounds'),
+                'height_window': data.get('height_window', 0.5),
+                'rotation': data.get('rotation', 0)
+            }
+        
+        # Renders on the job runner return their job right away, like /jobs
+        use_cache = not data.get('no_cache', False)
+        job_id = yard_service.queue_yard_map(mesh_path, generation_type=generation_type, use_cache=use_cache,
+                                             **parameters)
+        if job_id is not None:
+            response = jsonify({
+                'status': 'queued',
+                'job_id': job_id,
+                'status_url': f'{bp.url_prefix}/jobs/{job_id}',
+                'result_url': f'{bp.url_prefix}/jobs/{job_id}/result',
+                'cancel_url': f'{bp.url_prefix}/jobs/{job_id}/cancel'
+            })
+            response.headers['X-Cache-Status'] = 'MISS' if use_cache else 'BYPASS'
+            return response, 202
+        
+        image_data, log_output, cache_status = yard_service.generate_cached(
+            generation_type, mesh_path, use_cache=use_cache, **parameters
+        )
         
         if image_data:
             # Encode image as base64 for JSON response
             image_base64 = base64.b64encode(image_data).decode('utf-8')
             
-            return jsonify({
+            response = jsonify({
                 'status': 'success',
                 'image_data': image_base64,
                 'log_output': log_output,
+                'cache_status': cache_status,
                 'parameters': {
                     'mesh_file': mesh_file,
                     'type': generation_type,
@@ -123,15 +141,155 @@ def generate_yard_map():
                     'projection': projection
                 }
             })
+            response.headers['X-Cache-Status'] = cache_status
+            return response
         else:
-            return jsonify({
+            response = jsonify({
                 'status': 'error',
                 'error': log_output or 'Yard map generation failed'
-            }), 500
+            })
+            response.headers['X-Cache-Status'] = cache_status
+            return response, 500
             
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@bp.route('/jobs', methods=['POST'])
+def submit_yard_map_job():
+    """Queue a yard map render on the job runner and return its job ID right away"""
+    try:
+        data = request.json
+        mesh_file = data.get('mesh_file')
+        
+        if not mesh_file:
+            return jsonify({'error': 'Mesh file not specified'}), 400
+        
+        yard_service = current_app.yard_service
+        
+        # Get full path to mesh file
+        mesh_path = None
+        for mesh in yard_service.list_meshes():
+            if mesh['name'] == mesh_file:
+                mesh_path = mesh['path']
+                break
+        
+        if not mesh_path or not os.path.exists(mesh_path):
+            return jsonify({'error': 'Mesh file not found'}), 404
+        
+        job_id = yard_service.submit_yard_map_job(
+            mesh_path,
+            projection=data.get('projection', 'xy'),
+            custom_bounds=data.get('custom_bounds'),
+            output_width=data.get('output_width', 1280),
+            output_height=data.get('output_height', 720),
+            rotation=data.get('rotation', 0),
+            algorithm=data.get('algorithm', 'bottom_percentile'),
+            coloring=data.get('coloring', 'true_color'),
+            height_window=data.get('height_window', 0.5),
+            max_points=data.get('max_points', 20000000),
+            progressive=data.get('progressive', False),
+            export_ground=data.get('export_ground', False)
+        )
+        
+        return jsonify({
+            'status': 'queued',
+            'job_id': job_id,
+            'status_url': f'{bp.url_prefix}/jobs/{job_id}',
+            'preview_url': f'{bp.url_prefix}/jobs/{job_id}/preview',
+            'result_url': f'{bp.url_prefix}/jobs/{job_id}/result',
+            'cancel_url': f'{bp.url_prefix}/jobs/{job_id}/cancel'
+        }), 202
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@bp.route('/jobs/<job_id>')
+def get_yard_map_job(job_id):
+    """Status and progress of a yard map job"""
+    yard_service = current_app.yard_service
+    status = yard_service.job_runner.status(job_id)
+    
+    if status is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(status)
+
+@bp.route('/jobs/<job_id>/preview')
+def get_yard_map_job_preview(job_id):
+    """Latest preview pass of a progressive job as PNG (the final image once it is done)"""
+    yard_service = current_app.yard_service
+    status = yard_service.job_runner.status(job_id)
+    
+    if status is None:
+        return jsonify({'error': 'Job not found'}), 404
+    
+    result = yard_service.job_runner.result(job_id)
+    if result is not None:
+        response = Response(result[0], mimetype='image/png')
+        response.headers['X-Preview-Pass'] = 'final'
+        return response
+    
+    preview = yard_service.job_runner.preview(job_id)
+    if preview is None:
+        return jsonify({'status': status['status'], 'message': 'No preview available yet'}), 202
+    
+    image_data, info = preview
+    response = Response(image_data, mimetype='image/png')
+    response.headers['X-Preview-Pass'] = f"{info['pass']}/{info['passes']}"
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
+@bp.route('/jobs/<job_id>/cancel', methods=['POST'])
+def cancel_yard_map_job(job_id):
+    """Cancel a queued or running yard map job"""
+    yard_service = current_app.yard_service
+    status = yard_service.job_runner.status(job_id)
+    
+    if status is None:
+        return jsonify({'error': 'Job not found'}), 404
+    if not yard_service.job_runner.cancel(job_id):
+        return jsonify({'error': f"Job already {status['status']}"}), 409
+    
+    return jsonify({
+        'status': 'success',
+        'job_id': job_id,
+        'message': 'Cancellation requested'
+    })
+
+@bp.route('/jobs/<job_id>/result')
+def get_yard_map_job_result(job_id):
+    """Image of a finished yard map job, in the same form as /generate"""
+    yard_service = current_app.yard_service
+    status = yard_service.job_runner.status(job_id)
+    
+    if status is None:
+        return jsonify({'error': 'Job not found'}), 404
+    if status['status'] == 'failed':
+        return jsonify({'status': 'error', 'error': status['error_message'] or 'Yard map generation failed'}), 500
+    if status['status'] == 'cancelled':
+        return jsonify({'status': 'cancelled', 'job_id': job_id}), 410
+    
+    result = yard_service.job_runner.result(job_id)
+    if result is None:
+        return jsonify({'status': status['status'], 'job_id': job_id}), 202
+    
+    image_data, log_output = result
+    if image_data is None:  # Tile pyramid build
+        return jsonify({'status': 'success', 'log_output': log_output, **status['metadata'].get('result', {})})
+    options = status['metadata'].get('options', {})
+    return jsonify({
+        'status': 'success',
+        'image_data': base64.b64encode(image_data).decode('utf-8'),
+        'log_output': log_output,
+        'georef': status['metadata'].get('result', {}).get('georef'),
+        'ground_raster': status['metadata'].get('result', {}).get('ground_raster'),
+        'parameters': {
+            'mesh_file': os.path.basename(status['metadata'].get('mesh_path', '')),
+            'type': 'job',
+            'projection': options.get('projection'),
+            'algorithm': options.get('algorithm')
+        }
+    })
+
 @bp.route('/download', methods=['POST'])
 def download_yard_map():
     """Download generated yard map"""
@@ -181,6 +339,7 @@ def use_yard_map():
             'source': 'generated',
             'parameters': parameters,
             'generated_at': datetime.now().isoformat(),
+            'ground_raster': data.get('ground_raster'),
             
             # Extract map bounds from parameters for Erik positioning
             'map_bounds': {
@@ -273,6 +432,101 @@ def get_active_map_image():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@bp.route('/tiles', methods=['POST'])
+def build_tile_pyramid():
+    """Build (or reuse) the XYZ tile pyramid of a mesh view"""
+    try:
+        data = request.json
+        mesh_file = data.get('mesh_file')
+        
+        if not mesh_file:
+            return jsonify({'error': 'Mesh file not specified'}), 400
+        
+        yard_service = current_app.yard_service
+        
+        # Get full path to mesh file
+        mesh_path = None
+        for mesh in yard_service.list_meshes():
+            if mesh['name'] == mesh_file:
+                mesh_path = mesh['path']
+                break
+        
+        if not mesh_path or not os.path.exists(mesh_path):
+            return jsonify({'error': 'Mesh file not found'}), 404
+        
+        from yard_map.tile_pyramid import MAX_ZOOM
+        max_zoom = data.get('max_zoom')
+        if max_zoom is not None:
+            try:
+                max_zoom = int(max_zoom)
+            except (TypeError, ValueError):
+                return jsonify({'error': f'max_zoom must be an integer from 0 to {MAX_ZOOM}'}), 400
+            if not 0 <= max_zoom <= MAX_ZOOM:
+                return jsonify({'error': f'max_zoom must be an integer from 0 to {MAX_ZOOM}'}), 400
+        
+        pyramid_id, metadata, job_id = yard_service.build_tile_pyramid(
+            mesh_path,
+            projection=data.get('projection', 'xy'),
+            custom_bounds=data.get('custom_bounds'),
+            rotation=data.get('rotation', 0),
+            algorithm=data.get('algorithm', 'bottom_percentile'),
+            coloring=data.get('coloring', 'true_color'),
+            height_window=data.get('height_window', 0.5),
+            max_zoom=max_zoom
+        )
+        tile_url = f'{bp.url_prefix}/tiles/{pyramid_id}/{{z}}/{{x}}/{{y}}.png'
+        
+        # Cold pyramids build on the job runner; tiles are served once the job completes
+        if metadata is None:
+            return jsonify({
+                'status': 'queued',
+                'pyramid_id': pyramid_id,
+                'tile_url': tile_url,
+                'job_id': job_id,
+                'status_url': f'{bp.url_prefix}/jobs/{job_id}',
+                'metadata_url': f'{bp.url_prefix}/tiles/{pyramid_id}/metadata',
+                'cancel_url': f'{bp.url_prefix}/jobs/{job_id}/cancel'
+            }), 202
+        
+        return jsonify({
+            'status': 'success',
+            'pyramid_id': pyramid_id,
+            'tile_url': tile_url,
+            'metadata': metadata
+        })
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@bp.route('/tiles/<pyramid_id>/metadata')
+def get_tile_pyramid_metadata(pyramid_id):
+    """Georeference and zoom range of a tile pyramid"""
+    yard_service = current_app.yard_service
+    directory = yard_service.tile_pyramid_path(pyramid_id)
+    
+    if not directory:
+        return jsonify({'error': 'Tile pyramid not found'}), 404
+    
+    from yard_map.tile_pyramid import touch
+    touch(directory)
+    with open(os.path.join(directory, 'pyramid.json')) as f:
+        response = jsonify(json.load(f))
+    response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+    return response
+
+@bp.route('/tiles/<pyramid_id>/<int:z>/<int:x>/<int:y>.png')
+def get_tile(pyramid_id, z, x, y):
+    """Serve one tile; pyramids are content-addressed, so tiles are cacheable forever"""
+    yard_service = current_app.yard_service
+    directory = yard_service.tile_pyramid_path(pyramid_id)
+    
+    if not directory or not os.path.exists(os.path.join(directory, str(z), str(x), f'{y}.png')):
+        return jsonify({'error': 'Tile not found'}), 404
+    
+    response = send_from_directory(directory, f'{z}/{x}/{y}.png', mimetype='image/png', max_age=31536000)
+    response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+    return response
+
 @bp.route('/presets')
 def get_generation_presets():
     """Get predefined yard map generation presets"""
@@ -42,6 +42,15 @@ class Config:
     YARD_MAP_PATH = os.environ.get('YARD_MAP_PATH', './yard_map.png')
     ACTIVE_YARD_MAP_PATH = os.environ.get('ACTIVE_YARD_MAP_PATH', './active_yard_map.png')
     ACTIVE_YARD_MAP_JSON = os.environ.get('ACTIVE_YARD_MAP_JSON', './active_yard_map.json')
+    POINT_CACHE_DIR = os.environ.get('POINT_CACHE_DIR', os.path.expanduser('~/.cache/yard_map/points'))
+    POINT_CACHE_MAX_BYTES = int(os.environ.get('POINT_CACHE_MAX_BYTES', 8 * 1024 * 1024 * 1024))  # 8GB
+    YARD_MAP_TILES_FOLDER = os.environ.get('YARD_MAP_TILES_FOLDER', './yard_map_tiles')
+    YARD_MAP_TILES_MAX_BYTES = int(os.environ.get('YARD_MAP_TILES_MAX_BYTES', 2 * 1024 * 1024 * 1024))  # 2GB, LRU evicted
+    YARD_MAP_GROUND_FOLDER = os.environ.get('YARD_MAP_GROUND_FOLDER', './yard_map_ground')  # Ground elevation rasters of jobs
+    YARD_MAP_WORKERS = int(os.environ.get('YARD_MAP_WORKERS', 1))  # Persistent yard map render processes
+    YARD_MAP_PNG_COMPRESSION = int(os.environ.get('YARD_MAP_PNG_COMPRESSION', 1))  # zlib level 0-9 for yard map PNGs
+    YARD_MAP_RESULT_CACHE_DIR = os.environ.get('YARD_MAP_RESULT_CACHE_DIR', os.path.expanduser('~/.cache/yard_map/results'))
+    YARD_MAP_RESULT_CACHE_MAX_BYTES = int(os.environ.get('YARD_MAP_RESULT_CACHE_MAX_BYTES', 1024 * 1024 * 1024))  # 1GB
     
     # Global settings
     GLOBAL_SETTINGS_PATH = os.environ.get('GLOBAL_SETTINGS_PATH', './global_settings.json')
@@ -5,10 +5,14 @@ Handles MQTT connections and detection message processing
 
 import json
 import logging
+import time
 import threading
 from datetime import datetime
 import paho.mqtt.client as mqtt
 
+import erik_tracing
+from erik_tracing import LatencyAggregator
+
 logger = logging.getLogger(__name__)
 
 class MQTTDetectionListener:
@@ -33,6 +37,9 @@ class MQTTDetectionListener:
         self.matches_lock = threading.Lock()
         self.max_matches = 50
         
+        # End-to-end latency of traced detections (Frigate event -> position visible)
+        self.latency = LatencyAggregator()
+        
     def _on_connect(self, client, userdata, flags, rc):
         """Handle MQTT connection events"""
         if rc == 0:
@@ -44,8 +51,14 @@ class MQTTDetectionListener:
     def _on_message(self, client, userdata, msg):
         """Process incoming MQTT messages"""
         try:
+            received_at = time.time()
             detection_data = json.loads(msg.payload.decode())
             camera = msg.topic.split('/')[-1]
+            trace = detection_data.get('trace')
+            if isinstance(trace, dict) and isinstance(trace.get('stages'), dict):
+                erik_tracing.mark(trace, erik_tracing.MANAGER_RECEIVED, received_at)
+            else:
+                trace = None
             
             # Add camera name and timestamp
             detection_data['camera'] = camera
@@ -57,6 +70,11 @@ class MQTTDetectionListener:
                 if len(self.detection_matches) > self.max_matches:
                     self.detection_matches.pop()
                     
+            # The match is now visible to /api/erik/live-position
+            if trace is not None:
+                erik_tracing.mark(trace, erik_tracing.POSITION_VISIBLE)
+                self.latency.record(camera, trace)
+                    
             logger.info(f"Received Erik detection on {camera}: {detection_data.get('confidence', 0):.3f}")
             
         except Exception as e:
@@ -178,6 +196,22 @@ class MQTTService:
             return self.listener.get_match_count()
         return 0
     
+    def get_latency_stats(self, camera=None):
+        """Get end-to-end detection latency distributions
+        
+        Args:
+            camera: Limit to one camera (all cameras if not provided)
+            
+        Returns:
+            Dictionary with per-camera stage latency percentiles and recent traces
+        """
+        if self.listener:
+            return {
+                'cameras': self.listener.latency.summary(camera),
+                'recent': self.listener.latency.recent()
+            }
+        return {'cameras': {}, 'recent': []}
+    
     def is_running(self):
         """Check if MQTT listener is running
         
@@ -9,7 +9,9 @@ import numpy as np
 from typing import Dict, List, Tuple, Optional, Any
 import logging
 from pathlib import Path
-import struct
+
+from yard_map.ply_reader import PlyPointCloud
+from yard_map.point_cache import load_cached_points
 
 logger = logging.getLogger(__name__)
 
@@ -185,106 +187,73 @@ class PixelMappingService:
             logger.error(f"Error building ground height map: {e}")
             return {}
     
-    def load_point_cloud(self, file_path: str) -> np.ndarray:
-        """Load point cloud from PLY file (binary or ASCII)"""
+    def load_ground_raster(self, raster_path: str, min_points: int = 1) -> Dict:
+        """
+        Load the ground elevation raster saved with a yard map render instead of
+        rebuilding ground heights from the point cloud
+
+        The yard map configuration is replaced by one matching the raster's
+        georeference, so map pixels and ground height keys line up exactly.
+
+        Args:
+            raster_path: .npz written by yard_map.raster_output.save_ground_rasters
+            min_points: Minimum points measured in a cell for its height to be used
+                        (0 also keeps heights filled in from neighbouring cells)
+
+        Returns:
+            Dictionary mapping yard map pixels to ground heights
+        """
+        from yard_map.raster_output import load_ground_rasters
+
+        rasters = load_ground_rasters(raster_path)
+        georef = rasters['georef']
+        if georef['projection'] not in ('xy', 'xz'):
+            raise ValueError(f"Unsupported ground raster projection: {georef['projection']}")
+
+        # The map is rotated around rotation_center, then cropped to the view bounds;
+        # world_to_yard_map_pixel rotates around center_x/center_y and centers the image
+        mid = np.array([(georef['x_min'] + georef['x_max']) / 2, (georef['y_min'] + georef['y_max']) / 2])
+        pivot = np.array(georef.get('rotation_center') or mid)
+        angle = np.radians(georef.get('rotation_degrees', 0))
+        cos_a, sin_a = np.cos(angle), np.sin(angle)
+        offset = pivot - mid
+        center = pivot - np.array([offset[0] * cos_a + offset[1] * sin_a, -offset[0] * sin_a + offset[1] * cos_a])
+
+        self.yard_map_config = {
+            'image_width': georef['width'],
+            'image_height': georef['height'],
+            'center_x': float(center[0]),
+            'center_y': float(center[1]),
+            'projection': georef['projection'],
+            'rotation_degrees': georef.get('rotation_degrees', 0),
+            'scale_meters_per_pixel': georef['pixel_size_x']
+        }
+
+        usable = np.isfinite(rasters['elevation']) & (rasters['count'] >= min_points)
+        rows, cols = np.nonzero(usable)
+        self.ground_heights = {
+            (int(col), int(row)): float(height)
+            for row, col, height in zip(rows, cols, rasters['elevation'][usable])
+        }
+        logger.info(f"Loaded ground height map with {len(self.ground_heights)} pixels from {raster_path}")
+        return self.ground_heights
+
+    def load_point_cloud(self, file_path: str, max_points: int = 100000) -> np.ndarray:
+        """Load an evenly strided sample of up to max_points points from a PLY file (binary or ASCII)"""
         try:
-            points = []
-            with open(file_path, 'rb') as f:
-                # Read PLY header
-                line = f.readline().decode('utf-8').strip()
-                if line != 'ply':
-                    logger.error("Not a valid PLY file")
-                    return None
-                
-                # Parse header
-                vertex_count = 0
-                header_end = False
-                properties = []
-                format_type = None
-                
-                while not header_end:
-                    line = f.readline().decode('utf-8').strip()
-                    if line.startswith('format'):
-                        format_type = line.split()[1]
-                    elif line.startswith('element vertex'):
-                        vertex_count = int(line.split()[2])
-                    elif line.startswith('property'):
-                        parts = line.split()
-                        prop_type = parts[1]
-                        prop_name = parts[2] if len(parts) > 2 else parts[-1]
-                        properties.append((prop_type, prop_name))
-                    elif line == 'end_header':
-                        header_end = True
-                
-                logger.info(f"Loading PLY with {vertex_count} vertices, format: {format_type}")
-                
-                # Read vertices based on format
-                if format_type and 'binary' in format_type:
-                    # Binary format
-                    import struct
-                    
-                    # Determine byte order
-                    if 'little' in format_type:
-                        endian = '<'
-                    else:
-                        endian = '>'
-                    
-                    # Build format string for struct.unpack
-                    format_str = endian
-                    for prop_type, prop_name in properties:
-                        if prop_type == 'float':
-                            format_str += 'f'
-                        elif prop_type == 'double':
-                            format_str += 'd'
-                        elif prop_type == 'uchar':
-                            format_str += 'B'
-                        elif prop_type == 'char':
-                            format_str += 'b'
-                        elif prop_type == 'ushort':
-                            format_str += 'H'
-                        elif prop_type == 'short':
-                            format_str += 'h'
-                        elif prop_type == 'uint':
-                            format_str += 'I'
-                        elif prop_type == 'int':
-                            format_str += 'i'
-                    
-                    bytes_per_vertex = struct.calcsize(format_str)
-                    
-                    # Read vertices (sample for large files)
-                    sample_rate = max(1, vertex_count // 100000)  # Sample to get ~100k points max
-                    sampled_count = 0
-                    
-                    for i in range(vertex_count):
-                        vertex_bytes = f.read(bytes_per_vertex)
-                        if len(vertex_bytes) < bytes_per_vertex:
-                            break
-                        
-                        # Sample points to reduce memory usage
-                        if i % sample_rate == 0:
-                            vertex_data = struct.unpack(format_str, vertex_bytes)
-                            # Get x, y, z (first 3 floats)
-                            if len(vertex_data) >= 3:
-                                x, y, z = vertex_data[0:3]
-                                points.append(np.array([x, y, z]))
-                                sampled_count += 1
-                    
-                    logger.info(f"Loaded {sampled_count} points (sampled every {sample_rate} vertices)")
-                    
-                else:
-                    # ASCII format
-                    for i in range(min(vertex_count, 100000)):  # Limit to 100k points
-                        line = f.readline().decode('utf-8').strip()
-                        if not line:
-                            break
-                        vertex_data = line.split()
-                        if len(vertex_data) >= 3:
-                            x = float(vertex_data[0])
-                            y = float(vertex_data[1])
-                            z = float(vertex_data[2])
-                            points.append(np.array([x, y, z]))
+            cached = load_cached_points(file_path)
+            if cached is not None:
+                stride = max(1, -(-len(cached) // max_points))
+                points = np.asarray(cached.xyz[::stride])
+                total = len(cached)
+            else:
+                cloud = PlyPointCloud(file_path)
+                logger.info(f"Loading PLY with {len(cloud)} vertices, format: {cloud.header.format}")
+                points = cloud.xyz(cloud.strided(max_points))
+                total = len(cloud)
             
-            return np.array(points) if points else None
+            logger.info(f"Loaded {len(points)} points (sampled from {total} vertices)")
+            return points.astype(np.float64) if len(points) else None
             
         except Exception as e:
             logger.error(f"Error loading point cloud: {e}")
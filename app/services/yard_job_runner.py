@@ -0,0 +1,553 @@
+"""
+Yard Map Job Runner
+Renders yard maps and builds their tile pyramids in a persistent pool of worker
+processes that keep the yard map engine imported and point clouds open between jobs. Jobs return an ID immediately
+and report their progress through the shared progress tracker. Progressive jobs
+first publish low-resolution previews from decimated samples of the cloud, and
+any job can be cancelled; running jobs stop at their next pass.
+"""
+
+import io
+import os
+import sys
+import time
+import contextlib
+import collections
+import logging
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, CancelledError
+from concurrent.futures.process import BrokenProcessPool
+
+from app.utils.progress_tracker import global_progress_tracker
+
+logger = logging.getLogger(__name__)
+
+JOB_TYPE = 'yard_map'
+
+# Rendering options a job accepts, with their defaults
+JOB_DEFAULTS = {
+    'projection': 'xy',
+    'custom_bounds': None,
+    'output_width': 1280,
+    'output_height': 720,
+    'rotation': 0,
+    'algorithm': 'bottom_percentile',
+    'coloring': 'true_color',
+    'height_window': 0.5,
+    'max_points': 20000000,
+    'use_cell_index': True,
+    'compression': None,
+    # yard_map.backends renderer of in-memory clouds; 'numpy' also serves cell indexes and ground rasters
+    'backend': 'numpy',
+    'progressive': False,
+    # Path to also write the ground elevation/count rasters of the render to (.npz)
+    'ground_raster': None,
+    # 'standard' renders the view above; 'raster' is the fixed-size cube raster of
+    # fast_yard_map_raster over the data bounds, from max_points sampled points
+    'generation_type': 'standard',
+    # Height clustering window of the 'raster' generation type
+    'grid_resolution': 0.1,
+}
+
+# Preview passes of progressive jobs before the full render: (max points, resolution divisor)
+PREVIEW_PASSES = ((200000, 4), (2000000, 2))
+
+# Point clouds kept open per worker process
+MAX_WORKER_CLOUDS = 4
+
+# Worker process state, set up once by _init_worker
+_progress_queue = None
+_cancelled = None
+_clouds = {}
+
+
+class JobCancelled(Exception):
+    """Raised inside a worker when its job has been cancelled"""
+
+
+class JobResultExpired(RuntimeError):
+    """Raised by wait() for a finished job whose result has been pruned"""
+
+
+def _init_worker(progress_queue, cancelled, point_cache_dir=None, point_cache_max_bytes=None):
+    """Import the engine once per worker and route progress back to the parent"""
+    global _progress_queue, _cancelled
+    _progress_queue = progress_queue
+    _cancelled = cancelled
+    if point_cache_dir:
+        os.environ['POINT_CACHE_DIR'] = str(point_cache_dir)
+    if point_cache_max_bytes:
+        os.environ['POINT_CACHE_MAX_BYTES'] = str(point_cache_max_bytes)
+    root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    if root not in sys.path:
+        sys.path.insert(0, root)
+    import yard_map.raster_engine  # noqa: F401
+    import yard_map.cell_index_cache  # noqa: F401
+    import yard_map.streaming_raster  # noqa: F401
+
+
+def _report(job_id, kind, *values):
+    if _progress_queue is not None:
+        _progress_queue.put((job_id, kind) + values)
+
+
+def _check_cancelled(job_id):
+    if _cancelled is not None and job_id in _cancelled:
+        raise JobCancelled(f"Job {job_id} was cancelled")
+
+
+def _cached_cloud(mesh_path):
+    """Point cache entry of a mesh, kept open across the jobs of this worker"""
+    from yard_map.point_cache import PointCache, fingerprint
+    key = fingerprint(mesh_path)
+    cloud = _clouds.pop(key, None)
+    if cloud is None:
+        cloud = PointCache().load(mesh_path)
+        while len(_clouds) >= MAX_WORKER_CLOUDS:
+            _clouds.pop(next(iter(_clouds)))
+    _clouds[key] = cloud  # Most recently used last
+    return cloud
+
+
+def _exceeds_point_limit(mesh_path, max_points):
+    if not mesh_path.lower().endswith('.ply'):
+        return False
+    from yard_map.ply_reader import read_header
+    return read_header(mesh_path).vertex_count > max_points
+
+
+def _preview_sample(mesh_path, max_points):
+    """Evenly strided sample of a cloud as (xyz, rgb, total_points)
+
+    Read straight from the memory-mapped PLY while the cloud is not in the point
+    cache yet, so the first preview does not wait for the conversion.
+    """
+    from yard_map.point_cache import PointCache, fingerprint
+    if mesh_path.lower().endswith('.ply') and fingerprint(mesh_path) not in _clouds \
+            and not PointCache().contains(mesh_path):
+        from yard_map.ply_reader import PlyPointCloud
+        cloud = PlyPointCloud(mesh_path)
+        records = cloud.strided(max_points)
+        return cloud.xyz(records), cloud.colors(records), len(cloud)
+    cached = _cached_cloud(mesh_path)
+    step = max(1, -(-len(cached) // max_points))
+    return cached.xyz[::step], None if cached.rgb is None else cached.rgb[::step], len(cached)
+
+
+def _render_previews(job_id, mesh_path, options, note):
+    """Publish the preview passes of a progressive job"""
+    from yard_map.raster_engine import rasterize
+    from yard_map.raster_output import encode_image
+
+    passes = len(PREVIEW_PASSES) + 1
+    for i, (max_points, divisor) in enumerate(PREVIEW_PASSES):
+        _check_cancelled(job_id)
+        start_time = time.time()
+        xyz, rgb, total = _preview_sample(mesh_path, max_points)
+        if i > 0 and len(xyz) >= total:
+            break  # Not faster than the full render
+        width = max(1, options['output_width'] // divisor)
+        height = max(1, options['output_height'] // divisor)
+        image = rasterize(xyz, rgb, options['projection'], options['custom_bounds'], width, height,
+                          options['rotation'], options['algorithm'], options['coloring'], options['height_window'])
+        info = {'pass': i + 1, 'passes': passes, 'points': int(len(xyz)), 'width': width, 'height': height,
+                'seconds': round(time.time() - start_time, 3)}
+        _report(job_id, 'preview', encode_image(image, 'png', options['compression']), info)
+        _report(job_id, 'progress', 'passes', i + 1, passes)
+        note(f"Preview pass {i + 1}: {width}x{height} from {len(xyz):,} of {total:,} points in {info['seconds']:.2f}s")
+
+
+def _render_cube_raster(cached, options, note):
+    """fast_yard_map_raster map of a cached cloud as (image, georef)"""
+    from yard_map.fast_yard_map_raster import create_raster_map, project_to_2d
+    from yard_map.raster_output import georeference
+    from yard_map.sampling import subsample
+
+    vertices, colors = subsample(cached.xyz, cached.rgb, options['max_points'])
+    if len(vertices) < len(cached):
+        note(f"Sampled {len(vertices):,} of {len(cached):,} points")
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        image = create_raster_map(vertices, colors, options['projection'], options['grid_resolution'])
+    note(output.getvalue().rstrip())
+    xy = project_to_2d(vertices, options['projection'])
+    bounds = (xy[:, 0].min(), xy[:, 0].max(), xy[:, 1].min(), xy[:, 1].max())
+    return image, georeference(bounds, image.shape[1], image.shape[0], options['projection'])
+
+
+def render_yard_map(job_id, mesh_path, options):
+    """Render one yard map job (runs in a worker process)
+
+    Returns:
+        Tuple of (png_data, log_output, info)
+    """
+    from yard_map.backends import get_backend
+    from yard_map.raster_engine import rasterize
+    from yard_map.raster_output import encode_image, grid_georeference, save_ground_rasters
+    from yard_map.cell_index_cache import rasterize_cached
+    from yard_map.streaming_raster import rasterize_ply_streaming
+
+    options = {**JOB_DEFAULTS, **options}
+    view = (options['projection'], options['custom_bounds'], options['output_width'], options['output_height'],
+            options['rotation'], options['algorithm'], options['coloring'], options['height_window'])
+    log = []
+
+    def note(message):
+        logger.info(f"Job {job_id}: {message}")
+        log.append(message)
+
+    def streaming_progress(phase, done, total):
+        _check_cancelled(job_id)
+        _report(job_id, 'progress', phase, done, total)
+
+    start_time = time.time()
+    if options['progressive']:
+        _report(job_id, 'status', 'previewing')
+        _render_previews(job_id, mesh_path, options, note)
+    _check_cancelled(job_id)
+
+    georef = None
+    if options['generation_type'] == 'raster':
+        # max_points is a sample size here, not the streaming threshold
+        _report(job_id, 'status', 'loading')
+        cached = _cached_cloud(mesh_path)
+        points = len(cached)
+        note(f"Loaded {points:,} points from the point cache in {time.time() - start_time:.2f}s")
+        _report(job_id, 'progress', 'load', 1, 1)
+        _check_cancelled(job_id)
+
+        _report(job_id, 'status', 'rendering')
+        image, georef = _render_cube_raster(cached, options, note)
+    elif _exceeds_point_limit(mesh_path, options['max_points']):
+        _report(job_id, 'status', 'rendering')
+        note(f"Point cloud exceeds {options['max_points']:,} points, streaming it out-of-core")
+        image, grid, stats = rasterize_ply_streaming(mesh_path, *view, return_stats=True,
+                                                     progress=streaming_progress)
+        points = None
+    else:
+        _report(job_id, 'status', 'loading')
+        cached = _cached_cloud(mesh_path)
+        points = len(cached)
+        note(f"Loaded {points:,} points from the point cache in {time.time() - start_time:.2f}s")
+        _report(job_id, 'progress', 'load', 1, 1)
+        _check_cancelled(job_id)
+
+        _report(job_id, 'status', 'rendering')
+        render_start = time.time()
+        if options['backend'] != 'numpy' and not options['ground_raster']:
+            image, grid = get_backend(options['backend']).render(cached.xyz, cached.rgb, *view)
+        elif options['use_cell_index']:
+            image, grid, stats = rasterize_cached(cached, *view, return_stats=True)
+        else:
+            image, grid, stats = rasterize(cached.xyz, cached.rgb, *view, return_stats=True)
+        note(f"Rendered {options['output_width']}x{options['output_height']} {options['algorithm']} map "
+             f"with the {options['backend']} backend in {time.time() - render_start:.2f}s")
+    _report(job_id, 'progress', 'render', 1, 1)
+    if options['progressive']:
+        _report(job_id, 'progress', 'passes', len(PREVIEW_PASSES) + 1, len(PREVIEW_PASSES) + 1)
+
+    _report(job_id, 'status', 'encoding')
+    image_data = encode_image(image, 'png', options['compression'])
+    if georef is None:
+        georef = grid_georeference(grid, options['projection'], options['rotation'],
+                                   algorithm=options['algorithm'], coloring=options['coloring'])
+    info = {'points': points, 'worker_pid': os.getpid(), 'georef': georef}
+    if options['ground_raster']:
+        os.makedirs(os.path.dirname(os.path.abspath(options['ground_raster'])), exist_ok=True)
+        size = save_ground_rasters(stats, grid, options['ground_raster'], georef)
+        info['ground_raster'] = options['ground_raster']
+        note(f"Saved ground elevation raster ({size / 1024:.1f} KB) to {options['ground_raster']}")
+    note(f"Done in {time.time() - start_time:.2f}s")
+    info['render_seconds'] = round(time.time() - start_time, 3)
+    return image_data, '\n'.join(log), info
+
+
+def build_tile_pyramid(job_id, mesh_path, directory, parameters):
+    """Build the tile pyramid of a mesh view into `directory` (runs in a worker process)
+
+    Returns:
+        Tuple of (None, log_output, info) with the pyramid metadata in info
+    """
+    from yard_map.tile_pyramid import build_pyramid
+
+    def progress(done, total):
+        _check_cancelled(job_id)
+        _report(job_id, 'progress', 'tiles', done, total)
+
+    start_time = time.time()
+    _report(job_id, 'status', 'loading')
+    cached = _cached_cloud(mesh_path)
+    _report(job_id, 'progress', 'load', 1, 1)
+    _check_cancelled(job_id)
+
+    _report(job_id, 'status', 'rendering')
+    metadata = build_pyramid(cached.xyz, cached.rgb, directory, progress=progress, **parameters)
+    log_output = (f"Built tile pyramid zoom 0-{metadata['max_zoom']} from {len(cached):,} points "
+                  f"in {time.time() - start_time:.2f}s")
+    logger.info(f"Job {job_id}: {log_output}")
+    info = {'points': len(cached), 'worker_pid': os.getpid(), 'pyramid_id': os.path.basename(directory),
+            'pyramid': metadata}
+    return None, log_output, info
+
+
+class YardMapJobRunner:
+    """Persistent worker pool for yard map jobs, tracked in the progress tracker"""
+
+    def __init__(self, max_workers=1, point_cache_dir=None, point_cache_max_bytes=None,
+                 tracker=None, max_finished=10):
+        """Initialize the runner (worker processes start with the first job)
+
+        Args:
+            max_workers: Number of worker processes
+            point_cache_dir: Point cache directory used by the workers
+            point_cache_max_bytes: Point cache size budget used by the workers
+            tracker: ProgressTracker for job sessions (default: the global tracker)
+            max_finished: Finished jobs (and their images) kept for retrieval
+        """
+        self.max_workers = max(1, int(max_workers))
+        self.point_cache_dir = point_cache_dir
+        self.point_cache_max_bytes = point_cache_max_bytes
+        self.tracker = tracker or global_progress_tracker
+        self.max_finished = max_finished
+
+        self._lock = threading.Lock()
+        self._executor = None
+        self._manager = None
+        self._progress_queue = None
+        self._cancelled = None
+        self._futures = {}
+        self._results = {}
+        self._previews = {}
+        self._callbacks = {}
+        self._expired = collections.deque(maxlen=1000)
+
+    def _pool(self):
+        with self._lock:
+            if self._executor is None:
+                # Spawned (not forked) workers: the server process runs threads
+                context = multiprocessing.get_context('spawn')
+                if self._manager is None:
+                    self._manager = context.Manager()
+                    self._cancelled = self._manager.dict()
+                self._progress_queue = context.Queue()
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers, mp_context=context, initializer=_init_worker,
+                    initargs=(self._progress_queue, self._cancelled, self.point_cache_dir, self.point_cache_max_bytes)
+                )
+                threading.Thread(target=self._pump_progress, args=(self._progress_queue,), daemon=True).start()
+                logger.info(f"Started yard map worker pool with {self.max_workers} process(es)")
+            return self._executor
+
+    def _pump_progress(self, progress_queue):
+        """Forward worker progress messages into the tracker"""
+        while True:
+            try:
+                message = progress_queue.get()
+            except (EOFError, OSError):
+                return
+            if message is None:
+                return
+            job_id, kind = message[:2]
+            session = self.tracker.get_session(job_id)
+            if session is None or session.completed:
+                continue
+            if kind == 'status':
+                self.tracker.set_session_status(job_id, message[2])
+            elif kind == 'progress':
+                self.tracker.update_session_progress(job_id, *message[2:])
+            elif kind == 'preview':
+                image_data, info = message[2:]
+                with self._lock:
+                    self._previews[job_id] = (image_data, info)
+                self.tracker.add_session_metadata(job_id, 'preview', info)
+
+    def submit(self, mesh_path, on_complete=None, **options):
+        """Queue a render job
+
+        Args:
+            mesh_path: Path to the mesh file
+            on_complete: Optional callable(image_data, log_output, info) run when the job succeeds
+            **options: Rendering options (see JOB_DEFAULTS)
+
+        Returns:
+            Job ID (a progress tracker session ID)
+        """
+        unknown = set(options) - set(JOB_DEFAULTS)
+        if unknown:
+            raise ValueError(f"Unknown yard map job options: {sorted(unknown)}")
+        if options.get('generation_type', 'standard') not in ('standard', 'raster'):
+            raise ValueError(f"Unknown yard map generation type: {options['generation_type']}")
+        if options.get('generation_type') == 'raster' and (options.get('progressive') or options.get('ground_raster')):
+            raise ValueError("Raster yard maps have no preview passes or ground rasters")
+
+        job_id = self.tracker.create_session(session_type=JOB_TYPE)
+        self.tracker.add_session_metadata(job_id, 'mesh_path', mesh_path)
+        self.tracker.add_session_metadata(job_id, 'options', {**JOB_DEFAULTS, **options})
+        self.tracker.set_session_status(job_id, 'queued')
+        return self._start(job_id, on_complete, render_yard_map, job_id, mesh_path, options)
+
+    def submit_pyramid(self, mesh_path, directory, on_complete=None, **parameters):
+        """Queue a tile pyramid build (see yard_map.tile_pyramid.build_pyramid)
+
+        Args:
+            mesh_path: Path to the mesh file
+            directory: Pyramid directory to build
+            on_complete: Optional callable(None, log_output, info) run when the build succeeds
+            **parameters: Keyword arguments of build_pyramid
+
+        Returns:
+            Job ID (a progress tracker session ID)
+        """
+        job_id = self.tracker.create_session(session_type=JOB_TYPE)
+        self.tracker.add_session_metadata(job_id, 'mesh_path', mesh_path)
+        self.tracker.add_session_metadata(job_id, 'options', parameters)
+        self.tracker.add_session_metadata(job_id, 'pyramid_id', os.path.basename(directory))
+        self.tracker.set_session_status(job_id, 'queued')
+        return self._start(job_id, on_complete, build_tile_pyramid, job_id, mesh_path, directory, parameters)
+
+    def _start(self, job_id, on_complete, function, *args):
+        executor = self._pool()
+        try:
+            future = executor.submit(function, *args)
+        except BrokenProcessPool:
+            # A worker died while the pool was idle
+            self._release_pool(executor, wait=False)
+            executor = self._pool()
+            future = executor.submit(function, *args)
+        with self._lock:
+            self._futures[job_id] = future
+            if on_complete is not None:
+                self._callbacks[job_id] = on_complete
+        future.add_done_callback(lambda f: self._finish(job_id, f, executor))
+        return job_id
+
+    def _finish(self, job_id, future, executor=None):
+        try:
+            image_data, log_output, info = future.result()
+        except (CancelledError, JobCancelled):
+            logger.info(f"Yard map job {job_id} cancelled")
+            self.tracker.set_session_status(job_id, 'cancelled')
+        except BrokenProcessPool as e:
+            logger.error(f"Yard map worker pool broke during job {job_id}: {e}")
+            self._release_pool(executor, wait=False)  # Restarted on the next submit
+            self.tracker.set_session_status(job_id, 'failed', f"Worker process died: {e}")
+        except Exception as e:
+            logger.error(f"Yard map job {job_id} failed: {e}")
+            self.tracker.set_session_status(job_id, 'failed', str(e))
+        else:
+            with self._lock:
+                self._results[job_id] = (image_data, log_output)
+                on_complete = self._callbacks.get(job_id)
+            self.tracker.add_session_metadata(job_id, 'result', info)
+            self.tracker.set_session_status(job_id, 'completed')
+            if on_complete is not None:
+                try:
+                    on_complete(image_data, log_output, info)
+                except Exception as e:
+                    logger.warning(f"Completion callback of yard map job {job_id} failed: {e}")
+
+        with self._lock:
+            self._futures.pop(job_id, None)
+            self._callbacks.pop(job_id, None)
+            if self._cancelled is not None:
+                self._cancelled.pop(job_id, None)
+        self._prune()
+
+    def _prune(self):
+        """Drop the images of finished jobs the tracker no longer keeps"""
+        self.tracker.cleanup_completed_sessions(self.max_finished, session_type=JOB_TYPE)
+        with self._lock:
+            for stored in (self._results, self._previews):
+                for job_id in list(stored):
+                    if self.tracker.get_session(job_id) is None:
+                        del stored[job_id]
+                        if stored is self._results:
+                            self._expired.append(job_id)
+
+    def status(self, job_id):
+        """Progress session of a job as a dictionary, or None for unknown jobs"""
+        session = self.tracker.get_session(job_id)
+        if session is None or session.session_type != JOB_TYPE:
+            return None
+        return session.to_dict()
+
+    def result(self, job_id):
+        """(png_data, log_output) of a completed job, or None"""
+        with self._lock:
+            return self._results.get(job_id)
+
+    def preview(self, job_id):
+        """(png_data, info) of the latest preview pass of a job, or None"""
+        with self._lock:
+            return self._previews.get(job_id)
+
+    def cancel(self, job_id):
+        """Cancel a queued or running job; running jobs stop at their next pass
+
+        Returns:
+            False when the job is unknown or already finished
+        """
+        with self._lock:
+            future = self._futures.get(job_id)
+        if future is None:
+            return False
+        if not future.cancel():  # Already running
+            with self._lock:
+                cancelled = self._cancelled
+            if cancelled is not None:
+                cancelled[job_id] = True
+        self.tracker.add_session_metadata(job_id, 'cancel_requested', True)
+        logger.info(f"Cancellation requested for yard map job {job_id}")
+        return True
+
+    def wait(self, job_id, timeout=None):
+        """Block until a job finishes
+
+        Returns:
+            Tuple of (png_data, log_output)
+
+        Raises:
+            The job's exception, TimeoutError, or JobResultExpired when the
+            job succeeded but its result has already been pruned
+        """
+        with self._lock:
+            future = self._futures.get(job_id)
+            expired = job_id in self._expired
+        if future is not None:
+            image_data, log_output, _ = future.result(timeout)
+            return image_data, log_output
+        result = self.result(job_id)
+        if result is not None:
+            return result
+        if expired:
+            raise JobResultExpired(f"Result of yard map job {job_id} has expired")
+        session = self.tracker.get_session(job_id)
+        if session is None:
+            raise RuntimeError(f"Unknown job: {job_id}")
+        if session.status == 'completed':
+            raise JobResultExpired(f"Result of yard map job {job_id} has expired")
+        raise RuntimeError(session.error_message or f"Yard map job {job_id} {session.status}")
+
+    def _release_pool(self, broken=None, wait=True):
+        """Stop the worker pool along with its progress pump and manager
+
+        Args:
+            broken: Only release the pool if it is still this executor (a broken
+                pool fails all of its jobs, but is replaced once)
+            wait: Wait for the worker processes to exit
+        """
+        with self._lock:
+            if self._executor is None or (broken is not None and self._executor is not broken):
+                return
+            executor, self._executor = self._executor, None
+            progress_queue, self._progress_queue = self._progress_queue, None
+            manager, self._manager = self._manager, None
+            self._cancelled = None
+        executor.shutdown(wait=wait, cancel_futures=True)
+        progress_queue.put(None)
+        manager.shutdown()
+
+    def shutdown(self, wait=True):
+        """Stop the worker processes"""
+        self._release_pool(wait=wait)
@@ -10,11 +10,19 @@ import logging
 import subprocess
 import tempfile
 import shutil
+import threading
 from pathlib import Path
 from datetime import datetime
 
 logger = logging.getLogger(__name__)
 
+
+def valid_bounds(custom_bounds):
+    """True for a usable [x_min, x_max, y_min, y_max] list"""
+    return (custom_bounds is not None and len(custom_bounds) == 4
+            and all(isinstance(x, (int, float)) for x in custom_bounds))
+
+
 class YardMappingService:
     """Service for generating yard maps from 3D mesh data"""
     
@@ -27,16 +35,238 @@ class YardMappingService:
         self.yard_map_path = self.config.get('YARD_MAP_PATH', './yard_map.png')
         self.active_yard_map_path = self.config.get('ACTIVE_YARD_MAP_PATH', './active_yard_map.png')
         self.active_yard_map_json = self.config.get('ACTIVE_YARD_MAP_JSON', './active_yard_map.json')
+        self.tiles_folder = self.config.get('YARD_MAP_TILES_FOLDER', './yard_map_tiles')
+        self.tiles_max_bytes = int(self.config.get('YARD_MAP_TILES_MAX_BYTES', 2 * 1024 ** 3))
+        self.ground_folder = self.config.get('YARD_MAP_GROUND_FOLDER', './yard_map_ground')
         
         # Yard map generation scripts
         self.script_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
         self.yard_map_dir = os.path.join(self.script_dir, 'yard_map')
-        self.fast_yard_map_script = os.path.join(self.yard_map_dir, 'fast_yard_map.py')
-        self.raster_yard_map_script = os.path.join(self.yard_map_dir, 'fast_yard_map_raster.py')
         
         # Python executable (use dev-venv for packages)
         venv_python = os.path.join(self.script_dir, 'dev-venv', 'bin', 'python3')
         self.python_executable = venv_python if os.path.exists(venv_python) else sys.executable
+        
+        # Raster backend of the ground algorithms: 'auto' (calibrated pick) or a
+        # yard_map.backends name ('cuda', 'numba', 'tiled', 'numpy')
+        self.raster_backend = self.config.get('YARD_MAP_BACKEND', os.environ.get('YARD_MAP_BACKEND', 'auto'))
+        self.calibration_path = self.config.get('YARD_MAP_CALIBRATION')
+        self._cuda_available = None
+        # CPU backend renders through the persisted per-view cell index (fast parameter tweaks)
+        use_cell_index = self.config.get('YARD_MAP_CELL_INDEX', os.environ.get('YARD_MAP_CELL_INDEX', 'true'))
+        self.use_cell_index = str(use_cell_index).lower() in ('1', 'true', 'yes')
+        
+        # Columnar point cache shared with the generator scripts (via the environment)
+        self.point_cache_dir = self.config.get('POINT_CACHE_DIR')
+        self.point_cache_max_bytes = self.config.get('POINT_CACHE_MAX_BYTES')
+        
+        # zlib level of encoded yard map PNGs (lossless at every level, low levels encode fastest)
+        self.png_compression = self.config.get('YARD_MAP_PNG_COMPRESSION')
+        
+        # Generated images keyed by mesh fingerprint and parameters
+        from yard_map.result_cache import ResultCache
+        self.result_cache = ResultCache(self.config.get('YARD_MAP_RESULT_CACHE_DIR'),
+                                        self.config.get('YARD_MAP_RESULT_CACHE_MAX_BYTES'))
+        
+        # Warm worker processes rendering CPU yard maps in-process (started with the first job)
+        from app.services.yard_job_runner import YardMapJobRunner
+        self.job_runner = YardMapJobRunner(
+            max_workers=self.config.get('YARD_MAP_WORKERS', 1),
+            point_cache_dir=self.point_cache_dir,
+            point_cache_max_bytes=self.point_cache_max_bytes
+        )
+        # Tile pyramid builds in progress: pyramid ID -> job ID
+        self._pyramid_jobs = {}
+        self._pyramid_lock = threading.Lock()
+    
+    def point_cache(self):
+        from yard_map.point_cache import PointCache
+        return PointCache(self.point_cache_dir, self.point_cache_max_bytes)
+    
+    def script_env(self):
+        """Environment for generator subprocesses, pointing them at the shared point cache"""
+        env = dict(os.environ)
+        if self.point_cache_dir:
+            env['POINT_CACHE_DIR'] = str(self.point_cache_dir)
+        if self.point_cache_max_bytes:
+            env['POINT_CACHE_MAX_BYTES'] = str(self.point_cache_max_bytes)
+        return env
+    
+    def cuda_available(self):
+        """Whether the generator's Python can use CuPy on a GPU (checked once, in a subprocess)"""
+        if self._cuda_available is None:
+            try:
+                result = subprocess.run(
+                    [self.python_executable, '-c',
+                     'import cupy; assert cupy.cuda.runtime.getDeviceCount() > 0'],
+                    capture_output=True, timeout=60
+                )
+                self._cuda_available = result.returncode == 0
+            except (subprocess.TimeoutExpired, OSError) as e:
+                logger.warning(f"CUDA availability check failed: {e}")
+                self._cuda_available = False
+            logger.info(f"CUDA available for yard map generation: {self._cuda_available}")
+        return self._cuda_available
+    
+    def backend_checks(self):
+        """Requirement checks of yard_map.backends, with the GPU probed in the generator's Python"""
+        return {'cupy': self.cuda_available, 'gpu': self.cuda_available}
+    
+    def point_count(self, mesh_path):
+        """Vertex count from the PLY header (None when it cannot be read)"""
+        from yard_map.ply_reader import read_header
+        try:
+            return read_header(mesh_path).vertex_count
+        except Exception:
+            return None
+    
+    def select_backend(self, algorithm, n_points=None):
+        """Backend rendering `algorithm`: the configured one, else the calibrated fastest for n_points"""
+        from yard_map.backends import get_backend, pick_backend, load_calibration
+        if self.raster_backend != 'auto':
+            backend = get_backend(self.raster_backend)
+            if backend.supports(algorithm):
+                return backend
+            logger.warning(f"Backend {backend.name} does not implement {algorithm}, picking another")
+        return pick_backend(algorithm, n_points, load_calibration(self.calibration_path), self.backend_checks())
+    
+    def submit_yard_map_job(self, mesh_path, projection='xy', custom_bounds=None, output_width=1280,
+                            output_height=720, rotation=0, algorithm='bottom_percentile', coloring='true_color',
+                            height_window=0.5, max_points=20000000, progressive=False, export_ground=False,
+                            backend='numpy', generation_type='standard', grid_resolution=0.1, on_complete=None):
+        """Queue a yard map render on the job runner
+        
+        Args:
+            progressive: Publish low-resolution preview passes before the full render
+            generation_type: 'standard', or 'raster' for the fixed-size cube raster over the data
+                bounds (uses projection, grid_resolution and max_points as its sample size)
+            backend: In-process yard_map.backends renderer of the loaded cloud
+            export_ground: Also save the render's ground elevation raster (see ground_raster_for)
+            on_complete: Optional callable(image_data, log_output, info) run when the job succeeds
+        
+        Returns:
+            Job ID, whose progress is tracked in the progress tracker
+        """
+        ground_raster = None
+        if export_ground:
+            ground_raster = self.ground_raster_for(mesh_path, projection=projection, custom_bounds=custom_bounds,
+                                                   output_width=output_width, output_height=output_height,
+                                                   rotation=rotation, algorithm=algorithm,
+                                                   height_window=height_window)
+        return self.job_runner.submit(
+            mesh_path, on_complete=on_complete, projection=projection, custom_bounds=custom_bounds, output_width=output_width,
+            output_height=output_height, rotation=rotation, algorithm=algorithm, coloring=coloring,
+            height_window=height_window, max_points=max_points, use_cell_index=self.use_cell_index,
+            compression=self.png_compression, progressive=progressive, ground_raster=ground_raster,
+            backend=backend, generation_type=generation_type, grid_resolution=grid_resolution
+        )
+    
+    def queue_yard_map(self, mesh_path, generation_type='standard', use_cache=True, **parameters):
+        """Queue a yard map request on the job runner when its backend renders in-process
+        
+        The result is stored in the result cache when the job succeeds.
+        
+        Args:
+            mesh_path: Path to the mesh file
+            generation_type: 'standard' or 'raster' (see generate_cached)
+            use_cache: False to bypass the result cache
+            **parameters: Keyword arguments of generate_yard_map or generate_raster_yard_map
+            
+        Returns:
+            Job ID, or None when generate_cached serves the request instead
+            (cache hits and script backends)
+        """
+        key = self.result_cache_key(generation_type, mesh_path, parameters) if use_cache else None
+        if key and self.result_cache.get(key):
+            return None
+        
+        def store(image_data, log_output, info):
+            if key:
+                self.result_cache.put(key, image_data, log_output=log_output, mesh_path=mesh_path,
+                                      generation_type=generation_type, parameters=parameters)
+        
+        if generation_type == 'raster':
+            job_id = self.submit_yard_map_job(
+                mesh_path, projection=parameters.get('projection', 'xy'),
+                max_points=parameters.get('max_points', 20000000),
+                generation_type='raster', grid_resolution=parameters.get('grid_resolution', 0.1), on_complete=store
+            )
+            logger.info(f"Queued raster yard map in job runner (job {job_id})")
+            return job_id
+        
+        algorithm = parameters.get('algorithm', 'kmeans')
+        backend = self.select_backend(algorithm, self.point_count(mesh_path))
+        if not backend.in_process:
+            return None
+        custom_bounds = parameters.get('custom_bounds')
+        job_id = self.submit_yard_map_job(
+            mesh_path, projection=parameters.get('projection', 'xy'),
+            custom_bounds=custom_bounds if valid_bounds(custom_bounds) else None,
+            rotation=parameters.get('rotation', 0), algorithm=algorithm,
+            height_window=parameters.get('height_window', 0.5), backend=backend.name, on_complete=store
+        )
+        logger.info(f"Queued yard map with the {backend.name} backend in job runner (job {job_id})")
+        return job_id
+    
+    def ground_raster_for(self, mesh_path, **view):
+        """Ground raster path of a view: one file per mesh and view, overwritten on re-render"""
+        key = self.result_cache_key('ground', mesh_path, view)
+        name = key or os.path.splitext(os.path.basename(mesh_path))[0]
+        return os.path.join(self.ground_folder, f"{name}.npz")
+    
+    def active_ground_raster_path(self):
+        """Ground elevation raster saved with the active yard map"""
+        from yard_map.raster_output import ground_raster_path
+        return ground_raster_path(self.active_yard_map_path)
+    
+    def result_cache_key(self, generation_type, mesh_path, parameters):
+        """Result cache key of a generation request, or None when the mesh cannot be fingerprinted"""
+        from yard_map.result_cache import result_key
+        parameters = dict(parameters)
+        if generation_type != 'raster':
+            # The raster backends always use every point and render pixels, not sized dots
+            parameters.pop('max_points', None)
+            parameters.pop('point_size', None)
+        try:
+            return result_key(mesh_path, type=generation_type, **parameters)
+        except OSError as e:
+            logger.warning(f"Cannot fingerprint {mesh_path} for the result cache: {e}")
+            return None
+    
+    def generate_cached(self, generation_type, mesh_path, use_cache=True, **parameters):
+        """Generate a yard map, serving repeated requests from the result cache
+        
+        Args:
+            generation_type: 'standard' (generate_yard_map) or 'raster' (generate_raster_yard_map)
+            mesh_path: Path to the mesh file
+            use_cache: False to bypass the cache
+            **parameters: Keyword arguments of the generator
+            
+        Returns:
+            Tuple of (image_data, output_log, cache_status) with cache_status 'HIT', 'MISS' or 'BYPASS'
+        """
+        key = self.result_cache_key(generation_type, mesh_path, parameters) if use_cache else None
+        if key:
+            cached = self.result_cache.get(key)
+            if cached:
+                image_data, meta = cached
+                logger.info(f"Serving yard map from result cache ({key})")
+                return image_data, meta.get('log_output', ''), 'HIT'
+        
+        if generation_type == 'raster':
+            image_data, log_output = self.generate_raster_yard_map(mesh_path, **parameters)
+        else:
+            image_data, log_output = self.generate_yard_map(mesh_path, **parameters)
+        
+        if not key:
+            return image_data, log_output, 'BYPASS'
+        if image_data:
+            try:
+                self.result_cache.put(key, image_data, log_output=log_output, mesh_path=mesh_path,
+                                      generation_type=generation_type, parameters=parameters)
+            except OSError as e:
+                logger.warning(f"Could not store yard map in result cache: {e}")
+        return image_data, log_output, 'MISS'
     
     def generate_yard_map(self, mesh_path, grid_resolution=0.1, max_points=50000, 
                          point_size=0.1, projection='xy', algorithm='kmeans', custom_bounds=None, height_window=0.5, rotation=0):
@@ -48,7 +278,7 @@ class YardMappingService:
             max_points: Maximum number of points to process
             point_size: Size of points in the visualization
             projection: Projection plane ('xy', 'xz', 'yz')
-            algorithm: Algorithm for processing points ('kmeans', 'simple_average')
+            algorithm: Ground algorithm (raster_engine.ALGORITHMS, e.g. 'kmeans', 'simple_average')
             custom_bounds: [x_min, x_max, y_min, y_max] for fixed view area and scale
             height_window: Height window for K-means optimization (default: 0.5m)
             rotation: Rotation angle in degrees (default: 0)
@@ -59,45 +289,28 @@ class YardMappingService:
         try:
             logger.info(f"Generating yard map with algorithm: {algorithm}, custom_bounds: {custom_bounds}")
             
-            # Use CUDA script for bottom_percentile and simple_average, regular script for kmeans
-            if algorithm in ['simple_average', 'bottom_percentile']:
-                script_to_use = os.path.join(self.yard_map_dir, 'fast_yard_map_cuda.py')
-                # Use much higher point limit for CUDA algorithms since they can handle it efficiently
-                cuda_max_points = 20000000  # Use full dataset for CUDA algorithms
-                cmd = [
-                    self.python_executable, script_to_use, mesh_path,
-                    '--max-points', str(cuda_max_points),
-                    '--grid-resolution', str(grid_resolution),
-                    '--projection', projection,
-                    '--algorithm', algorithm,
-                    '--rotation', str(rotation)
-                ]
-                logger.info(f"Using CUDA algorithm with {cuda_max_points:,} max points")
-                
-                # CUDA script uses separate parameters for bounds
-                if custom_bounds is not None and len(custom_bounds) == 4 and all(isinstance(x, (int, float)) and x is not None for x in custom_bounds):
-                    cmd.extend(['--x-min', str(custom_bounds[0])])
-                    cmd.extend(['--x-max', str(custom_bounds[1])])
-                    cmd.extend(['--y-min', str(custom_bounds[2])])
-                    cmd.extend(['--y-max', str(custom_bounds[3])])
-                    logger.info(f"Added bounds parameters: x=[{custom_bounds[0]}, {custom_bounds[1]}], y=[{custom_bounds[2]}, {custom_bounds[3]}]")
-                elif custom_bounds is not None:
-                    logger.warning(f"Invalid custom_bounds ignored: {custom_bounds} (type: {type(custom_bounds)}, len: {len(custom_bounds) if hasattr(custom_bounds, '__len__') else 'N/A'})")
-                    
-            else:  # kmeans - use regular script
-                cmd = [
-                    self.python_executable, self.fast_yard_map_script, mesh_path,
-                    '--max-points', str(max_points),
-                    '--point-size', str(point_size),
-                    '--grid-resolution', str(grid_resolution),
-                    '--projection', projection,
-                    '--algorithm', algorithm,
-                    '--height-window', str(height_window)
-                ]
-                
-                # Add custom bounds if provided
-                if custom_bounds is not None:
-                    cmd.extend(['--custom-bounds'] + [str(bound) for bound in custom_bounds])
+            # Registered raster backends for every ground algorithm
+            backend = self.select_backend(algorithm, self.point_count(mesh_path))
+            bounds_ok = valid_bounds(custom_bounds)
+            if custom_bounds is not None and not bounds_ok:
+                logger.warning(f"Invalid custom_bounds ignored: {custom_bounds}")
+            
+            # CPU backends run in the warm job runner instead of a fresh interpreter
+            if backend.in_process:
+                job_id = self.submit_yard_map_job(
+                    mesh_path, projection=projection, custom_bounds=custom_bounds if bounds_ok else None,
+                    rotation=rotation, algorithm=algorithm, height_window=height_window, backend=backend.name
+                )
+                logger.info(f"Rendering yard map with the {backend.name} backend in job runner (job {job_id})")
+                return self.job_runner.wait(job_id, timeout=600)
+            
+            # Use the full dataset: these algorithms handle it efficiently
+            cmd = backend.command(
+                self.python_executable, mesh_path, projection=projection,
+                custom_bounds=custom_bounds if bounds_ok else None, rotation=rotation, algorithm=algorithm,
+                height_window=height_window, grid_resolution=grid_resolution, compression=self.png_compression
+            )
+            logger.info(f"Using {backend.name} backend generator script")
                 
             # Create temporary output file
             with tempfile.NamedTemporaryFile(suffix='.png', delete=False) as tmp_file:
@@ -105,7 +318,7 @@ class YardMappingService:
                 
                 logger.info(f"Running yard map generation command: {cmd}")
                 logger.info(f"Command as string: {' '.join(cmd)}")
-                result = subprocess.run(cmd, capture_output=True, text=True, timeout=600)
+                result = subprocess.run(cmd, capture_output=True, text=True, timeout=600, env=self.script_env())
                 
                 if result.returncode == 0:
                     # Read the generated image
@@ -120,7 +333,7 @@ class YardMappingService:
                     logger.error(f"Yard map generation failed: {result.stderr}")
                     return None, result.stderr
                     
-        except subprocess.TimeoutExpired:
+        except (subprocess.TimeoutExpired, TimeoutError):
             logger.error("Yard map generation timed out")
             return None, "Generation timed out after 10 minutes"
         except Exception as e:
@@ -149,41 +362,13 @@ class YardMappingService:
             Tuple of (image_data, output_log) or (None, error_message) if failed
         """
         try:
-            # Check if raster script exists, fallback to regular if not
-            if not os.path.exists(self.raster_yard_map_script):
-                logger.warning(f"Raster script not found, using regular yard map generation")
-                return self.generate_yard_map(mesh_path, grid_resolution, max_points, 0.1, projection)
-            
-            cmd = [
-                self.python_executable, self.raster_yard_map_script, mesh_path,
-                '--max-points', str(max_points),
-                '--grid-resolution', str(grid_resolution),
-                '--projection', projection
-            ]
-            
-            # Note: custom bounds not supported by raster script
-                
-            # Create temporary output file
-            with tempfile.NamedTemporaryFile(suffix='.png', delete=False) as tmp_file:
-                cmd.extend(['--output', tmp_file.name])
-                
-                logger.info(f"Running raster yard map generation")
-                result = subprocess.run(cmd, capture_output=True, text=True, timeout=600)
-                
-                if result.returncode == 0:
-                    # Read the generated image
-                    with open(tmp_file.name, 'rb') as f:
-                        image_data = f.read()
-                    
-                    # Clean up temp file
-                    os.unlink(tmp_file.name)
+            # Rendered from the point cache in the warm job runner (custom bounds are not supported)
+            job_id = self.submit_yard_map_job(mesh_path, projection=projection, max_points=max_points,
+                                              generation_type='raster', grid_resolution=grid_resolution)
+            logger.info(f"Running raster yard map generation in job runner (job {job_id})")
+            return self.job_runner.wait(job_id, timeout=600)
                     
-                    return image_data, result.stdout
-                else:
-                    logger.error(f"Raster yard map generation failed: {result.stderr}")
-                    return None, result.stderr
-                    
-        except subprocess.TimeoutExpired:
+        except TimeoutError:
             logger.error("Raster yard map generation timed out")
             return None, "Generation timed out after 10 minutes"
         except Exception as e:
@@ -202,19 +387,15 @@ class YardMappingService:
             Bounds dictionary or None if failed
         """
         try:
-            import trimesh
-            import numpy as np
-            
             logger.info(f"Scanning bounds for: {mesh_path} with projection: {projection}")
             
-            # Load mesh and get vertices
-            mesh = trimesh.load(mesh_path)
-            vertices = mesh.vertices
+            # Exact for converted clouds, else from a strided sample stored in the point cache
+            scan = self.point_cache().scan(mesh_path)
             
-            # Calculate 2-98 percentile bounds for all axes
-            x_bounds = np.percentile(vertices[:, 0], [2, 98])
-            y_bounds = np.percentile(vertices[:, 1], [2, 98])
-            z_bounds = np.percentile(vertices[:, 2], [2, 98])
+            # 2-98 percentile bounds for all axes
+            x_bounds = scan.percentiles('x', (2, 98))
+            y_bounds = scan.percentiles('y', (2, 98))
+            z_bounds = scan.percentiles('z', (2, 98))
             
             # Select bounds based on projection
             if projection == 'xy':
@@ -253,7 +434,9 @@ class YardMappingService:
                 'y_max': float(axis2_bounds[1]),
                 'z_min': float(z_bounds[0]),
                 'z_max': float(z_bounds[1]),
-                'total_points': len(vertices)
+                'total_points': len(scan),
+                'sampled_points': scan.meta['sample_size'] or len(scan),
+                'percentile_error': scan.meta['rank_error']
             }
             
             return bounds
@@ -265,6 +448,55 @@ class YardMappingService:
             logger.error(f"Error scanning bounds: {e}")
             return None
     
+    def build_tile_pyramid(self, mesh_path, projection='xy', custom_bounds=None, rotation=0,
+                           algorithm='bottom_percentile', coloring='true_color', height_window=0.5, max_zoom=None):
+        """Reuse the XYZ tile pyramid of a mesh view, or queue its build on the job runner
+        
+        Pyramids are content-addressed by the mesh fingerprint and every rendering
+        parameter, so a built pyramid never changes and is reused as is. Least
+        recently used pyramids are evicted once the tiles folder exceeds
+        YARD_MAP_TILES_MAX_BYTES after a build.
+        
+        Returns:
+            Tuple of (pyramid_id, metadata, job_id): metadata for a built pyramid, else the
+            ID of the job building it (a build already in progress is not queued again)
+        """
+        from yard_map.point_cache import fingerprint
+        from yard_map.tile_pyramid import pyramid_id, load_metadata, touch, evict_pyramids
+        
+        parameters = {
+            'projection': projection, 'custom_bounds': custom_bounds, 'rotation': rotation,
+            'algorithm': algorithm, 'coloring': coloring, 'height_window': height_window, 'max_zoom': max_zoom
+        }
+        pid = pyramid_id(fingerprint(mesh_path), **parameters)
+        directory = os.path.join(self.tiles_folder, pid)
+        
+        metadata = load_metadata(directory)
+        if metadata is not None:
+            touch(directory)
+            return pid, metadata, None
+        
+        with self._pyramid_lock:
+            job_id = self._pyramid_jobs.get(pid)
+            status = self.job_runner.status(job_id) if job_id else None
+            if status is None or status['status'] in ('failed', 'cancelled', 'completed'):
+                def evict(image_data, log_output, info):
+                    with self._pyramid_lock:
+                        self._pyramid_jobs.pop(pid, None)
+                    evict_pyramids(self.tiles_folder, self.tiles_max_bytes, keep=pid)
+                
+                job_id = self.job_runner.submit_pyramid(mesh_path, directory, on_complete=evict, **parameters)
+                self._pyramid_jobs[pid] = job_id
+                logger.info(f"Queued tile pyramid {pid} for {mesh_path} (job {job_id})")
+        return pid, None, job_id
+    
+    def tile_pyramid_path(self, pyramid_id):
+        """Directory of a built pyramid, or None for unknown (or malformed) ids"""
+        if not pyramid_id or not all(c in '0123456789abcdef' for c in pyramid_id):
+            return None
+        directory = os.path.join(self.tiles_folder, pyramid_id)
+        return directory if os.path.isdir(directory) else None
+    
     def list_meshes(self):
         """List available mesh files
         
@@ -305,6 +537,15 @@ class YardMappingService:
             with open(self.active_yard_map_path, 'wb') as f:
                 f.write(image_data)
             
+            # Keep the ground elevation raster rendered with the map (one of ours) alongside it
+            ground_raster = (metadata or {}).get('ground_raster')
+            ground_folder = os.path.realpath(self.ground_folder)
+            if (ground_raster and os.path.exists(ground_raster) and
+                    os.path.commonpath([os.path.realpath(ground_raster), ground_folder]) == ground_folder):
+                shutil.copyfile(ground_raster, self.active_ground_raster_path())
+            elif os.path.exists(self.active_ground_raster_path()):
+                os.unlink(self.active_ground_raster_path())
+            
             # Save metadata if provided
             if metadata:
                 # Enhanced metadata for Erik positioning
@@ -334,7 +575,9 @@ class YardMappingService:
                     # Generation metadata
                     'algorithm': metadata.get('parameters', {}).get('algorithm'),
                     'grid_resolution': metadata.get('parameters', {}).get('grid_resolution'),
-                    'mesh_file': metadata.get('parameters', {}).get('mesh_file')
+                    'mesh_file': metadata.get('parameters', {}).get('mesh_file'),
+                    'ground_raster': (self.active_ground_raster_path()
+                                      if os.path.exists(self.active_ground_raster_path()) else None)
                 }
                 
                 with open(self.active_yard_map_json, 'w') as f:
@@ -3,6 +3,9 @@
  * Centralized API calls and communication with the backend
  */
 
+// Matches the server-side timeout of a yard map render
+const YARD_MAP_JOB_TIMEOUT_MS = 600 * 1000;
+
 class ApiClient {
     constructor() {
         this.baseUrl = window.location.origin;
@@ -238,10 +241,39 @@ class ApiClient {
 
     /**
      * Generate yard map
+     * Renders queued on the job runner (202 with a job ID) are polled until they finish,
+     * give up or pass the server's own render timeout
      * @param {Object} config - Map generation configuration
      */
     async generateYardMap(config) {
-        return this.post('/api/yard-map/generate', config);
+        const data = await this.post('/api/yard-map/generate', config);
+        if (data.status !== 'queued') {
+            return data;
+        }
+        
+        const deadline = Date.now() + YARD_MAP_JOB_TIMEOUT_MS;
+        while (Date.now() < deadline) {
+            const response = await fetch(data.status_url, { headers: this.defaultHeaders });
+            if (response.status === 404) {
+                return { status: 'error', error: 'Yard map job no longer exists' };
+            }
+            if (!response.ok) {
+                return { status: 'error', error: `Yard map job status failed: HTTP ${response.status}` };
+            }
+            const job = await response.json();
+            if (job.status === 'completed') {
+                const result = await fetch(data.result_url, { headers: this.defaultHeaders });
+                const body = await result.json();
+                return result.ok ? body : { status: 'error', error: body.error || `HTTP ${result.status}` };
+            }
+            if (job.status === 'failed' || job.status === 'cancelled') {
+                return { status: 'error', error: job.error_message || `Yard map job ${job.status}` };
+            }
+            await new Promise(resolve => setTimeout(resolve, 500));
+        }
+        
+        this.post(data.cancel_url).catch(() => {});
+        return { status: 'error', error: 'Yard map generation timed out' };
     }
 
     /**
@@ -216,14 +216,16 @@ class ProgressTracker:
         
         return all_sessions
     
-    def cleanup_completed_sessions(self, max_completed: int = 10):
+    def cleanup_completed_sessions(self, max_completed: int = 10, session_type: str = None):
         """Clean up completed sessions, keeping only the most recent
         
         Args:
             max_completed: Maximum number of completed sessions to keep
+            session_type: Only clean up sessions of this type (default: all types)
         """
         with self._lock:
-            completed_sessions = [(sid, s) for sid, s in self._sessions.items() if s.completed]
+            completed_sessions = [(sid, s) for sid, s in self._sessions.items()
+                                  if s.completed and (session_type is None or s.session_type == session_type)]
             
             if len(completed_sessions) > max_completed:
                 # Sort by last updated time and keep most recent
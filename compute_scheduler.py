@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+"""
+Compute Scheduler - Per-camera processing rates under a CPU/latency budget
+Allocates the tracker's processing capacity across cameras, favouring the camera where
+Erik was last seen and its neighbours, and degrades smoothly (lower rates, skipping the
+face stage) when the budget is exceeded instead of letting queues grow.
+"""
+
+import math
+import time
+import threading
+from collections import deque
+from typing import Callable, Dict, List, Optional, Any
+
+
+class ScheduleDecision:
+    """How much of the pipeline to run for one admitted detection"""
+
+    __slots__ = ('run_face', 'priority', 'pressure')
+
+    def __init__(self, run_face: bool, priority: float, pressure: float):
+        self.run_face = run_face
+        self.priority = priority
+        self.pressure = pressure
+
+
+class ComputeScheduler:
+    """Token-bucket admission with priority-weighted rate allocation
+
+    Capacity (detections/second) is estimated from the measured per-detection cost
+    and the utilization target, then scaled by an AIMD factor driven by pressure
+    (the worse of utilization and latency relative to their budgets). Capacity is
+    water-filled across cameras by priority weight up to each camera's own
+    arrival rate (spare capacity is shared out by weight) and enforced with one
+    token bucket per camera.
+    """
+
+    def __init__(self, target_utilization: float = 0.8, latency_budget: float = 1.0, workers: int = 1,
+                 neighbors: Optional[Dict[str, List[str]]] = None, erik_boost: float = 4.0,
+                 neighbor_boost: float = 2.0, boost_half_life: float = 120.0, idle_after: float = 60.0,
+                 idle_weight: float = 0.25, min_rate: float = 0.05, face_pressure: float = 0.9,
+                 clock: Callable[[], float] = time.monotonic):
+        self.target_utilization = target_utilization
+        self.latency_budget = latency_budget
+        self.workers = workers
+        self.neighbors = neighbors or {}
+        self.erik_boost = erik_boost
+        self.neighbor_boost = neighbor_boost
+        self.boost_half_life = boost_half_life
+        self.idle_after = idle_after
+        self.idle_weight = idle_weight
+        self.min_rate = min_rate
+        self.face_pressure = face_pressure
+        self.clock = clock
+
+        self._lock = threading.Lock()
+        self._arrival_rate: Dict[str, float] = {}
+        self._last_arrival: Dict[str, float] = {}
+        self._tokens: Dict[str, float] = {}
+        self._last_refill: Dict[str, float] = {}
+        self._rates: Dict[str, float] = {}
+        self._last_allocation = float('-inf')
+
+        # Cost model (EWMA seconds per detection) and recent busy time for utilization
+        self.base_cost = 0.2
+        self.face_cost = 0.1
+        self._busy: deque = deque()
+        self._busy_window = 10.0
+        self.latency_ewma = 0.0
+        self.scale = 1.0
+        self.pressure = 0.0
+
+        self.last_erik_camera: Optional[str] = None
+        self.last_erik_time = float('-inf')
+        self.stats = {'admitted': 0, 'throttled': 0, 'face_skipped': 0}
+
+    # Arrival tracking and allocation
+
+    def _observe_arrival(self, camera: str, now: float, tau: float = 10.0):
+        """Exponentially-decayed arrival rate estimate (events/second)"""
+        last = self._last_arrival.get(camera)
+        rate = self._arrival_rate.get(camera, 0.0)
+        if last is not None:
+            rate *= math.exp(-(now - last) / tau)
+        self._arrival_rate[camera] = rate + 1.0 / tau
+        self._last_arrival[camera] = now
+
+    def _current_arrival_rate(self, camera: str, now: float, tau: float = 10.0) -> float:
+        last = self._last_arrival.get(camera)
+        if last is None:
+            return 0.0
+        return self._arrival_rate[camera] * math.exp(-(now - last) / tau)
+
+    def priority(self, camera: str, now: Optional[float] = None) -> float:
+        """Relative weight of a camera in the allocation"""
+        now = self.clock() if now is None else now
+        last = self._last_arrival.get(camera)
+        weight = 1.0 if last is not None and now - last < self.idle_after else self.idle_weight
+
+        if self.last_erik_camera is not None:
+            decay = 0.5 ** ((now - self.last_erik_time) / self.boost_half_life)
+            if camera == self.last_erik_camera:
+                weight += self.erik_boost * decay
+            elif camera in self.neighbors.get(self.last_erik_camera, []):
+                weight += self.neighbor_boost * decay
+        return weight
+
+    def capacity(self) -> float:
+        """Detections per second the budget allows at the current scale"""
+        face_fraction = 1.0 if self.pressure < self.face_pressure else 0.5
+        cost = max(self.base_cost + face_fraction * self.face_cost, 1e-3)
+        return self.scale * self.target_utilization * self.workers / cost
+
+    def _allocate(self, now: float):
+        """Water-fill capacity across cameras by priority, capped at each camera's demand"""
+        cameras = list(self._last_arrival)
+        if not cameras:
+            return
+        weights = {c: self.priority(c, now) for c in cameras}
+        # Allow some headroom above the measured arrival rate so bursts are not clipped
+        demand = {c: max(self._current_arrival_rate(c, now) * 1.5, self.min_rate) for c in cameras}
+
+        remaining = self.capacity()
+        rates = {c: 0.0 for c in cameras}
+        active = set(cameras)
+        while active and remaining > 1e-9:
+            total_weight = sum(weights[c] for c in active)
+            satisfied = set()
+            spent = 0.0
+            for c in active:
+                share = remaining * weights[c] / total_weight
+                grant = min(share, demand[c] - rates[c])
+                rates[c] += grant
+                spent += grant
+                if rates[c] >= demand[c] - 1e-9:
+                    satisfied.add(c)
+            remaining -= spent
+            if not satisfied:
+                break
+            active -= satisfied
+
+        # Spare capacity is shared out too, so light load is never throttled
+        if remaining > 1e-9:
+            total_weight = sum(weights.values())
+            for c in cameras:
+                rates[c] += remaining * weights[c] / total_weight
+
+        for c in cameras:
+            self._rates[c] = max(rates[c], self.min_rate * self.scale)
+        self._last_allocation = now
+
+    # Admission and planning
+
+    def admit(self, camera: str) -> bool:
+        """Decide at enqueue time whether a detection from this camera is processed"""
+        with self._lock:
+            now = self.clock()
+            self._observe_arrival(camera, now)
+            if now - self._last_allocation >= 1.0 or camera not in self._rates:
+                self._allocate(now)
+
+            rate = self._rates.get(camera, self.min_rate)
+            burst = max(1.0, rate * 2.0)
+            tokens = self._tokens.get(camera, burst)
+            tokens = min(burst, tokens + rate * (now - self._last_refill.get(camera, now)))
+            self._last_refill[camera] = now
+
+            if tokens >= 1.0:
+                self._tokens[camera] = tokens - 1.0
+                self.stats['admitted'] += 1
+                return True
+            self._tokens[camera] = tokens
+            self.stats['throttled'] += 1
+            return False
+
+    def plan(self, camera: str) -> ScheduleDecision:
+        """Choose pipeline stages for an admitted detection
+
+        The face stage is dropped first under pressure, except on high-priority
+        cameras (where Erik was just seen) until pressure is well over budget.
+        """
+        with self._lock:
+            priority = self.priority(camera)
+            threshold = self.face_pressure * (1.5 if priority > 1.0 + self.neighbor_boost / 2 else 1.0)
+            run_face = self.pressure < threshold
+            if not run_face:
+                self.stats['face_skipped'] += 1
+            return ScheduleDecision(run_face, priority, self.pressure)
+
+    # Feedback
+
+    def record(self, processing_seconds: float, latency_seconds: Optional[float] = None,
+               face_seconds: Optional[float] = None, alpha: float = 0.2):
+        """Feed back the cost of one processed detection and update pressure"""
+        with self._lock:
+            now = self.clock()
+            if face_seconds is not None:
+                self.face_cost += alpha * (face_seconds - self.face_cost)
+            base = processing_seconds - (face_seconds or 0.0)
+            self.base_cost += alpha * (max(base, 0.0) - self.base_cost)
+            if latency_seconds is not None:
+                self.latency_ewma += alpha * (latency_seconds - self.latency_ewma)
+
+            self._busy.append((now, processing_seconds))
+            while self._busy and now - self._busy[0][0] > self._busy_window:
+                self._busy.popleft()
+            utilization = sum(s for _, s in self._busy) / (self._busy_window * self.workers)
+
+            self.pressure = max(utilization / self.target_utilization, self.latency_ewma / self.latency_budget)
+            # AIMD: back off quickly when over budget, recover slowly
+            if self.pressure > 1.0:
+                self.scale = max(0.05, self.scale * 0.85)
+            else:
+                self.scale = min(1.0, self.scale + 0.02)
+
+    def erik_seen(self, camera: str):
+        """Shift priority toward the camera where Erik was just detected"""
+        with self._lock:
+            self.last_erik_camera = camera
+            self.last_erik_time = self.clock()
+            self._last_allocation = float('-inf')
+
+    def status(self) -> Dict[str, Any]:
+        """Current allocation and budget state"""
+        with self._lock:
+            now = self.clock()
+            return {
+                'capacity_per_second': round(self.capacity(), 3),
+                'scale': round(self.scale, 3),
+                'pressure': round(self.pressure, 3),
+                'base_cost_ms': round(self.base_cost * 1000, 1),
+                'face_cost_ms': round(self.face_cost * 1000, 1),
+                'latency_ewma_ms': round(self.latency_ewma * 1000, 1),
+                'last_erik_camera': self.last_erik_camera,
+                'cameras': {
+                    c: {
+                        'rate': round(self._rates.get(c, 0.0), 3),
+                        'arrival_rate': round(self._current_arrival_rate(c, now), 3),
+                        'priority': round(self.priority(c, now), 3)
+                    } for c in self._last_arrival
+                },
+                **self.stats
+            }
@@ -0,0 +1,576 @@
+#!/usr/bin/env python3
+"""
+Embedding Archive - Append-only store of OSNet embeddings for every processed person crop
+Provides an IVF/PQ approximate nearest-neighbour index built in NumPy for fast history search
+"""
+
+import json
+import logging
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple, Any
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+EMBEDDINGS_FILE = 'embeddings.f32'
+TIMESTAMPS_FILE = 'timestamps.f64'
+METADATA_FILE = 'metadata.jsonl'
+HEADER_FILE = 'archive.json'
+INDEX_FILE = 'ivfpq_index.npz'
+
+
+class EmbeddingArchive:
+    """Append-only, memory-mapped archive of person embeddings
+
+    Embedding rows live in a raw float32 file that is memory-mapped and grown by
+    doubling. Each row has a matching float64 timestamp and a JSON metadata line
+    (camera, timestamp, event ID, crop path). The metadata line is written last,
+    so it acts as the commit record: rows without one are ignored on reopen.
+    """
+
+    def __init__(self, archive_dir: str, dim: int = 512, initial_capacity: int = 4096):
+        self.archive_dir = Path(archive_dir)
+        self.archive_dir.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+
+        header_path = self.archive_dir / HEADER_FILE
+        if header_path.exists():
+            with open(header_path, 'r') as f:
+                header = json.load(f)
+            self.dim = header['dim']
+        else:
+            self.dim = dim
+            with open(header_path, 'w') as f:
+                json.dump({'dim': self.dim, 'dtype': 'float32', 'version': 1}, f, indent=2)
+
+        # Committed rows are the ones with a metadata line
+        self._metadata: List[Dict[str, Any]] = []
+        metadata_path = self.archive_dir / METADATA_FILE
+        if metadata_path.exists():
+            self._load_metadata(metadata_path)
+        self._metadata_file = open(metadata_path, 'a')
+
+        self.count = len(self._metadata)
+        self.capacity = 0
+        self._embeddings: Optional[np.memmap] = None
+        self._timestamps: Optional[np.memmap] = None
+        self._map_files(max(initial_capacity, self.count, 1))
+
+        # Camera of every row as a small integer code, for vectorized filtering
+        self._camera_ids: Dict[str, int] = {}
+        self._camera_codes = np.empty(self.capacity, dtype=np.int32)
+        for row, record in enumerate(self._metadata):
+            self._camera_codes[row] = self._camera_code(record['camera'])
+
+        logger.info(f"Embedding archive opened at {self.archive_dir} with {self.count} embeddings (dim={self.dim})")
+
+    def _load_metadata(self, metadata_path: Path):
+        """Read the committed metadata lines, truncating an incomplete last line
+
+        A crash while appending can leave a partial final line; it never committed
+        its row, so it is cut off and the row is overwritten by the next append.
+        """
+        committed = 0
+        with open(metadata_path, 'rb') as f:
+            for line in f:
+                if not line.endswith(b'\n'):
+                    break
+                try:
+                    record = json.loads(line) if line.strip() else None
+                except ValueError:
+                    break
+                if record is not None:
+                    self._metadata.append(record)
+                committed += len(line)
+        if committed < metadata_path.stat().st_size:
+            logger.warning(f"Discarding incomplete metadata after {len(self._metadata)} rows in {metadata_path}")
+            with open(metadata_path, 'r+b') as f:
+                f.truncate(committed)
+
+    def _camera_code(self, camera: str) -> int:
+        return self._camera_ids.setdefault(camera, len(self._camera_ids))
+
+    def _map_files(self, capacity: int):
+        """(Re)map the embedding and timestamp files with at least the given capacity"""
+        emb_path = self.archive_dir / EMBEDDINGS_FILE
+        ts_path = self.archive_dir / TIMESTAMPS_FILE
+
+        if self._embeddings is not None:
+            self._embeddings.flush()
+            self._timestamps.flush()
+            self._embeddings = None
+            self._timestamps = None
+
+        for path, itemsize in ((emb_path, 4 * self.dim), (ts_path, 8)):
+            required = capacity * itemsize
+            with open(path, 'ab') as f:
+                if f.tell() < required:
+                    f.truncate(required)
+
+        self.capacity = capacity
+        self._embeddings = np.memmap(emb_path, dtype=np.float32, mode='r+', shape=(capacity, self.dim))
+        self._timestamps = np.memmap(ts_path, dtype=np.float64, mode='r+', shape=(capacity,))
+
+    def append(self, embedding: np.ndarray, camera: str, timestamp: float,
+               event_id: Optional[str] = None, crop_path: Optional[str] = None) -> int:
+        """Append one embedding and its metadata
+
+        Returns:
+            Row ID of the stored embedding
+        """
+        vector = np.asarray(embedding, dtype=np.float32).reshape(-1)
+        if vector.shape[0] != self.dim:
+            raise ValueError(f"Embedding has dimension {vector.shape[0]}, archive expects {self.dim}")
+
+        with self._lock:
+            if self.count >= self.capacity:
+                self._map_files(self.capacity * 2)
+                self._camera_codes = np.resize(self._camera_codes, self.capacity)
+
+            row = self.count
+            self._embeddings[row] = vector
+            self._timestamps[row] = float(timestamp)
+            self._camera_codes[row] = self._camera_code(camera)
+
+            record = {
+                'row': row,
+                'camera': camera,
+                'timestamp': float(timestamp),
+                'event_id': event_id,
+                'crop_path': crop_path
+            }
+            self._metadata_file.write(json.dumps(record) + '\n')
+            self._metadata_file.flush()
+            self._metadata.append(record)
+            self.count += 1
+
+        return row
+
+    def flush(self):
+        """Flush memory-mapped data to disk"""
+        with self._lock:
+            self._embeddings.flush()
+            self._timestamps.flush()
+            self._metadata_file.flush()
+
+    def close(self):
+        """Flush and close the archive"""
+        self.flush()
+        self._metadata_file.close()
+
+    @property
+    def embeddings(self) -> np.ndarray:
+        """Read-only view of all committed embeddings"""
+        return self._embeddings[:self.count]
+
+    @property
+    def timestamps(self) -> np.ndarray:
+        """Timestamps of all committed embeddings"""
+        return self._timestamps[:self.count]
+
+    def get_metadata(self, row: int) -> Dict[str, Any]:
+        """Get metadata for a row"""
+        return self._metadata[row]
+
+    def rows_in_range(self, start_time: Optional[float] = None, end_time: Optional[float] = None,
+                      camera: Optional[str] = None) -> np.ndarray:
+        """Get row IDs within a time range, optionally limited to one camera"""
+        mask = np.ones(self.count, dtype=bool)
+        timestamps = self.timestamps
+        if start_time is not None:
+            mask &= timestamps >= start_time
+        if end_time is not None:
+            mask &= timestamps <= end_time
+        if camera is not None:
+            mask &= self._camera_codes[:self.count] == self._camera_ids.get(camera, -1)
+        return np.nonzero(mask)[0]
+
+    def score_against(self, reference: np.ndarray, rows: Optional[np.ndarray] = None,
+                      batch_size: int = 65536) -> np.ndarray:
+        """Cosine similarity of archived embeddings against a reference embedding
+
+        Embeddings are stored L2-normalized, so this is a single matrix-vector
+        product per batch. Used to re-score history after references change.
+        """
+        ref = np.asarray(reference, dtype=np.float32).reshape(-1)
+        ref = ref / max(np.linalg.norm(ref), 1e-12)
+
+        if rows is None:
+            rows = np.arange(self.count)
+        scores = np.empty(len(rows), dtype=np.float32)
+        for start in range(0, len(rows), batch_size):
+            batch_rows = rows[start:start + batch_size]
+            scores[start:start + len(batch_rows)] = self._embeddings[batch_rows] @ ref
+        return scores
+
+    def search_exact(self, query: np.ndarray, k: int = 10,
+                     rows: Optional[np.ndarray] = None) -> List[Tuple[int, float]]:
+        """Brute-force nearest neighbours by cosine similarity"""
+        if rows is None:
+            rows = np.arange(self.count)
+        if len(rows) == 0:
+            return []
+        scores = self.score_against(query, rows)
+        k = min(k, len(rows))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(int(rows[i]), float(scores[i])) for i in top]
+
+
+def _squared_distances(x: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    """Pairwise squared L2 distances between rows of x and centroids"""
+    x_norm = np.einsum('ij,ij->i', x, x)[:, None]
+    c_norm = np.einsum('ij,ij->i', centroids, centroids)[None, :]
+    distances = x_norm - 2.0 * (x @ centroids.T) + c_norm
+    np.maximum(distances, 0, out=distances)
+    return distances
+
+
+def _assign(x: np.ndarray, centroids: np.ndarray, batch_size: int = 16384) -> np.ndarray:
+    """Nearest centroid for every row of x, computed in batches to bound memory"""
+    labels = np.empty(len(x), dtype=np.int64)
+    for start in range(0, len(x), batch_size):
+        labels[start:start + batch_size] = np.argmin(
+            _squared_distances(x[start:start + batch_size], centroids), axis=1
+        )
+    return labels
+
+
+def kmeans(x: np.ndarray, k: int, iterations: int = 20, seed: int = 0) -> np.ndarray:
+    """Lloyd's k-means in NumPy with k-means++ style seeding on a subsample
+
+    Returns:
+        Array of k centroids
+    """
+    rng = np.random.default_rng(seed)
+    x = np.asarray(x, dtype=np.float32)
+    n = len(x)
+    if n <= k:
+        # Not enough data - duplicate points so every code is usable
+        return x[rng.integers(0, n, size=k)].copy()
+
+    # k-means++ seeding on at most 256 points per centroid
+    sample = x[rng.choice(n, size=min(n, 256 * k), replace=False)]
+    centroids = np.empty((k, x.shape[1]), dtype=np.float32)
+    centroids[0] = sample[rng.integers(len(sample))]
+    closest = _squared_distances(sample, centroids[:1])[:, 0]
+    for i in range(1, k):
+        probabilities = closest / closest.sum() if closest.sum() > 0 else None
+        centroids[i] = sample[rng.choice(len(sample), p=probabilities)]
+        closest = np.minimum(closest, _squared_distances(sample, centroids[i:i + 1])[:, 0])
+
+    for _ in range(iterations):
+        labels = _assign(x, centroids)
+        counts = np.bincount(labels, minlength=k).astype(np.float32)
+        # Segmented sums over points grouped by label (much faster than np.add.at)
+        order = np.argsort(labels, kind='stable')
+        present = np.nonzero(counts)[0]
+        starts = np.concatenate([[0], np.cumsum(counts[present])[:-1]]).astype(np.int64)
+        sums = np.zeros_like(centroids)
+        sums[present] = np.add.reduceat(x[order], starts, axis=0)
+        non_empty = counts > 0
+        new_centroids = centroids.copy()
+        new_centroids[non_empty] = sums[non_empty] / counts[non_empty, None]
+        # Re-seed empty clusters from random points
+        empty = np.nonzero(~non_empty)[0]
+        if len(empty):
+            new_centroids[empty] = x[rng.integers(0, n, size=len(empty))]
+        shift = np.abs(new_centroids - centroids).max()
+        centroids = new_centroids
+        if shift < 1e-6:
+            break
+
+    return centroids
+
+
+class IVFPQIndex:
+    """Inverted-file index with product-quantized residuals
+
+    Vectors are assigned to the nearest of ``n_lists`` coarse centroids, and the
+    residual is split into ``n_subvectors`` chunks that are each encoded as one
+    byte. A query scans only the ``n_probe`` closest lists using per-subspace
+    distance lookup tables (asymmetric distance computation).
+    """
+
+    def __init__(self, dim: int = 512, n_lists: int = 64, n_subvectors: int = 16,
+                 n_codes: int = 256, seed: int = 0):
+        if dim % n_subvectors != 0:
+            raise ValueError(f"Dimension {dim} is not divisible by {n_subvectors} subvectors")
+        if n_codes > 256:
+            raise ValueError("At most 256 codes per subspace are supported (uint8 codes)")
+
+        self.dim = dim
+        self.n_lists = n_lists
+        self.n_subvectors = n_subvectors
+        self.sub_dim = dim // n_subvectors
+        self.n_codes = n_codes
+        self.seed = seed
+
+        self.coarse_centroids: Optional[np.ndarray] = None
+        self.codebooks: Optional[np.ndarray] = None  # (n_subvectors, n_codes, sub_dim)
+
+        # Inverted lists stored contiguously, sorted by list
+        self.list_offsets = np.zeros(n_lists + 1, dtype=np.int64)
+        self.ids = np.empty(0, dtype=np.int64)
+        self.codes = np.empty((0, n_subvectors), dtype=np.uint8)
+
+    @property
+    def is_trained(self) -> bool:
+        return self.coarse_centroids is not None
+
+    @property
+    def size(self) -> int:
+        return len(self.ids)
+
+    def train(self, vectors: np.ndarray, iterations: int = 20, max_points_per_centroid: int = 64):
+        """Train coarse centroids and PQ codebooks
+
+        Each k-means run sees at most ``max_points_per_centroid`` points per
+        centroid, which is plenty for stable codebooks and bounds training time.
+        """
+        vectors = np.asarray(vectors, dtype=np.float32)
+        n_lists = min(self.n_lists, len(vectors))
+        self.n_lists = n_lists
+        self.list_offsets = np.zeros(n_lists + 1, dtype=np.int64)
+
+        rng = np.random.default_rng(self.seed)
+        coarse_sample = vectors
+        if len(vectors) > n_lists * max_points_per_centroid:
+            coarse_sample = vectors[rng.choice(len(vectors), n_lists * max_points_per_centroid, replace=False)]
+        self.coarse_centroids = kmeans(coarse_sample, n_lists, iterations, self.seed)
+
+        if len(vectors) > self.n_codes * max_points_per_centroid:
+            vectors = vectors[rng.choice(len(vectors), self.n_codes * max_points_per_centroid, replace=False)]
+        residuals = vectors - self.coarse_centroids[_assign(vectors, self.coarse_centroids)]
+
+        self.codebooks = np.empty((self.n_subvectors, self.n_codes, self.sub_dim), dtype=np.float32)
+        for m in range(self.n_subvectors):
+            chunk = residuals[:, m * self.sub_dim:(m + 1) * self.sub_dim]
+            self.codebooks[m] = kmeans(chunk, self.n_codes, iterations, self.seed + m + 1)
+
+        logger.info(f"Trained IVF/PQ index: {n_lists} lists, {self.n_subvectors}x{self.n_codes} codes")
+
+    def _encode(self, residuals: np.ndarray) -> np.ndarray:
+        codes = np.empty((len(residuals), self.n_subvectors), dtype=np.uint8)
+        for m in range(self.n_subvectors):
+            chunk = residuals[:, m * self.sub_dim:(m + 1) * self.sub_dim]
+            codes[:, m] = _assign(chunk, self.codebooks[m])
+        return codes
+
+    def add(self, vectors: np.ndarray, ids: np.ndarray):
+        """Encode and add vectors to the inverted lists"""
+        if not self.is_trained:
+            raise RuntimeError("Index must be trained before adding vectors")
+
+        vectors = np.asarray(vectors, dtype=np.float32)
+        ids = np.asarray(ids, dtype=np.int64)
+        lists = _assign(vectors, self.coarse_centroids)
+        codes = self._encode(vectors - self.coarse_centroids[lists])
+
+        # Merge with existing entries and keep everything grouped by list
+        existing_lists = np.repeat(np.arange(self.n_lists), np.diff(self.list_offsets))
+        all_lists = np.concatenate([existing_lists, lists])
+        order = np.argsort(all_lists, kind='stable')
+        self.ids = np.concatenate([self.ids, ids])[order]
+        self.codes = np.concatenate([self.codes, codes])[order]
+        self.list_offsets = np.concatenate(
+            [[0], np.cumsum(np.bincount(all_lists, minlength=self.n_lists))]
+        ).astype(np.int64)
+
+    def search(self, query: np.ndarray, k: int = 10, n_probe: int = 8,
+               allowed_ids: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Approximate nearest neighbours of a single query
+
+        Args:
+            query: Query vector
+            k: Number of neighbours to return
+            n_probe: Number of inverted lists to scan
+            allowed_ids: Optional sorted array of IDs to restrict results to
+
+        Returns:
+            Tuple of (ids, approximate squared distances), nearest first
+        """
+        if not self.is_trained or self.size == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+        query = np.asarray(query, dtype=np.float32).reshape(-1)
+        coarse = _squared_distances(query[None, :], self.coarse_centroids)[0]
+        probe = np.argsort(coarse)[:min(n_probe, self.n_lists)]
+
+        candidate_ids = []
+        candidate_distances = []
+        for list_id in probe:
+            start, end = self.list_offsets[list_id], self.list_offsets[list_id + 1]
+            if start == end:
+                continue
+            residual = (query - self.coarse_centroids[list_id]).reshape(self.n_subvectors, 1, self.sub_dim)
+            # Lookup table: distance from each query sub-vector to every codeword
+            table = ((self.codebooks - residual) ** 2).sum(axis=2)
+            codes = self.codes[start:end]
+            distances = table[np.arange(self.n_subvectors), codes].sum(axis=1)
+            list_ids = self.ids[start:end]
+            if allowed_ids is not None:
+                keep = np.isin(list_ids, allowed_ids, assume_unique=True)
+                list_ids, distances = list_ids[keep], distances[keep]
+            candidate_ids.append(list_ids)
+            candidate_distances.append(distances)
+
+        if not candidate_ids:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+        candidate_ids = np.concatenate(candidate_ids)
+        candidate_distances = np.concatenate(candidate_distances)
+        k = min(k, len(candidate_ids))
+        if k == 0:
+            return candidate_ids[:0], candidate_distances[:0]
+        top = np.argpartition(candidate_distances, k - 1)[:k]
+        top = top[np.argsort(candidate_distances[top])]
+        return candidate_ids[top], candidate_distances[top]
+
+    def save(self, path: str):
+        """Save the index to an .npz file"""
+        np.savez(
+            path,
+            config=np.array([self.dim, self.n_lists, self.n_subvectors, self.n_codes, self.seed]),
+            coarse_centroids=self.coarse_centroids,
+            codebooks=self.codebooks,
+            list_offsets=self.list_offsets,
+            ids=self.ids,
+            codes=self.codes
+        )
+
+    @classmethod
+    def load(cls, path: str) -> 'IVFPQIndex':
+        """Load an index saved with save()"""
+        data = np.load(path)
+        dim, n_lists, n_subvectors, n_codes, seed = (int(v) for v in data['config'])
+        index = cls(dim, n_lists, n_subvectors, n_codes, seed)
+        index.coarse_centroids = data['coarse_centroids']
+        index.codebooks = data['codebooks']
+        index.list_offsets = data['list_offsets']
+        index.ids = data['ids']
+        index.codes = data['codes']
+        return index
+
+
+class EmbeddingSearch:
+    """History search over an EmbeddingArchive backed by an IVF/PQ index
+
+    Rows appended after the index was built are searched exactly, so results
+    never miss recent detections. Approximate candidates are re-ranked with the
+    exact cosine similarity from the memory-mapped archive.
+    """
+
+    def __init__(self, archive: EmbeddingArchive, n_lists: int = 64, n_subvectors: int = 16):
+        self.archive = archive
+        self.n_lists = n_lists
+        self.n_subvectors = n_subvectors
+        self.index: Optional[IVFPQIndex] = None
+        self.indexed_count = 0
+        self._lock = threading.Lock()
+        self._rebuild_thread: Optional[threading.Thread] = None
+
+        index_path = archive.archive_dir / INDEX_FILE
+        if index_path.exists():
+            try:
+                self.index = IVFPQIndex.load(str(index_path))
+                self.indexed_count = self.index.size
+            except Exception as e:
+                logger.warning(f"Could not load embedding index, will rebuild: {e}")
+
+    def rebuild(self, max_training_vectors: int = 50000) -> bool:
+        """Train a new index over the archive and persist it
+
+        Returns:
+            True if an index was built, False if there is not enough data
+        """
+        count = self.archive.count
+        min_vectors = max(self.n_lists, 256)
+        if count < min_vectors:
+            logger.info(f"Not enough embeddings to build index ({count} < {min_vectors}), using exact search")
+            return False
+
+        embeddings = self.archive.embeddings
+        rng = np.random.default_rng(0)
+        training_rows = np.sort(rng.choice(count, size=min(count, max_training_vectors), replace=False))
+
+        index = IVFPQIndex(self.archive.dim, self.n_lists, self.n_subvectors)
+        index.train(np.asarray(embeddings[training_rows]))
+        for start in range(0, count, 65536):
+            end = min(start + 65536, count)
+            index.add(np.asarray(embeddings[start:end]), np.arange(start, end))
+
+        index.save(str(self.archive.archive_dir / INDEX_FILE))
+        with self._lock:
+            self.index = index
+            self.indexed_count = count
+        logger.info(f"Rebuilt embedding index over {count} embeddings")
+        return True
+
+    @property
+    def unindexed_count(self) -> int:
+        """Rows appended since the last rebuild (searched exactly)"""
+        return self.archive.count - self.indexed_count
+
+    def rebuild_in_background(self, min_unindexed: int) -> bool:
+        """Start a background rebuild once at least min_unindexed rows await indexing
+
+        Keeps the exact-scan tail bounded on long-running processes; searches keep
+        using the previous index until the new one is swapped in.
+
+        Returns:
+            True if a rebuild was started
+        """
+        if self.unindexed_count < min_unindexed:
+            return False
+        if self._rebuild_thread is not None and self._rebuild_thread.is_alive():
+            return False
+
+        def run():
+            try:
+                self.rebuild()
+            except Exception as e:
+                logger.error(f"Background embedding index rebuild failed: {e}")
+
+        self._rebuild_thread = threading.Thread(target=run, daemon=True)
+        self._rebuild_thread.start()
+        return True
+
+    def search(self, query: np.ndarray, k: int = 20, start_time: Optional[float] = None,
+               end_time: Optional[float] = None, camera: Optional[str] = None,
+               n_probe: int = 8, min_similarity: Optional[float] = None) -> List[Dict[str, Any]]:
+        """Find archived detections most similar to a query embedding
+
+        Returns:
+            List of metadata dictionaries with an added 'similarity', best first
+        """
+        filtered = start_time is not None or end_time is not None or camera is not None
+        allowed = self.archive.rows_in_range(start_time, end_time, camera) if filtered else None
+
+        with self._lock:
+            index, indexed_count = self.index, self.indexed_count
+
+        candidates = []
+        if index is not None and indexed_count > 0:
+            indexed_allowed = allowed[allowed < indexed_count] if allowed is not None else None
+            ids, _ = index.search(query, k * 4, n_probe, indexed_allowed)
+            candidates.append(ids)
+
+        # Rows appended since the last rebuild are scanned exactly
+        if allowed is not None:
+            tail = allowed[allowed >= indexed_count]
+        else:
+            tail = np.arange(indexed_count, self.archive.count)
+        candidates.append(tail)
+
+        rows = np.unique(np.concatenate(candidates)) if candidates else np.empty(0, dtype=np.int64)
+        results = []
+        for row, similarity in self.archive.search_exact(query, k, rows):
+            if min_similarity is not None and similarity < min_similarity:
+                continue
+            record = dict(self.archive.get_metadata(row))
+            record['similarity'] = similarity
+            results.append(record)
+        return results
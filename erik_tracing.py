@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Erik Tracing - Trace IDs and stage timestamps for Erik detections
+Every detection carries a trace from the Frigate event through the hybrid tracker's
+publish to the image manager making the position visible. Both processes aggregate
+the traces into per-camera latency distributions.
+"""
+
+import time
+import uuid
+import threading
+from collections import deque
+from typing import Dict, List, Optional, Any
+
+import numpy as np
+
+# Pipeline stages in the order they happen
+FRIGATE_DETECTED = 'frigate_detected'
+TRACKER_RECEIVED = 'tracker_received'
+PROCESSING_STARTED = 'processing_started'
+CROP_FETCHED = 'crop_fetched'
+SCORED = 'scored'
+PUBLISHED = 'published'
+MANAGER_RECEIVED = 'manager_received'
+POSITION_VISIBLE = 'position_visible'
+
+STAGES = [FRIGATE_DETECTED, TRACKER_RECEIVED, PROCESSING_STARTED, CROP_FETCHED,
+          SCORED, PUBLISHED, MANAGER_RECEIVED, POSITION_VISIBLE]
+
+
+def new_trace(frigate_time: Optional[float] = None, trace_id: Optional[str] = None) -> Dict[str, Any]:
+    """Start a trace, optionally anchored at the Frigate detection time"""
+    trace = {'trace_id': trace_id or uuid.uuid4().hex, 'stages': {}}
+    if frigate_time:
+        trace['stages'][FRIGATE_DETECTED] = float(frigate_time)
+    return trace
+
+
+def mark(trace: Optional[Dict[str, Any]], stage: str, timestamp: Optional[float] = None) -> Optional[Dict[str, Any]]:
+    """Record a stage timestamp (wall clock seconds) on a trace"""
+    if trace is not None:
+        trace['stages'][stage] = time.time() if timestamp is None else timestamp
+    return trace
+
+
+def frigate_event_time(payload: Any) -> Optional[float]:
+    """Best-effort detection time from a Frigate MQTT payload"""
+    if not isinstance(payload, dict):
+        return None
+    event = payload.get('after') or payload
+    for key in ('frame_time', 'start_time'):
+        value = event.get(key)
+        if isinstance(value, (int, float)) and value > 0:
+            return float(value)
+    return None
+
+
+def stage_durations(trace: Dict[str, Any]) -> Dict[str, float]:
+    """Durations in milliseconds between consecutive recorded stages, plus the total"""
+    stages = trace.get('stages', {})
+    present = [s for s in STAGES if s in stages]
+    durations = {}
+    for previous, current in zip(present, present[1:]):
+        durations[f"{previous}->{current}"] = (stages[current] - stages[previous]) * 1000.0
+    if len(present) >= 2:
+        durations['total'] = (stages[present[-1]] - stages[present[0]]) * 1000.0
+    return durations
+
+
+class LatencyAggregator:
+    """Rolling per-camera latency distributions built from traces"""
+
+    def __init__(self, window: int = 1000):
+        self.window = window
+        self._samples: Dict[str, Dict[str, deque]] = {}
+        self._lock = threading.Lock()
+        self._recent: deque = deque(maxlen=50)
+
+    def record(self, camera: str, trace: Dict[str, Any]):
+        """Add one completed (or partially completed) trace"""
+        durations = stage_durations(trace)
+        with self._lock:
+            segments = self._samples.setdefault(camera, {})
+            for segment, value in durations.items():
+                segments.setdefault(segment, deque(maxlen=self.window)).append(value)
+            self._recent.append({'camera': camera, 'trace_id': trace.get('trace_id'), 'latency_ms': durations})
+
+    def summary(self, camera: Optional[str] = None) -> Dict[str, Any]:
+        """Latency percentiles per camera and segment"""
+        with self._lock:
+            cameras = [camera] if camera else list(self._samples)
+            snapshot = {c: {s: np.fromiter(v, dtype=np.float64) for s, v in self._samples.get(c, {}).items()}
+                        for c in cameras}
+
+        result = {}
+        for cam, segments in snapshot.items():
+            result[cam] = {}
+            for segment, values in segments.items():
+                if len(values) == 0:
+                    continue
+                p50, p90, p99 = np.percentile(values, [50, 90, 99])
+                result[cam][segment] = {
+                    'count': int(len(values)),
+                    'mean_ms': round(float(values.mean()), 2),
+                    'p50_ms': round(float(p50), 2),
+                    'p90_ms': round(float(p90), 2),
+                    'p99_ms': round(float(p99), 2),
+                    'max_ms': round(float(values.max()), 2)
+                }
+        return result
+
+    def recent(self, limit: int = 20) -> List[Dict[str, Any]]:
+        """Most recent traces, newest first"""
+        with self._lock:
+            return list(self._recent)[-limit:][::-1]
+
+    def clear(self):
+        with self._lock:
+            self._samples.clear()
+            self._recent.clear()
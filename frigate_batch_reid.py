@@ -0,0 +1,380 @@
+#!/usr/bin/env python3
+"""
+Frigate Batch Re-Identification - Offline Erik recognition over Frigate's event history
+Reads person events and snapshots straight from the Frigate SQLite database and media
+folder, runs them through the hybrid recognition pipeline in large batches across a
+process pool and writes the scores to a local SQLite store.
+"""
+
+import os
+import json
+import time
+import sqlite3
+import logging
+import argparse
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Iterator, Any
+
+import cv2
+import numpy as np
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+
+class FrigateEventReader:
+    """Read-only access to person events in a Frigate database"""
+
+    def __init__(self, db_path: str, clips_dir: str):
+        self.db_path = db_path
+        self.clips_dir = Path(clips_dir)
+
+    def _connect(self) -> sqlite3.Connection:
+        # Open read-only so a running Frigate instance is never blocked or modified
+        conn = sqlite3.connect(f"file:{self.db_path}?mode=ro", uri=True)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def iter_events(self, start_time: Optional[float] = None, end_time: Optional[float] = None,
+                    cameras: Optional[List[str]] = None, label: str = 'person',
+                    page_size: int = 1000) -> Iterator[Dict[str, Any]]:
+        """Yield events with snapshots in start_time order
+
+        Pages with keyset pagination on (start_time, id) so memory stays flat over
+        months of history.
+        """
+        conditions = ["label = ?", "has_snapshot = 1"]
+        params: List[Any] = [label]
+        if start_time is not None:
+            conditions.append("start_time >= ?")
+            params.append(start_time)
+        if end_time is not None:
+            conditions.append("start_time <= ?")
+            params.append(end_time)
+        if cameras:
+            conditions.append(f"camera IN ({','.join('?' * len(cameras))})")
+            params.extend(cameras)
+
+        query = (f"SELECT id, camera, start_time, end_time, top_score, box, region, data FROM event "
+                 f"WHERE {' AND '.join(conditions)} AND (start_time > ? OR (start_time = ? AND id > ?)) "
+                 f"ORDER BY start_time, id LIMIT ?")
+
+        conn = self._connect()
+        try:
+            last_time, last_id = float('-inf'), ''
+            while True:
+                rows = conn.execute(query, params + [last_time, last_time, last_id, page_size]).fetchall()
+                if not rows:
+                    break
+                for row in rows:
+                    yield self._row_to_event(row)
+                last_time, last_id = rows[-1]['start_time'], rows[-1]['id']
+        finally:
+            conn.close()
+
+    def count_events(self, label: str = 'person') -> int:
+        """Count events with snapshots for a label"""
+        conn = self._connect()
+        try:
+            return conn.execute("SELECT COUNT(*) FROM event WHERE label = ? AND has_snapshot = 1",
+                                (label,)).fetchone()[0]
+        finally:
+            conn.close()
+
+    def _row_to_event(self, row: sqlite3.Row) -> Dict[str, Any]:
+        data = json.loads(row['data']) if row['data'] else {}
+        return {
+            'id': row['id'],
+            'camera': row['camera'],
+            'start_time': row['start_time'],
+            'end_time': row['end_time'],
+            'top_score': row['top_score'],
+            # Frigate 0.14+ stores a normalized [x, y, w, h] box in data; older
+            # versions store pixel [x1, y1, x2, y2] in the box column
+            'box_normalized': data.get('box'),
+            'box_pixels': json.loads(row['box']) if row['box'] else None,
+            'snapshot_path': self.snapshot_path(row['camera'], row['id'])
+        }
+
+    def snapshot_path(self, camera: str, event_id: str) -> Optional[str]:
+        """Locate an event snapshot, preferring the clean (unannotated) version"""
+        for name in (f"{camera}-{event_id}-clean.png", f"{camera}-{event_id}.jpg"):
+            path = self.clips_dir / name
+            if path.exists():
+                return str(path)
+        return None
+
+
+def crop_event(image: np.ndarray, event: Dict[str, Any]) -> Optional[np.ndarray]:
+    """Crop the person out of a full-frame event snapshot"""
+    h_img, w_img = image.shape[:2]
+
+    if event.get('box_normalized') and len(event['box_normalized']) >= 4:
+        x, y, w, h = event['box_normalized'][:4]
+        x1, y1, x2, y2 = x * w_img, y * h_img, (x + w) * w_img, (y + h) * h_img
+    elif event.get('box_pixels') and len(event['box_pixels']) >= 4:
+        x1, y1, x2, y2 = event['box_pixels'][:4]
+    else:
+        return image
+
+    x1, x2 = max(0, int(x1)), min(w_img, int(x2))
+    y1, y2 = max(0, int(y1)), min(h_img, int(y2))
+    if x2 - x1 < 2 or y2 - y1 < 2:
+        return None
+    return image[y1:y2, x1:x2]
+
+
+class BatchResultStore:
+    """Local SQLite store for batch re-identification results"""
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(db_path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS reid_results (
+                event_id TEXT PRIMARY KEY,
+                camera TEXT NOT NULL,
+                start_time REAL NOT NULL,
+                osnet_score REAL,
+                face_score REAL,
+                color_score REAL,
+                combined_score REAL,
+                is_erik INTEGER,
+                method TEXT,
+                error TEXT,
+                details TEXT,
+                processed_at REAL NOT NULL
+            )
+        """)
+        self.conn.execute("CREATE INDEX IF NOT EXISTS reid_results_start_time ON reid_results (start_time)")
+        self.conn.commit()
+
+    def processed_ids(self) -> set:
+        """Event IDs that already have a result (used to resume a backfill)"""
+        return {row[0] for row in self.conn.execute("SELECT event_id FROM reid_results")}
+
+    def write_many(self, results: List[Dict[str, Any]]):
+        """Insert or replace a batch of results in a single transaction"""
+        now = time.time()
+        rows = [(
+            r['event_id'], r['camera'], r['start_time'],
+            r.get('osnet_score'), r.get('face_score'), r.get('color_score'),
+            r.get('combined_score'), int(r['is_erik']) if r.get('is_erik') is not None else None,
+            r.get('method'), r.get('error'),
+            json.dumps(r['details']) if r.get('details') else None, now
+        ) for r in results]
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO reid_results VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows
+            )
+
+    def close(self):
+        self.conn.close()
+
+
+# Per-process tracker, created once by the pool initializer
+_worker_tracker = None
+
+
+def _init_worker(config: Dict[str, Any], torch_threads: int):
+    """Load OSNet and Erik's references once per worker process"""
+    global _worker_tracker
+    import torch
+    from hybrid_erik_tracker import HybridErikTracker
+
+    # Keep workers from oversubscribing cores with intra-op threads
+    torch.set_num_threads(torch_threads)
+    _worker_tracker = HybridErikTracker(config)
+    if not _worker_tracker.load_erik_references(config.get('erik_images_folder', '/app/erik_images')):
+        raise RuntimeError("Failed to load Erik reference images")
+
+
+def _process_batch(events: List[Dict[str, Any]], return_embeddings: bool) -> List[Dict[str, Any]]:
+    """Score a batch of events in a worker process"""
+    tracker = _worker_tracker
+    results = []
+    crops = []
+    crop_results = []
+
+    for event in events:
+        result = {'event_id': event['id'], 'camera': event['camera'], 'start_time': event['start_time']}
+        results.append(result)
+
+        if not event.get('snapshot_path'):
+            result['error'] = 'snapshot missing'
+            continue
+        image = cv2.imread(event['snapshot_path'])
+        if image is None:
+            result['error'] = 'snapshot unreadable'
+            continue
+        crop = crop_event(image, event)
+        if crop is None:
+            result['error'] = 'empty crop'
+            continue
+        crops.append(crop)
+        crop_results.append(result)
+
+    # One batched OSNet forward pass for every readable crop
+    features = tracker._extract_osnet_features_batch(crops)
+
+    for i, (crop, result) in enumerate(zip(crops, crop_results)):
+        crop_features = features[i:i + 1] if features is not None else None
+        is_erik, combined_score, details = tracker.score_person_crop(crop, crop_features)
+        result.update({
+            'osnet_score': details['osnet_score'],
+            'face_score': details['face_score'],
+            'color_score': details['color_score'],
+            'combined_score': combined_score,
+            'is_erik': is_erik,
+            'method': details['method'],
+            'details': details
+        })
+        if return_embeddings and crop_features is not None:
+            result['embedding'] = crop_features.numpy().reshape(-1)
+
+    return results
+
+
+def _batched(iterable: Iterator, size: int) -> Iterator[List]:
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def run_batch_reid(reader: FrigateEventReader, store: BatchResultStore, config: Dict[str, Any],
+                   workers: int = None, batch_size: int = 64, start_time: Optional[float] = None,
+                   end_time: Optional[float] = None, cameras: Optional[List[str]] = None,
+                   reprocess: bool = False, archive_dir: Optional[str] = None) -> Dict[str, Any]:
+    """Run the recognition pipeline over Frigate history
+
+    Batches are fanned out to a process pool with a bounded number in flight;
+    results are written from the parent so the store has a single writer.
+    """
+    workers = workers or max(1, (os.cpu_count() or 2) - 1)
+    torch_threads = max(1, (os.cpu_count() or 1) // workers)
+
+    archive = None
+    if archive_dir:
+        from embedding_archive import EmbeddingArchive
+        archive = EmbeddingArchive(archive_dir)
+
+    done_ids = set() if reprocess else store.processed_ids()
+    events = (e for e in reader.iter_events(start_time, end_time, cameras) if e['id'] not in done_ids)
+
+    stats = {'processed': 0, 'matches': 0, 'errors': 0, 'skipped': len(done_ids)}
+    started = time.time()
+
+    def collect(future):
+        results = future.result()
+        for result in results:
+            embedding = result.pop('embedding', None)
+            if archive is not None and embedding is not None:
+                archive.append(embedding, result['camera'], result['start_time'], result['event_id'])
+            if result.get('error'):
+                stats['errors'] += 1
+            elif result.get('is_erik'):
+                stats['matches'] += 1
+        store.write_many(results)
+        stats['processed'] += len(results)
+
+        elapsed = time.time() - started
+        logger.info(f"Processed {stats['processed']} events ({stats['processed'] / max(elapsed, 1e-6):.1f}/s), "
+                    f"{stats['matches']} matches, {stats['errors']} errors")
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(config, torch_threads)) as pool:
+        pending = set()
+        for batch in _batched(events, batch_size):
+            # Bound in-flight work so snapshot decoding never outruns the writer
+            if len(pending) >= workers * 2:
+                finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    collect(future)
+            pending.add(pool.submit(_process_batch, batch, archive is not None))
+        for future in pending:
+            collect(future)
+
+    if archive is not None:
+        archive.close()
+
+    stats['elapsed_seconds'] = time.time() - started
+    return stats
+
+
+def _parse_time(value: Optional[str]) -> Optional[float]:
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.fromisoformat(value).timestamp()
+
+
+def main():
+    from hybrid_erik_tracker import load_config
+
+    parser = argparse.ArgumentParser(description='Batch Erik re-identification over Frigate event history')
+    parser.add_argument('--frigate-db', default=os.getenv('FRIGATE_DB', '/app/config/frigate.db'),
+                        help='Path to the Frigate SQLite database')
+    parser.add_argument('--clips-dir', default=os.getenv('FRIGATE_CLIPS_DIR', '/media/frigate/clips'),
+                        help='Frigate clips folder containing event snapshots')
+    parser.add_argument('--output', default=os.getenv('BATCH_REID_DB', '/app/logs/batch_reid.db'),
+                        help='SQLite file for results')
+    parser.add_argument('--start', help='Start time (unix timestamp or ISO date)')
+    parser.add_argument('--end', help='End time (unix timestamp or ISO date)')
+    parser.add_argument('--camera', action='append', help='Limit to camera (repeatable)')
+    parser.add_argument('--workers', type=int, default=None, help='Worker processes (default: CPUs - 1)')
+    parser.add_argument('--batch-size', type=int, default=64, help='Events per worker batch')
+    parser.add_argument('--osnet-threshold', type=float, default=None, help='Override OSNet threshold')
+    parser.add_argument('--enable-face-recognition', action='store_true',
+                        help='Query the face API for every event (much slower)')
+    parser.add_argument('--archive', action='store_true', help='Also append embeddings to the embedding archive')
+    parser.add_argument('--reprocess', action='store_true', help='Re-score events that already have results')
+
+    args = parser.parse_args()
+
+    config = load_config()
+    config['enable_face_recognition'] = args.enable_face_recognition
+    # Workers only score; archiving happens once in the parent process
+    config['embedding_archive_dir'] = None
+    # Offline scoring runs every event; the live compute budget does not apply
+    config['enable_scheduler'] = False
+    if args.osnet_threshold is not None:
+        config['osnet_threshold'] = args.osnet_threshold
+
+    reader = FrigateEventReader(args.frigate_db, args.clips_dir)
+    logger.info(f"Frigate database has {reader.count_events()} person events with snapshots")
+
+    store = BatchResultStore(args.output)
+    try:
+        stats = run_batch_reid(
+            reader, store, config,
+            workers=args.workers,
+            batch_size=args.batch_size,
+            start_time=_parse_time(args.start),
+            end_time=_parse_time(args.end),
+            cameras=args.camera,
+            reprocess=args.reprocess,
+            archive_dir=os.getenv('EMBEDDING_ARCHIVE_DIR', '/app/embeddings') if args.archive else None
+        )
+    finally:
+        store.close()
+
+    logger.info(f"Batch re-identification complete: {stats}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,513 @@
+#!/usr/bin/env python3
+"""
+Frigate Load Generator - Stand-in Frigate for yard-wide stress testing
+Publishes realistic frigate/events new/update/end sequences for many cameras and people,
+serves matching synthetic frames at /api/<camera>/latest.jpg, and ramps the event rate
+while watching the hybrid tracker and the image manager's MQTTDetectionListener until
+latency SLOs break. The result is a capacity curve.
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import string
+import logging
+import argparse
+import threading
+import subprocess
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple, Any
+
+import cv2
+import numpy as np
+import paho.mqtt.client as mqtt
+import requests
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+DEFAULT_CAMERAS = ['backyard', 'frontyard', 'side_yard', 'garage', 'driveway', 'patio', 'garden', 'gate']
+
+
+def make_person_sprite(shirt_bgr: Tuple[int, int, int], height: int = 240, seed: int = 0) -> np.ndarray:
+    """Draw a simple standing figure (head, shirt, trousers) on a transparent background"""
+    rng = np.random.default_rng(seed)
+    width = height // 2
+    sprite = np.zeros((height, width, 4), dtype=np.uint8)
+    skin = tuple(int(c) for c in rng.integers(90, 220, 3))
+    trousers = tuple(int(c) for c in rng.integers(20, 120, 3))
+
+    cx = width // 2
+    head_r = height // 12
+    cv2.circle(sprite, (cx, head_r + 2), head_r, (*skin, 255), -1)
+    cv2.rectangle(sprite, (cx - width // 3, 2 * head_r + 4), (cx + width // 3, height // 2), (*shirt_bgr, 255), -1)
+    cv2.rectangle(sprite, (cx - width // 4, height // 2), (cx - 2, height - 2), (*trousers, 255), -1)
+    cv2.rectangle(sprite, (cx + 2, height // 2), (cx + width // 4, height - 2), (*trousers, 255), -1)
+    return sprite
+
+
+def load_person_sprites(folder: Optional[str], count: int, seed: int = 0) -> List[np.ndarray]:
+    """Load person images from a folder (e.g. Erik's references), topping up with drawn figures"""
+    sprites = []
+    if folder and Path(folder).is_dir():
+        for path in sorted(Path(folder).iterdir()):
+            if path.suffix.lower() in ('.jpg', '.jpeg', '.png', '.bmp'):
+                image = cv2.imread(str(path))
+                if image is not None:
+                    sprites.append(np.dstack([image, np.full(image.shape[:2], 255, np.uint8)]))
+            if len(sprites) >= count:
+                break
+
+    rng = np.random.default_rng(seed)
+    while len(sprites) < count:
+        shirt = tuple(int(c) for c in rng.integers(0, 256, 3))
+        sprites.append(make_person_sprite(shirt, seed=seed + len(sprites)))
+    return sprites
+
+
+class Track:
+    """One simulated person crossing one camera's view"""
+
+    def __init__(self, camera: str, sprite_index: int, start: float, duration: float,
+                 frame_size: Tuple[int, int], rng: random.Random):
+        self.camera = camera
+        self.sprite_index = sprite_index
+        self.start = start
+        self.end = start + duration
+        suffix = ''.join(rng.choices(string.ascii_lowercase + string.digits, k=6))
+        self.id = f"{start:.6f}-{suffix}"
+
+        width, height = frame_size
+        self.box_h = rng.uniform(0.25, 0.6) * height
+        self.box_w = self.box_h / 2
+        self.y = rng.uniform(0.05 * height, height - self.box_h - 1)
+        self.x0 = rng.uniform(0, width - self.box_w - 1)
+        self.x1 = rng.uniform(0, width - self.box_w - 1)
+        self.score = rng.uniform(0.7, 0.95)
+        self.ended = False
+        self.updates = 0
+
+    def box(self, now: float) -> List[int]:
+        """Current [x1, y1, x2, y2] box in frame pixels"""
+        progress = min(1.0, max(0.0, (now - self.start) / max(self.end - self.start, 1e-6)))
+        x = self.x0 + (self.x1 - self.x0) * progress
+        return [int(x), int(self.y), int(x + self.box_w), int(self.y + self.box_h)]
+
+    def to_event(self, now: float) -> Dict[str, Any]:
+        """Frigate event state as published under before/after"""
+        box = self.box(now)
+        area = (box[2] - box[0]) * (box[3] - box[1])
+        return {
+            'id': self.id,
+            'camera': self.camera,
+            'frame_time': now,
+            'snapshot_time': now,
+            'label': 'person',
+            'sub_label': None,
+            'top_score': self.score,
+            'false_positive': False,
+            'start_time': self.start,
+            'end_time': now if self.ended else None,
+            'score': self.score,
+            'box': box,
+            'area': area,
+            'ratio': (box[2] - box[0]) / max(box[3] - box[1], 1),
+            'region': box,
+            'stationary': False,
+            'motionless_count': 0,
+            'position_changes': self.updates,
+            'current_zones': [],
+            'entered_zones': [],
+            'has_clip': False,
+            'has_snapshot': True
+        }
+
+
+class SceneSimulator:
+    """Spawns person tracks across cameras and produces Frigate event messages"""
+
+    def __init__(self, cameras: List[str], sprites: List[np.ndarray], frame_size: Tuple[int, int] = (1280, 720),
+                 track_duration: float = 10.0, update_interval: float = 1.0, max_people_per_camera: int = 4,
+                 seed: int = 0):
+        self.cameras = cameras
+        self.sprites = sprites
+        self.frame_size = frame_size
+        self.track_duration = track_duration
+        self.update_interval = update_interval
+        self.max_people_per_camera = max_people_per_camera
+        self.rng = random.Random(seed)
+        self.tracks: Dict[str, List[Track]] = {camera: [] for camera in cameras}
+        self._last_update: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+        width, height = frame_size
+        # Static per-camera backgrounds so frames differ between cameras but not between requests
+        self.backgrounds = {}
+        for i, camera in enumerate(cameras):
+            gradient = np.linspace(60, 160, height, dtype=np.float32)[:, None, None]
+            tint = np.array([40 + 20 * (i % 4), 90 + 10 * (i % 3), 60], dtype=np.float32)
+            self.backgrounds[camera] = np.clip(gradient + tint - 60, 0, 255).astype(np.uint8).repeat(width, axis=1)
+
+    def spawn(self, now: float) -> Optional[Dict[str, Any]]:
+        """Start a new track on a random camera with room; returns its 'new' event"""
+        with self._lock:
+            open_cameras = [c for c in self.cameras if len(self.tracks[c]) < self.max_people_per_camera]
+            if not open_cameras:
+                return None
+            camera = self.rng.choice(open_cameras)
+            duration = self.rng.uniform(0.5, 1.5) * self.track_duration
+            track = Track(camera, self.rng.randrange(len(self.sprites)), now, duration, self.frame_size, self.rng)
+            self.tracks[camera].append(track)
+            self._last_update[track.id] = now
+            after = track.to_event(now)
+            return {'type': 'new', 'before': after, 'after': after}
+
+    def advance(self, now: float) -> List[Dict[str, Any]]:
+        """Emit 'update' events for moving tracks and 'end' events for finished ones"""
+        messages = []
+        with self._lock:
+            for camera, tracks in self.tracks.items():
+                remaining = []
+                for track in tracks:
+                    before = track.to_event(self._last_update[track.id])
+                    if now >= track.end:
+                        track.ended = True
+                        messages.append({'type': 'end', 'before': before, 'after': track.to_event(now)})
+                        del self._last_update[track.id]
+                        continue
+                    if now - self._last_update[track.id] >= self.update_interval:
+                        track.updates += 1
+                        messages.append({'type': 'update', 'before': before, 'after': track.to_event(now)})
+                        self._last_update[track.id] = now
+                    remaining.append(track)
+                self.tracks[camera] = remaining
+        return messages
+
+    def active_count(self) -> int:
+        with self._lock:
+            return sum(len(t) for t in self.tracks.values())
+
+    def render(self, camera: str, now: Optional[float] = None) -> np.ndarray:
+        """Composite every active person onto the camera background at its current box"""
+        now = time.time() if now is None else now
+        frame = self.backgrounds[camera].copy()
+        with self._lock:
+            tracks = list(self.tracks.get(camera, []))
+        for track in tracks:
+            x1, y1, x2, y2 = track.box(now)
+            w, h = x2 - x1, y2 - y1
+            if w < 2 or h < 2:
+                continue
+            sprite = cv2.resize(self.sprites[track.sprite_index], (w, h), interpolation=cv2.INTER_LINEAR)
+            alpha = sprite[:, :, 3:4].astype(np.float32) / 255.0
+            region = frame[y1:y2, x1:x2].astype(np.float32)
+            frame[y1:y2, x1:x2] = (alpha * sprite[:, :, :3] + (1 - alpha) * region).astype(np.uint8)
+        return frame
+
+
+class FrameServer:
+    """Serves /api/<camera>/latest.jpg like Frigate, rendered from the simulator"""
+
+    def __init__(self, simulator: SceneSimulator, port: int = 5000, jpeg_quality: int = 85):
+        self.simulator = simulator
+        self.port = port
+        self.jpeg_quality = jpeg_quality
+        self.requests_served = 0
+        self.server = None
+
+    def start(self):
+        frame_server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                parts = self.path.split('?')[0].strip('/').split('/')
+                if len(parts) == 3 and parts[0] == 'api' and parts[2] == 'latest.jpg' \
+                        and parts[1] in frame_server.simulator.backgrounds:
+                    frame = frame_server.simulator.render(parts[1])
+                    ok, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, frame_server.jpeg_quality])
+                    payload = buffer.tobytes()
+                    frame_server.requests_served += 1
+                    self.send_response(200)
+                    self.send_header('Content-Type', 'image/jpeg')
+                    self.send_header('Content-Length', str(len(payload)))
+                    self.end_headers()
+                    self.wfile.write(payload)
+                else:
+                    self.send_error(404)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('0.0.0.0', self.port), Handler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        logger.info(f"Synthetic Frigate frames on http://0.0.0.0:{self.port}/api/<camera>/latest.jpg")
+
+    def stop(self):
+        if self.server:
+            self.server.shutdown()
+
+
+def summarize_latencies(cameras: Dict[str, Dict[str, Dict[str, float]]], segment: str = 'total') -> Dict[str, float]:
+    """Worst per-camera percentile for one segment, from a LatencyAggregator summary"""
+    stats = [segments[segment] for segments in cameras.values() if segment in segments]
+    if not stats:
+        return {'count': 0}
+    return {
+        'count': sum(s['count'] for s in stats),
+        'p50_ms': max(s['p50_ms'] for s in stats),
+        'p90_ms': max(s['p90_ms'] for s in stats),
+        'p99_ms': max(s['p99_ms'] for s in stats),
+        'max_ms': max(s['max_ms'] for s in stats)
+    }
+
+
+def find_capacity(steps: List[Dict[str, Any]], slo_ms: float, percentile: str = 'p90_ms',
+                  min_delivery: float = 0.95) -> Optional[float]:
+    """Highest offered rate whose step met both the latency SLO and the delivery ratio"""
+    capacity = None
+    for step in sorted(steps, key=lambda s: s['rate']):
+        latency = step['tracker_latency'].get(percentile)
+        if latency is None or latency > slo_ms or step['delivery_ratio'] < min_delivery:
+            break
+        capacity = step['rate']
+    return capacity
+
+
+class LoadGenerator:
+    """Drives the tracker through MQTT and measures it at increasing event rates"""
+
+    def __init__(self, simulator: SceneSimulator, mqtt_host: str = 'localhost', mqtt_port: int = 1883,
+                 tracker_url: str = 'http://localhost:8080', publish_counts: bool = False):
+        self.simulator = simulator
+        self.tracker_url = tracker_url.rstrip('/')
+        self.publish_counts = publish_counts
+        self.client = mqtt.Client()
+        self.client.connect(mqtt_host, mqtt_port, 60)
+        self.client.loop_start()
+
+        # The image manager's own listener, so end-to-end delivery is measured with the real code path
+        sys.path.insert(0, str(Path(__file__).resolve().parent))
+        from app.services.mqtt_service import MQTTDetectionListener
+        self.listener = MQTTDetectionListener(mqtt_host, mqtt_port)
+        self.listener.start()
+
+    def _tracker_get(self, path: str) -> Dict[str, Any]:
+        try:
+            return requests.get(f"{self.tracker_url}{path}", timeout=5).json()
+        except Exception as e:
+            logger.warning(f"Tracker {path} unavailable: {e}")
+            return {}
+
+    def _tracker_reset(self):
+        try:
+            requests.post(f"{self.tracker_url}/latency/reset", timeout=5)
+        except Exception as e:
+            logger.warning(f"Could not reset tracker latency: {e}")
+
+    def _publish(self, message: Dict[str, Any]):
+        self.client.publish('frigate/events', json.dumps(message))
+
+    def run_step(self, rate: float, duration: float, drain_timeout: float = 30.0) -> Dict[str, Any]:
+        """Offer new person events at `rate` per second (Poisson arrivals) for `duration` seconds"""
+        self._tracker_reset()
+        self.listener.latency.clear()
+        before = self._tracker_get('/health')
+
+        published_new = 0
+        published_total = 0
+        rng = random.Random(int(rate * 1000))
+        start = time.time()
+        next_arrival = start + rng.expovariate(rate)
+        next_tick = start
+
+        while time.time() - start < duration:
+            now = time.time()
+            while next_arrival <= now:
+                message = self.simulator.spawn(next_arrival)
+                if message:
+                    self._publish(message)
+                    published_new += 1
+                    published_total += 1
+                next_arrival += rng.expovariate(rate)
+            if now >= next_tick:
+                for message in self.simulator.advance(now):
+                    self._publish(message)
+                    published_total += 1
+                if self.publish_counts:
+                    for camera, tracks in self.simulator.tracks.items():
+                        self.client.publish(f"frigate/{camera}/person", str(len(tracks)))
+                next_tick = now + 0.1
+            time.sleep(max(0.0, min(next_arrival, next_tick) - time.time()))
+
+        # Let the tracker drain its queue before reading the step's numbers
+        drain_start = time.time()
+        while time.time() - drain_start < drain_timeout:
+            health = self._tracker_get('/health')
+            if not health or health.get('queue_size', 0) == 0:
+                break
+            time.sleep(0.5)
+        after = self._tracker_get('/health')
+
+        received = after.get('received', 0) - before.get('received', 0)
+        processed = after.get('processed', 0) - before.get('processed', 0)
+        dropped = after.get('dropped', 0) - before.get('dropped', 0)
+        throttled = after.get('throttled', 0) - before.get('throttled', 0)
+        tracker_latency = summarize_latencies(self._tracker_get('/latency').get('cameras', {}))
+        end_to_end = summarize_latencies(self.listener.latency.summary())
+
+        step = {
+            'rate': rate,
+            'duration': duration,
+            'published_new_events': published_new,
+            'published_messages': published_total,
+            'tracker_received': received,
+            'tracker_processed': processed,
+            'tracker_dropped': dropped,
+            'tracker_throttled': throttled,
+            'delivery_ratio': processed / published_new if published_new else 1.0,
+            'tracker_latency': tracker_latency,
+            'end_to_end_latency': end_to_end,
+            'active_people': self.simulator.active_count()
+        }
+        logger.info(f"Rate {rate:.2f}/s: {processed}/{published_new} processed, {dropped} dropped, "
+                    f"tracker p90 {tracker_latency.get('p90_ms')}ms, "
+                    f"end-to-end p90 {end_to_end.get('p90_ms')}ms ({end_to_end.get('count', 0)} matches)")
+        return step
+
+    def ramp(self, start_rate: float, max_rate: float, factor: float, step_duration: float,
+             slo_ms: float, percentile: str = 'p90_ms', min_delivery: float = 0.95) -> List[Dict[str, Any]]:
+        """Increase the rate geometrically until the SLO breaks or max_rate is reached"""
+        steps = []
+        rate = start_rate
+        while rate <= max_rate:
+            step = self.run_step(rate, step_duration)
+            steps.append(step)
+            latency = step['tracker_latency'].get(percentile)
+            if latency is None or latency > slo_ms or step['delivery_ratio'] < min_delivery:
+                logger.info(f"SLO broken at {rate:.2f} events/s")
+                break
+            rate *= factor
+        return steps
+
+    def stop(self):
+        self.listener.stop()
+        self.client.loop_stop()
+        self.client.disconnect()
+
+
+def save_capacity_curve(steps: List[Dict[str, Any]], capacity: Optional[float], output_dir: str,
+                        slo_ms: float, percentile: str):
+    """Write the capacity curve as JSON, CSV and (when matplotlib is available) a PNG"""
+    output = Path(output_dir)
+    output.mkdir(parents=True, exist_ok=True)
+
+    with open(output / 'capacity_curve.json', 'w') as f:
+        json.dump({'capacity_events_per_second': capacity, 'slo_ms': slo_ms,
+                   'percentile': percentile, 'steps': steps}, f, indent=2)
+
+    with open(output / 'capacity_curve.csv', 'w') as f:
+        f.write('rate,processed,dropped,delivery_ratio,tracker_p50_ms,tracker_p90_ms,tracker_p99_ms,'
+                'end_to_end_p90_ms\n')
+        for s in steps:
+            f.write(f"{s['rate']:.3f},{s['tracker_processed']},{s['tracker_dropped']},{s['delivery_ratio']:.3f},"
+                    f"{s['tracker_latency'].get('p50_ms', '')},{s['tracker_latency'].get('p90_ms', '')},"
+                    f"{s['tracker_latency'].get('p99_ms', '')},{s['end_to_end_latency'].get('p90_ms', '')}\n")
+
+    try:
+        import matplotlib
+        matplotlib.use('Agg')
+        import matplotlib.pyplot as plt
+    except ImportError:
+        return
+
+    rates = [s['rate'] for s in steps]
+    fig, ax = plt.subplots(figsize=(8, 5))
+    for key in ('p50_ms', 'p90_ms', 'p99_ms'):
+        ax.plot(rates, [s['tracker_latency'].get(key, np.nan) for s in steps], marker='o', label=f"tracker {key}")
+    ax.axhline(slo_ms, color='red', linestyle='--', label=f"SLO {percentile} {slo_ms:.0f}ms")
+    if capacity:
+        ax.axvline(capacity, color='green', linestyle=':', label=f"capacity {capacity:.2f}/s")
+    ax.set_xlabel('New person events per second')
+    ax.set_ylabel('Latency (ms)')
+    ax.set_title('Hybrid tracker capacity')
+    ax.legend()
+    fig.savefig(output / 'capacity_curve.png', dpi=120, bbox_inches='tight')
+    plt.close(fig)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Stand-in Frigate event generator for stress testing')
+    parser.add_argument('--mqtt-host', default=os.getenv('MQTT_HOST', 'localhost'))
+    parser.add_argument('--mqtt-port', type=int, default=int(os.getenv('MQTT_PORT', '1883')))
+    parser.add_argument('--frame-port', type=int, default=5000, help='Port for synthetic /api/<camera>/latest.jpg')
+    parser.add_argument('--tracker-url', default='http://localhost:8080', help='Tracker health/latency endpoint')
+    parser.add_argument('--cameras', type=int, default=8, help='Number of simulated cameras')
+    parser.add_argument('--people-per-camera', type=int, default=4, help='Max concurrent people per camera')
+    parser.add_argument('--person-images', default=os.getenv('ERIK_IMAGES_FOLDER'),
+                        help='Folder of person images to composite (e.g. Erik references)')
+    parser.add_argument('--frame-width', type=int, default=1280)
+    parser.add_argument('--frame-height', type=int, default=720)
+    parser.add_argument('--track-duration', type=float, default=10.0, help='Mean seconds a person stays in view')
+    parser.add_argument('--update-interval', type=float, default=1.0, help='Seconds between update events')
+    parser.add_argument('--start-rate', type=float, default=0.5, help='Initial new events per second')
+    parser.add_argument('--max-rate', type=float, default=64.0, help='Highest rate to try')
+    parser.add_argument('--rate-factor', type=float, default=1.5, help='Rate multiplier per step')
+    parser.add_argument('--step-duration', type=float, default=60.0, help='Seconds per ramp step')
+    parser.add_argument('--slo-ms', type=float, default=1000.0, help='Latency SLO in milliseconds')
+    parser.add_argument('--slo-percentile', default='p90_ms', choices=['p50_ms', 'p90_ms', 'p99_ms'])
+    parser.add_argument('--min-delivery', type=float, default=0.95, help='Minimum processed/published ratio')
+    parser.add_argument('--publish-counts', action='store_true', help='Also publish frigate/<camera>/person counts')
+    parser.add_argument('--spawn-tracker', action='store_true',
+                        help='Launch hybrid_erik_tracker.py pointed at the synthetic frames')
+    parser.add_argument('--output', default='load_test_results', help='Directory for the capacity curve')
+    parser.add_argument('--seed', type=int, default=0)
+
+    args = parser.parse_args()
+
+    cameras = [DEFAULT_CAMERAS[i] if i < len(DEFAULT_CAMERAS) else f"camera_{i}" for i in range(args.cameras)]
+    sprites = load_person_sprites(args.person_images, max(8, args.people_per_camera * 2), args.seed)
+    simulator = SceneSimulator(cameras, sprites, (args.frame_width, args.frame_height), args.track_duration,
+                               args.update_interval, args.people_per_camera, args.seed)
+
+    frame_server = FrameServer(simulator, args.frame_port)
+    frame_server.start()
+
+    tracker_process = None
+    if args.spawn_tracker:
+        env = dict(os.environ, FRIGATE_URL=f"http://localhost:{args.frame_port}",
+                   MQTT_HOST=args.mqtt_host, MQTT_PORT=str(args.mqtt_port))
+        tracker_process = subprocess.Popen([sys.executable, str(Path(__file__).resolve().parent / 'hybrid_erik_tracker.py')],
+                                           env=env)
+        # Wait for the tracker to load OSNet and answer health checks
+        for _ in range(120):
+            try:
+                requests.get(f"{args.tracker_url}/health", timeout=1)
+                break
+            except Exception:
+                time.sleep(1)
+
+    generator = LoadGenerator(simulator, args.mqtt_host, args.mqtt_port, args.tracker_url, args.publish_counts)
+    try:
+        steps = generator.ramp(args.start_rate, args.max_rate, args.rate_factor, args.step_duration,
+                               args.slo_ms, args.slo_percentile, args.min_delivery)
+        capacity = find_capacity(steps, args.slo_ms, args.slo_percentile, args.min_delivery)
+        save_capacity_curve(steps, capacity, args.output, args.slo_ms, args.slo_percentile)
+        logger.info(f"Capacity: {capacity} new person events/s at {args.slo_percentile} <= {args.slo_ms}ms "
+                    f"(results in {args.output})")
+    except KeyboardInterrupt:
+        logger.info("Load test interrupted")
+    finally:
+        generator.stop()
+        frame_server.stop()
+        if tracker_process:
+            tracker_process.terminate()
+
+
+if __name__ == '__main__':
+    main()
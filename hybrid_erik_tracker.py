@@ -19,9 +19,15 @@ from PIL import Image
 import time
 from pathlib import Path
 import os
-from datetime import datetime
+from datetime import datetime, timedelta
 import threading
 import queue
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from embedding_archive import EmbeddingArchive, EmbeddingSearch
+import erik_tracing
+from erik_tracing import LatencyAggregator
+from compute_scheduler import ComputeScheduler
 
 # Configure logging
 logging.basicConfig(
@@ -76,6 +82,35 @@ class HybridErikTracker:
         self.daily_color_notified = False
         self.last_notification_date = None
         
+        # Historical embedding archive (every processed crop, not just matches)
+        self.embedding_archive = None
+        self.embedding_search = None
+        self.archive_crops = config.get('archive_crops', False)
+        self.crop_retention_days = config.get('crop_retention_days', 7)
+        self.index_rebuild_rows = config.get('index_rebuild_rows', 10000)
+        self._last_crop_prune_date = None
+        archive_dir = config.get('embedding_archive_dir')
+        if archive_dir:
+            try:
+                self.embedding_archive = EmbeddingArchive(archive_dir)
+                self.embedding_search = EmbeddingSearch(self.embedding_archive)
+            except Exception as e:
+                logger.error(f"Could not open embedding archive at {archive_dir}: {e}")
+        
+        # End-to-end latency tracing (Frigate event -> publish)
+        self.latency = LatencyAggregator(window=config.get('latency_window', 1000))
+        self.health_port = config.get('health_port', 8080)
+        self.stats = {'received': 0, 'dropped': 0, 'throttled': 0, 'processed': 0}
+        
+        # Compute budget: per-camera processing rates instead of all-or-nothing
+        self.scheduler = None
+        if config.get('enable_scheduler', True):
+            self.scheduler = ComputeScheduler(
+                target_utilization=config.get('cpu_budget', 0.8),
+                latency_budget=config.get('latency_budget', 1.0),
+                neighbors=config.get('camera_neighbors', {})
+            )
+        
         logger.info("Hybrid Erik Tracker initialized")
         
     def load_erik_references(self, image_folder: str):
@@ -116,23 +151,26 @@ class HybridErikTracker:
             return None
         return self._extract_osnet_features(image)
         
+    def _preprocess_for_osnet(self, image: np.ndarray) -> np.ndarray:
+        """Resize and normalize a BGR crop into a CHW float32 OSNet input"""
+        # Resize to OSNet input size
+        image = cv2.resize(image, (128, 256))
+        
+        # Convert BGR to RGB and normalize
+        image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+        image = image.astype(np.float32) / 255.0
+        
+        # ImageNet normalization
+        mean = np.array([0.485, 0.456, 0.406], dtype=np.float32)
+        std = np.array([0.229, 0.224, 0.225], dtype=np.float32)
+        image = (image - mean) / std
+        
+        return image.transpose(2, 0, 1)
+        
     def _extract_osnet_features(self, image: np.ndarray) -> Optional[torch.Tensor]:
         """Extract OSNet features from image array"""
         try:
-            # Resize to OSNet input size
-            image = cv2.resize(image, (128, 256))
-            
-            # Convert BGR to RGB and normalize
-            image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-            image = image.astype(np.float32) / 255.0
-            
-            # ImageNet normalization
-            mean = np.array([0.485, 0.456, 0.406])
-            std = np.array([0.229, 0.224, 0.225])
-            image = (image - mean) / std
-            
-            # Convert to tensor
-            tensor = torch.tensor(image, dtype=torch.float32).permute(2, 0, 1).unsqueeze(0)
+            tensor = torch.from_numpy(self._preprocess_for_osnet(image)).unsqueeze(0)
             
             with torch.no_grad():
                 features = self.osnet_model(tensor)
@@ -145,6 +183,26 @@ class HybridErikTracker:
             logger.error(f"OSNet feature extraction failed: {e}")
             return None
             
+    def _extract_osnet_features_batch(self, images: List[np.ndarray], batch_size: int = 32) -> Optional[torch.Tensor]:
+        """Extract OSNet features for many crops with one forward pass per batch
+        
+        Returns an (N, D) tensor of L2-normalized features in input order.
+        """
+        if not images:
+            return None
+            
+        try:
+            outputs = []
+            for start in range(0, len(images), batch_size):
+                batch = np.stack([self._preprocess_for_osnet(image) for image in images[start:start + batch_size]])
+                with torch.no_grad():
+                    outputs.append(self.osnet_model(torch.from_numpy(batch)))
+            return torch.nn.functional.normalize(torch.cat(outputs), p=2, dim=1)
+            
+        except Exception as e:
+            logger.error(f"Batch OSNet feature extraction failed: {e}")
+            return None
+            
     def _compute_osnet_similarity(self, features: torch.Tensor) -> float:
         """Compute OSNet similarity with Erik's reference features"""
         if self.erik_features is None:
@@ -155,6 +213,101 @@ class HybridErikTracker:
         ).item()
         return similarity
     
+    def _archive_embedding(self, camera: str, detection: Dict, person_crop: np.ndarray,
+                           features: torch.Tensor) -> Optional[int]:
+        """Store a processed crop's OSNet embedding in the historical archive"""
+        if self.embedding_archive is None:
+            return None
+            
+        try:
+            timestamp = time.time()
+            event_id = detection.get('id')
+            crop_path = None
+            
+            if self.archive_crops:
+                today = datetime.now().strftime('%Y-%m-%d')
+                if self._last_crop_prune_date != today:
+                    self._prune_archived_crops()
+                    self._last_crop_prune_date = today
+                crops_dir = self.embedding_archive.archive_dir / 'crops' / today
+                crops_dir.mkdir(parents=True, exist_ok=True)
+                crop_file = crops_dir / f"{camera}_{int(timestamp * 1000)}_{event_id or 'unknown'}.jpg"
+                if cv2.imwrite(str(crop_file), person_crop):
+                    crop_path = str(crop_file)
+            
+            row = self.embedding_archive.append(
+                features.cpu().numpy().reshape(-1), camera, timestamp, event_id, crop_path
+            )
+            
+            # Keep the exact-scan tail of history searches bounded
+            if self.embedding_search is not None:
+                self.embedding_search.rebuild_in_background(self.index_rebuild_rows)
+            return row
+            
+        except Exception as e:
+            logger.error(f"Failed to archive embedding: {e}")
+            return None
+    
+    def _prune_archived_crops(self):
+        """Delete archived crop folders older than the retention period
+        
+        Their embeddings stay searchable; only the crop_path files are gone.
+        """
+        crops_root = self.embedding_archive.archive_dir / 'crops'
+        if not crops_root.exists():
+            return
+        cutoff = (datetime.now() - timedelta(days=self.crop_retention_days)).strftime('%Y-%m-%d')
+        for day_dir in crops_root.iterdir():
+            # Folder names are ISO dates, so string order is date order
+            if day_dir.is_dir() and day_dir.name < cutoff:
+                for crop_file in day_dir.iterdir():
+                    crop_file.unlink()
+                day_dir.rmdir()
+                logger.info(f"Removed archived crops from {day_dir.name}")
+    
+    def find_appearances(self, query_features: Optional[torch.Tensor] = None, start_time: Optional[float] = None,
+                         end_time: Optional[float] = None, camera: Optional[str] = None,
+                         k: int = 50, min_similarity: Optional[float] = None) -> List[Dict]:
+        """Find archived detections of a person, e.g. every appearance in the last week
+        
+        Uses Erik's reference features when no query is given.
+        """
+        if self.embedding_search is None:
+            return []
+            
+        if query_features is None:
+            query_features = self.erik_features
+        if query_features is None:
+            return []
+            
+        if min_similarity is None:
+            min_similarity = self.osnet_threshold
+            
+        query = query_features.cpu().numpy().reshape(-1)
+        return self.embedding_search.search(query, k, start_time, end_time, camera,
+                                            min_similarity=min_similarity)
+    
+    def rescore_history(self, start_time: Optional[float] = None,
+                        end_time: Optional[float] = None) -> List[Dict]:
+        """Re-score archived embeddings against the current reference features
+        
+        Lets the history be re-evaluated after references change without
+        recomputing any OSNet features.
+        """
+        if self.embedding_archive is None or self.erik_features is None:
+            return []
+            
+        rows = self.embedding_archive.rows_in_range(start_time, end_time)
+        scores = self.embedding_archive.score_against(self.erik_features.cpu().numpy(), rows)
+        
+        results = []
+        for row, score in zip(rows, scores):
+            record = dict(self.embedding_archive.get_metadata(int(row)))
+            record['osnet_score'] = float(score)
+            record['osnet_detected'] = bool(score >= self.osnet_threshold)
+            results.append(record)
+        return results
+    
     def _hue_to_color_name(self, hue: float) -> str:
         """Convert HSV hue value to human-readable color name"""
         if hue is None:
@@ -404,7 +557,11 @@ class HybridErikTracker:
                 full_image = cv2.imdecode(image_array, cv2.IMREAD_COLOR)
                 
                 # Extract bounding box
-                bbox = detection.get('box', detection.get('bbox'))
+                bbox = detection.get('bbox')
+                if detection.get('box') and len(detection['box']) >= 4:
+                    # Frigate event boxes are [x1, y1, x2, y2]
+                    x1, y1, x2, y2 = detection['box'][:4]
+                    bbox = [x1, y1, x2 - x1, y2 - y1]
                 if bbox and len(bbox) >= 4:
                     x, y, w, h = bbox[:4]
                     # Ensure coordinates are within image bounds
@@ -459,13 +616,15 @@ class HybridErikTracker:
         return False, 0.0
         
     def _fuse_confidence_scores(self, osnet_score: float, face_score: float, color_score: float,
-                               osnet_detected: bool, face_detected: bool, color_detected: bool) -> Tuple[bool, float, Dict]:
+                               osnet_detected: bool, face_detected: bool, color_detected: bool,
+                               face_available: bool = True) -> Tuple[bool, float, Dict]:
         """Fuse OSNet, face recognition, and color confidence scores"""
         
-        # Normalize weights to ensure they sum to 1.0
-        total_weight = self.osnet_weight + self.face_weight + self.color_weight
+        # Normalize weights to ensure they sum to 1.0 (face excluded when the stage was skipped)
+        face_weight = self.face_weight if face_available else 0.0
+        total_weight = self.osnet_weight + face_weight + self.color_weight
         norm_osnet_weight = self.osnet_weight / total_weight
-        norm_face_weight = self.face_weight / total_weight
+        norm_face_weight = face_weight / total_weight
         norm_color_weight = self.color_weight / total_weight
         
         # Count how many methods detected Erik
@@ -538,6 +697,45 @@ class HybridErikTracker:
         
         return is_erik, combined_score, details
         
+    def score_person_crop(self, person_crop: np.ndarray, osnet_features: Optional[torch.Tensor] = None,
+                          run_face: bool = True) -> Tuple[bool, float, Dict]:
+        """Run the OSNet, face and color pipeline on one person crop
+        
+        Precomputed OSNet features can be passed in (e.g. from a batch forward pass).
+        The face stage can be skipped when the compute budget is exceeded.
+        """
+        osnet_score = 0.0
+        osnet_detected = False
+        
+        if osnet_features is not None:
+            osnet_score = self._compute_osnet_similarity(osnet_features)
+            osnet_detected = osnet_score >= self.osnet_threshold
+            
+        # Face recognition analysis
+        face_detected, face_score = False, 0.0
+        face_start = time.time()
+        if run_face:
+            face_detected, face_score = self._query_face_recognition(person_crop)
+        face_seconds = time.time() - face_start
+        
+        # Color analysis
+        color_score = self._compute_color_similarity(person_crop)
+        color_detected = color_score >= self.color_confidence_threshold
+        
+        # Update Erik's color profile if we have high confidence face match
+        if face_detected and face_score >= 0.9:
+            self._update_erik_color_profile(person_crop, face_score)
+        
+        # Fuse confidence scores (face weight renormalized away only when the scheduler skipped it;
+        # disabled face recognition keeps scoring 0 at its configured weight)
+        is_erik, combined_score, details = self._fuse_confidence_scores(
+            osnet_score, face_score, color_score, osnet_detected, face_detected, color_detected,
+            face_available=run_face
+        )
+        details['face_skipped'] = not run_face
+        details['face_seconds'] = face_seconds if run_face else None
+        return is_erik, combined_score, details
+        
     def _is_recent_detection(self, camera: str) -> bool:
         """Check if we recently detected Erik on this camera"""
         key = f"{camera}_erik"
@@ -549,47 +747,49 @@ class HybridErikTracker:
         key = f"{camera}_erik"
         self.recent_detections[key] = time.time()
         
-    def _process_person_detection(self, camera: str, detection: Dict):
+    def _process_person_detection(self, camera: str, detection: Dict, trace: Optional[Dict] = None):
         """Process person detection with hybrid approach"""
         try:
+            processing_start = time.time()
+            erik_tracing.mark(trace, erik_tracing.PROCESSING_STARTED, processing_start)
+            
             # Skip if we recently detected Erik on this camera
             if self._is_recent_detection(camera):
                 return
                 
+            decision = self.scheduler.plan(camera) if self.scheduler else None
+                
             # Get person crop from Frigate
             person_crop = self._get_person_crop_from_frigate(camera, detection)
             if person_crop is None:
                 logger.warning(f"Could not get person crop for {camera}")
                 return
+            erik_tracing.mark(trace, erik_tracing.CROP_FETCHED)
                 
             # OSNet analysis
             osnet_features = self._extract_osnet_features(person_crop)
-            osnet_score = 0.0
-            osnet_detected = False
-            
             if osnet_features is not None:
-                osnet_score = self._compute_osnet_similarity(osnet_features)
-                osnet_detected = osnet_score >= self.osnet_threshold
+                self._archive_embedding(camera, detection, person_crop, osnet_features)
                 
-            # Face recognition analysis
-            face_detected, face_score = self._query_face_recognition(person_crop)
-            
-            # Color analysis
-            color_score = self._compute_color_similarity(person_crop)
-            color_detected = color_score >= self.color_confidence_threshold
-            
-            # Update Erik's color profile if we have high confidence face match
-            if face_detected and face_score >= 0.9:
-                self._update_erik_color_profile(person_crop, face_score)
-            
-            # Fuse confidence scores
-            is_erik, combined_confidence, details = self._fuse_confidence_scores(
-                osnet_score, face_score, color_score, osnet_detected, face_detected, color_detected
+            is_erik, combined_confidence, details = self.score_person_crop(
+                person_crop, osnet_features, run_face=decision.run_face if decision else True
             )
+            osnet_score = details['osnet_score']
+            face_score = details['face_score']
+            color_score = details['color_score']
+            erik_tracing.mark(trace, erik_tracing.SCORED)
+            
+            if self.scheduler:
+                # Latency from the tracker receiving the event, including queue wait
+                received = (trace or {}).get('stages', {}).get(erik_tracing.TRACKER_RECEIVED, processing_start)
+                self.scheduler.record(time.time() - processing_start, time.time() - received,
+                                      details['face_seconds'])
             
             if is_erik:
                 # Mark recent detection to prevent spam
                 self._mark_recent_detection(camera)
+                if self.scheduler:
+                    self.scheduler.erik_seen(camera)
                 
                 # Publish Erik detection
                 erik_data = {
@@ -602,6 +802,11 @@ class HybridErikTracker:
                     "method": "hybrid_tracker"
                 }
                 
+                # Stamp the publish time last so the payload carries every tracker stage
+                if trace is not None:
+                    erik_tracing.mark(trace, erik_tracing.PUBLISHED)
+                    erik_data["trace"] = trace
+                
                 self.mqtt_client.publish(
                     f"yard/erik/detected/{camera}",
                     json.dumps(erik_data)
@@ -621,6 +826,10 @@ class HybridErikTracker:
                     "timestamp": erik_data["timestamp"]
                 }))
                 
+            # Record every scored detection, not just matches, so load tests see the full pipeline
+            if trace is not None:
+                self.latency.record(camera, trace)
+                
         except Exception as e:
             logger.error(f"Error processing person detection: {e}")
             
@@ -628,8 +837,9 @@ class HybridErikTracker:
         """Worker thread to process detections"""
         while True:
             try:
-                camera, detection = self.processing_queue.get(timeout=1)
-                self._process_person_detection(camera, detection)
+                camera, detection, trace = self.processing_queue.get(timeout=1)
+                self._process_person_detection(camera, detection, trace)
+                self.stats['processed'] += 1
                 self.processing_queue.task_done()
             except queue.Empty:
                 continue
@@ -646,6 +856,61 @@ class HybridErikTracker:
         else:
             logger.error(f"MQTT connection failed with code {rc}")
             
+    def _start_trace(self, payload: Any) -> Dict:
+        """Start a trace for an incoming Frigate message"""
+        trace = erik_tracing.new_trace(erik_tracing.frigate_event_time(payload))
+        return erik_tracing.mark(trace, erik_tracing.TRACKER_RECEIVED)
+        
+    def _admit(self, camera: str) -> bool:
+        """Apply the compute budget before a detection is queued"""
+        if self.scheduler is None or self.scheduler.admit(camera):
+            return True
+        self.stats['throttled'] += 1
+        return False
+        
+    def _start_health_server(self):
+        """Serve /health and /latency for the container health check and monitoring"""
+        tracker = self
+        
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path == '/health':
+                    body = {'status': 'ok', 'queue_size': tracker.processing_queue.qsize(), **tracker.stats}
+                elif self.path == '/latency':
+                    body = {'cameras': tracker.latency.summary(), 'recent': tracker.latency.recent()}
+                elif self.path == '/scheduler':
+                    body = tracker.scheduler.status() if tracker.scheduler else {'enabled': False}
+                else:
+                    self.send_error(404)
+                    return
+                self._send_json(body)
+                
+            def do_POST(self):
+                # Load tests reset the distributions between ramp steps
+                if self.path != '/latency/reset':
+                    self.send_error(404)
+                    return
+                tracker.latency.clear()
+                self._send_json({'status': 'reset'})
+                
+            def _send_json(self, body):
+                payload = json.dumps(body).encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+                
+            def log_message(self, format, *args):
+                pass
+        
+        try:
+            server = ThreadingHTTPServer(('0.0.0.0', self.health_port), Handler)
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+            logger.info(f"Health and latency endpoints on port {self.health_port}")
+        except OSError as e:
+            logger.warning(f"Could not start health server on port {self.health_port}: {e}")
+            
     def _on_mqtt_message(self, client, userdata, msg):
         """MQTT message callback"""
         try:
@@ -655,22 +920,33 @@ class HybridErikTracker:
                 # Person detection on specific camera
                 camera = topic_parts[1]
                 data = json.loads(msg.payload.decode())
+                trace = self._start_trace(data)
+                self.stats['received'] += 1
+                if not self._admit(camera):
+                    return
                 
                 # Add to processing queue (non-blocking)
                 try:
-                    self.processing_queue.put_nowait((camera, data))
+                    self.processing_queue.put_nowait((camera, data, trace))
                 except queue.Full:
+                    self.stats['dropped'] += 1
                     logger.warning("Processing queue full, dropping detection")
                     
             elif msg.topic == "frigate/events":
-                # General Frigate events
+                # General Frigate events carry the event state under 'after'
                 data = json.loads(msg.payload.decode())
-                if data.get('type') == 'new' and 'person' in data.get('label', ''):
-                    camera = data.get('camera')
+                event = data.get('after') or data
+                if data.get('type') == 'new' and 'person' in event.get('label', ''):
+                    camera = event.get('camera')
                     if camera:
+                        trace = self._start_trace(data)
+                        self.stats['received'] += 1
+                        if not self._admit(camera):
+                            return
                         try:
-                            self.processing_queue.put_nowait((camera, data))
+                            self.processing_queue.put_nowait((camera, event, trace))
                         except queue.Full:
+                            self.stats['dropped'] += 1
                             logger.warning("Processing queue full, dropping event")
                             
         except Exception as e:
@@ -686,10 +962,16 @@ class HybridErikTracker:
             logger.error("Failed to load Erik reference images")
             return False
             
+        # Refresh the history index so archived embeddings are searchable
+        if self.embedding_search is not None:
+            self.embedding_search.rebuild()
+            
         # Start worker thread
         worker = threading.Thread(target=self._worker_thread, daemon=True)
         worker.start()
         
+        self._start_health_server()
+        
         # Setup MQTT
         self.mqtt_client = mqtt.Client()
         self.mqtt_client.on_connect = self._on_mqtt_connect
@@ -737,6 +1019,21 @@ def load_config():
         
         # Detection settings
         'detection_cooldown': int(os.getenv('DETECTION_COOLDOWN', '5')),
+        
+        # Embedding archive settings
+        'embedding_archive_dir': os.getenv('EMBEDDING_ARCHIVE_DIR', '/app/embeddings'),
+        'archive_crops': os.getenv('ARCHIVE_CROPS', 'false').lower() == 'true',
+        'crop_retention_days': int(os.getenv('ARCHIVE_CROP_RETENTION_DAYS', '7')),
+        'index_rebuild_rows': int(os.getenv('EMBEDDING_INDEX_REBUILD_ROWS', '10000')),
+        
+        # Compute budget scheduler
+        'enable_scheduler': os.getenv('ENABLE_SCHEDULER', 'true').lower() == 'true',
+        'cpu_budget': float(os.getenv('CPU_BUDGET', '0.8')),
+        'latency_budget': float(os.getenv('LATENCY_BUDGET', '1.0')),
+        'camera_neighbors': json.loads(os.getenv('CAMERA_NEIGHBORS', '{}')),
+        
+        # Health check and latency endpoint
+        'health_port': int(os.getenv('HEALTH_PORT', '8080')),
     }
     
     return config
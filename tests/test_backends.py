@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Test the yard map backend registry, its calibration file and the automatic picker
+"""
+
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from yard_map.backends import (BACKENDS, get_backend, calibrate, load_calibration, pick_backend,
+                               predict_seconds, machine_id)
+from yard_map.benchmark_yard_maps import synthetic_yard, write_synthetic_yard
+from yard_map.raster_engine import rasterize
+from app.services.yard_service import YardMappingService
+from app.utils.progress_tracker import ProgressTracker
+
+ALL_USABLE = {'multicore': lambda: True, 'cupy': lambda: False, 'gpu': lambda: False}
+
+
+def test_backends_render_and_build_commands(tmp_path):
+    vertices, colors = synthetic_yard(20000, seed=3)
+    expected = rasterize(vertices, colors, output_width=96, output_height=54, rotation=10, algorithm='kmeans')
+    image, grid = get_backend('numpy').render(vertices, colors, output_width=96, output_height=54, rotation=10,
+                                              algorithm='kmeans')
+    assert np.array_equal(image, expected) and grid.center is not None
+    assert not BACKENDS['numba'].supports('kmeans') and BACKENDS['tiled'].supports('kmeans')
+    try:
+        get_backend('numba').render(vertices, colors, algorithm='kmeans')
+        assert False, "numba has no kmeans kernel"
+    except ValueError as e:
+        assert 'does not implement kmeans' in str(e)
+
+    numba = get_backend('numba')
+    image, _ = numba.render(vertices, colors, output_width=96, output_height=54, rotation=10)
+    mesh = tmp_path / 'yard.ply'
+    write_synthetic_yard(mesh, 20000, seed=3)
+    cmd = numba.command(sys.executable, mesh, tmp_path / 'map.png', output_width=96, output_height=54, rotation=10,
+                        custom_bounds=(2, 30, 1, 17))
+    assert cmd[cmd.index('--x-min') + 1] == '2' and cmd[-2:] == ['--output', str(tmp_path / 'map.png')]
+    subprocess.run(cmd[:cmd.index('--x-min')] + cmd[-2:], check=True, capture_output=True, timeout=600)
+    assert np.array_equal(np.asarray(Image.open(tmp_path / 'map.png')), image)
+
+
+def test_calibration_and_pick(tmp_path):
+    path = tmp_path / 'calibration.json'
+    calibration = calibrate(path, sizes=(2000, 8000), backends=('numpy', 'tiled'), checks=ALL_USABLE,
+                            log=lambda message: None)
+    assert set(calibration['timings']) == {'numpy', 'tiled'} and set(calibration['timings']['numpy']) == {'2000', '8000'}
+    assert load_calibration(path) == calibration
+
+    # Calibrations of other machines are ignored
+    path.write_text(json.dumps({**calibration, 'machine': 'elsewhere'}))
+    assert load_calibration(path) is None and machine_id() != 'elsewhere'
+
+    # A fixed cost that pays off on large clouds: numpy wins small, numba wins large
+    timings = {'numpy': {'100000': 0.1, '1000000': 1.0}, 'numba': {'100000': 0.5, '1000000': 0.8}}
+    assert np.isclose(predict_seconds(timings['numba'], 10000000), 3.8)
+    calibration = {'timings': timings}
+    assert pick_backend('bottom_percentile', 50000, calibration, ALL_USABLE).name == 'numpy'
+    assert pick_backend('bottom_percentile', 5000000, calibration, ALL_USABLE).name == 'numba'
+    # Only backends implementing the algorithm (and usable here) are candidates
+    assert pick_backend('kmeans', 5000000, calibration, ALL_USABLE).name == 'numpy'
+    assert pick_backend('kmeans', None, None, ALL_USABLE).name == 'tiled'
+    assert pick_backend('bottom_percentile', None, None, {**ALL_USABLE, 'numba': lambda: False}).name == 'tiled'
+
+
+def test_backends_share_a_process():
+    # Numba's threaded kernels followed by the tiled process pool (as in calibrate() or a
+    # long-lived job worker) must not leave the process hanging at exit
+    script = (
+        "from yard_map.backends import get_backend\n"
+        "from yard_map.benchmark_yard_maps import synthetic_yard\n"
+        "from yard_map.tiled_raster import rasterize_tiled\n"
+        "vertices, colors = synthetic_yard(20000, seed=3)\n"
+        "get_backend('numba').render(vertices, colors, output_width=96, output_height=54)\n"
+        "rasterize_tiled(vertices, colors, output_width=96, output_height=54, tile_size=32, workers=2)\n"
+    )
+    subprocess.run([sys.executable, '-c', script], check=True, capture_output=True, timeout=120,
+                   cwd=Path(__file__).resolve().parent.parent)
+
+
+def test_service_renders_with_calibrated_backend(tmp_path):
+    mesh_folder = tmp_path / 'meshes'
+    mesh_folder.mkdir()
+    write_synthetic_yard(mesh_folder / 'yard.ply', 20000, seed=3)
+    calibration_path = tmp_path / 'calibration.json'
+    calibration_path.write_text(json.dumps({
+        'machine': machine_id(), 'timings': {'numpy': {'10000': 0.01, '100000': 0.1}, 'numba': {'10000': 1.0}}
+    }))
+    service = YardMappingService({
+        'MESH_FOLDER': str(mesh_folder), 'POINT_CACHE_DIR': str(tmp_path / 'cache'),
+        'YARD_MAP_CALIBRATION': str(calibration_path)
+    })
+    service.job_runner.tracker = ProgressTracker()
+    service._cuda_available = False
+
+    try:
+        assert service.point_count(str(mesh_folder / 'yard.ply')) == 20000
+        image_data, log = service.generate_yard_map(str(mesh_folder / 'yard.ply'), algorithm='bottom_percentile')
+        assert image_data is not None and 'with the numpy backend' in log
+
+        service.raster_backend = 'numba'
+        image_data, log = service.generate_yard_map(str(mesh_folder / 'yard.ply'), algorithm='simple_average')
+        assert image_data is not None and 'with the numba backend' in log
+    finally:
+        service.job_runner.shutdown()
+
+
+if __name__ == "__main__":
+    import tempfile
+    test_backends_share_a_process()
+    for test in (test_backends_render_and_build_commands, test_calibration_and_pick,
+                 test_service_renders_with_calibrated_backend):
+        with tempfile.TemporaryDirectory() as tmp:
+            test(Path(tmp))
+    print("✅ Backend registry tests passed")
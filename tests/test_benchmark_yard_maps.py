@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+Test the yard map benchmark suite: synthetic yards, measured runs and reference diffs
+"""
+
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+from yard_map.benchmark_yard_maps import synthetic_yard, write_synthetic_yard, compare_images, YARD_WIDTH, YARD_DEPTH
+from yard_map.ply_reader import PlyPointCloud
+
+
+def test_synthetic_yard_is_seeded_and_chunked(tmp_path):
+    xyz, rgb = synthetic_yard(50000, seed=4)
+    again, _ = synthetic_yard(50000, seed=4)
+    assert np.array_equal(xyz, again) and xyz.dtype == np.float32 and rgb.dtype == np.uint8
+    assert not np.array_equal(xyz, synthetic_yard(50000, seed=4, chunk=1)[0])
+    # Ground dominates near z = 0, trees and the roof reach several meters
+    assert 0.5 < np.mean(np.abs(xyz[:, 2] - 0.02 * xyz[:, 0]) < 0.2) < 0.75 and xyz[:, 2].max() > 4
+    assert xyz[:, 0].min() >= -2 and xyz[:, 0].max() <= YARD_WIDTH + 2 and xyz[:, 1].max() <= YARD_DEPTH + 2
+
+    write_synthetic_yard(tmp_path / 'yard.ply', 25000, seed=4, chunk_size=10000)
+    cloud = PlyPointCloud(str(tmp_path / 'yard.ply'))
+    assert len(cloud) == 25000 and np.array_equal(cloud.xyz()[:10000], synthetic_yard(10000, seed=4)[0])
+
+
+def test_reference_diffs_fail_on_changed_maps(tmp_path):
+    command = [sys.executable, str(ROOT / 'yard_map' / 'benchmark_yard_maps.py'), '--sizes', '20000',
+               '--cases', 'engine_bottom_percentile', 'numba_simple_average', '--width', '160', '--height', '90',
+               '--work-dir', str(tmp_path / 'work'), '--reference-dir', str(tmp_path / 'reference')]
+    subprocess.run(command + ['--update-reference'], capture_output=True, text=True, check=True)
+    unchanged = subprocess.run(command + ['--json', str(tmp_path / 'results.json')], capture_output=True, text=True)
+    assert unchanged.returncode == 0, unchanged.stdout + unchanged.stderr
+    with open(tmp_path / 'results.json') as f:
+        results = json.load(f)
+    assert [r['case'] for r in results] == ['engine_bottom_percentile', 'numba_simple_average']
+    for result in results:
+        assert result['status'] == 'ok' and result['points'] == 20000 and result['peak_rss_mb'] > 0
+        assert result['diff'] == {'changed_fraction': 0.0, 'max_abs_diff': 0, 'psnr': float('inf')}
+
+    reference = tmp_path / 'reference' / 'synthetic_20000_s0' / 'engine_bottom_percentile.png'
+    image = np.asarray(Image.open(reference)).copy()
+    image[:10] = 0
+    Image.fromarray(image).save(reference)
+    assert compare_images(str(reference), str(reference))['changed_fraction'] == 0.0
+    changed = subprocess.run(command, capture_output=True, text=True)
+    assert changed.returncode == 1 and 'Output changed: synthetic_20000_s0 engine_bottom_percentile' in changed.stdout
+
+
+if __name__ == "__main__":
+    import tempfile
+    for test in (test_synthetic_yard_is_seeded_and_chunked, test_reference_diffs_fail_on_changed_maps):
+        with tempfile.TemporaryDirectory() as tmp:
+            test(Path(tmp))
+    print("✅ Yard map benchmark tests passed")
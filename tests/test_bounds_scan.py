@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Test sampled bounds scans of PLY clouds that are not in the point cache yet
+"""
+
+import os
+import sys
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from yard_map.point_cache import PointCache, percentile_rank_error
+from app.services.yard_service import YardMappingService
+
+
+def write_yard_ply(path, n=200000, seed=7):
+    rng = np.random.default_rng(seed)
+    records = np.empty(n, dtype=[('x', '<f4'), ('y', '<f4'), ('z', '<f4'),
+                                 ('red', 'u1'), ('green', 'u1'), ('blue', 'u1')])
+    records['x'], records['y'] = rng.uniform(0, 32, n), rng.uniform(0, 18, n)
+    records['z'] = np.where(rng.random(n) < 0.3, rng.uniform(0.5, 2.0, n), rng.normal(0, 0.02, n))
+    for channel in ('red', 'green', 'blue'):
+        records[channel] = rng.integers(0, 256, n)
+    with open(path, 'wb') as f:
+        f.write((f"ply\nformat binary_little_endian 1.0\nelement vertex {n}\n"
+                 "property float x\nproperty float y\nproperty float z\n"
+                 "property uchar red\nproperty uchar green\nproperty uchar blue\nend_header\n").encode('ascii'))
+        records.tofile(f)
+    return np.column_stack([records[a] for a in 'xyz'])
+
+
+def test_sampled_scan_within_error(tmp_path):
+    vertices = write_yard_ply(tmp_path / 'yard.ply')
+    cache = PointCache(str(tmp_path / 'cache'))
+
+    scan = cache.scan(str(tmp_path / 'yard.ply'), sample_size=10000)
+    assert len(scan) == 200000 and not scan.meta['exact'] and scan.meta['sample_size'] == 10000
+    assert scan.meta['rank_error'] == percentile_rank_error(10000)
+    assert cache.entries() == []  # Nothing converted
+    for i, axis in enumerate('xyz'):
+        for p, value in zip((2, 50, 98), scan.percentiles(axis, (2, 50, 98))):
+            rank = 100 * np.mean(vertices[:, i] <= value)
+            assert abs(rank - p) <= scan.meta['rank_error']
+
+    # Stored once per mesh: a smaller request reuses it, a larger one rescans
+    assert cache.scan(str(tmp_path / 'yard.ply'), sample_size=5000).meta['created'] == scan.meta['created']
+    assert cache.scan(str(tmp_path / 'yard.ply'), sample_size=20000).meta['sample_size'] == 20000
+
+    cache.load(str(tmp_path / 'yard.ply'))
+    exact = cache.scan(str(tmp_path / 'yard.ply'))
+    assert exact.meta['exact'] and exact.meta['rank_error'] == 0.0
+    assert exact.percentiles('x', (2, 98)) == cache.load(str(tmp_path / 'yard.ply')).percentiles('x', (2, 98))
+
+
+def test_scan_bounds_reports_sample(tmp_path):
+    mesh_folder = tmp_path / 'meshes'
+    mesh_folder.mkdir()
+    write_yard_ply(mesh_folder / 'yard.ply', n=50000)
+    service = YardMappingService({'MESH_FOLDER': str(mesh_folder), 'POINT_CACHE_DIR': str(tmp_path / 'cache')})
+    try:
+        bounds = service.scan_bounds(str(mesh_folder / 'yard.ply'), projection='xz')
+        assert bounds['total_points'] == 50000 and bounds['sampled_points'] == 50000
+        assert bounds['percentile_error'] == 0.0 and bounds['axis2_label'] == 'Z'
+        assert os.listdir(tmp_path / 'cache') == ['scans']
+    finally:
+        service.job_runner.shutdown()
+
+
+if __name__ == "__main__":
+    import tempfile
+    for test in (test_sampled_scan_within_error, test_scan_bounds_reports_sample):
+        with tempfile.TemporaryDirectory() as tmp:
+            test(Path(tmp))
+    print("✅ Bounds scan tests passed")
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Test persisted per-view cell indexes: re-renders and coarser views match the in-memory engine
+"""
+
+import os
+import sys
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from yard_map.point_cache import PointCache
+from yard_map.raster_engine import rasterize
+from yard_map.cell_index_cache import INDEX_DIR, load_view_index, rasterize_cached
+
+
+def cached_cloud(tmp_path, n=30000, seed=5):
+    rng = np.random.default_rng(seed)
+    x, y = rng.uniform(0, 40, n), rng.uniform(0, 24, n)
+    z = 0.03 * x + np.where(rng.random(n) < 0.3, rng.uniform(0.5, 2.0, n), rng.normal(0, 0.02, n))
+    records = np.empty(n, dtype=[('x', '<f4'), ('y', '<f4'), ('z', '<f4'),
+                                 ('red', 'u1'), ('green', 'u1'), ('blue', 'u1')])
+    records['x'], records['y'], records['z'] = x, y, z
+    for channel in ('red', 'green', 'blue'):
+        records[channel] = rng.integers(0, 256, n)
+    header = (f"ply\nformat binary_little_endian 1.0\nelement vertex {n}\n"
+              "property float x\nproperty float y\nproperty float z\n"
+              "property uchar red\nproperty uchar green\nproperty uchar blue\nend_header\n")
+    path = tmp_path / 'yard.ply'
+    with open(path, 'wb') as f:
+        f.write(header.encode('ascii'))
+        records.tofile(f)
+    return PointCache(tmp_path / 'cache').load(str(path))
+
+
+def test_rerenders_reuse_the_persisted_index(tmp_path):
+    cached = cached_cloud(tmp_path)
+    vertices, colors = np.array(cached.xyz), np.array(cached.rgb)
+
+    for algorithm in ('bottom_percentile', 'height_window', 'kmeans', 'simple_average'):
+        for coloring in ('true_color', 'height', 'path'):
+            image = rasterize_cached(cached, output_width=80, output_height=48, rotation=15,
+                                     algorithm=algorithm, coloring=coloring, height_window=0.3)
+            expected = rasterize(vertices, colors, output_width=80, output_height=48, rotation=15,
+                                 algorithm=algorithm, coloring=coloring, height_window=0.3)
+            assert np.array_equal(image, expected), (algorithm, coloring)
+
+    # One index for the whole parameter sweep, reloaded memory-mapped
+    assert len(os.listdir(os.path.join(cached.entry_dir, INDEX_DIR))) == 1
+    index = load_view_index(cached, output_width=80, output_height=48, rotation=15)
+    assert isinstance(index.order, np.memmap)
+
+
+def test_coarser_view_is_derived_from_finer_index(tmp_path):
+    cached = cached_cloud(tmp_path)
+    vertices, colors = np.array(cached.xyz), np.array(cached.rgb)
+    bounds = (2.0, 38.0, 1.0, 23.0)
+
+    fine = load_view_index(cached, custom_bounds=bounds, output_width=120, output_height=72)
+    coarse = load_view_index(cached, custom_bounds=bounds, output_width=40, output_height=24)
+    assert coarse.grid.pixel_size == fine.grid.pixel_size * 3
+    assert coarse.counts.sum() == fine.counts.sum()
+
+    image = rasterize_cached(cached, custom_bounds=bounds, output_width=40, output_height=24)
+    expected = rasterize(vertices, colors, custom_bounds=bounds, output_width=40, output_height=24)
+    assert np.array_equal(image, expected)
+
+
+if __name__ == "__main__":
+    import tempfile
+    for test in (test_rerenders_reuse_the_persisted_index, test_coarser_view_is_derived_from_finer_index):
+        with tempfile.TemporaryDirectory() as tmp:
+            test(Path(tmp))
+    print("✅ Cell index cache tests passed")
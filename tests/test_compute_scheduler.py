@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Test the per-camera compute budget scheduler
+"""
+
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from compute_scheduler import ComputeScheduler
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def offer(scheduler, clock, cameras, rate, seconds):
+    """Offer `rate` detections/second on each camera; return admitted counts"""
+    admitted = {c: 0 for c in cameras}
+    for _ in range(int(seconds * rate)):
+        clock.now += 1.0 / rate
+        for camera in cameras:
+            admitted[camera] += scheduler.admit(camera)
+    return admitted
+
+
+def test_light_load_admits_everything():
+    """Under budget every detection is processed"""
+    clock = FakeClock()
+    scheduler = ComputeScheduler(clock=clock)
+    scheduler.base_cost, scheduler.face_cost = 0.01, 0.01
+    admitted = offer(scheduler, clock, ['backyard', 'garage'], rate=1.0, seconds=30)
+    assert admitted['backyard'] >= 29 and admitted['garage'] >= 29
+
+
+def test_overload_favours_erik_camera_and_neighbours():
+    """When capacity is short, Erik's camera and its neighbours get the larger share"""
+    clock = FakeClock()
+    scheduler = ComputeScheduler(neighbors={'backyard': ['side_yard']}, clock=clock)
+    scheduler.base_cost, scheduler.face_cost = 0.5, 0.0   # ~1.6 detections/s total
+    cameras = ['backyard', 'side_yard', 'garage', 'driveway']
+    offer(scheduler, clock, cameras, rate=2.0, seconds=10)
+    scheduler.erik_seen('backyard')
+
+    admitted = offer(scheduler, clock, cameras, rate=2.0, seconds=60)
+    assert admitted['backyard'] > admitted['side_yard'] > admitted['garage']
+    assert sum(admitted.values()) < 0.5 * 4 * 2.0 * 60
+
+
+def test_pressure_reduces_scale_and_skips_face():
+    """Sustained over-budget processing degrades rates and drops the face stage"""
+    clock = FakeClock()
+    scheduler = ComputeScheduler(target_utilization=0.5, clock=clock)
+    assert scheduler.plan('garage').run_face
+
+    for _ in range(20):
+        clock.now += 0.5
+        scheduler.record(processing_seconds=0.5, latency_seconds=3.0, face_seconds=0.2)
+
+    assert scheduler.pressure > 1.0
+    assert scheduler.scale < 0.5
+    assert not scheduler.plan('garage').run_face
+
+    # Recovery is gradual once load falls
+    for _ in range(200):
+        clock.now += 1.0
+        scheduler.record(processing_seconds=0.01, latency_seconds=0.05, face_seconds=0.0)
+    assert scheduler.pressure < 1.0 and scheduler.scale > 0.9
+    assert scheduler.plan('garage').run_face
+
+
+if __name__ == '__main__':
+    test_light_load_admits_everything()
+    test_overload_favours_erik_camera_and_neighbours()
+    test_pressure_reduces_scale_and_skips_face()
+    print("All compute scheduler tests passed")
@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""
+Test the embedding archive and IVF/PQ history search
+"""
+
+import sys
+import time
+import tempfile
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from embedding_archive import EmbeddingArchive, EmbeddingSearch, METADATA_FILE
+
+
+def random_embeddings(n, dim=64, seed=0):
+    """Create L2-normalized random embeddings"""
+    rng = np.random.default_rng(seed)
+    vectors = rng.normal(size=(n, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def test_archive_append_and_reopen():
+    """Rows survive reopening and the archive grows past its initial capacity"""
+    with tempfile.TemporaryDirectory() as tmp:
+        vectors = random_embeddings(50)
+        archive = EmbeddingArchive(tmp, dim=64, initial_capacity=8)
+        for i, vector in enumerate(vectors):
+            archive.append(vector, f"cam{i % 3}", 1000.0 + i, event_id=f"event-{i}")
+        archive.close()
+
+        reopened = EmbeddingArchive(tmp)
+        assert reopened.count == 50
+        assert reopened.dim == 64
+        np.testing.assert_allclose(reopened.embeddings, vectors, atol=1e-6)
+        assert reopened.get_metadata(7)['event_id'] == 'event-7'
+
+        rows = reopened.rows_in_range(1010.0, 1019.0, camera='cam0')
+        assert all(reopened.get_metadata(r)['camera'] == 'cam0' for r in rows)
+        assert len(rows) == 3
+        reopened.close()
+
+
+def test_reopen_after_interrupted_append():
+    """A metadata line cut short by a crash is dropped and its row reused"""
+    with tempfile.TemporaryDirectory() as tmp:
+        vectors = random_embeddings(12)
+        archive = EmbeddingArchive(tmp, dim=64)
+        for i, vector in enumerate(vectors[:10]):
+            archive.append(vector, f"cam{i % 2}", float(i))
+        archive.close()
+        with open(Path(tmp) / METADATA_FILE, 'a') as f:
+            f.write('{"row": 10, "camera": "ca')
+
+        reopened = EmbeddingArchive(tmp)
+        assert reopened.count == 10
+        assert reopened.append(vectors[11], 'cam9', 11.0) == 10
+        np.testing.assert_allclose(reopened.embeddings[10], vectors[11], atol=1e-6)
+        reopened.close()
+
+        again = EmbeddingArchive(tmp)
+        assert again.count == 11
+        assert again.rows_in_range(camera='cam9').tolist() == [10]
+        assert len(again.rows_in_range(camera='cam1')) == 5
+        assert len(again.rows_in_range(camera='unknown')) == 0
+        again.close()
+
+
+def test_exact_search_finds_query():
+    """Exact search ranks the query's own row first"""
+    with tempfile.TemporaryDirectory() as tmp:
+        vectors = random_embeddings(200)
+        archive = EmbeddingArchive(tmp, dim=64)
+        for i, vector in enumerate(vectors):
+            archive.append(vector, 'backyard', float(i))
+
+        results = archive.search_exact(vectors[42], k=5)
+        assert results[0][0] == 42
+        assert abs(results[0][1] - 1.0) < 1e-5
+        archive.close()
+
+
+def test_ivfpq_recall():
+    """IVF/PQ search with re-ranking recovers the true nearest neighbour"""
+    with tempfile.TemporaryDirectory() as tmp:
+        vectors = random_embeddings(3000, seed=1)
+        archive = EmbeddingArchive(tmp, dim=64)
+        for i, vector in enumerate(vectors):
+            archive.append(vector, 'garage', float(i))
+
+        search = EmbeddingSearch(archive, n_lists=16, n_subvectors=8)
+        assert search.rebuild()
+
+        # Slightly perturbed copies of archived vectors as queries
+        rng = np.random.default_rng(2)
+        queries = np.arange(0, 3000, 150)
+        hits = 0
+        for row in queries:
+            query = vectors[row] + rng.normal(scale=0.05, size=64).astype(np.float32)
+            results = search.search(query, k=5, n_probe=4)
+            hits += results and results[0]['row'] == row
+        assert hits / len(queries) >= 0.9
+
+        # A freshly loaded index gives the same answer
+        loaded = EmbeddingSearch(archive, n_lists=16, n_subvectors=8)
+        assert loaded.indexed_count == 3000
+        archive.close()
+
+
+def test_unindexed_tail_is_searched():
+    """Rows appended after the last rebuild are still found"""
+    with tempfile.TemporaryDirectory() as tmp:
+        vectors = random_embeddings(600, seed=3)
+        archive = EmbeddingArchive(tmp, dim=64)
+        for i, vector in enumerate(vectors[:500]):
+            archive.append(vector, 'side_yard', float(i))
+        search = EmbeddingSearch(archive, n_lists=8, n_subvectors=8)
+        search.rebuild()
+
+        for i, vector in enumerate(vectors[500:], start=500):
+            archive.append(vector, 'side_yard', float(i))
+
+        results = search.search(vectors[550], k=1)
+        assert results[0]['row'] == 550
+
+        # Time filters apply to both indexed and tail rows
+        results = search.search(vectors[10], k=3, start_time=100.0)
+        assert all(r['timestamp'] >= 100.0 for r in results)
+        archive.close()
+
+
+def test_background_rebuild_bounds_tail():
+    """A background rebuild starts once enough rows are unindexed"""
+    with tempfile.TemporaryDirectory() as tmp:
+        vectors = random_embeddings(700, seed=4)
+        archive = EmbeddingArchive(tmp, dim=64)
+        search = EmbeddingSearch(archive, n_lists=8, n_subvectors=8)
+        for i, vector in enumerate(vectors[:300]):
+            archive.append(vector, 'driveway', float(i))
+        assert not search.rebuild_in_background(min_unindexed=400)
+
+        for i, vector in enumerate(vectors[300:], start=300):
+            archive.append(vector, 'driveway', float(i))
+        assert search.rebuild_in_background(min_unindexed=400)
+        search._rebuild_thread.join(timeout=60)
+        assert search.indexed_count == 700 and search.unindexed_count == 0
+        assert search.search(vectors[650], k=1)[0]['row'] == 650
+        archive.close()
+
+
+def benchmark_search(n=200000, dim=512):
+    """Compare exact and IVF/PQ search latency on a large random archive"""
+    with tempfile.TemporaryDirectory() as tmp:
+        archive = EmbeddingArchive(tmp, dim=dim, initial_capacity=n)
+        vectors = random_embeddings(n, dim)
+        for i in range(n):
+            archive.append(vectors[i], 'backyard', float(i))
+        search = EmbeddingSearch(archive)
+        start = time.time()
+        search.rebuild()
+        print(f"Index build: {time.time() - start:.1f}s for {n} embeddings")
+
+        start = time.time()
+        archive.search_exact(vectors[0], k=20)
+        print(f"Exact search: {(time.time() - start) * 1000:.1f}ms")
+
+        start = time.time()
+        search.search(vectors[0], k=20)
+        print(f"IVF/PQ search: {(time.time() - start) * 1000:.1f}ms")
+        archive.close()
+
+
+if __name__ == '__main__':
+    test_archive_append_and_reopen()
+    test_reopen_after_interrupted_append()
+    test_exact_search_finds_query()
+    test_ivfpq_recall()
+    test_unindexed_tail_is_searched()
+    test_background_rebuild_bounds_tail()
+    print("All embedding archive tests passed")
+    benchmark_search()
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Test end-to-end detection tracing and latency aggregation
+"""
+
+import sys
+import json
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+import erik_tracing
+from erik_tracing import LatencyAggregator, new_trace, mark, stage_durations, frigate_event_time
+from app.services.mqtt_service import MQTTDetectionListener
+
+
+def test_stage_durations():
+    """Durations cover consecutive recorded stages and the total"""
+    trace = new_trace(frigate_time=100.0)
+    mark(trace, erik_tracing.TRACKER_RECEIVED, 100.05)
+    mark(trace, erik_tracing.SCORED, 100.25)
+    mark(trace, erik_tracing.PUBLISHED, 100.26)
+
+    durations = stage_durations(trace)
+    assert round(durations['frigate_detected->tracker_received']) == 50
+    assert round(durations['tracker_received->scored']) == 200
+    assert round(durations['total']) == 260
+
+
+def test_frigate_event_time():
+    """Detection time comes from the 'after' state of Frigate events"""
+    assert frigate_event_time({'type': 'new', 'after': {'frame_time': 123.5, 'start_time': 120.0}}) == 123.5
+    assert frigate_event_time({'start_time': 99.0}) == 99.0
+    assert frigate_event_time(3) is None
+
+
+def test_aggregator_percentiles_per_camera():
+    """Latency percentiles are tracked separately for each camera"""
+    aggregator = LatencyAggregator(window=100)
+    for i in range(100):
+        trace = new_trace(frigate_time=1000.0)
+        mark(trace, erik_tracing.PUBLISHED, 1000.0 + (i + 1) / 1000.0)
+        aggregator.record('backyard' if i % 2 else 'garage', trace)
+
+    summary = aggregator.summary()
+    assert set(summary) == {'backyard', 'garage'}
+    assert summary['garage']['total']['count'] == 50
+    assert summary['backyard']['total']['max_ms'] == 100.0
+    assert list(aggregator.summary('garage')) == ['garage']
+
+
+def test_listener_records_end_to_end_latency():
+    """The image manager closes traces when a detection becomes visible"""
+    listener = MQTTDetectionListener()
+    trace = new_trace(frigate_time=time.time() - 0.5)
+    mark(trace, erik_tracing.PUBLISHED, time.time() - 0.1)
+    payload = {'confidence': 0.9, 'detection_id': 'abc', 'trace': trace}
+    msg = SimpleNamespace(topic='yard/erik/detected/garage', payload=json.dumps(payload).encode())
+
+    listener._on_message(None, None, msg)
+
+    match = listener.get_matches()[0]
+    assert match['trace']['trace_id'] == trace['trace_id']
+    assert erik_tracing.POSITION_VISIBLE in match['trace']['stages']
+    total = listener.latency.summary()['garage']['total']
+    assert total['count'] == 1 and total['p50_ms'] >= 500
+
+
+if __name__ == '__main__':
+    test_stage_durations()
+    test_frigate_event_time()
+    test_aggregator_percentiles_per_camera()
+    test_listener_records_end_to_end_latency()
+    print("All tracing tests passed")
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Test the Numba CPU yard map backend against a per-pixel reference of the CUDA kernels
+"""
+
+import sys
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'yard_map'))
+import fast_yard_map_numba
+from yard_map.raster_engine import prepare_view
+from yard_map.raster_output import grid_georeference
+from app.services.yard_service import YardMappingService
+
+
+def reference_kernel(vertices, colors, width, height, algorithm):
+    """Direct transcription of the CUDA per-pixel logic (no cell caps, 1-99% view bounds)"""
+    xy, z = vertices[:, :2].astype(np.float64), vertices[:, 2].astype(np.float32)
+    x_min, x_max = np.percentile(xy[:, 0], [1, 99])
+    y_min, y_max = np.percentile(xy[:, 1], [1, 99])
+    if (x_max - x_min) / (y_max - y_min) > width / height:
+        pixel_size = (x_max - x_min) / width
+        y_max += (height * pixel_size - (y_max - y_min)) / 2
+    else:
+        pixel_size = (y_max - y_min) / height
+        x_min -= (width * pixel_size - (x_max - x_min)) / 2
+
+    image = np.zeros((height, width, 3), dtype=np.uint8)
+    for row in range(height):
+        for col in range(width):
+            box = [x_min + col * pixel_size, x_min + (col + 1) * pixel_size,
+                   y_max - (row + 1) * pixel_size, y_max - row * pixel_size]
+            for expansion in range(1, 6):
+                margin = pixel_size * expansion * (expansion - 1)
+                inside = np.flatnonzero((xy[:, 0] >= box[0] - margin) & (xy[:, 0] <= box[1] + margin) &
+                                        (xy[:, 1] >= box[2] - margin) & (xy[:, 1] <= box[3] + margin))
+                if len(inside):
+                    break
+            if not len(inside):
+                image[row, col] = 128 if algorithm == 'simple_average' else 50
+                continue
+            if algorithm == 'bottom_percentile':
+                heights = np.sort(z[inside])
+                inside = inside[z[inside] <= heights[max(1, int(len(inside) * 0.4)) - 1]]
+            average = colors[inside].astype(np.float64).mean(axis=0)
+            image[row, col] = np.where(average <= 1.0, average * 255, average).astype(int)
+    return image
+
+
+def sparse_cloud(n=3000, seed=0):
+    rng = np.random.default_rng(seed)
+    vertices = np.column_stack([rng.uniform(0, 16, n), rng.uniform(0, 9, n), rng.normal(0, 0.3, n)])
+    colors = rng.integers(0, 256, (n, 3)).astype(np.uint8)
+    return vertices, colors
+
+
+def test_numba_kernels_match_cuda_reference():
+    vertices, colors = sparse_cloud()
+    for algorithm in ('bottom_percentile', 'simple_average'):
+        image = fast_yard_map_numba.create_numba_raster_map(
+            vertices, colors, output_width=48, output_height=27, algorithm=algorithm)
+        expected = reference_kernel(vertices, colors, 48, 27, algorithm)
+        assert image.shape == (27, 48, 3)
+        assert np.array_equal(image, expected), algorithm
+
+
+def test_height_and_path_coloring_without_colors():
+    vertices, _ = sparse_cloud()
+    height = fast_yard_map_numba.create_numba_raster_map(vertices, None, coloring='height',
+                                                          output_width=32, output_height=18)
+    path = fast_yard_map_numba.create_numba_raster_map(vertices, None, coloring='path',
+                                                        output_width=32, output_height=18)
+    assert len(np.unique(height.reshape(-1, 3), axis=0)) > 10
+    assert set(map(tuple, np.unique(path.reshape(-1, 3), axis=0))) <= {(0, 255, 0), (255, 0, 0), (50, 50, 50)}
+
+
+def test_rotated_grid_keeps_rotation_center():
+    vertices, colors = sparse_cloud()
+    _, grid = fast_yard_map_numba.create_numba_raster_map(vertices, colors, output_width=48, output_height=27,
+                                                          rotation=25, return_grid=True)
+    expected = prepare_view(vertices, output_width=48, output_height=27, rotation=25)[3]
+    assert np.allclose(grid.center, expected.center)
+    assert np.allclose(grid_georeference(grid, rotation=25)['rotation_center'], expected.center)
+    _, unrotated = fast_yard_map_numba.create_numba_raster_map(vertices, colors, output_width=48, output_height=27,
+                                                               return_grid=True)
+    assert unrotated.center is None
+
+
+def test_service_falls_back_to_numba_without_cuda():
+    service = YardMappingService({'YARD_MAP_BACKEND': 'auto', 'YARD_MAP_CALIBRATION': '/nonexistent.json'})
+    service._cuda_available = False
+    backend = service.select_backend('bottom_percentile')
+    assert backend.name == 'numba' and backend.script == 'fast_yard_map_numba.py'
+
+    service = YardMappingService({'YARD_MAP_BACKEND': 'cuda'})
+    assert service.select_backend('bottom_percentile').name == 'cuda'
+
+
+if __name__ == "__main__":
+    test_numba_kernels_match_cuda_reference()
+    test_height_and_path_coloring_without_colors()
+    test_rotated_grid_keeps_rotation_center()
+    test_service_falls_back_to_numba_without_cuda()
+    print("✅ Numba backend tests passed")
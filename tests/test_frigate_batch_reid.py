@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Test reading Frigate events for batch re-identification and the result store
+"""
+
+import sys
+import json
+import sqlite3
+import tempfile
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from frigate_batch_reid import FrigateEventReader, BatchResultStore, crop_event
+
+
+def create_frigate_db(path, clips_dir, n_events=25):
+    """Create a minimal Frigate event table with snapshots"""
+    conn = sqlite3.connect(path)
+    conn.execute('CREATE TABLE "event" ("id" VARCHAR(30) NOT NULL PRIMARY KEY, "label" VARCHAR(20) NOT NULL, '
+                 '"camera" VARCHAR(20) NOT NULL, "start_time" DATETIME NOT NULL, "end_time" DATETIME, '
+                 '"top_score" REAL, "has_snapshot" INTEGER NOT NULL, "region" JSON, "box" JSON, "data" JSON NOT NULL)')
+    image = np.zeros((100, 200, 3), dtype=np.uint8)
+    for i in range(n_events):
+        camera = 'backyard' if i % 2 else 'garage'
+        event_id = f"{1000 + i}.0-abc{i}"
+        # Two events share a start time to exercise keyset pagination ties
+        start_time = 1000.0 + (i // 2)
+        conn.execute("INSERT INTO event VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", (
+            event_id, 'person', camera, start_time, start_time + 5, 0.8, 1, None, None,
+            json.dumps({'box': [0.25, 0.1, 0.5, 0.8]})
+        ))
+        cv2.imwrite(str(Path(clips_dir) / f"{camera}-{event_id}.jpg"), image)
+    conn.execute("INSERT INTO event VALUES ('car-1', 'car', 'garage', 1000.0, NULL, 0.9, 1, NULL, NULL, '{}')")
+    conn.commit()
+    conn.close()
+
+
+def test_reader_pages_through_all_events():
+    """Every person event is read once, in start_time order, across small pages"""
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = str(Path(tmp) / 'frigate.db')
+        create_frigate_db(db_path, tmp)
+        reader = FrigateEventReader(db_path, tmp)
+
+        events = list(reader.iter_events(page_size=4))
+        assert len(events) == 25
+        assert len({e['id'] for e in events}) == 25
+        assert [e['start_time'] for e in events] == sorted(e['start_time'] for e in events)
+        assert all(e['snapshot_path'] for e in events)
+
+        garage = list(reader.iter_events(start_time=1003.0, cameras=['garage']))
+        assert all(e['camera'] == 'garage' and e['start_time'] >= 1003.0 for e in garage)
+        assert reader.count_events() == 25
+
+
+def test_crop_event_uses_normalized_box():
+    """Normalized Frigate boxes are scaled to the snapshot size"""
+    image = np.zeros((100, 200, 3), dtype=np.uint8)
+    crop = crop_event(image, {'box_normalized': [0.25, 0.1, 0.5, 0.8]})
+    assert crop.shape[:2] == (80, 100)
+
+    crop = crop_event(image, {'box_normalized': None, 'box_pixels': [10, 20, 60, 90]})
+    assert crop.shape[:2] == (70, 50)
+
+
+def test_result_store_resume():
+    """Stored results are reported as processed so a backfill can resume"""
+    with tempfile.TemporaryDirectory() as tmp:
+        store = BatchResultStore(str(Path(tmp) / 'results.db'))
+        store.write_many([
+            {'event_id': 'a', 'camera': 'garage', 'start_time': 1.0, 'osnet_score': 0.6,
+             'combined_score': 0.5, 'is_erik': True, 'method': 'osnet_only', 'details': {'x': 1}},
+            {'event_id': 'b', 'camera': 'garage', 'start_time': 2.0, 'error': 'snapshot missing'},
+        ])
+        assert store.processed_ids() == {'a', 'b'}
+        store.close()
+
+
+if __name__ == '__main__':
+    test_reader_pages_through_all_events()
+    test_crop_event_uses_normalized_box()
+    test_result_store_resume()
+    print("All Frigate batch re-identification tests passed")
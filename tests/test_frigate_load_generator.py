@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+Test the stand-in Frigate event generator used for stress testing
+"""
+
+import sys
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from frigate_load_generator import SceneSimulator, load_person_sprites, find_capacity
+
+
+def test_track_lifecycle_events():
+    """Tracks produce one new, periodic updates and one end event"""
+    simulator = SceneSimulator(['backyard', 'garage'], load_person_sprites(None, 2),
+                               track_duration=2.0, update_interval=0.5)
+    new = simulator.spawn(100.0)
+    assert new['type'] == 'new' and new['after']['label'] == 'person'
+    event_id = new['after']['id']
+
+    messages = []
+    for t in np.arange(100.1, 104.0, 0.1):
+        messages.extend(simulator.advance(float(t)))
+
+    types = [m['type'] for m in messages if m['after']['id'] == event_id]
+    assert types[-1] == 'end' and types.count('end') == 1
+    assert 'update' in types
+    assert simulator.active_count() == 0
+
+
+def test_frames_contain_people_at_event_boxes():
+    """Rendered frames differ from the background inside the published box only"""
+    simulator = SceneSimulator(['backyard'], load_person_sprites(None, 1), frame_size=(320, 240))
+    new = simulator.spawn(50.0)
+    x1, y1, x2, y2 = new['after']['box']
+
+    frame = simulator.render('backyard', now=50.0)
+    diff = np.abs(frame.astype(int) - simulator.backgrounds['backyard'].astype(int)).sum(axis=2)
+    assert diff[y1:y2, x1:x2].sum() > 0
+    outside = diff.copy()
+    outside[y1:y2, x1:x2] = 0
+    assert outside.sum() == 0
+
+
+def test_find_capacity():
+    """Capacity is the last rate before latency or delivery breaks"""
+    steps = [
+        {'rate': 1.0, 'tracker_latency': {'p90_ms': 200}, 'delivery_ratio': 1.0},
+        {'rate': 2.0, 'tracker_latency': {'p90_ms': 400}, 'delivery_ratio': 0.99},
+        {'rate': 4.0, 'tracker_latency': {'p90_ms': 900}, 'delivery_ratio': 0.7},
+        {'rate': 8.0, 'tracker_latency': {'p90_ms': 5000}, 'delivery_ratio': 0.3},
+    ]
+    assert find_capacity(steps, slo_ms=1000) == 2.0
+    assert find_capacity(steps, slo_ms=100) is None
+
+
+if __name__ == '__main__':
+    test_track_lifecycle_events()
+    test_frames_contain_people_at_event_boxes()
+    test_find_capacity()
+    print("All load generator tests passed")
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Test batched empty-pixel filling: nearest occupied cells and batched ball searches
+"""
+
+import sys
+from pathlib import Path
+
+import numpy as np
+from scipy.spatial import cKDTree
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(ROOT / 'yard_map'))
+from yard_map import raster_engine
+from yard_map.raster_engine import nearest_occupied
+import fast_yard_map_optimized
+import fast_yard_map_raster
+import fast_yard_map_ultra
+
+
+def yard_with_hole(n=40000, seed=6):
+    """Colored yard cloud with an empty 4 x 6 m patch"""
+    rng = np.random.default_rng(seed)
+    vertices = np.column_stack([rng.uniform(0, 32, n), rng.uniform(0, 18, n), rng.normal(0, 0.05, n)])
+    vertices[rng.random(n) < 0.3, 2] += 2.0
+    keep = ~((vertices[:, 0] > 10) & (vertices[:, 0] < 14) & (vertices[:, 1] > 3) & (vertices[:, 1] < 9))
+    return vertices[keep], rng.integers(0, 256, (n, 3)).astype(np.uint8)[keep]
+
+
+def test_nearest_occupied_matches_brute_force():
+    occupied = np.random.default_rng(0).random((30, 50)) < 0.05
+    rows, cols = np.divmod(np.arange(occupied.size), 50)
+    cells = np.flatnonzero(occupied)
+    brute = np.hypot(rows[:, None] - rows[cells], cols[:, None] - cols[cells]).min(axis=1)
+
+    nearest = nearest_occupied(occupied)
+    assert occupied.ravel()[nearest].all() and np.allclose(np.hypot(rows - rows[nearest], cols - cols[nearest]), brute)
+    raster_engine.SCIPY_AVAILABLE = False
+    try:
+        nearest = nearest_occupied(occupied)
+    finally:
+        raster_engine.SCIPY_AVAILABLE = True
+    assert np.allclose(np.hypot(rows - rows[nearest], cols - cols[nearest]), brute)
+    assert (nearest_occupied(np.zeros((3, 4), dtype=bool)) == -1).all()
+
+
+def test_batched_ball_search_matches_per_pixel_search():
+    vertices, colors = yard_with_hole()
+    image = fast_yard_map_optimized.create_optimized_raster_map(vertices, colors)
+    assert image.shape == (360, 640, 3)
+
+    # Per-pixel expanding ball search on a sample of pixels, including the hole
+    tree = cKDTree(vertices[:, :2])
+    pixel_width, pixel_height = np.ptp(vertices[:, 0]) / 640, np.ptp(vertices[:, 1]) / 360
+    rng = np.random.default_rng(1)
+    for row, col in [*zip(rng.integers(0, 360, 150), rng.integers(0, 640, 150)), (150, 240), (120, 220)]:
+        center = (vertices[:, 0].min() + (col + 0.5) * pixel_width, vertices[:, 1].max() - (row + 0.5) * pixel_height)
+        radius = max(pixel_width, pixel_height) * 2
+        for _ in range(5):
+            found = tree.query_ball_point(center, radius)
+            if found:
+                break
+            radius *= 2
+        if not found:
+            assert tuple(image[row, col]) == (50, 50, 50)
+            continue
+        ground = np.array(found)[np.argsort(vertices[found, 2])[:max(1, len(found) // 4)]] if len(found) > 4 else found
+        assert tuple(image[row, col]) == tuple(colors[ground].mean(axis=0).astype(np.uint8))
+
+
+def test_raster_and_ultra_fill_every_pixel():
+    vertices, colors = yard_with_hole()
+    raster = fast_yard_map_raster.create_raster_map(vertices, colors)
+    x0, y1 = vertices[:, 0].min(), vertices[:, 1].max()
+    pixel_width, pixel_height = np.ptp(vertices[:, 0]) / 640, np.ptp(vertices[:, 1]) / 360
+    # Only the middle of the hole is beyond the 10 pixel (0.5 m) cube expansion
+    rows, cols = np.nonzero((raster == 50).all(axis=2))
+    assert raster.shape == (360, 640, 3) and len(rows) > 0
+    assert (np.abs(x0 + (cols + 0.5) * pixel_width - 12) < 1.6).all()
+    assert (np.abs(y1 - (rows + 0.5) * pixel_height - 6) < 2.6).all()
+
+    # A populated pixel averages the points within grid_resolution of its lowest point
+    cells = (np.floor((y1 - vertices[:, 1]) / pixel_height) * 640 + np.floor((vertices[:, 0] - x0) / pixel_width))
+    row, col = divmod(int(np.bincount(cells.astype(np.int64)).argmax()), 640)
+    inside = cells == row * 640 + col
+    depths = vertices[inside, 2]
+    cluster = inside.nonzero()[0][depths <= depths.min() + 0.1]
+    assert np.abs(raster[row, col].astype(int) - colors[cluster].mean(axis=0).astype(int)).max() <= 1
+
+    ultra = fast_yard_map_ultra.create_ultra_fast_raster_map(vertices, colors)
+    assert ultra.shape == (360, 640, 3) and ultra.any(axis=2).all()
+
+
+if __name__ == "__main__":
+    test_nearest_occupied_matches_brute_force()
+    test_batched_ball_search_matches_per_pixel_search()
+    test_raster_and_ultra_fill_every_pixel()
+    print("✅ Gap fill tests passed")
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Test the ground elevation raster exported with a yard map render and its use for pixel mapping
+"""
+
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from yard_map.raster_engine import rasterize, prepare_view
+from yard_map.raster_output import (ground_rasters, save_ground_rasters, load_ground_rasters,
+                                    grid_georeference)
+from app.services.yard_service import YardMappingService
+from app.services.pixel_mapping_service import PixelMappingService
+from app.utils.progress_tracker import ProgressTracker
+
+
+def write_yard_ply(path, n=20000, seed=5):
+    rng = np.random.default_rng(seed)
+    records = np.empty(n, dtype=[('x', '<f4'), ('y', '<f4'), ('z', '<f4'),
+                                 ('red', 'u1'), ('green', 'u1'), ('blue', 'u1')])
+    records['x'], records['y'] = rng.uniform(0, 32, n), rng.uniform(0, 18, n)
+    records['z'] = np.where(rng.random(n) < 0.3, rng.uniform(0.5, 2.0, n), rng.normal(0, 0.02, n))
+    for channel in ('red', 'green', 'blue'):
+        records[channel] = rng.integers(0, 256, n)
+    with open(path, 'wb') as f:
+        f.write((f"ply\nformat binary_little_endian 1.0\nelement vertex {n}\n"
+                 "property float x\nproperty float y\nproperty float z\n"
+                 "property uchar red\nproperty uchar green\nproperty uchar blue\nend_header\n").encode('ascii'))
+        records.tofile(f)
+    vertices = np.column_stack([records[a] for a in 'xyz'])
+    colors = np.column_stack([records[c] for c in ('red', 'green', 'blue')])
+    return vertices, colors
+
+
+def test_rasters_match_cell_ground(tmp_path):
+    vertices, colors = write_yard_ply(tmp_path / 'yard.ply')
+    _, grid, stats = rasterize(vertices, colors, output_width=64, output_height=36, rotation=20, return_stats=True)
+    rasters = ground_rasters(stats, grid)
+
+    x, y, depth, _ = prepare_view(vertices, output_width=64, output_height=36, rotation=20)
+    cells = grid.cell_of(x, y)
+    counts = np.bincount(cells[cells >= 0], minlength=grid.n_cells).reshape(36, 64)
+    measured = counts > 0
+    assert np.array_equal(rasters['count'], np.where(measured, counts, 0))
+    assert np.all(rasters['fill_radius'][measured] == 0)
+    assert np.all(rasters['fill_radius'][~measured] != 0)
+
+    # Measured cells: mean of the bottom 40 percent of the cell's heights (bottom_percentile)
+    for cell in np.flatnonzero(measured.ravel())[::97]:
+        heights = np.sort(depth[cells == cell].astype(np.float32))
+        ground = heights[heights <= heights[max(1, int(len(heights) * 0.4)) - 1]]
+        assert np.isclose(rasters['elevation'].ravel()[cell], ground.mean(), atol=1e-5)
+
+    path = tmp_path / 'yard_ground.npz'
+    save_ground_rasters(stats, grid, path, grid_georeference(grid, rotation=20))
+    loaded = load_ground_rasters(path)
+    assert loaded['elevation'].dtype == np.float32 and loaded['count'].dtype == np.uint32
+    assert np.array_equal(loaded['elevation'], rasters['elevation'], equal_nan=True)
+    assert loaded['georef']['rotation_center'] == list(grid.center) and loaded['georef']['width'] == 64
+
+
+def test_job_export_feeds_pixel_mapping(tmp_path):
+    mesh_folder = tmp_path / 'meshes'
+    mesh_folder.mkdir()
+    vertices, _ = write_yard_ply(mesh_folder / 'yard.ply')
+    service = YardMappingService({
+        'MESH_FOLDER': str(mesh_folder), 'POINT_CACHE_DIR': str(tmp_path / 'cache'),
+        'YARD_MAP_GROUND_FOLDER': str(tmp_path / 'ground'), 'YARD_MAP_BACKEND': 'numba',
+        'ACTIVE_YARD_MAP_PATH': str(tmp_path / 'active.png'), 'ACTIVE_YARD_MAP_JSON': str(tmp_path / 'active.json')
+    })
+    service.job_runner.tracker = ProgressTracker()
+
+    try:
+        job_id = service.submit_yard_map_job(str(mesh_folder / 'yard.ply'), output_width=160, output_height=90,
+                                             rotation=30, export_ground=True)
+        deadline = time.time() + 120
+        while service.job_runner.status(job_id)['status'] not in ('completed', 'failed'):
+            assert time.time() < deadline
+            time.sleep(0.05)
+        result = service.job_runner.status(job_id)['metadata']['result']
+        assert Path(result['ground_raster']).parent == tmp_path / 'ground'
+
+        image_data, _ = service.job_runner.result(job_id)
+        assert service.save_active_map(image_data, {'ground_raster': result['ground_raster']})
+        assert service.get_active_map_info()['ground_raster'] == service.active_ground_raster_path()
+    finally:
+        service.job_runner.shutdown()
+
+    pixel_service = PixelMappingService()
+    ground_heights = pixel_service.load_ground_raster(service.active_ground_raster_path())
+    rasters = load_ground_rasters(service.active_ground_raster_path())
+    assert len(ground_heights) == int(np.count_nonzero(rasters['count'] > 0))
+
+    # World points land on the pixel the engine binned them into
+    _, grid, _ = rasterize(vertices, None, output_width=160, output_height=90, rotation=30, return_stats=True)
+    x, y, _, _ = prepare_view(vertices, output_width=160, output_height=90, rotation=30)
+    cells = grid.cell_of(x, y)
+    agree = 0
+    for point, cell in zip(vertices[::50], cells[::50]):
+        if cell < 0:
+            continue
+        pixel = pixel_service.world_to_yard_map_pixel(point)
+        agree += (int(pixel['y']), int(pixel['x'])) == divmod(int(cell), grid.width)
+    assert agree >= 0.99 * np.count_nonzero(cells[::50] >= 0)
+
+    row, col = divmod(int(np.flatnonzero(rasters['count'].ravel())[0]), grid.width)
+    assert np.isclose(ground_heights[(col, row)], rasters['elevation'][row, col])
+
+
+if __name__ == "__main__":
+    import tempfile
+    for test in (test_rasters_match_cell_ground, test_job_export_feeds_pixel_mapping):
+        with tempfile.TemporaryDirectory() as tmp:
+            test(Path(tmp))
+    print("✅ Ground raster tests passed")
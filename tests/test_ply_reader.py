@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Test the shared memory-mapped PLY reader and the consumers built on it
+"""
+
+import sys
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'yard_map'))
+from yard_map.ply_reader import PlyPointCloud, read_header, read_faces, iter_vertex_chunks
+from app.services.pixel_mapping_service import PixelMappingService
+from app.api.manual_orient_interface import load_point_cloud_sample
+import mesh_to_yard_map
+
+# Poisson reconstruction layout: position, normal and color (27 bytes per vertex)
+VERTEX_DTYPE = [('x', '<f4'), ('y', '<f4'), ('z', '<f4'), ('nx', '<f4'), ('ny', '<f4'), ('nz', '<f4'),
+                ('red', 'u1'), ('green', 'u1'), ('blue', 'u1')]
+
+
+def mesh(n=1000, seed=0):
+    rng = np.random.default_rng(seed)
+    records = np.zeros(n, dtype=VERTEX_DTYPE)
+    for axis in ('x', 'y', 'z', 'nx', 'ny', 'nz'):
+        records[axis] = rng.normal(0, 5, n)
+    for channel in ('red', 'green', 'blue'):
+        records[channel] = rng.integers(0, 256, n)
+    faces = rng.integers(0, n, (n // 2, 3))
+    return records, faces
+
+
+def write_ply(path, records, faces, format='binary_little_endian'):
+    properties = ''.join(f"property {'float' if t == '<f4' else 'uchar'} {name}\n" for name, t in VERTEX_DTYPE)
+    header = (f"ply\nformat {format} 1.0\nelement vertex {len(records)}\n{properties}"
+              f"element face {len(faces)}\nproperty list uchar int vertex_indices\nend_header\n")
+    with open(path, 'wb') as f:
+        f.write(header.encode('ascii'))
+        if format == 'ascii':
+            np.savetxt(f, records, fmt=' '.join(['%.9g'] * 6 + ['%d'] * 3))
+            np.savetxt(f, np.column_stack([np.full(len(faces), 3), faces]), fmt='%d')
+        else:
+            records.tofile(f)
+            face_records = np.empty(len(faces), dtype=[('n', 'u1'), ('indices', '<i4', (3,))])
+            face_records['n'], face_records['indices'] = 3, faces
+            face_records.tofile(f)
+
+
+def test_float_colors_scale_once_per_file(tmp_path):
+    # 0-1 float colors; one later chunk overshoots 1.0 but must not switch to 0-255
+    n = 70000
+    records = np.zeros(n, dtype=[('x', '<f4'), ('y', '<f4'), ('z', '<f4'),
+                                 ('red', '<f4'), ('green', '<f4'), ('blue', '<f4')])
+    for channel in ('red', 'green', 'blue'):
+        records[channel] = np.linspace(0, 1, n)
+    records['red'][68000:68100] = 0.5
+    records['red'][68050] = 1.2
+    path = tmp_path / 'float_colors.ply'
+    properties = ''.join(f"property float {name}\n" for name in records.dtype.names)
+    with open(path, 'wb') as f:
+        f.write(f"ply\nformat binary_little_endian 1.0\nelement vertex {n}\n{properties}end_header\n".encode('ascii'))
+        records.tofile(f)
+
+    chunks = np.concatenate([rgb for _, rgb in iter_vertex_chunks(path, chunk_size=1000)])
+    assert chunks[68000, 0] == 127 and chunks[68050, 0] == 255
+    cloud = PlyPointCloud(path)
+    assert np.array_equal(cloud.colors(), chunks)
+    assert np.array_equal(cloud.colors(cloud.records[68000:68100]), chunks[68000:68100])
+
+
+def test_binary_vertices_are_memory_mapped(tmp_path):
+    records, faces = mesh()
+    path = tmp_path / 'mesh.ply'
+    write_ply(path, records, faces)
+
+    cloud = PlyPointCloud(path)
+    assert isinstance(cloud.records, np.memmap) and len(cloud) == 1000
+    assert cloud.header.vertex_dtype.itemsize == 27
+
+    sample = cloud.strided(300)
+    assert len(sample) <= 300 and np.shares_memory(sample, cloud.records)
+    assert np.shares_memory(cloud.column('z'), cloud.records)
+    assert np.array_equal(cloud.xyz(sample), np.column_stack([records[a] for a in 'xyz'])[::4])
+    assert np.array_equal(cloud.colors(), np.column_stack([records[c] for c in ('red', 'green', 'blue')]))
+    assert np.array_equal(read_faces(path), faces)
+
+
+def test_ascii_matches_binary(tmp_path):
+    records, faces = mesh(n=200)
+    write_ply(tmp_path / 'b.ply', records, faces)
+    write_ply(tmp_path / 'a.ply', records, faces, format='ascii')
+
+    binary, ascii = PlyPointCloud(tmp_path / 'b.ply'), PlyPointCloud(tmp_path / 'a.ply')
+    assert not read_header(tmp_path / 'a.ply').binary
+    assert np.array_equal(ascii.xyz(), binary.xyz())
+    assert np.array_equal(ascii.colors(), binary.colors())
+    assert np.array_equal(read_faces(tmp_path / 'a.ply'), faces)
+
+
+def test_consumers_use_shared_reader(tmp_path, monkeypatch):
+    monkeypatch.setenv('POINT_CACHE_DIR', str(tmp_path / 'cache'))
+    records, faces = mesh(n=5000)
+    path = tmp_path / 'mesh.ply'
+    write_ply(path, records, faces)
+    xyz = np.column_stack([records[a] for a in 'xyz'])
+
+    points = PixelMappingService().load_point_cloud(str(path), max_points=1000)
+    assert points.shape == (1000, 3) and np.allclose(points, xyz[::5])
+
+    sample = load_point_cloud_sample(str(path), max_points=2500)
+    assert len(sample) == 2500
+    assert np.allclose(sample[1], [-xyz[2, 0], -xyz[2, 1], xyz[2, 2],
+                                   records['red'][2], records['green'][2], records['blue'][2]])
+
+    vertices, mesh_faces = mesh_to_yard_map.load_ply_basic(str(path))
+    assert np.allclose(vertices, xyz) and np.array_equal(mesh_faces, faces)
+
+
+if __name__ == "__main__":
+    import tempfile
+    with tempfile.TemporaryDirectory() as tmp:
+        test_float_colors_scale_once_per_file(Path(tmp))
+        test_binary_vertices_are_memory_mapped(Path(tmp))
+        test_ascii_matches_binary(Path(tmp))
+        import pytest
+        with pytest.MonkeyPatch.context() as monkeypatch:
+            test_consumers_use_shared_reader(Path(tmp), monkeypatch)
+    print("✅ PLY reader tests passed")
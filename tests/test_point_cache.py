@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Test the columnar point-cloud cache: conversion, memory-mapped reloads and LRU eviction
+"""
+
+import os
+import sys
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from yard_map.point_cache import PointCache, fingerprint
+from app.services.yard_service import YardMappingService
+
+
+def write_ply(path, n=4000, seed=0):
+    rng = np.random.default_rng(seed)
+    records = np.empty(n, dtype=[('x', '<f4'), ('y', '<f4'), ('z', '<f4'),
+                                 ('red', 'u1'), ('green', 'u1'), ('blue', 'u1')])
+    for axis, scale in zip('xyz', (30, 20, 2)):
+        records[axis] = rng.normal(0, scale, n)
+    for channel in ('red', 'green', 'blue'):
+        records[channel] = rng.integers(0, 256, n)
+    header = (f"ply\nformat binary_little_endian 1.0\nelement vertex {n}\n"
+              "property float x\nproperty float y\nproperty float z\n"
+              "property uchar red\nproperty uchar green\nproperty uchar blue\nend_header\n")
+    with open(path, 'wb') as f:
+        f.write(header.encode('ascii'))
+        records.tofile(f)
+    return records
+
+
+def test_first_load_converts_and_later_loads_are_memory_mapped(tmp_path):
+    records = write_ply(tmp_path / 'yard.ply')
+    cache = PointCache(tmp_path / 'cache')
+    assert not cache.contains(str(tmp_path / 'yard.ply'))
+
+    cached = cache.load(str(tmp_path / 'yard.ply'), chunk_size=1500)
+    xyz = np.column_stack([records[a] for a in 'xyz'])
+    assert np.array_equal(cached.xyz, xyz)
+    assert np.array_equal(cached.rgb, np.column_stack([records[c] for c in ('red', 'green', 'blue')]))
+    assert np.allclose(cached.percentiles('x', (2, 98)), np.percentile(xyz[:, 0], [2, 98]))
+    assert cached.bounds['z'] == (float(xyz[:, 2].min()), float(xyz[:, 2].max()))
+
+    reloaded = cache.load(str(tmp_path / 'yard.ply'))
+    assert isinstance(reloaded.xyz, np.memmap) and len(reloaded) == 4000
+    assert len(cache.entries()) == 1
+
+
+def test_modified_source_gets_a_new_entry(tmp_path):
+    path = tmp_path / 'yard.ply'
+    write_ply(path)
+    key = fingerprint(path)
+    write_ply(path, n=3000, seed=1)
+    os.utime(path, ns=(0, os.stat(path).st_mtime_ns + 1000))
+    assert fingerprint(path) != key
+
+    cache = PointCache(tmp_path / 'cache')
+    assert len(cache.load(str(path))) == 3000
+
+
+def test_lru_eviction_keeps_recently_used_entries(tmp_path):
+    paths = [tmp_path / f'yard_{i}.ply' for i in range(3)]
+    for i, path in enumerate(paths):
+        write_ply(path, seed=i)
+    entry_bytes = 4000 * 15 + 2 * 128 + 2000  # xyz + rgb + npy headers + meta.json (approx.)
+    cache = PointCache(tmp_path / 'cache', max_bytes=int(2.5 * entry_bytes))
+
+    cache.load(str(paths[0]))
+    cache.load(str(paths[1]))
+    meta_0 = os.path.join(cache.entry_dir(fingerprint(paths[0])), 'meta.json')
+    os.utime(meta_0, (0, 1))  # Pretend entry 0 was used long ago
+    cache.load(str(paths[1]))
+    cache.load(str(paths[2]))
+
+    assert not cache.contains(str(paths[0]))
+    assert cache.contains(str(paths[1])) and cache.contains(str(paths[2]))
+
+
+def test_scan_bounds_reads_cached_percentiles(tmp_path):
+    records = write_ply(tmp_path / 'yard.ply')
+    service = YardMappingService({'POINT_CACHE_DIR': str(tmp_path / 'cache')})
+    bounds = service.scan_bounds(str(tmp_path / 'yard.ply'), projection='xz')
+
+    assert bounds['axis2_label'] == 'Z' and bounds['total_points'] == 4000
+    assert np.isclose(bounds['axis1_min'], np.percentile(records['x'], 2))
+    assert np.isclose(bounds['axis2_max'], np.percentile(records['z'], 98))
+    # Small clouds fit the scan sample whole, without being converted
+    assert bounds['percentile_error'] == 0.0 and not service.point_cache().contains(str(tmp_path / 'yard.ply'))
+
+
+if __name__ == "__main__":
+    import tempfile
+    for test in (test_first_load_converts_and_later_loads_are_memory_mapped, test_modified_source_gets_a_new_entry,
+                 test_lru_eviction_keeps_recently_used_entries, test_scan_bounds_reads_cached_percentiles):
+        with tempfile.TemporaryDirectory() as tmp:
+            test(Path(tmp))
+    print("✅ Point cache tests passed")
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Test the vectorized yard map raster engine against a per-pixel reference
+"""
+
+import sys
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from yard_map.raster_engine import (
+    RasterGrid, CellIndex, select_ground, reduce_cells, expand_empty_cells, rasterize, two_means_split
+)
+
+
+def synthetic_yard(n=60000, seed=0):
+    """Sloped ground with a 'tree canopy' patch floating above part of it"""
+    rng = np.random.default_rng(seed)
+    x = rng.uniform(0, 16, n)
+    y = rng.uniform(0, 9, n)
+    z = 0.05 * x + rng.normal(0, 0.02, n)
+    canopy = (x > 4) & (x < 8) & (rng.random(n) < 0.5)
+    z[canopy] += rng.uniform(2, 4, canopy.sum())
+    colors = np.where(canopy[:, None], [30, 120, 30], [120, 100, 60]).astype(np.uint8)
+    return np.column_stack([x, y, z]).astype(np.float32), colors
+
+
+def reference_cells(vertices, grid, algorithm, height_window=0.5, percentile=0.4):
+    """Per-pixel loop: (count, selected, mean color sum) for every cell"""
+    x, y, z = vertices[:, 0], vertices[:, 1], vertices[:, 2]
+    cell = grid.cell_of(x, y)
+    count = np.zeros(grid.n_cells, dtype=np.int64)
+    selected = np.zeros(grid.n_cells, dtype=np.int64)
+    depth_max = np.full(grid.n_cells, np.nan)
+    for c in np.unique(cell[cell >= 0]):
+        heights = np.sort(z[cell == c])
+        if algorithm == 'simple_average':
+            ground = heights
+        elif algorithm == 'bottom_percentile':
+            ground = heights[heights <= heights[max(1, int(len(heights) * percentile)) - 1]]
+        else:
+            ground = heights[heights <= heights[0] + height_window]
+        count[c], selected[c], depth_max[c] = len(heights), len(ground), ground.max()
+    return count, selected, depth_max
+
+
+def test_cell_selection_matches_per_pixel_loop():
+    vertices, colors = synthetic_yard()
+    grid = RasterGrid.fit(0, 16, 0, 9, 64, 36)
+    index = CellIndex.build(vertices[:, 0], vertices[:, 1], vertices[:, 2], grid)
+
+    for algorithm in ('simple_average', 'bottom_percentile', 'height_window'):
+        selected = select_ground(index, algorithm, height_window=0.5)
+        stats = reduce_cells(index, colors, selected)
+        count, expected, depth_max = reference_cells(vertices, grid, algorithm)
+        assert np.array_equal(stats['count'], count)
+        assert np.array_equal(stats['selected'], expected), algorithm
+        assert np.allclose(stats['depth_max'], depth_max, equal_nan=True)
+
+
+def test_ground_selection_rejects_canopy():
+    vertices, colors = synthetic_yard()
+    image = rasterize(vertices, colors, custom_bounds=(0, 16, 0, 9), output_width=64, output_height=36,
+                      algorithm='height_window', height_window=0.5)
+    assert image.shape == (36, 64, 3)
+    # Under the canopy the ground color (brown) wins, not the foliage (green)
+    assert np.all(image[:, 20:28, 0] == 120) and np.all(image[:, 20:28, 1] == 100)
+
+
+def test_empty_pixels_fill_from_neighbours():
+    vertices, colors = synthetic_yard()
+    keep = ~((vertices[:, 0] > 10) & (vertices[:, 0] < 10.5) & (vertices[:, 1] > 4) & (vertices[:, 1] < 4.5))
+    grid = RasterGrid.fit(0, 16, 0, 9, 64, 36)
+    index = CellIndex.build(vertices[keep, 0], vertices[keep, 1], vertices[keep, 2], grid)
+    stats = reduce_cells(index, colors[keep], select_ground(index, 'bottom_percentile'))
+    assert (stats['count'] == 0).any()
+
+    filled = expand_empty_cells(stats, grid, radii=(2,))
+    assert (filled['count'] > 0).all()
+    cx, cy = grid.cell_centers(np.arange(grid.n_cells))
+    hole = np.flatnonzero((cx > 10) & (cx < 10.5) & (cy > 4) & (cy < 4.5))
+    assert (stats['count'][hole] == 0).all()
+    assert np.allclose(filled['color_sum'][hole] / filled['selected'][hole, None], [120, 100, 60])
+
+
+def sse(heights, lower):
+    low, high = heights[:lower], heights[lower:]
+    return ((low - low.mean()) ** 2).sum() + (((high - high.mean()) ** 2).sum() if len(high) else 0.0)
+
+
+def test_two_means_split_is_optimal_and_matches_sklearn():
+    from sklearn.cluster import KMeans
+    vertices, _ = synthetic_yard(n=8000)
+    grid = RasterGrid.fit(0, 16, 0, 9, 16, 9)
+    index = CellIndex.build(vertices[:, 0], vertices[:, 1], vertices[:, 2], grid)
+    split = two_means_split(index)
+
+    matches = 0
+    for cell in range(grid.n_cells):
+        heights = index.depth[index.offsets[cell]:index.offsets[cell + 1]].astype(np.float64)
+        # Exhaustive search over splits between distinct heights
+        candidates = [t for t in range(1, len(heights)) if heights[t] > heights[t - 1]]
+        assert np.isclose(sse(heights, split[cell]), min(sse(heights, t) for t in candidates))
+
+        kmeans = KMeans(n_clusters=2, random_state=42, n_init=10)
+        labels = kmeans.fit_predict(heights.reshape(-1, 1))
+        lower = np.count_nonzero(labels == np.argmin(kmeans.cluster_centers_.flatten()))
+        matches += lower == split[cell]
+        assert sse(heights, split[cell]) <= sse(heights, lower) + 1e-9
+    assert matches >= 0.9 * grid.n_cells
+
+
+def test_two_means_split_keeps_flat_cells_whole():
+    grid = RasterGrid.fit(0, 2, 0, 1, 2, 1)
+    x = np.array([0.5, 0.5, 0.5, 1.5, 1.5, 1.5])
+    z = np.array([1.0, 1.0, 1.0, 0.0, 0.0, 3.0], dtype=np.float32)
+    index = CellIndex.build(x, np.full(6, 0.5), z, grid)
+    assert list(two_means_split(index)) == [3, 2]
+    # Within the height window the whole cell is ground
+    assert list(select_ground(index, 'kmeans', height_window=5.0)) == [3, 3]
+
+
+if __name__ == "__main__":
+    test_cell_selection_matches_per_pixel_loop()
+    test_ground_selection_rejects_canopy()
+    test_empty_pixels_fill_from_neighbours()
+    test_two_means_split_is_optimal_and_matches_sklearn()
+    test_two_means_split_keeps_flat_cells_whole()
+    print("✅ Raster engine tests passed")
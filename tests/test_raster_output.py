@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Test direct raster encoding, georeference sidecars and the matplotlib-free raster generators
+"""
+
+import io
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(ROOT / 'yard_map'))
+from yard_map.raster_output import encode_image, save_raster, georeference, sidecar_path
+from yard_map.raster_engine import prepare_view
+import fast_yard_map
+
+
+def test_encoding_is_lossless(tmp_path):
+    image = np.random.default_rng(0).integers(0, 256, (36, 64, 3)).astype(np.uint8)
+    for compression in (0, 1, 9):
+        assert np.array_equal(np.asarray(Image.open(io.BytesIO(encode_image(image, 'png', compression)))), image)
+    webp = Image.open(io.BytesIO(encode_image(image, 'webp')))
+    assert webp.format == 'WEBP' and np.array_equal(np.asarray(webp.convert('RGB')), image)
+
+    georef = georeference((0, 64, 10, 46), 64, 36, rotation=15, algorithm='kmeans')
+    save_raster(image, tmp_path / 'map.webp', georef=georef)
+    assert Image.open(tmp_path / 'map.webp').format == 'WEBP'
+    with open(sidecar_path(tmp_path / 'map.webp')) as f:
+        assert json.load(f) == {**georef, 'pixel_size_x': 1.0, 'pixel_size_y': 1.0}
+
+
+def test_raster_generators_skip_matplotlib(tmp_path):
+    imported = subprocess.run(
+        [sys.executable, '-c', "import sys; import fast_yard_map, fast_yard_map_raster, fast_yard_map_numba; "
+                               "print('matplotlib' in sys.modules)"],
+        cwd=ROOT / 'yard_map', capture_output=True, text=True, check=True
+    )
+    assert imported.stdout.strip().splitlines()[-1] == 'False'
+
+    rng = np.random.default_rng(1)
+    vertices = np.column_stack([rng.uniform(0, 20, 5000), rng.uniform(0, 10, 5000), rng.normal(0, 0.05, 5000)])
+    colors = rng.integers(0, 256, (5000, 3)).astype(np.uint8)
+    image = fast_yard_map.create_yard_map(vertices, colors, algorithm='simple_average',
+                                          custom_bounds=[0, 20, 0, 10], output_width=80, output_height=40)
+    assert image.dtype == np.uint8 and image.shape == (40, 80, 3)
+    # Row 0 is the max-y edge, as in the other generators
+    corner = fast_yard_map.create_raster_image(np.array([0.0]), np.array([10.0]), np.array([[1, 2, 3]]),
+                                               0, 20, 0, 10, 80, 40)
+    assert tuple(corner[0, 0]) == (1, 2, 3) and (corner[1:] == 255).all()
+
+
+def test_numba_cli_writes_georeference(tmp_path):
+    rng = np.random.default_rng(2)
+    records = np.empty(4000, dtype=[('x', '<f4'), ('y', '<f4'), ('z', '<f4'),
+                                    ('red', 'u1'), ('green', 'u1'), ('blue', 'u1')])
+    records['x'], records['y'], records['z'] = rng.uniform(0, 16, 4000), rng.uniform(0, 9, 4000), 0
+    with open(tmp_path / 'yard.ply', 'wb') as f:
+        f.write(("ply\nformat binary_little_endian 1.0\nelement vertex 4000\n"
+                 "property float x\nproperty float y\nproperty float z\n"
+                 "property uchar red\nproperty uchar green\nproperty uchar blue\nend_header\n").encode('ascii'))
+        records.tofile(f)
+
+    output = tmp_path / 'yard.png'
+    subprocess.run([sys.executable, str(ROOT / 'yard_map' / 'fast_yard_map_numba.py'), str(tmp_path / 'yard.ply'),
+                    '--output', str(output), '--output-width', '64', '--output-height', '36', '--rotation', '20',
+                    '--compression', '6'],
+                   capture_output=True, text=True, check=True, env={'POINT_CACHE_DIR': str(tmp_path / 'cache'),
+                                                                    'PATH': '/usr/bin:/bin'})
+    with open(tmp_path / 'yard.json') as f:
+        georef = json.load(f)
+    vertices = np.column_stack([records[a] for a in 'xyz'])
+    grid = prepare_view(vertices, output_width=64, output_height=36, rotation=20)[3]
+    assert np.allclose([georef[k] for k in ('x_min', 'x_max', 'y_min', 'y_max')], grid.bounds, atol=1e-4)
+    assert georef['rotation_degrees'] == 20 and Image.open(output).size == (64, 36)
+
+
+if __name__ == "__main__":
+    import tempfile
+    for test in (test_encoding_is_lossless, test_raster_generators_skip_matplotlib, test_numba_cli_writes_georeference):
+        with tempfile.TemporaryDirectory() as tmp:
+            test(Path(tmp))
+    print("✅ Raster output tests passed")
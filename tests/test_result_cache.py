@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Test the content-addressed yard map result cache and its /generate integration
+"""
+
+import os
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+from flask import Flask
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from yard_map.result_cache import ResultCache, result_key
+from app.services.yard_service import YardMappingService
+from app.utils.progress_tracker import ProgressTracker
+from app.api.yard_map import bp
+
+
+def write_yard_ply(path, n=20000, seed=5):
+    rng = np.random.default_rng(seed)
+    records = np.empty(n, dtype=[('x', '<f4'), ('y', '<f4'), ('z', '<f4'),
+                                 ('red', 'u1'), ('green', 'u1'), ('blue', 'u1')])
+    records['x'], records['y'] = rng.uniform(0, 32, n), rng.uniform(0, 18, n)
+    records['z'] = np.where(rng.random(n) < 0.3, rng.uniform(0.5, 2.0, n), rng.normal(0, 0.02, n))
+    for channel in ('red', 'green', 'blue'):
+        records[channel] = rng.integers(0, 256, n)
+    with open(path, 'wb') as f:
+        f.write((f"ply\nformat binary_little_endian 1.0\nelement vertex {n}\n"
+                 "property float x\nproperty float y\nproperty float z\n"
+                 "property uchar red\nproperty uchar green\nproperty uchar blue\nend_header\n").encode('ascii'))
+        records.tofile(f)
+
+
+def test_keys_and_lru_eviction(tmp_path):
+    mesh = tmp_path / 'yard.ply'
+    mesh.write_bytes(b'ply')
+    key = result_key(mesh, algorithm='kmeans', rotation=0, custom_bounds=(0, 10, 0, 5), coloring=None)
+    assert key == result_key(mesh, rotation=0.0, algorithm='kmeans', custom_bounds=[0.0, 10.0, 0.0, 5.0])
+    assert key != result_key(mesh, algorithm='kmeans', rotation=90, custom_bounds=[0, 10, 0, 5])
+    os.utime(mesh, ns=(0, 0))
+    assert key != result_key(mesh, algorithm='kmeans', rotation=0, custom_bounds=[0, 10, 0, 5])
+
+    cache = ResultCache(str(tmp_path / 'results'), max_bytes=2500)
+    for i, name in enumerate(('a', 'b', 'c')):
+        cache.put(name, bytes(1000), log_output=name)
+        os.utime(os.path.join(cache.entry_dir(name), 'meta.json'), (i, i))
+    assert cache.get('b')[1]['log_output'] == 'b'  # Touching b leaves a least recently used
+    cache.put('d', bytes(1000))
+    assert cache.get('a') is None and cache.get('c') is None
+    assert cache.get('b')[0] == bytes(1000) and cache.get('d') is not None
+
+
+def test_generate_serves_hits(tmp_path):
+    mesh_folder = tmp_path / 'meshes'
+    mesh_folder.mkdir()
+    write_yard_ply(mesh_folder / 'yard.ply')
+    service = YardMappingService({
+        'MESH_FOLDER': str(mesh_folder), 'POINT_CACHE_DIR': str(tmp_path / 'cache'),
+        'YARD_MAP_RESULT_CACHE_DIR': str(tmp_path / 'results'), 'YARD_MAP_BACKEND': 'numba'
+    })
+    service.job_runner.tracker = ProgressTracker()
+    app = Flask(__name__)
+    app.register_blueprint(bp)
+    app.yard_service = service
+    client = app.test_client()
+
+    try:
+        request = {'mesh_file': 'yard.ply', 'algorithm': 'bottom_percentile', 'rotation': 10}
+        miss = client.post('/api/yard-map/generate', json=request)
+        assert miss.status_code == 202 and miss.headers['X-Cache-Status'] == 'MISS'
+        deadline = time.time() + 120
+        while client.get(miss.get_json()['status_url']).get_json()['status'] != 'completed':
+            assert time.time() < deadline
+            time.sleep(0.05)
+        rendered = client.get(miss.get_json()['result_url']).get_json()
+
+        start_time = time.time()
+        hit = client.post('/api/yard-map/generate', json={**request, 'rotation': 10.0, 'max_points': 123})
+        assert hit.headers['X-Cache-Status'] == 'HIT' and time.time() - start_time < 0.5
+        assert hit.get_json()['image_data'] == rendered['image_data']
+        assert len(service.job_runner.tracker.get_all_sessions()) == 1
+
+        bypass = client.post('/api/yard-map/generate', json={**request, 'no_cache': True})
+        assert bypass.status_code == 202 and bypass.headers['X-Cache-Status'] == 'BYPASS'
+        assert client.post('/api/yard-map/generate', json={**request, 'rotation': 20}).headers['X-Cache-Status'] == 'MISS'
+    finally:
+        service.job_runner.shutdown()
+
+
+if __name__ == "__main__":
+    import tempfile
+    for test in (test_keys_and_lru_eviction, test_generate_serves_hits):
+        with tempfile.TemporaryDirectory() as tmp:
+            test(Path(tmp))
+    print("✅ Result cache tests passed")
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Test deterministic stratified and strided subsampling of point clouds
+"""
+
+import os
+import sys
+from pathlib import Path
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(ROOT / 'yard_map'))
+from yard_map.sampling import stratified_indices, strided_indices, sample_indices, subsample
+import fast_yard_map_numba
+
+
+def foliage_cloud(n=400000, seed=3):
+    """Uniform 32 x 18 m lawn with half of the points in a dense 1 m bush at (5, 5)"""
+    rng = np.random.default_rng(seed)
+    xyz = np.zeros((n, 3), dtype=np.float32)
+    xyz[:, 0], xyz[:, 1] = rng.uniform(0, 32, n), rng.uniform(0, 18, n)
+    bush = n // 2
+    xyz[:bush, 0], xyz[:bush, 1] = rng.normal(5, 0.5, bush), rng.normal(5, 0.5, bush)
+    return xyz
+
+
+def test_stratified_sample_is_uniform_and_reproducible(tmp_path):
+    xyz = foliage_cloud()
+    indices = stratified_indices(xyz, 20000)
+    assert len(indices) == 20000 and (np.diff(indices) > 0).all()
+    assert np.array_equal(indices, stratified_indices(xyz, 20000))
+    assert not np.array_equal(indices, stratified_indices(xyz, 20000, seed=1))
+
+    # The bush covers 9 of 576 square meters: its share drops from ~50% to its area share
+    in_bush = (np.abs(xyz[indices, 0] - 5) < 1.5) & (np.abs(xyz[indices, 1] - 5) < 1.5)
+    assert abs(in_bush.mean() - 9 / 576) < 0.005
+
+    # Chunked reads of a memory-mapped cloud, with known bounds, select the same points
+    np.save(tmp_path / 'xyz.npy', xyz)
+    mapped = np.load(tmp_path / 'xyz.npy', mmap_mode='r')
+    bounds = (xyz[:, 0].min(), xyz[:, 0].max(), xyz[:, 1].min(), xyz[:, 1].max())
+    assert np.array_equal(stratified_indices(mapped, 20000, bounds=bounds, chunk_size=70000), indices)
+
+    for max_points in (1, 399999, 400000, 500000):
+        assert len(stratified_indices(xyz, max_points)) == min(max_points, len(xyz))
+
+
+def test_strided_and_loader_sampling(tmp_path):
+    strided = strided_indices(1000003, 1000, seed=2)
+    assert len(strided) == 1000 and np.array_equal(strided, strided_indices(1000003, 1000, seed=2))
+    assert (np.diff(strided) >= 1000).all() and strided[-1] < 1000003
+    assert np.array_equal(sample_indices(np.zeros((10, 3)), 20, 'strided'), np.arange(10))
+
+    xyz = foliage_cloud(n=50000)
+    colors = np.arange(150000, dtype=np.uint8).reshape(-1, 3)
+    vertices, sampled_colors = subsample(xyz, colors, 5000)
+    indices = stratified_indices(xyz, 5000)
+    assert np.array_equal(vertices, xyz[indices]) and np.array_equal(sampled_colors, colors[indices])
+
+    records = np.empty(50000, dtype=[('x', '<f4'), ('y', '<f4'), ('z', '<f4'),
+                                     ('red', 'u1'), ('green', 'u1'), ('blue', 'u1')])
+    records['x'], records['y'], records['z'] = xyz[:, 0], xyz[:, 1], xyz[:, 2]
+    records['red'] = records['green'] = records['blue'] = 7
+    with open(tmp_path / 'yard.ply', 'wb') as f:
+        f.write(("ply\nformat binary_little_endian 1.0\nelement vertex 50000\n"
+                 "property float x\nproperty float y\nproperty float z\n"
+                 "property uchar red\nproperty uchar green\nproperty uchar blue\nend_header\n").encode('ascii'))
+        records.tofile(f)
+    os.environ['POINT_CACHE_DIR'] = str(tmp_path / 'cache')
+    try:
+        first, _ = fast_yard_map_numba.load_mesh_vertices(str(tmp_path / 'yard.ply'), max_points=5000)
+        second, _ = fast_yard_map_numba.load_mesh_vertices(str(tmp_path / 'yard.ply'), max_points=5000)
+    finally:
+        del os.environ['POINT_CACHE_DIR']
+    assert len(first) == 5000 and np.array_equal(first, second)
+
+
+if __name__ == "__main__":
+    import tempfile
+    for test in (test_stratified_sample_is_uniform_and_reproducible, test_strided_and_loader_sampling):
+        with tempfile.TemporaryDirectory() as tmp:
+            test(Path(tmp))
+    print("✅ Sampling tests passed")
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Test chunked PLY reading and out-of-core streaming rasterization against the in-memory engine
+"""
+
+import sys
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from yard_map.ply_reader import read_header, iter_vertex_chunks
+from yard_map.raster_engine import RasterGrid, rasterize
+from yard_map.streaming_raster import rasterize_ply_streaming, StreamingCellStats
+
+
+def yard_cloud(n=20000, seed=3):
+    rng = np.random.default_rng(seed)
+    x, y = rng.uniform(0, 32, n), rng.uniform(0, 18, n)
+    ground = 0.05 * x + rng.normal(0, 0.02, n)
+    z = np.where(rng.random(n) < 0.3, ground + rng.uniform(0.5, 2.0, n), ground)
+    vertices = np.column_stack([x, y, z]).astype(np.float32)
+    colors = rng.integers(0, 256, (n, 3)).astype(np.uint8)
+    return vertices, colors
+
+
+def write_ply(path, vertices, colors, format='binary_little_endian'):
+    header = (f"ply\nformat {format} 1.0\ncomment test cloud\nelement vertex {len(vertices)}\n"
+              "property float x\nproperty float y\nproperty float z\n"
+              "property uchar red\nproperty uchar green\nproperty uchar blue\n"
+              "element face 0\nproperty list uchar int vertex_indices\nend_header\n")
+    records = np.empty(len(vertices), dtype=[('x', '<f4'), ('y', '<f4'), ('z', '<f4'),
+                                             ('red', 'u1'), ('green', 'u1'), ('blue', 'u1')])
+    for i, axis in enumerate('xyz'):
+        records[axis] = vertices[:, i]
+    for i, channel in enumerate(('red', 'green', 'blue')):
+        records[channel] = colors[:, i]
+    with open(path, 'wb') as f:
+        f.write(header.encode('ascii'))
+        if format == 'ascii':
+            np.savetxt(f, records, fmt='%.9g %.9g %.9g %d %d %d')
+        else:
+            records.tofile(f)
+
+
+def test_chunked_reader_round_trips(tmp_path):
+    vertices, colors = yard_cloud(n=2500)
+    for format in ('binary_little_endian', 'ascii'):
+        path = tmp_path / f'cloud_{format}.ply'
+        write_ply(path, vertices, colors, format)
+        header = read_header(path)
+        assert header.vertex_count == 2500 and header.color_fields == ['red', 'green', 'blue']
+
+        chunks = list(iter_vertex_chunks(path, chunk_size=1000, header=header))
+        assert [len(xyz) for xyz, _ in chunks] == [1000, 1000, 500]
+        assert np.array_equal(np.concatenate([xyz for xyz, _ in chunks]), vertices), format
+        assert np.array_equal(np.concatenate([rgb for _, rgb in chunks]), colors), format
+
+
+def test_streaming_matches_in_memory_engine(tmp_path):
+    vertices, colors = yard_cloud()
+    path = tmp_path / 'cloud.ply'
+    write_ply(path, vertices, colors)
+
+    for algorithm in ('bottom_percentile', 'height_window', 'kmeans', 'simple_average'):
+        for coloring in ('true_color', 'height'):
+            # A reservoir larger than any cell keeps every height, so thresholds are exact
+            streamed = rasterize_ply_streaming(path, output_width=64, output_height=36, algorithm=algorithm,
+                                               coloring=coloring, chunk_size=3000, reservoir_size=256)
+            expected = rasterize(vertices, colors, output_width=64, output_height=36,
+                                 algorithm=algorithm, coloring=coloring)
+            assert np.array_equal(streamed, expected), (algorithm, coloring)
+
+
+def test_reservoir_percentile_on_dense_cells():
+    grid = RasterGrid(0.0, 1.0, 1.0, 1, 1)
+    heights = np.random.default_rng(0).permutation(np.arange(10000, dtype=np.float32))
+    cells = StreamingCellStats(grid, reservoir_size=512)
+    for chunk in np.array_split(heights, 7):
+        cells.add_heights(np.zeros(len(chunk), dtype=np.int64), chunk)
+
+    assert cells.count[0] == 10000 and cells.depth_min[0] == 0
+    threshold = cells.thresholds('bottom_percentile', percentile=0.4)[0]
+    assert abs(threshold - 4000) < 600
+
+
+if __name__ == "__main__":
+    import tempfile
+    with tempfile.TemporaryDirectory() as tmp:
+        test_chunked_reader_round_trips(Path(tmp))
+        test_streaming_matches_in_memory_engine(Path(tmp))
+    test_reservoir_percentile_on_dense_cells()
+    print("✅ Streaming raster tests passed")
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+Test the yard map tile pyramid: deepest level matches a full raster, parents are downsampled children
+"""
+
+import os
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+from flask import Flask
+from PIL import Image
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from yard_map.raster_engine import rasterize
+from yard_map.tile_pyramid import build_pyramid, tile_path, auto_max_zoom, pyramid_entries, evict_pyramids
+from app.services.yard_service import YardMappingService
+from app.utils.progress_tracker import ProgressTracker
+from app.api.yard_map import bp
+
+
+def yard_cloud(n=40000, seed=9):
+    rng = np.random.default_rng(seed)
+    x, y = rng.uniform(0, 30, n), rng.uniform(0, 20, n)
+    z = 0.02 * y + np.where(rng.random(n) < 0.3, rng.uniform(0.5, 2.0, n), rng.normal(0, 0.02, n))
+    return np.column_stack([x, y, z]).astype(np.float32), rng.integers(0, 256, (n, 3)).astype(np.uint8)
+
+
+def read_level(directory, z, tile_size):
+    n = 2 ** z
+    image = np.empty((n * tile_size, n * tile_size, 3), dtype=np.uint8)
+    for tx in range(n):
+        for ty in range(n):
+            image[ty * tile_size:(ty + 1) * tile_size, tx * tile_size:(tx + 1) * tile_size] = \
+                np.asarray(Image.open(tile_path(directory, z, tx, ty)))
+    return image
+
+
+def test_pyramid_levels(tmp_path):
+    vertices, colors = yard_cloud()
+    directory = str(tmp_path / 'pyramid')
+    metadata = build_pyramid(vertices, colors, directory, rotation=10, max_zoom=2, tile_size=32)
+    assert metadata['max_zoom'] == 2 and metadata['grid']['width'] == 128
+
+    # Deepest level is the full-size raster of the same (square) view
+    expected = rasterize(vertices, colors, output_width=128, output_height=128, rotation=10)
+    assert np.array_equal(read_level(directory, 2, 32), expected)
+
+    # Each level is the rounded 2x2 mean of the level below
+    for z in (1, 0):
+        below = read_level(directory, z + 1, 32).astype(np.int64)
+        mean = (below.reshape(32 * 2 ** z, 2, 32 * 2 ** z, 2, 3).sum(axis=(1, 3)) + 2) // 4
+        assert np.array_equal(read_level(directory, z, 32), mean)
+
+    assert auto_max_zoom(100) == 0 and auto_max_zoom(20_000_000) == 4
+    # Out-of-range zoom levels are clamped
+    assert build_pyramid(vertices, colors, str(tmp_path / 'flat'), max_zoom=-3, tile_size=32)['max_zoom'] == 0
+
+
+def test_tile_endpoints_serve_cacheable_tiles(tmp_path):
+    mesh_folder = tmp_path / 'meshes'
+    mesh_folder.mkdir()
+    vertices, colors = yard_cloud(n=5000)
+    records = np.empty(len(vertices), dtype=[('x', '<f4'), ('y', '<f4'), ('z', '<f4'),
+                                             ('red', 'u1'), ('green', 'u1'), ('blue', 'u1')])
+    for i, axis in enumerate('xyz'):
+        records[axis] = vertices[:, i]
+    for i, channel in enumerate(('red', 'green', 'blue')):
+        records[channel] = colors[:, i]
+    with open(mesh_folder / 'yard.ply', 'wb') as f:
+        f.write((f"ply\nformat binary_little_endian 1.0\nelement vertex {len(records)}\n"
+                 "property float x\nproperty float y\nproperty float z\n"
+                 "property uchar red\nproperty uchar green\nproperty uchar blue\nend_header\n").encode('ascii'))
+        records.tofile(f)
+
+    app = Flask(__name__)
+    app.register_blueprint(bp)
+    app.yard_service = YardMappingService({
+        'MESH_FOLDER': str(mesh_folder), 'POINT_CACHE_DIR': str(tmp_path / 'cache'),
+        'YARD_MAP_TILES_FOLDER': str(tmp_path / 'tiles')
+    })
+    app.yard_service.job_runner.tracker = ProgressTracker()
+    client = app.test_client()
+
+    def build(**request):
+        # Cold pyramids are built on the job runner
+        response = client.post('/api/yard-map/tiles', json={'mesh_file': 'yard.ply', **request})
+        if response.status_code == 200:
+            return response.get_json()
+        assert response.status_code == 202
+        queued = response.get_json()
+        deadline = time.time() + 120
+        while client.get(queued['status_url']).get_json()['status'] not in ('completed', 'failed', 'cancelled'):
+            assert time.time() < deadline
+            time.sleep(0.05)
+        assert client.get(queued['status_url']).get_json()['status'] == 'completed'
+        built = client.post('/api/yard-map/tiles', json={'mesh_file': 'yard.ply', **request}).get_json()
+        assert built['pyramid_id'] == queued['pyramid_id']
+        return built
+
+    try:
+        for max_zoom in (-1, 9, 'deep', [1]):
+            response = client.post('/api/yard-map/tiles', json={'mesh_file': 'yard.ply', 'max_zoom': max_zoom})
+            assert response.status_code == 400 and 'max_zoom' in response.get_json()['error']
+
+        queued = client.post('/api/yard-map/tiles', json={'mesh_file': 'yard.ply', 'max_zoom': 1}).get_json()
+        # A second request while the build runs joins the same job
+        assert client.post('/api/yard-map/tiles', json={'mesh_file': 'yard.ply', 'max_zoom': 1}).get_json().get('job_id') \
+            in (queued['job_id'], None)
+        built = build(max_zoom=1)
+        assert built['status'] == 'success' and built['metadata']['max_zoom'] == 1
+        result = client.get(f"/api/yard-map/jobs/{queued['job_id']}/result").get_json()
+        assert result['pyramid_id'] == built['pyramid_id'] and result['pyramid']['max_zoom'] == 1
+        again = client.post('/api/yard-map/tiles', json={'mesh_file': 'yard.ply', 'max_zoom': 1})
+        assert again.status_code == 200 and again.get_json()['pyramid_id'] == built['pyramid_id']
+
+        tile = client.get(built['tile_url'].format(z=1, x=1, y=0))
+        assert tile.status_code == 200 and tile.mimetype == 'image/png'
+        assert 'immutable' in tile.headers['Cache-Control'] and 'max-age=31536000' in tile.headers['Cache-Control']
+        assert client.get(built['tile_url'].format(z=1, x=2, y=0)).status_code == 404
+        assert client.get('/api/yard-map/tiles/..%2F..%2Fetc/0/0/0.png').status_code == 404
+        assert client.get(f"/api/yard-map/tiles/{built['pyramid_id']}/metadata").get_json()['tile_size'] == 256
+
+        # A budget of one pyramid: building another view evicts the least recently used one
+        app.yard_service.tiles_max_bytes = built['metadata']['size_bytes']
+        other = build(max_zoom=1, rotation=30)
+        assert [e[0] for e in pyramid_entries(str(tmp_path / 'tiles'))] == [other['pyramid_id']]
+        assert client.get(built['tile_url'].format(z=1, x=1, y=0)).status_code == 404
+    finally:
+        app.yard_service.job_runner.shutdown()
+
+
+def test_pyramid_eviction_order(tmp_path):
+    vertices, colors = yard_cloud(n=2000)
+    for i, name in enumerate(('a', 'b', 'c')):
+        build_pyramid(vertices, colors, str(tmp_path / name), max_zoom=0, rotation=10 * i)
+        os.utime(tmp_path / name / 'pyramid.json', (i, i))
+    entries = {pid: size for pid, _, size in pyramid_entries(str(tmp_path))}
+    assert all(size == sum(f.stat().st_size for f in (tmp_path / pid).rglob('*.png')) for pid, size in entries.items())
+
+    budget = entries['a'] + entries['c']
+    assert evict_pyramids(str(tmp_path), budget, keep='a') == ['b']
+    assert evict_pyramids(str(tmp_path), budget) == []
+    assert sorted(os.listdir(tmp_path)) == ['a', 'c']
+
+
+if __name__ == "__main__":
+    import tempfile
+    for test in (test_pyramid_levels, test_tile_endpoints_serve_cacheable_tiles, test_pyramid_eviction_order):
+        with tempfile.TemporaryDirectory() as tmp:
+            test(Path(tmp))
+    print("✅ Tile pyramid tests passed")
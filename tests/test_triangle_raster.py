@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Test the vectorized triangle rasterizer and the mesh_to_yard_map raster output
+"""
+
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+from yard_map.triangle_raster import rasterize_triangles, triangulate
+from yard_map.raster_engine import EMPTY_COLOR
+
+
+def grid_mesh(n, z, color, x_range=(0, 32), y_range=(0, 18)):
+    """(n+1) x (n+1) vertex grid over the given ranges, two triangles per square"""
+    xs, ys = np.meshgrid(np.linspace(*x_range, n + 1), np.linspace(*y_range, n + 1))
+    vertices = np.column_stack([xs.ravel(), ys.ravel(), np.full(xs.size, z)])
+    index = np.arange((n + 1) ** 2).reshape(n + 1, n + 1)
+    a, b, c, d = index[:-1, :-1].ravel(), index[:-1, 1:].ravel(), index[1:, 1:].ravel(), index[1:, :-1].ravel()
+    faces = np.concatenate([np.column_stack([a, b, c]), np.column_stack([a, c, d])])
+    colors = np.tile(np.array(color, dtype=np.uint8), (len(vertices), 1))
+    return vertices, faces, colors
+
+
+def write_mesh_ply(path, vertices, faces, colors):
+    with open(path, 'w') as f:
+        f.write(f"ply\nformat ascii 1.0\nelement vertex {len(vertices)}\n"
+                "property float x\nproperty float y\nproperty float z\n"
+                "property uchar red\nproperty uchar green\nproperty uchar blue\n"
+                f"element face {len(faces)}\nproperty list uchar int vertex_indices\nend_header\n")
+        for (x, y, z), (r, g, b) in zip(vertices, colors):
+            f.write(f"{x} {y} {z} {r} {g} {b}\n")
+        for face in faces:
+            f.write(f"{len(face)} {' '.join(map(str, face))}\n")
+
+
+def test_lowest_surface_wins_without_holes():
+    # Coarse ground (2 triangles) under a canopy over the left half
+    ground = grid_mesh(1, 0.0, (40, 200, 40))
+    canopy = grid_mesh(4, 3.0, (200, 40, 40), x_range=(0, 16))
+    vertices = np.concatenate([canopy[0], ground[0]])
+    faces = np.concatenate([canopy[1], ground[1] + len(canopy[0])])
+    colors = np.concatenate([canopy[2], ground[2]])
+
+    image, grid, stats = rasterize_triangles(vertices, faces, colors, custom_bounds=(0, 32, 0, 18),
+                                             output_width=64, output_height=36, return_stats=True)
+    assert image.shape == (36, 64, 3) and grid.pixel_size == 0.5
+    # Every pixel of the two large ground triangles is covered, by the ground
+    assert np.all(stats['count'] == 1)
+    assert np.all(image.reshape(-1, 3) == [40, 200, 40])
+    assert np.allclose(stats['depth_min'], 0.0)
+
+    # Small batches give the same raster as one batch
+    small = rasterize_triangles(vertices, faces, colors, custom_bounds=(0, 32, 0, 18), output_width=64,
+                                output_height=36, batch_pixels=100)
+    assert np.array_equal(small, image)
+
+
+def test_interpolation_and_coverage():
+    vertices = np.array([[0, 0, 0], [10, 0, 1], [0, 10, 2]], dtype=np.float64)
+    colors = np.array([[255, 0, 0], [0, 255, 0], [0, 0, 255]], dtype=np.uint8)
+    image, grid, stats = rasterize_triangles(vertices, [[0, 1, 2]], colors, custom_bounds=(0, 10, 0, 10),
+                                             output_width=10, output_height=10, return_stats=True)
+    covered = stats['count'].reshape(10, 10) > 0
+    # Pixel centers with x + y <= 10 are inside the triangle, the rest stay empty
+    rows, cols = np.indices((10, 10))
+    px, py = cols + 0.5, 10 - (rows + 0.5)
+    assert np.array_equal(covered, px + py <= 10)
+    assert np.all(image[~covered] == EMPTY_COLOR)
+
+    # Pixel (row 9, col 2) has center (2.5, 0.5): weights 0.7 / 0.25 / 0.05
+    assert np.isclose(stats['depth_min'].reshape(10, 10)[9, 2], 0.25 * 1 + 0.05 * 2)
+    assert np.allclose(image[9, 2], [0.7 * 255, 0.25 * 255, 0.05 * 255], atol=1)
+
+
+def test_triangulate_quads_and_polygons():
+    assert triangulate([[0, 1, 2, 3]]).tolist() == [[0, 1, 2], [0, 2, 3]]
+    mixed = np.empty(2, dtype=object)
+    mixed[0], mixed[1] = [0, 1, 2], [3, 4, 5, 6, 7]
+    assert triangulate(mixed).tolist() == [[0, 1, 2], [3, 4, 5], [3, 5, 6], [3, 6, 7]]
+
+    vertices = np.array([[0, 0, 0], [4, 0, 0], [4, 4, 0], [0, 4, 0]], dtype=np.float64)
+    image, _, stats = rasterize_triangles(vertices, [[0, 1, 2, 3]], custom_bounds=(0, 4, 0, 4), output_width=8,
+                                          output_height=8, coloring='height', return_stats=True)
+    assert np.all(stats['count'] == 1)
+
+
+def test_cli_writes_raster_and_sidecar(tmp_path):
+    vertices, faces, colors = grid_mesh(6, 0.0, (90, 160, 60))
+    write_mesh_ply(tmp_path / 'mesh.ply', vertices, faces, colors)
+    subprocess.run([sys.executable, str(ROOT / 'yard_map' / 'mesh_to_yard_map.py'), str(tmp_path / 'mesh.ply'),
+                    '--output', str(tmp_path / 'map.png'), '--output-width', '64'],
+                   check=True, capture_output=True, timeout=300)
+    image = np.asarray(Image.open(tmp_path / 'map.png'))
+    assert image.shape == (36, 64, 3) and np.all(image == [90, 160, 60])
+    georef = json.loads((tmp_path / 'map.json').read_text())
+    assert georef['width'] == 64 and georef['height'] == 36
+
+
+if __name__ == "__main__":
+    import tempfile
+    test_lowest_surface_wins_without_holes()
+    test_interpolation_and_coverage()
+    test_triangulate_quads_and_polygons()
+    with tempfile.TemporaryDirectory() as tmp:
+        test_cli_writes_raster_and_sidecar(Path(tmp))
+    print("✅ Triangle raster tests passed")
@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+"""
+Test the in-process yard map job runner and its job endpoints
+"""
+
+import io
+import os
+import base64
+import signal
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+from flask import Flask
+from PIL import Image
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from yard_map.raster_engine import rasterize
+from app.services.yard_service import YardMappingService
+from app.services.yard_job_runner import JobResultExpired
+from app.utils.progress_tracker import ProgressTracker
+from app.api.yard_map import bp
+
+
+def write_yard_ply(path, n=20000, seed=5):
+    rng = np.random.default_rng(seed)
+    records = np.empty(n, dtype=[('x', '<f4'), ('y', '<f4'), ('z', '<f4'),
+                                 ('red', 'u1'), ('green', 'u1'), ('blue', 'u1')])
+    records['x'], records['y'] = rng.uniform(0, 32, n), rng.uniform(0, 18, n)
+    records['z'] = np.where(rng.random(n) < 0.3, rng.uniform(0.5, 2.0, n), rng.normal(0, 0.02, n))
+    for channel in ('red', 'green', 'blue'):
+        records[channel] = rng.integers(0, 256, n)
+    with open(path, 'wb') as f:
+        f.write((f"ply\nformat binary_little_endian 1.0\nelement vertex {n}\n"
+                 "property float x\nproperty float y\nproperty float z\n"
+                 "property uchar red\nproperty uchar green\nproperty uchar blue\nend_header\n").encode('ascii'))
+        records.tofile(f)
+    vertices = np.column_stack([records[a] for a in 'xyz'])
+    colors = np.column_stack([records[c] for c in ('red', 'green', 'blue')])
+    return vertices, colors
+
+
+def make_service(tmp_path):
+    mesh_folder = tmp_path / 'meshes'
+    mesh_folder.mkdir()
+    service = YardMappingService({
+        'MESH_FOLDER': str(mesh_folder), 'POINT_CACHE_DIR': str(tmp_path / 'cache'),
+        'YARD_MAP_BACKEND': 'numba', 'YARD_MAP_WORKERS': 1
+    })
+    service.job_runner.tracker = ProgressTracker()
+    return service, mesh_folder
+
+
+def test_job_endpoints(tmp_path):
+    service, mesh_folder = make_service(tmp_path)
+    vertices, colors = write_yard_ply(mesh_folder / 'yard.ply')
+    app = Flask(__name__)
+    app.register_blueprint(bp)
+    app.yard_service = service
+    client = app.test_client()
+
+    try:
+        response = client.post('/api/yard-map/jobs', json={'mesh_file': 'yard.ply', 'output_width': 160,
+                                                           'output_height': 90, 'rotation': 15})
+        assert response.status_code == 202
+        job = response.get_json()
+
+        deadline = time.time() + 120
+        while client.get(job['status_url']).get_json()['status'] != 'completed':
+            assert time.time() < deadline and client.get(job['status_url']).get_json()['status'] != 'failed'
+            time.sleep(0.1)
+        status = client.get(job['status_url']).get_json()
+        assert status['progress']['render']['percent'] == 100 and status['metadata']['result']['points'] == 20000
+
+        result = client.get(job['result_url']).get_json()
+        image = np.asarray(Image.open(io.BytesIO(base64.b64decode(result['image_data']))))
+        assert np.array_equal(image, rasterize(vertices, colors, output_width=160, output_height=90, rotation=15))
+
+        assert client.get('/api/yard-map/jobs/unknown').status_code == 404
+        assert client.post('/api/yard-map/jobs', json={'mesh_file': 'missing.ply'}).status_code == 404
+    finally:
+        service.job_runner.shutdown()
+
+
+def test_generate_reuses_warm_worker(tmp_path):
+    service, mesh_folder = make_service(tmp_path)
+    write_yard_ply(mesh_folder / 'yard.ply')
+
+    try:
+        first, log = service.generate_yard_map(str(mesh_folder / 'yard.ply'), algorithm='simple_average')
+        assert first[:8] == b'\x89PNG\r\n\x1a\n' and 'Rendered' in log
+        second, _ = service.generate_yard_map(str(mesh_folder / 'yard.ply'), algorithm='simple_average')
+        assert second == first
+
+        pids = {s['metadata']['result']['worker_pid'] for s in service.job_runner.tracker.get_all_sessions().values()}
+        assert len(pids) == 1
+
+        job_id = service.submit_yard_map_job(str(mesh_folder / 'yard.ply'), algorithm='no_such_algorithm')
+        image_data, error = service.generate_yard_map(str(mesh_folder / 'missing.ply'), algorithm='simple_average')
+        assert image_data is None and error
+        deadline = time.time() + 60
+        while service.job_runner.status(job_id)['status'] != 'failed':
+            assert time.time() < deadline
+            time.sleep(0.1)
+        assert 'Unknown algorithm' in service.job_runner.status(job_id)['error_message']
+    finally:
+        service.job_runner.shutdown()
+
+
+def wait_for(runner, job_id, statuses=('completed', 'failed', 'cancelled'), timeout=120):
+    deadline = time.time() + timeout
+    while runner.status(job_id)['status'] not in statuses:
+        assert time.time() < deadline
+        time.sleep(0.05)
+    return runner.status(job_id)
+
+
+def test_progressive_previews_and_cancel(tmp_path):
+    service, mesh_folder = make_service(tmp_path)
+    vertices, colors = write_yard_ply(mesh_folder / 'yard.ply')
+    app = Flask(__name__)
+    app.register_blueprint(bp)
+    app.yard_service = service
+    client = app.test_client()
+
+    try:
+        job = client.post('/api/yard-map/jobs', json={'mesh_file': 'yard.ply', 'output_width': 160,
+                                                      'output_height': 90, 'progressive': True}).get_json()
+        queued = service.submit_yard_map_job(str(mesh_folder / 'yard.ply'), output_width=160, output_height=90)
+        assert client.post(f"/api/yard-map/jobs/{queued}/cancel").status_code == 200
+
+        status = wait_for(service.job_runner, job['job_id'])
+        assert status['status'] == 'completed' and status['progress']['passes']['percent'] == 100
+        # The whole (small) cloud fits the first pass, rendered at a quarter of the resolution
+        assert status['metadata']['preview'] == {**status['metadata']['preview'], 'pass': 1, 'width': 40,
+                                                 'height': 22, 'points': 20000}
+        image_data, info = service.job_runner.preview(job['job_id'])
+        preview = np.asarray(Image.open(io.BytesIO(image_data)))
+        assert np.array_equal(preview, rasterize(vertices, colors, output_width=40, output_height=22))
+        final = client.get(job['preview_url'])
+        assert final.headers['X-Preview-Pass'] == 'final' and final.data == service.job_runner.result(job['job_id'])[0]
+
+        assert wait_for(service.job_runner, queued)['status'] == 'cancelled'
+        assert client.get(f"/api/yard-map/jobs/{queued}/result").status_code == 410
+        assert client.post(f"/api/yard-map/jobs/{queued}/cancel").status_code == 409
+    finally:
+        service.job_runner.shutdown()
+
+
+def test_generate_queues_and_pruning_is_scoped(tmp_path):
+    service, mesh_folder = make_service(tmp_path)
+    service.result_cache.cache_dir = str(tmp_path / 'results')
+    write_yard_ply(mesh_folder / 'yard.ply')
+    app = Flask(__name__)
+    app.register_blueprint(bp)
+    app.yard_service = service
+    client = app.test_client()
+    tracker = service.job_runner.tracker
+    other = tracker.create_session(session_type='reconstruction')
+    tracker.set_session_status(other, 'completed')
+    service.job_runner.max_finished = 1
+
+    try:
+        request = {'mesh_file': 'yard.ply', 'algorithm': 'simple_average'}
+        response = client.post('/api/yard-map/generate', json=request)
+        assert response.status_code == 202 and response.headers['X-Cache-Status'] == 'MISS'
+        first = response.get_json()['job_id']
+        assert wait_for(service.job_runner, first)['status'] == 'completed'
+        assert client.post('/api/yard-map/generate', json=request).headers['X-Cache-Status'] == 'HIT'
+
+        second = service.submit_yard_map_job(str(mesh_folder / 'yard.ply'), output_width=64, output_height=36)
+        wait_for(service.job_runner, second)
+        assert service.job_runner.wait(second)[0][:8] == b'\x89PNG\r\n\x1a\n'
+        # Only yard map sessions are pruned
+        assert tracker.get_session(other) is not None and service.job_runner.status(first) is None
+        try:
+            service.job_runner.wait(first)
+            assert False, "pruned result"
+        except JobResultExpired as e:
+            assert 'expired' in str(e)
+    finally:
+        service.job_runner.shutdown()
+
+
+def test_kmeans_and_raster_generate_through_runner(tmp_path):
+    service, mesh_folder = make_service(tmp_path)
+    service.result_cache.cache_dir = str(tmp_path / 'results')
+    vertices, colors = write_yard_ply(mesh_folder / 'yard.ply')
+    app = Flask(__name__)
+    app.register_blueprint(bp)
+    app.yard_service = service
+    client = app.test_client()
+
+    try:
+        # kmeans has no numba kernel: the configured backend falls back to an in-process one
+        response = client.post('/api/yard-map/generate', json={'mesh_file': 'yard.ply', 'algorithm': 'kmeans'})
+        assert response.status_code == 202
+        job = response.get_json()
+        assert wait_for(service.job_runner, job['job_id'])['status'] == 'completed'
+        image = np.asarray(Image.open(io.BytesIO(service.job_runner.result(job['job_id'])[0])))
+        assert np.array_equal(image, rasterize(vertices, colors, algorithm='kmeans'))
+
+        request = {'mesh_file': 'yard.ply', 'type': 'raster', 'max_points': 5000}
+        response = client.post('/api/yard-map/generate', json=request)
+        assert response.status_code == 202
+        status = wait_for(service.job_runner, response.get_json()['job_id'])
+        assert status['status'] == 'completed' and status['metadata']['options']['generation_type'] == 'raster'
+        georef = status['metadata']['result']['georef']
+        assert (georef['width'], georef['height']) == (640, 360)
+        image_data, log_output = service.job_runner.result(response.get_json()['job_id'])
+        assert 'Sampled 5,000 of 20,000 points' in log_output and 'Rasterization complete' in log_output
+        cached = client.post('/api/yard-map/generate', json=request)
+        assert cached.status_code == 200 and cached.headers['X-Cache-Status'] == 'HIT'
+        assert base64.b64decode(cached.get_json()['image_data']) == image_data
+
+        assert service.generate_raster_yard_map(str(mesh_folder / 'yard.ply'), max_points=5000)[0] == image_data
+    finally:
+        service.job_runner.shutdown()
+
+
+def test_broken_pool_is_replaced(tmp_path):
+    service, mesh_folder = make_service(tmp_path)
+    write_yard_ply(mesh_folder / 'yard.ply')
+    runner = service.job_runner
+
+    try:
+        first = runner.submit(str(mesh_folder / 'yard.ply'), output_width=64, output_height=36)
+        pid = wait_for(runner, first)['metadata']['result']['worker_pid']
+        manager, progress_queue = runner._manager, runner._progress_queue
+        os.kill(pid, signal.SIGKILL)
+
+        # Whether or not the pool noticed the dead worker before this job, the next one gets a new pool
+        broken = wait_for(runner, runner.submit(str(mesh_folder / 'yard.ply'), output_width=64, output_height=36))
+        assert broken['status'] == 'completed' or 'Worker process died' in broken['error_message']
+        status = wait_for(runner, runner.submit(str(mesh_folder / 'yard.ply'), output_width=64, output_height=36))
+        assert status['status'] == 'completed' and status['metadata']['result']['worker_pid'] != pid
+        assert runner._manager is not manager and runner._progress_queue is not progress_queue
+        # The old manager process has been shut down
+        assert manager._process is not None and not manager._process.is_alive()
+    finally:
+        runner.shutdown()
+
+
+if __name__ == "__main__":
+    import tempfile
+    for test in (test_job_endpoints, test_generate_reuses_warm_worker, test_progressive_previews_and_cancel,
+                 test_generate_queues_and_pruning_is_scoped, test_kmeans_and_raster_generate_through_runner,
+                 test_broken_pool_is_replaced):
+        with tempfile.TemporaryDirectory() as tmp:
+            test(Path(tmp))
+    print("✅ Yard map job runner tests passed")
@@ -0,0 +1,5 @@
+"""
+Yard map generation: ground-surface rasterization of the yard reconstruction.
+The fast_yard_map*.py files are standalone CLI scripts; shared engine code lives
+in this package so the scripts and the Flask services use the same implementation.
+"""
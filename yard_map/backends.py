@@ -0,0 +1,305 @@
+#!/usr/bin/env python3
+"""
+Registry of yard map rendering backends and an automatic backend picker.
+Every backend declares the ground algorithms it implements and what it needs from
+the machine, renders in-process through one signature and (when it has a generator
+script) builds that script's command line. A calibration run times the usable
+backends on synthetic yards and is stored on disk per machine; the picker then takes
+the backend with the lowest predicted time for the point count at hand, falling back
+to a fixed preference order without calibration.
+"""
+
+import argparse
+import importlib
+import importlib.util
+import json
+import os
+import platform
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from yard_map.raster_engine import ALGORITHMS
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Overridable per process with YARD_MAP_CALIBRATION
+DEFAULT_CALIBRATION_PATH = os.path.expanduser('~/.cache/yard_map/calibration.json')
+
+# Synthetic cloud sizes and output size timed by calibrate()
+CALIBRATION_SIZES = (50000, 500000, 2000000)
+CALIBRATION_OUTPUT = (640, 360)
+
+
+def _module_available(name):
+    return importlib.util.find_spec(name) is not None
+
+
+def _gpu_available():
+    try:
+        import cupy
+        return cupy.cuda.runtime.getDeviceCount() > 0
+    except Exception:
+        return False
+
+
+# Hardware/software requirement -> check
+REQUIREMENTS = {
+    'numba': lambda: _module_available('numba'),
+    'cupy': lambda: _module_available('cupy'),
+    'gpu': _gpu_available,
+    'multicore': lambda: (os.cpu_count() or 1) > 1,
+}
+
+
+class Backend:
+    """A yard map renderer
+
+    Args:
+        name: Registry key (also the YARD_MAP_BACKEND value selecting it)
+        algorithms: Ground algorithms it implements
+        requires: Keys of REQUIREMENTS that must all hold
+        renderer: 'module:function' rendering (vertices, colors, *view) -> (image, grid)
+        script: Generator script in yard_map/ with the numba/CUDA command line, or None
+        in_process: Whether the service renders it in its own worker processes
+        priority: Preference without calibration (lower first)
+    """
+
+    def __init__(self, name, algorithms, requires=(), renderer=None, script=None, in_process=True, priority=0,
+                 description=''):
+        self.name = name
+        self.algorithms = tuple(algorithms)
+        self.requires = tuple(requires)
+        self.renderer = renderer
+        self.script = script
+        self.in_process = in_process
+        self.priority = priority
+        self.description = description
+
+    def __repr__(self):
+        return f"Backend({self.name!r})"
+
+    def supports(self, algorithm):
+        return algorithm in self.algorithms
+
+    def available(self, checks=None):
+        """Whether every requirement holds (`checks` overrides individual REQUIREMENTS)"""
+        checks = {**REQUIREMENTS, **(checks or {})}
+        return all(checks[requirement]() for requirement in self.requires)
+
+    def render(self, vertices, colors=None, projection='xy', custom_bounds=None, output_width=1280,
+               output_height=720, rotation=0, algorithm='bottom_percentile', coloring='true_color',
+               height_window=0.5):
+        """Render in this process; same view arguments as raster_engine.rasterize
+
+        Returns:
+            Tuple of (uint8 RGB image, RasterGrid)
+        """
+        if not self.supports(algorithm):
+            raise ValueError(f"Backend {self.name} does not implement {algorithm} "
+                             f"(supported: {', '.join(self.algorithms)})")
+        module, function = self.renderer.split(':')
+        return getattr(importlib.import_module(module), function)(
+            vertices, colors, projection, custom_bounds, output_width, output_height, rotation, algorithm,
+            coloring, height_window)
+
+    def command(self, python, mesh_path, output=None, projection='xy', custom_bounds=None, output_width=1280,
+                output_height=720, rotation=0, algorithm='bottom_percentile', coloring='true_color',
+                height_window=0.5, grid_resolution=0.1, max_points=20000000, compression=None):
+        """Command line of the backend's generator script (without --output when output is None)"""
+        if self.script is None:
+            raise ValueError(f"Backend {self.name} has no generator script")
+        cmd = [
+            python, os.path.join(SCRIPT_DIR, self.script), str(mesh_path),
+            '--max-points', str(max_points),
+            '--grid-resolution', str(grid_resolution),
+            '--projection', projection,
+            '--algorithm', algorithm,
+            '--coloring', coloring,
+            '--height-window', str(height_window),
+            '--rotation', str(rotation),
+            '--output-width', str(output_width),
+            '--output-height', str(output_height)
+        ]
+        if custom_bounds is not None:
+            for flag, value in zip(('--x-min', '--x-max', '--y-min', '--y-max'), custom_bounds):
+                cmd.extend([flag, str(value)])
+        if compression is not None:
+            cmd.extend(['--compression', str(compression)])
+        if output is not None:
+            cmd.extend(['--output', str(output)])
+        return cmd
+
+
+def render_numpy(vertices, colors, projection, custom_bounds, output_width, output_height, rotation, algorithm,
+                 coloring, height_window):
+    from yard_map.raster_engine import rasterize
+    image, grid, _ = rasterize(vertices, colors, projection, custom_bounds, output_width, output_height, rotation,
+                               algorithm, coloring, height_window, return_stats=True)
+    return image, grid
+
+
+def render_tiled(vertices, colors, projection, custom_bounds, output_width, output_height, rotation, algorithm,
+                 coloring, height_window):
+    from yard_map.raster_engine import prepare_view
+    from yard_map.tiled_raster import rasterize_tiled
+    image = rasterize_tiled(vertices, colors, projection, custom_bounds, output_width, output_height, rotation,
+                            algorithm, coloring, height_window)
+    return image, prepare_view(vertices, projection, custom_bounds, output_width, output_height, rotation)[3]
+
+
+def render_numba(vertices, colors, projection, custom_bounds, output_width, output_height, rotation, algorithm,
+                 coloring, height_window):
+    # Imported under its script name: Numba's on-disk kernel cache records the defining module
+    if SCRIPT_DIR not in sys.path:
+        sys.path.insert(0, SCRIPT_DIR)
+    from fast_yard_map_numba import create_numba_raster_map
+    return create_numba_raster_map(vertices, colors, projection, 0.1, height_window, custom_bounds, coloring,
+                                   output_width, output_height, rotation, algorithm, return_grid=True)
+
+
+def render_cuda(vertices, colors, projection, custom_bounds, output_width, output_height, rotation, algorithm,
+                coloring, height_window):
+    if SCRIPT_DIR not in sys.path:
+        sys.path.insert(0, SCRIPT_DIR)
+    from fast_yard_map_cuda import create_cuda_raster_map
+    return create_cuda_raster_map(vertices, colors, projection, 0.1, height_window, custom_bounds, coloring,
+                                  output_width, output_height, rotation, algorithm, return_grid=True)
+
+
+KERNEL_ALGORITHMS = ('bottom_percentile', 'simple_average')
+
+BACKENDS = {
+    'cuda': Backend('cuda', KERNEL_ALGORITHMS, ('cupy', 'gpu'), 'yard_map.backends:render_cuda',
+                    'fast_yard_map_cuda.py', in_process=False, priority=0,
+                    description='CuPy/Numba CUDA kernels on the GPU'),
+    'numba': Backend('numba', KERNEL_ALGORITHMS, ('numba',), 'yard_map.backends:render_numba',
+                     'fast_yard_map_numba.py', priority=1,
+                     description='Numba-compiled CPU port of the CUDA kernels'),
+    'tiled': Backend('tiled', ALGORITHMS, ('multicore',), 'yard_map.backends:render_tiled', priority=2,
+                     description='Vectorized engine over output tiles in a process pool'),
+    'numpy': Backend('numpy', ALGORITHMS, (), 'yard_map.backends:render_numpy', priority=3,
+                     description='Vectorized NumPy engine (raster_engine)'),
+}
+
+
+def get_backend(name):
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown yard map backend: {name} (expected one of {sorted(BACKENDS)})")
+    return BACKENDS[name]
+
+
+def machine_id():
+    """Identifies the machine a calibration was measured on"""
+    return f"{platform.node()}/{platform.machine()}/{os.cpu_count()} cpus"
+
+
+def calibration_path(path=None):
+    return path or os.environ.get('YARD_MAP_CALIBRATION', DEFAULT_CALIBRATION_PATH)
+
+
+def load_calibration(path=None):
+    """Stored calibration of this machine, or None"""
+    try:
+        with open(calibration_path(path)) as f:
+            calibration = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return calibration if calibration.get('machine') == machine_id() else None
+
+
+def calibrate(path=None, sizes=CALIBRATION_SIZES, backends=None, algorithm='bottom_percentile', seed=0,
+              checks=None, log=print):
+    """Time every usable backend on synthetic yards and store the result
+
+    Each backend renders once untimed first (Numba compiles its kernels then).
+
+    Returns:
+        The stored calibration: {'machine', 'created', 'algorithm', 'output', 'timings'},
+        with timings[backend][str(points)] in seconds
+    """
+    from yard_map.benchmark_yard_maps import synthetic_yard
+
+    candidates = [get_backend(name) for name in (backends or BACKENDS)]
+    candidates = [b for b in candidates if b.supports(algorithm) and b.available(checks)]
+    width, height = CALIBRATION_OUTPUT
+    timings = {b.name: {} for b in candidates}
+    for n_points in sorted(sizes):
+        vertices, colors = synthetic_yard(n_points, seed)
+        for backend in candidates:
+            if not timings[backend.name]:
+                backend.render(vertices[:1000], colors[:1000], output_width=width, output_height=height,
+                               algorithm=algorithm)
+            start_time = time.perf_counter()
+            backend.render(vertices, colors, output_width=width, output_height=height, algorithm=algorithm)
+            timings[backend.name][str(n_points)] = round(time.perf_counter() - start_time, 4)
+            log(f"{backend.name:>6}: {n_points:>10,} points in {timings[backend.name][str(n_points)]:.3f}s")
+
+    calibration = {'machine': machine_id(), 'created': time.time(), 'algorithm': algorithm,
+                   'output': [width, height], 'timings': timings}
+    path = calibration_path(path)
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = f"{path}.tmp-{os.getpid()}"
+    with open(tmp_path, 'w') as f:
+        json.dump(calibration, f, indent=2)
+    os.replace(tmp_path, path)
+    return calibration
+
+
+def predict_seconds(timings, n_points):
+    """Render time for n_points from measured {points: seconds}: a least-squares line, never below 0"""
+    points = np.array([int(n) for n in timings], dtype=np.float64)
+    seconds = np.array(list(timings.values()), dtype=np.float64)
+    if len(points) == 1:
+        return float(seconds[0] * n_points / points[0])
+    slope, intercept = np.polyfit(points, seconds, 1)
+    return max(float(slope * n_points + intercept), 0.0)
+
+
+def pick_backend(algorithm, n_points=None, calibration=None, checks=None):
+    """Fastest usable backend for an algorithm
+
+    With a calibration and a point count the lowest predicted time wins (backends
+    missing from the calibration come after timed ones); otherwise the first usable
+    backend by priority.
+    """
+    candidates = sorted((b for b in BACKENDS.values() if b.supports(algorithm) and b.available(checks)),
+                        key=lambda b: b.priority)
+    if not candidates:
+        raise ValueError(f"No available yard map backend implements {algorithm}")
+    timings = (calibration or {}).get('timings', {})
+    if n_points is None or not any(b.name in timings for b in candidates):
+        return candidates[0]
+    return min(candidates, key=lambda b: (b.name not in timings,
+                                          predict_seconds(timings[b.name], n_points) if b.name in timings else 0,
+                                          b.priority))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='List, calibrate and pick yard map rendering backends')
+    parser.add_argument('--calibrate', action='store_true', help='Time the usable backends and store the result')
+    parser.add_argument('--sizes', type=int, nargs='*', default=list(CALIBRATION_SIZES),
+                        help='Synthetic cloud sizes to time (default: 50k, 500k, 2M)')
+    parser.add_argument('--path', help=f'Calibration file (default: {DEFAULT_CALIBRATION_PATH})')
+    parser.add_argument('--points', type=int, help='Show the backend picked for this many points')
+    parser.add_argument('--algorithm', choices=ALGORITHMS, default='bottom_percentile',
+                        help='Ground algorithm (default: bottom_percentile)')
+    args = parser.parse_args()
+
+    calibration = calibrate(args.path, args.sizes, algorithm=args.algorithm) if args.calibrate \
+        else load_calibration(args.path)
+    for backend in sorted(BACKENDS.values(), key=lambda b: b.priority):
+        state = 'available' if backend.available() else 'unavailable'
+        print(f"{backend.name:>6}: {state:<11} {', '.join(backend.algorithms):<55} {backend.description}")
+    if calibration is None:
+        print("No calibration for this machine (run with --calibrate)")
+    if args.points is not None:
+        backend = pick_backend(args.algorithm, args.points, calibration)
+        print(f"Picked for {args.points:,} points ({args.algorithm}): {backend.name}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
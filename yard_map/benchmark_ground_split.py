@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Benchmark the vectorized 1D 2-means ground/foliage split against per-pixel sklearn KMeans.
+Uses a synthetic yard (noisy ground plus a canopy layer over part of it) so it runs without a mesh.
+"""
+
+import argparse
+import os
+import sys
+import time
+import warnings
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from yard_map.raster_engine import RasterGrid, CellIndex, two_means_split
+
+
+def synthetic_cloud(n_points, canopy_fraction=0.3, seed=0):
+    rng = np.random.default_rng(seed)
+    x = rng.uniform(0, 32, n_points)
+    y = rng.uniform(0, 18, n_points)
+    z = 0.02 * x + rng.normal(0, 0.05, n_points)
+    canopy = (x < 16) & (rng.random(n_points) < canopy_fraction * 2)
+    z[canopy] += rng.uniform(1.5, 5.0, canopy.sum())
+    return x, y, z.astype(np.float32)
+
+
+def within_cluster_sse(heights, lower):
+    """Total within-cluster sum of squares of a split after `lower` sorted points"""
+    low, high = heights[:lower], heights[lower:]
+    return ((low - low.mean()) ** 2).sum() + (((high - high.mean()) ** 2).sum() if len(high) else 0.0)
+
+
+def sklearn_split(index, cells):
+    """Current path: a new KMeans(2, n_init=10) per cell, lower-centroid cluster size"""
+    from sklearn.cluster import KMeans
+    sizes = {}
+    for cell in cells:
+        heights = index.depth[index.offsets[cell]:index.offsets[cell + 1]].astype(np.float64)
+        kmeans = KMeans(n_clusters=2, random_state=42, n_init=10)
+        labels = kmeans.fit_predict(heights.reshape(-1, 1))
+        sizes[cell] = int(np.count_nonzero(labels == np.argmin(kmeans.cluster_centers_.flatten())))
+    return sizes
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark ground/foliage splitting per raster cell')
+    parser.add_argument('--points', type=int, default=2000000, help='Synthetic points (default: 2000000)')
+    parser.add_argument('--width', type=int, default=640, help='Raster width (default: 640)')
+    parser.add_argument('--height', type=int, default=360, help='Raster height (default: 360)')
+    parser.add_argument('--sklearn-cells', type=int, default=500,
+                        help='Cells timed with sklearn; the full-raster time is extrapolated (default: 500)')
+    args = parser.parse_args()
+
+    x, y, z = synthetic_cloud(args.points)
+    grid = RasterGrid.fit(0, 32, 0, 18, args.width, args.height)
+    index = CellIndex.build(x, y, z, grid)
+    cell_ids = index.cell_ids()
+    candidates = np.flatnonzero(index.counts >= 2)
+    print(f"{args.points} points, {grid.n_cells} cells, {len(candidates)} cells with 2+ points")
+
+    start = time.perf_counter()
+    split = two_means_split(index, cell_ids)
+    vectorized_seconds = time.perf_counter() - start
+    print(f"Vectorized split: {vectorized_seconds:.3f}s for all cells")
+
+    sample = np.random.default_rng(1).choice(candidates, min(args.sklearn_cells, len(candidates)), replace=False)
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')  # ConvergenceWarning on cells with duplicate heights
+        start = time.perf_counter()
+        reference = sklearn_split(index, sample)
+        sklearn_seconds = time.perf_counter() - start
+    per_cell = sklearn_seconds / max(len(sample), 1)
+    print(f"sklearn KMeans: {sklearn_seconds:.2f}s for {len(sample)} cells "
+          f"(~{per_cell * len(candidates):.0f}s extrapolated to all cells)")
+    print(f"Speedup: ~{per_cell * len(candidates) / max(vectorized_seconds, 1e-9):.0f}x")
+
+    # Agreement with sklearn's lower cluster; where they differ compare inertia
+    mismatched = [c for c in sample if reference[c] != split[c]]
+    not_worse = sum(
+        within_cluster_sse(index.depth[index.offsets[c]:index.offsets[c + 1]].astype(np.float64), split[c]) <=
+        within_cluster_sse(index.depth[index.offsets[c]:index.offsets[c + 1]].astype(np.float64), reference[c]) + 1e-9
+        for c in mismatched
+    )
+    print(f"Lower cluster identical in {len(sample) - len(mismatched)}/{len(sample)} cells; "
+          f"{not_worse}/{len(mismatched)} differing cells have equal or lower inertia than sklearn")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
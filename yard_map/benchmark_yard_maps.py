@@ -0,0 +1,341 @@
+#!/usr/bin/env python3
+"""
+Benchmark every yard map generator on the same clouds and parameters.
+Synthetic yards (sloped ground with a path, trees, a house and outliers) are written
+as binary PLY from 100k to 50M points; recorded meshes can be added with --mesh. Each
+generator runs in its own process and is reported with wall time, peak RSS and points
+per second. With --reference-dir, every output raster is diffed against the stored
+output of the same generator on the same cloud, so optimizations cannot silently
+change the map (--update-reference stores the current outputs as the reference).
+"""
+
+import argparse
+import importlib.util
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from yard_map.point_cache import PointCache
+from yard_map.raster_engine import ALGORITHMS, rasterize
+from yard_map.raster_output import save_raster
+from yard_map.sampling import subsample
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+BENCHMARK_SCRIPT = os.path.abspath(__file__)
+
+DEFAULT_SIZES = (100000, 1000000, 10000000, 50000000)
+
+# Synthetic yard extent in meters
+YARD_WIDTH = 32.0
+YARD_DEPTH = 18.0
+# Share of ground, tree, house and outlier points
+SCENE_MIX = (0.6, 0.25, 0.1, 0.05)
+
+# name: (command after the interpreter, shared parameters the generator accepts, required modules)
+# 'size' passes --output-width/--output-height, 'max_points' passes --max-points
+CASES = {
+    **{f"engine_{algorithm}": ([BENCHMARK_SCRIPT, '--render-engine', algorithm], ('size', 'max_points'), ())
+       for algorithm in ALGORITHMS},
+    'numba_bottom_percentile': (['fast_yard_map_numba.py', '--algorithm', 'bottom_percentile'],
+                                ('size', 'max_points'), ('numba',)),
+    'numba_simple_average': (['fast_yard_map_numba.py', '--algorithm', 'simple_average'],
+                             ('size', 'max_points'), ('numba',)),
+    'numba_streaming': (['fast_yard_map_numba.py', '--algorithm', 'bottom_percentile', '--stream'],
+                        ('size',), ('numba',)),
+    'cuda_bottom_percentile': (['fast_yard_map_cuda.py', '--algorithm', 'bottom_percentile'],
+                               ('size', 'max_points'), ('cupy',)),
+    'cuda_simple_average': (['fast_yard_map_cuda.py', '--algorithm', 'simple_average'],
+                            ('size', 'max_points'), ('cupy',)),
+    'fast_kmeans': (['fast_yard_map.py', '--algorithm', 'kmeans'], ('size', 'max_points'), ('trimesh',)),
+    'fast_simple_average': (['fast_yard_map.py', '--algorithm', 'simple_average'],
+                            ('size', 'max_points'), ('trimesh',)),
+    'raster': (['fast_yard_map_raster.py'], ('max_points',), ('trimesh',)),
+    'kmeans': (['fast_yard_map_kmeans.py'], ('max_points',), ('trimesh',)),
+    'optimized': (['fast_yard_map_optimized.py'], ('max_points',), ('trimesh', 'scipy')),
+    'ultra': (['fast_yard_map_ultra.py'], ('max_points',), ('trimesh',)),
+    'height_optimized': (['fast_yard_map_height_optimized.py'], ('size', 'max_points'), ('trimesh',)),
+    'fixed': (['fast_yard_map_fixed.py'], ('max_points',), ('trimesh', 'matplotlib')),
+    'mesh_to_yard_map': (['mesh_to_yard_map.py'], ('size',), ()),
+}
+
+
+def _yard_layout(seed):
+    """Tree crowns (x, y, radius) and the house footprint of a seeded yard"""
+    rng = np.random.default_rng([seed, 0])
+    house = (20.0, 28.0, 10.0, 16.0)
+    trees = []
+    while len(trees) < 6:
+        x, y = rng.uniform(2, YARD_WIDTH - 2), rng.uniform(2, YARD_DEPTH - 2)
+        if not (house[0] - 2 < x < house[1] + 2 and house[2] - 2 < y < house[3] + 2):
+            trees.append((x, y, rng.uniform(1.0, 2.0)))
+    return np.array(trees), house
+
+
+def synthetic_yard(n_points, seed=0, chunk=0):
+    """One chunk of a synthetic yard as (float32 N x 3 xyz, uint8 N x 3 rgb)
+
+    The layout depends only on `seed`; `chunk` draws independent points of it.
+    """
+    rng = np.random.default_rng([seed, chunk + 1])
+    trees, house = _yard_layout(seed)
+    kind = rng.choice(4, n_points, p=SCENE_MIX)
+    xyz = np.empty((n_points, 3), dtype=np.float32)
+    rgb = np.empty((n_points, 3), dtype=np.uint8)
+
+    # Gently sloped ground with a gravel path along y = 6
+    ground = np.flatnonzero(kind == 0)
+    x, y = rng.uniform(0, YARD_WIDTH, len(ground)), rng.uniform(0, YARD_DEPTH, len(ground))
+    xyz[ground] = np.column_stack([x, y, 0.02 * x + 0.05 * np.sin(y / 3) + rng.normal(0, 0.02, len(ground))])
+    on_path = np.abs(y - 6) < 0.6
+    rgb[ground] = np.where(on_path[:, None], [150, 145, 135], [70, 140, 50])
+    rgb[ground] = np.clip(rgb[ground] + rng.integers(-20, 21, (len(ground), 1)), 0, 255)
+
+    # Trees: a trunk and a spherical crown each
+    tree_points = np.flatnonzero(kind == 1)
+    which = trees[rng.integers(0, len(trees), len(tree_points))]
+    trunk = rng.random(len(tree_points)) < 0.1
+    direction = rng.normal(size=(len(tree_points), 3))
+    direction /= np.linalg.norm(direction, axis=1, keepdims=True)
+    radius = np.where(trunk, 0.15, which[:, 2] * rng.random(len(tree_points)) ** (1 / 3))
+    height = np.where(trunk, rng.uniform(0, 2.5, len(tree_points)), 2.5 + which[:, 2] + radius * direction[:, 2])
+    xyz[tree_points] = np.column_stack([which[:, 0] + radius * direction[:, 0],
+                                        which[:, 1] + radius * direction[:, 1], height])
+    rgb[tree_points] = np.where(trunk[:, None], [90, 60, 35], [30, 90, 30])
+
+    # House: walls around the footprint and a gable roof
+    house_points = np.flatnonzero(kind == 2)
+    x0, x1, y0, y1 = house
+    wall = rng.random(len(house_points)) < 0.4
+    t = rng.random(len(house_points)) * 2 * ((x1 - x0) + (y1 - y0))
+    wall_x = np.where(t < x1 - x0, x0 + t, np.where(t < (x1 - x0) + (y1 - y0), x1,
+                      np.where(t < 2 * (x1 - x0) + (y1 - y0), x1 - (t - (x1 - x0) - (y1 - y0)), x0)))
+    wall_y = np.where(t < x1 - x0, y0, np.where(t < (x1 - x0) + (y1 - y0), y0 + (t - (x1 - x0)),
+                      np.where(t < 2 * (x1 - x0) + (y1 - y0), y1, y1 - (t - 2 * (x1 - x0) - (y1 - y0)))))
+    roof_x, roof_y = rng.uniform(x0, x1, len(house_points)), rng.uniform(y0, y1, len(house_points))
+    roof_z = 3.0 + 1.5 * (1 - np.abs(roof_y - (y0 + y1) / 2) / ((y1 - y0) / 2))
+    xyz[house_points] = np.column_stack([np.where(wall, wall_x, roof_x), np.where(wall, wall_y, roof_y),
+                                         np.where(wall, rng.uniform(0, 3, len(house_points)), roof_z)])
+    rgb[house_points] = np.where(wall[:, None], [200, 195, 180], [150, 60, 45])
+
+    # Outliers anywhere in the scan volume
+    noise = np.flatnonzero(kind == 3)
+    xyz[noise] = np.column_stack([rng.uniform(0, YARD_WIDTH, len(noise)), rng.uniform(0, YARD_DEPTH, len(noise)),
+                                  rng.uniform(-1, 6, len(noise))])
+    rgb[noise] = rng.integers(0, 256, (len(noise), 3))
+    return xyz, rgb
+
+
+def write_synthetic_yard(path, n_points, seed=0, chunk_size=2000000):
+    """Write a synthetic yard as binary PLY, chunk by chunk (memory bounded by chunk_size)"""
+    dtype = np.dtype([('x', '<f4'), ('y', '<f4'), ('z', '<f4'), ('red', 'u1'), ('green', 'u1'), ('blue', 'u1')])
+    tmp_path = f"{path}.tmp-{os.getpid()}"
+    with open(tmp_path, 'wb') as f:
+        f.write((f"ply\nformat binary_little_endian 1.0\nelement vertex {n_points}\n"
+                 "property float x\nproperty float y\nproperty float z\n"
+                 "property uchar red\nproperty uchar green\nproperty uchar blue\nend_header\n").encode('ascii'))
+        for chunk, start in enumerate(range(0, n_points, chunk_size)):
+            xyz, rgb = synthetic_yard(min(chunk_size, n_points - start), seed, chunk)
+            records = np.empty(len(xyz), dtype=dtype)
+            for i, name in enumerate(('x', 'y', 'z')):
+                records[name] = xyz[:, i]
+            for i, name in enumerate(('red', 'green', 'blue')):
+                records[name] = rgb[:, i]
+            records.tofile(f)
+    os.replace(tmp_path, path)
+    return path
+
+
+def available(case):
+    """None when every module a case needs is importable, else the first missing one"""
+    for module in CASES[case][2]:
+        if importlib.util.find_spec(module) is None:
+            return module
+    return None
+
+
+def case_command(case, input_path, output_path, width, height, max_points):
+    """Command line of one generator run with the shared parameters it accepts"""
+    command, accepts, _ = CASES[case]
+    script = command[0] if os.path.isabs(command[0]) else os.path.join(SCRIPT_DIR, command[0])
+    args = [sys.executable, script, *command[1:], input_path, '--output', output_path]
+    if 'size' in accepts:
+        args += ['--output-width', str(width), '--output-height', str(height)]
+    if 'max_points' in accepts:
+        args += ['--max-points', str(max_points)]
+    return args
+
+
+def run_measured(args, log_path, env=None, timeout=None):
+    """Run a command to completion; (exit code or None on timeout, wall seconds, peak RSS in MB)"""
+    with open(log_path, 'wb') as log:
+        start_time = time.perf_counter()
+        process = subprocess.Popen(args, stdout=log, stderr=subprocess.STDOUT, env=env, cwd=SCRIPT_DIR)
+        timed_out = threading.Event()
+        timer = threading.Timer(timeout, lambda: (timed_out.set(), process.kill())) if timeout else None
+        if timer:
+            timer.start()
+        try:
+            _, status, usage = os.wait4(process.pid, 0)
+        finally:
+            if timer:
+                timer.cancel()
+        seconds = time.perf_counter() - start_time
+    process.returncode = os.waitstatus_to_exitcode(status)
+    # ru_maxrss is in kilobytes on Linux
+    return (None if timed_out.is_set() else process.returncode), seconds, usage.ru_maxrss / 1024
+
+
+def compare_images(path, reference_path):
+    """Pixel differences of an output raster against its reference"""
+    image = np.asarray(Image.open(path).convert('RGB'), dtype=np.int16)
+    reference = np.asarray(Image.open(reference_path).convert('RGB'), dtype=np.int16)
+    if image.shape != reference.shape:
+        return {'shape': list(image.shape), 'reference_shape': list(reference.shape), 'changed_fraction': 1.0}
+    difference = np.abs(image - reference)
+    mse = float((difference.astype(np.float64) ** 2).mean())
+    return {
+        'changed_fraction': float(difference.any(axis=2).mean()),
+        'max_abs_diff': int(difference.max()),
+        'psnr': float('inf') if mse == 0 else float(10 * np.log10(255 ** 2 / mse)),
+    }
+
+
+def benchmark_cloud(name, input_path, cases, args, work_dir):
+    """Run every case on one cloud; list of result dicts"""
+    points = PointCache(os.path.join(work_dir, 'cache')).load(input_path)  # Warm the point cache once
+    env = {**os.environ, 'POINT_CACHE_DIR': os.path.join(work_dir, 'cache')}
+    output_dir = os.path.join(work_dir, 'outputs', name)
+    os.makedirs(output_dir, exist_ok=True)
+
+    results = []
+    for case in cases:
+        result = {'cloud': name, 'points': len(points), 'case': case}
+        missing = available(case)
+        if missing:
+            results.append({**result, 'status': f"skipped (no {missing})"})
+            continue
+        output_path = os.path.join(output_dir, f"{case}.png")
+        if os.path.exists(output_path):
+            os.remove(output_path)
+        command = case_command(case, input_path, output_path, args.width, args.height, args.max_points)
+        code, seconds, peak_rss = run_measured(command, os.path.join(output_dir, f"{case}.log"), env, args.timeout)
+        result.update(seconds=seconds, peak_rss_mb=peak_rss, points_per_second=len(points) / seconds)
+        if code is None:
+            result['status'] = 'timeout'
+        elif code != 0 or not os.path.exists(output_path):
+            result['status'] = f"failed (exit {code}, see {os.path.join(output_dir, case)}.log)"
+        else:
+            result['status'] = 'ok'
+            if args.reference_dir:
+                reference_path = os.path.join(args.reference_dir, name, f"{case}.png")
+                if args.update_reference:
+                    os.makedirs(os.path.dirname(reference_path), exist_ok=True)
+                    with open(output_path, 'rb') as src, open(reference_path, 'wb') as dst:
+                        dst.write(src.read())
+                elif os.path.exists(reference_path):
+                    result['diff'] = compare_images(output_path, reference_path)
+        results.append(result)
+        print(format_result(result), flush=True)
+    return results
+
+
+def format_result(result):
+    line = f"{result['cloud']:<24} {result['case']:<26} "
+    if 'seconds' not in result:
+        return line + result['status']
+    line += (f"{result['seconds']:8.2f}s {result['peak_rss_mb']:9.1f} MB "
+             f"{result['points_per_second'] / 1e6:8.2f} Mpts/s  {result['status']}")
+    if 'diff' in result:
+        diff = result['diff']
+        line += f"  changed {100 * diff['changed_fraction']:.3f}%"
+        if 'max_abs_diff' in diff:
+            line += f" max {diff['max_abs_diff']} PSNR {diff['psnr']:.1f} dB"
+    return line
+
+
+def render_engine(argv):
+    """--render-engine ALGORITHM INPUT --output PATH ...: raster_engine.rasterize on the cached cloud"""
+    parser = argparse.ArgumentParser(prog='benchmark_yard_maps.py --render-engine')
+    parser.add_argument('algorithm', choices=ALGORITHMS)
+    parser.add_argument('input')
+    parser.add_argument('--output', required=True)
+    parser.add_argument('--output-width', type=int, default=1280)
+    parser.add_argument('--output-height', type=int, default=720)
+    parser.add_argument('--max-points', type=int, default=20000000)
+    args = parser.parse_args(argv)
+
+    cached = PointCache().load(args.input)
+    bounds = (*cached.bounds['x'], *cached.bounds['y'])
+    vertices, colors = subsample(cached.xyz, cached.rgb, args.max_points, bounds=bounds)
+    image = rasterize(np.asarray(vertices), None if colors is None else np.asarray(colors),
+                      output_width=args.output_width, output_height=args.output_height, algorithm=args.algorithm)
+    save_raster(image, args.output)
+    return 0
+
+
+def main():
+    if len(sys.argv) > 1 and sys.argv[1] == '--render-engine':
+        return render_engine(sys.argv[2:])
+
+    parser = argparse.ArgumentParser(description='Benchmark the yard map generators on the same clouds')
+    parser.add_argument('--sizes', type=int, nargs='*', default=list(DEFAULT_SIZES),
+                        help='Synthetic cloud sizes in points (default: 100k, 1M, 10M, 50M)')
+    parser.add_argument('--mesh', action='append', default=[], help='Recorded PLY cloud to include (repeatable)')
+    parser.add_argument('--seed', type=int, default=0, help='Synthetic yard seed (default: 0)')
+    parser.add_argument('--cases', nargs='*', choices=sorted(CASES), default=sorted(CASES),
+                        help='Generators to run (default: all available)')
+    parser.add_argument('--width', type=int, default=1280, help='Output width (default: 1280)')
+    parser.add_argument('--height', type=int, default=720, help='Output height (default: 720)')
+    parser.add_argument('--max-points', type=int, default=20000000,
+                        help='Point limit passed to generators that sample (default: 20000000)')
+    parser.add_argument('--timeout', type=float, default=1800, help='Seconds per run before it is killed')
+    parser.add_argument('--work-dir', help='Clouds, point cache and outputs (default: a temporary directory)')
+    parser.add_argument('--reference-dir', help='Reference rasters to diff the outputs against')
+    parser.add_argument('--update-reference', action='store_true',
+                        help='Store the outputs as the new reference instead of diffing')
+    parser.add_argument('--tolerance', type=float, default=0.0,
+                        help='Changed-pixel fraction above which a diff fails the run (default: 0)')
+    parser.add_argument('--json', help='Write the results to this JSON file')
+    args = parser.parse_args()
+    if args.update_reference and not args.reference_dir:
+        parser.error('--update-reference needs --reference-dir')
+
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix='yard_map_benchmark-')
+    os.makedirs(os.path.join(work_dir, 'clouds'), exist_ok=True)
+    clouds = []
+    for size in args.sizes:
+        path = os.path.join(work_dir, 'clouds', f"synthetic_{size}_s{args.seed}.ply")
+        if not os.path.exists(path):
+            start_time = time.perf_counter()
+            write_synthetic_yard(path, size, args.seed)
+            print(f"Generated {size:,} point synthetic yard in {time.perf_counter() - start_time:.1f}s")
+        clouds.append((os.path.splitext(os.path.basename(path))[0], path))
+    clouds += [(os.path.splitext(os.path.basename(mesh))[0], os.path.abspath(mesh)) for mesh in args.mesh]
+
+    print(f"{'cloud':<24} {'case':<26} {'wall':>9} {'peak RSS':>12} {'throughput':>13}")
+    results = []
+    for name, path in clouds:
+        results += benchmark_cloud(name, path, args.cases, args, work_dir)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+    print(f"Outputs and logs in {work_dir}")
+
+    failed = [r for r in results if r['status'] not in ('ok',) and not r['status'].startswith('skipped')]
+    changed = [r for r in results if r.get('diff', {}).get('changed_fraction', 0) > args.tolerance]
+    for result in changed:
+        print(f"Output changed: {result['cloud']} {result['case']}")
+    return 1 if failed or changed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
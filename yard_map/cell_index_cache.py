@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Persisted cell indexes for cached point clouds.
+Binning and height-sorting the cloud is the expensive part of a render. The CSR index
+(cell offsets, point permutation, sorted heights) of every rendered view is stored
+inside the cloud's point-cache entry, so re-rendering that view with another
+algorithm, height window, percentile or coloring only reruns the per-cell reduction.
+Views at a coarser integer-factor resolution are derived from a stored finer index
+without touching the cloud.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import shutil
+import time
+
+from yard_map.raster_engine import (
+    CUDA_EXPANSION_RADII, PROJECTION_AXES, CellIndex, prepare_view, render_index
+)
+
+logger = logging.getLogger(__name__)
+
+INDEX_DIR = 'cell_index'
+
+
+def view_key(projection='xy', custom_bounds=None, rotation=0):
+    """Key of the view geometry (everything that decides which cell a point falls in, except size)"""
+    bounds = None if custom_bounds is None else [float(b) for b in custom_bounds]
+    source = json.dumps([projection, bounds, float(rotation)])
+    return hashlib.sha1(source.encode('utf-8')).hexdigest()[:16]
+
+
+def _stored_sizes(root, key):
+    """[(width, height)] of the indexes stored for a view"""
+    sizes = []
+    if os.path.isdir(root):
+        for name in os.listdir(root):
+            prefix, _, size = name.partition('_')
+            if prefix == key and '.tmp-' not in name and os.path.exists(os.path.join(root, name, 'grid.json')):
+                width, height = size.split('x')
+                sizes.append((int(width), int(height)))
+    return sizes
+
+
+def _save(index, directory):
+    build_dir = f"{directory}.tmp-{os.getpid()}"
+    shutil.rmtree(build_dir, ignore_errors=True)
+    index.save(build_dir)
+    try:
+        os.rename(build_dir, directory)
+    except OSError:
+        # Another process stored the same index first
+        shutil.rmtree(build_dir, ignore_errors=True)
+
+
+def load_view_index(cached, projection='xy', custom_bounds=None, output_width=1280, output_height=720,
+                    rotation=0):
+    """Cell index of a view of a cached point cloud, built and persisted on first use
+
+    Args:
+        cached: point_cache.CachedPointCloud
+    """
+    root = os.path.join(cached.entry_dir, INDEX_DIR)
+    key = view_key(projection, custom_bounds, rotation)
+    directory = os.path.join(root, f"{key}_{output_width}x{output_height}")
+    if os.path.exists(os.path.join(directory, 'grid.json')):
+        index = CellIndex.load(directory)
+        # Indexes of rotated views stored before grids recorded their rotation center are rebuilt
+        if not rotation or index.grid.center is not None:
+            return index
+
+    start_time = time.time()
+    # RasterGrid.fit gives a w/f x h/f view exactly the f x f blocks of the w x h view
+    finer = [(w // output_width, w, h) for w, h in _stored_sizes(root, key)
+             if w % output_width == 0 and h % output_height == 0 and w // output_width == h // output_height]
+    if finer:
+        factor, width, height = min(finer)
+        index = CellIndex.load(os.path.join(root, f"{key}_{width}x{height}")).coarsen(factor)
+        source = f"coarsened {width}x{height} index"
+    else:
+        x, y, depth, grid = prepare_view(cached.xyz, projection, custom_bounds, output_width, output_height, rotation)
+        index = CellIndex.build(x, y, depth, grid)
+        source = f"{len(cached):,} points"
+
+    _save(index, directory)
+    logger.info(f"Built {output_width}x{output_height} cell index from {source} in {time.time() - start_time:.2f}s")
+    return index
+
+
+def rasterize_cached(cached, projection='xy', custom_bounds=None, output_width=1280, output_height=720, rotation=0,
+                     algorithm='bottom_percentile', coloring='true_color', height_window=0.5, percentile=0.4,
+                     expansion_radii=CUDA_EXPANSION_RADII, return_stats=False):
+    """raster_engine.rasterize for a cached point cloud, reusing the persisted cell index of the view"""
+    index = load_view_index(cached, projection, custom_bounds, output_width, output_height, rotation)
+    # Height range of the whole cloud, as rasterize() uses for height coloring
+    z_range = cached.bounds['xyz'[PROJECTION_AXES[projection][2]]]
+    # Cached colors are always uint8 0-255
+    image, stats = render_index(index, cached.rgb, algorithm, coloring, height_window, percentile,
+                                expansion_radii, z_range, 1.0)
+    if return_stats:
+        return image, index.grid, stats
+    return image
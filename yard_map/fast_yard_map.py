@@ -5,13 +5,17 @@ Container-friendly version for Erik Image Manager.
 """
 
 import numpy as np
-import matplotlib
-matplotlib.use('Agg')  # Use non-interactive backend for containers
-import matplotlib.pyplot as plt
 import argparse
 import os
 import sys
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from yard_map.raster_engine import (
+    PROJECTION_AXES, RasterGrid, CellIndex, project_points, select_ground, selected_means, nearest_points
+)
+from yard_map.raster_output import save_raster, georeference
+from yard_map.sampling import DEFAULT_SAMPLING, subsample
+
 try:
     import trimesh
     TRIMESH_AVAILABLE = True
@@ -19,7 +23,7 @@ except ImportError:
     TRIMESH_AVAILABLE = False
 
 
-def load_mesh_vertices(ply_path, max_points=100000):
+def load_mesh_vertices(ply_path, max_points=100000, sampling=DEFAULT_SAMPLING):
     """Load mesh vertices and colors, sampling if too large."""
     if TRIMESH_AVAILABLE:
         try:
@@ -38,10 +42,7 @@ def load_mesh_vertices(ply_path, max_points=100000):
             
             # Sample if too many points
             if len(vertices) > max_points:
-                indices = np.random.choice(len(vertices), max_points, replace=False)
-                vertices = vertices[indices]
-                if colors is not None:
-                    colors = colors[indices]
+                vertices, colors = subsample(vertices, colors, max_points, sampling)
                 print(f"Sampled {max_points} vertices from {len(mesh.vertices)} total")
             
             return vertices, colors
@@ -62,8 +63,8 @@ def create_fast_simple_average_map(vertices, colors=None, projection='xy', grid_
     y_min, y_max = vertices_2d[:, 1].min(), vertices_2d[:, 1].max()
     
     # Calculate grid dimensions  
-    x_bins = int(np.ceil((x_max - x_min) / grid_resolution))
-    y_bins = int(np.ceil((y_max - y_min) / grid_resolution))
+    x_bins = max(1, int(np.ceil((x_max - x_min) / grid_resolution)))
+    y_bins = max(1, int(np.ceil((y_max - y_min) / grid_resolution)))
     
     print(f"Fast simple average: {x_bins}x{y_bins} grid = {x_bins * y_bins} cells")
     
@@ -78,29 +79,18 @@ def create_fast_simple_average_map(vertices, colors=None, projection='xy', grid_
     # Convert to linear indices for easy grouping
     linear_indices = y_indices * x_bins + x_indices
     
-    # Group points by cell and compute averages
-    ground_vertices = []
-    ground_colors = []
+    # Per-cell sums in one pass, then divide by counts of the occupied cells
+    counts = np.bincount(linear_indices, minlength=x_bins * y_bins)
+    occupied = np.flatnonzero(counts)
     
-    for cell_idx in np.unique(linear_indices):
-        mask = linear_indices == cell_idx
-        cell_vertices = vertices[mask]
-        
-        # Average position
-        avg_vertex = np.mean(cell_vertices, axis=0)
-        ground_vertices.append(avg_vertex)
-        
-        # Average color if available
-        if colors is not None:
-            cell_colors = colors[mask]
-            avg_color = np.mean(cell_colors, axis=0)
-            ground_colors.append(avg_color)
+    def cell_average(values):
+        return np.stack([
+            np.bincount(linear_indices, weights=values[:, c], minlength=x_bins * y_bins)[occupied]
+            for c in range(values.shape[1])
+        ], axis=1) / counts[occupied, None]
     
-    ground_vertices = np.array(ground_vertices)
-    if colors is not None:
-        ground_colors = np.array(ground_colors)
-    else:
-        ground_colors = None
+    ground_vertices = cell_average(np.asarray(vertices, dtype=np.float64))
+    ground_colors = cell_average(np.asarray(colors, dtype=np.float64)) if colors is not None else None
         
     print(f"Fast simple average produced {len(ground_vertices)} grid points")
     return ground_vertices, ground_colors
@@ -113,6 +103,9 @@ def create_ground_surface_map(vertices, colors=None, projection='xy', grid_resol
     If algorithm is 'simple_average': always use simple average of all points in cube
     If algorithm is 'kmeans' (default): If all points fit within height_window: simple average (fast)
                                        If points spread across heights: K-means clustering to separate ground from foliage
+    
+    Points are binned once with the vectorized raster engine and all cells are
+    clustered at once.
     """
     print(f"Creating ground surface with cube projection: {grid_resolution}m resolution, height_window: {height_window}m, algorithm: {algorithm}")
     
@@ -124,118 +117,43 @@ def create_ground_surface_map(vertices, colors=None, projection='xy', grid_resol
         print("Using fast simple average algorithm")
         return create_fast_simple_average_map(vertices, colors, projection, grid_resolution)
     
-    # Get 2D projection coordinates (the plane we're viewing)
-    vertices_2d = project_to_2d(vertices, projection)
-    
-    # Determine the depth axis (perpendicular to projection plane)
-    if projection == 'xy':
-        depth_values = vertices[:, 2]  # Z axis for XY projection
-        depth_name = 'Z'
-    elif projection == 'xz':
-        depth_values = vertices[:, 1]  # Y axis for XZ projection  
-        depth_name = 'Y'
-    elif projection == 'yz':
-        depth_values = vertices[:, 0]  # X axis for YZ projection
-        depth_name = 'X'
-    else:
+    if projection not in PROJECTION_AXES:
         return vertices, colors
     
-    # Create pixel grid bounds
-    x_min, x_max = vertices_2d[:, 0].min(), vertices_2d[:, 0].max()
-    y_min, y_max = vertices_2d[:, 1].min(), vertices_2d[:, 1].max()
+    x, y, depth_values = project_points(vertices, projection)
+    depth_name = 'XYZ'[PROJECTION_AXES[projection][2]]
     
-    # Calculate grid dimensions
-    x_pixels = int(np.ceil((x_max - x_min) / grid_resolution))
-    y_pixels = int(np.ceil((y_max - y_min) / grid_resolution))
+    # Pixel grid covering the data; widen by a hair so max-edge points land inside
+    x_min, x_max = float(x.min()), float(x.max())
+    y_min, y_max = float(y.min()), float(y.max())
+    grid = RasterGrid.from_resolution(x_min, x_max + grid_resolution * 1e-6, y_min, y_max + grid_resolution * 1e-6, grid_resolution)
     
-    print(f"Cube projection grid: {x_pixels}x{y_pixels} pixels, depth axis: {depth_name}, clustering window: {grid_resolution}m")
+    print(f"Cube projection grid: {grid.width}x{grid.height} pixels, depth axis: {depth_name}, clustering window: {grid_resolution}m")
     
-    ground_vertices = []
-    ground_colors = [] if colors is not None else None
+    index = CellIndex.build(x, y, depth_values, grid)
+    cell_ids = index.cell_ids()
+    counts = index.counts
     
-    # Project cube from each pixel
-    for i in range(x_pixels):
-        for j in range(y_pixels):
-            # Calculate pixel edges (cube boundaries)
-            pixel_x_min = x_min + i * grid_resolution
-            pixel_x_max = x_min + (i + 1) * grid_resolution
-            pixel_y_min = y_min + j * grid_resolution
-            pixel_y_max = y_min + (j + 1) * grid_resolution
-            
-            # Find all points within the cube projection
-            within_cube = ((vertices_2d[:, 0] >= pixel_x_min) & 
-                          (vertices_2d[:, 0] <= pixel_x_max) &
-                          (vertices_2d[:, 1] >= pixel_y_min) & 
-                          (vertices_2d[:, 1] <= pixel_y_max))
-            
-            if not np.any(within_cube):
-                # No points found in cube, find nearest point as fallback
-                pixel_center_x = (pixel_x_min + pixel_x_max) / 2
-                pixel_center_y = (pixel_y_min + pixel_y_max) / 2
-                distances_2d = np.sqrt((vertices_2d[:, 0] - pixel_center_x)**2 + 
-                                     (vertices_2d[:, 1] - pixel_center_y)**2)
-                closest_idx = np.argmin(distances_2d)
-                ground_vertices.append(vertices[closest_idx])
-                if colors is not None:
-                    ground_colors.append(colors[closest_idx])
-                continue
-            
-            # Get points and depths within cube
-            cube_indices = np.where(within_cube)[0]
-            cube_depths = depth_values[within_cube]
-            
-            # Optimized height filtering: check if all points fit within height window
-            depth_min, depth_max = cube_depths.min(), cube_depths.max()
-            depth_range = depth_max - depth_min
-            
-            if algorithm == 'simple_average':
-                # Always use simple average of all points in cube
-                best_cluster = cube_indices
-            elif height_window is not None and depth_range <= height_window:
-                # All points within height window - simple average (fast path)
-                best_cluster = cube_indices
-            else:
-                # Points spread across heights - use K-means to separate ground from foliage
-                if len(cube_depths) >= 2:
-                    try:
-                        from sklearn.cluster import KMeans
-                        # Use K-means with n=2 to separate ground and foliage
-                        kmeans = KMeans(n_clusters=2, random_state=42, n_init=10)
-                        cluster_labels = kmeans.fit_predict(cube_depths.reshape(-1, 1))
-                        
-                        # Find the cluster with the lower centroid (ground)
-                        centroids = kmeans.cluster_centers_.flatten()
-                        ground_cluster_label = np.argmin(centroids)
-                        
-                        # Select indices belonging to ground cluster
-                        ground_mask = cluster_labels == ground_cluster_label
-                        best_cluster = cube_indices[ground_mask]
-                    except ImportError:
-                        # Fallback to simple lowest point selection if sklearn not available
-                        lowest_idx = np.argmin(cube_depths)
-                        best_cluster = cube_indices[lowest_idx:lowest_idx+1]
-                else:
-                    # Single point or empty - use all points
-                    best_cluster = cube_indices
-            
-            # Average position and color from best cluster
-            if best_cluster is not None and len(best_cluster) > 0:
-                # Average vertex position in the cluster
-                cluster_vertices = vertices[best_cluster]
-                avg_vertex = np.mean(cluster_vertices, axis=0)
-                ground_vertices.append(avg_vertex)
-                
-                # Average colors in the cluster
-                if colors is not None:
-                    cluster_colors = colors[best_cluster]
-                    avg_color = np.mean(cluster_colors, axis=0)
-                    ground_colors.append(avg_color)
+    # Cells whose points all fit in the height window are averaged whole (fast path);
+    # points spread across heights are split by an exact 1D 2-means on height to
+    # separate ground from foliage, keeping the lower cluster
+    selected = select_ground(index, 'kmeans', height_window, cell_ids=cell_ids)
+    clustered = np.count_nonzero(selected < counts)
     
-    ground_vertices = np.array(ground_vertices)
-    if colors is not None:
-        ground_colors = np.array(ground_colors)
+    cells, ground_vertices = selected_means(index, vertices, selected, cell_ids)
+    ground_colors = selected_means(index, colors, selected, cell_ids)[1] if colors is not None else None
+    
+    # No points found in a cube - use the nearest input point as fallback
+    empty_cells = np.flatnonzero(counts == 0)
+    if len(empty_cells) > 0:
+        centers = np.column_stack(grid.cell_centers(empty_cells))
+        nearest = nearest_points(np.column_stack([x, y]), centers)
+        ground_vertices = np.vstack([ground_vertices, vertices[nearest]])
+        if colors is not None:
+            ground_colors = np.vstack([ground_colors, colors[nearest]])
     
-    print(f"Ray-cast ground surface: {len(ground_vertices)} pixels from {len(vertices)} input points")
+    print(f"Ray-cast ground surface: {len(ground_vertices)} pixels from {len(vertices)} input points "
+          f"({clustered} cells split into ground/foliage)")
     
     return ground_vertices, ground_colors
 
@@ -280,21 +198,8 @@ def create_raster_image(x, y, colors, x_min, x_max, y_min, y_max, width, height)
         # Use default green color for ground
         image[pixel_y, pixel_x] = [34, 139, 34]  # Forest green
     
-    # Create matplotlib figure with exact pixel dimensions
-    dpi = 100
-    fig, ax = plt.subplots(figsize=(width/dpi, height/dpi), dpi=dpi)
-    
-    # Display the raster image
-    ax.imshow(image, extent=[x_min, x_max, y_min, y_max], aspect='equal', origin='lower')
-    ax.set_xlim(x_min, x_max)
-    ax.set_ylim(y_min, y_max)
-    ax.axis('off')  # Remove axes for clean raster output
-    
-    # Remove all margins and padding for exact pixel output
-    plt.subplots_adjust(left=0, right=1, top=1, bottom=0)
-    
     print(f"Created {width}x{height} raster image with {len(x)} points")
-    return fig, ax
+    return image
 
 
 def create_yard_map(vertices, colors=None, depth_min=None, depth_max=None, point_size=0.1, colormap='terrain', projection='xy', grid_resolution=0.1, height_window=0.5, algorithm='kmeans', custom_bounds=None, output_width=1280, output_height=720):
@@ -304,6 +209,9 @@ def create_yard_map(vertices, colors=None, depth_min=None, depth_max=None, point
         custom_bounds: [x_min, x_max, y_min, y_max] for fixed view area and scale
         output_width: Output image width in pixels (default: 1280)  
         output_height: Output image height in pixels (default: 720)
+    
+    Returns:
+        uint8 RGB raster when custom_bounds is given, otherwise a matplotlib (fig, ax) chart
     """
     print(f"DEBUG: create_yard_map called with colormap='{colormap}', projection='{projection}'")
     print(f"DEBUG: colors is None: {colors is None}")
@@ -339,9 +247,12 @@ def create_yard_map(vertices, colors=None, depth_min=None, depth_max=None, point
         print(f"Scale: {scale_x:.4f} m/px (X), {scale_y:.4f} m/px (Y)")
         
         # Create fixed-size raster image
-        fig, ax = create_raster_image(x, y, filtered_colors, x_min, x_max, y_min, y_max, output_width, output_height)
+        result = create_raster_image(x, y, filtered_colors, x_min, x_max, y_min, y_max, output_width, output_height)
     else:
-        # Auto-calculate bounds and create matplotlib chart (legacy behavior)
+        # Auto-calculate bounds and create matplotlib chart (legacy behavior, only path that needs matplotlib)
+        import matplotlib
+        matplotlib.use('Agg')  # Use non-interactive backend for containers
+        import matplotlib.pyplot as plt
         fig, ax = plt.subplots(figsize=(12, 12))
         
         # For Erik's position tracking, we prioritize true colors from the mesh
@@ -385,6 +296,7 @@ def create_yard_map(vertices, colors=None, depth_min=None, depth_max=None, point
         ax.set_ylabel(ylabel)
         ax.set_title(f"Erik's Yard {title_suffix}")
         ax.grid(True, alpha=0.3)
+        result = fig, ax
     
     # Print ground surface stats
     print(f"Ground surface bounds:")
@@ -395,7 +307,7 @@ def create_yard_map(vertices, colors=None, depth_min=None, depth_max=None, point
     elif projection == 'yz':
         print(f"  Y=[{x.min():.2f}, {x.max():.2f}], Z=[{y.min():.2f}, {y.max():.2f}] meters")
     
-    return fig, ax
+    return result
 
 
 def main():
@@ -417,7 +329,11 @@ def main():
                        help='Custom view bounds [x_min, x_max, y_min, y_max] for fixed scale and center')
     parser.add_argument('--output-width', type=int, default=1280, help='Output image width in pixels (default: 1280)')
     parser.add_argument('--output-height', type=int, default=720, help='Output image height in pixels (default: 720)')
-    parser.add_argument('--dpi', type=int, default=150, help='Output image DPI (default: 150)')
+    parser.add_argument('--dpi', type=int, default=150, help='Output image DPI for charts (default: 150)')
+    parser.add_argument('--format', choices=['png', 'webp'],
+                       help='Raster image format (default: from the output extension, else png)')
+    parser.add_argument('--compression', type=int,
+                       help='PNG zlib level 0-9 (default: 1) or WebP quality 0-100 (default: lossless)')
     # Keep old parameters for backward compatibility (but ignore them)
     parser.add_argument('--depth-max', type=float, help='DEPRECATED: Ground-up projection used instead')
     parser.add_argument('--depth-min', type=float, help='DEPRECATED: Ground-up projection used instead')
@@ -465,16 +381,20 @@ def main():
     print(f"  Point size: {args.point_size}")
     
     try:
-        fig, ax = create_yard_map(vertices, colors, None, None, args.point_size, 'true_color', args.projection, args.grid_resolution, args.height_window, args.algorithm, args.custom_bounds, args.output_width, args.output_height)
+        result = create_yard_map(vertices, colors, None, None, args.point_size, 'true_color', args.projection, args.grid_resolution, args.height_window, args.algorithm, args.custom_bounds, args.output_width, args.output_height)
         
         print(f"Saving to: {args.output}")
         if args.custom_bounds is not None:
-            # For custom bounds (raster images), save with exact dimensions
-            plt.savefig(args.output, dpi=100, bbox_inches=None, pad_inches=0, facecolor='white')
+            # Raster images are encoded directly, with the view bounds in a JSON sidecar
+            georef = georeference(args.custom_bounds, args.output_width, args.output_height, args.projection,
+                                  algorithm=args.algorithm)
+            save_raster(result, args.output, args.format, args.compression, georef)
         else:
             # For legacy charts, use tight bounding box
-            plt.savefig(args.output, dpi=args.dpi, bbox_inches='tight', facecolor='white')
-        plt.close()
+            import matplotlib.pyplot as plt
+            fig, ax = result
+            fig.savefig(args.output, dpi=args.dpi, bbox_inches='tight', facecolor='white')
+            plt.close(fig)
         
         # Verify file was created and get size
         if os.path.exists(args.output):
@@ -17,21 +17,46 @@ try:
     import numpy as np  # Make sure numpy is available for filtering
     import numba.cuda as cuda
     from numba import types
-    CUDA_AVAILABLE = True
-    print("CUDA acceleration available")
+    CUDA_AVAILABLE = cuda.is_available()
 except ImportError:
     CUDA_AVAILABLE = False
+
+if CUDA_AVAILABLE:
+    print("CUDA acceleration available")
+    cuda_kernel = cuda.jit
+else:
     print("CUDA not available, falling back to CPU")
 
+    def cuda_kernel(func):
+        """Kernels are left uncompiled so the module still imports without a GPU"""
+        return func
+
 try:
     import trimesh
     TRIMESH_AVAILABLE = True
 except ImportError:
     TRIMESH_AVAILABLE = False
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from yard_map.point_cache import load_cached_points
+from yard_map.raster_engine import RasterGrid
+from yard_map.raster_output import save_raster, grid_georeference
+from yard_map.sampling import SAMPLING_METHODS, DEFAULT_SAMPLING, subsample
+
 
-def load_mesh_vertices(ply_path, max_points=100000):
+def load_mesh_vertices(ply_path, max_points=100000, sampling=DEFAULT_SAMPLING):
     """Load mesh vertices and colors, sampling if too large."""
+    cached = load_cached_points(ply_path)
+    if cached is not None:
+        vertices, colors = cached.xyz, cached.rgb
+        print(f"Loaded {len(vertices):,} points from the point cache{' with colors' if colors is not None else ''}",
+              flush=True)
+        if len(vertices) > max_points:
+            bounds = (*cached.bounds['x'], *cached.bounds['y'])
+            vertices, colors = subsample(vertices, colors, max_points, sampling, bounds=bounds)
+            print(f"Sampled {max_points} vertices from {len(cached)} total points")
+        return vertices, colors
+
     if TRIMESH_AVAILABLE:
         try:
             mesh = trimesh.load(ply_path)
@@ -65,10 +90,7 @@ def load_mesh_vertices(ply_path, max_points=100000):
             
             # Sample if too many points
             if len(vertices) > max_points:
-                indices = np.random.choice(len(vertices), max_points, replace=False)
-                vertices = vertices[indices]
-                if colors is not None:
-                    colors = colors[indices]
+                vertices, colors = subsample(vertices, colors, max_points, sampling)
                 print(f"Sampled {max_points} vertices from {len(mesh.vertices)} total points")
             
             return vertices, colors
@@ -90,7 +112,7 @@ def project_to_2d(vertices, projection='xy'):
         raise ValueError(f"Unknown projection: {projection}")
 
 
-@cuda.jit
+@cuda_kernel
 def cuda_build_spatial_grid(vertices_2d, grid_cells, grid_count,
                            x_min, y_min, cell_size, grid_width, grid_height):
     """Build spatial hash grid for fast point lookups."""
@@ -119,7 +141,7 @@ def cuda_build_spatial_grid(vertices_2d, grid_cells, grid_count,
         grid_cells[cell_idx, old_count] = idx
 
 
-@cuda.jit
+@cuda_kernel
 def cuda_process_pixels_with_grid(vertices_2d, vertices_z, colors, 
                                  grid_cells, grid_count,
                                  x_min, y_min, y_max, pixel_size, cell_size,
@@ -348,7 +370,7 @@ def cuda_process_pixels_with_grid(vertices_2d, vertices_z, colors,
         output_image[row, col, 2] = 50
 
 
-@cuda.jit
+@cuda_kernel
 def cuda_simple_average_pixels(vertices_2d, vertices_z, colors, 
                                grid_cells, grid_count,
                                x_min, y_min, y_max, pixel_size, cell_size,
@@ -532,11 +554,13 @@ def cuda_simple_average_pixels(vertices_2d, vertices_z, colors,
 
 def create_cuda_raster_map(vertices, colors=None, projection='xy', grid_resolution=0.1, 
                           height_window=0.5, custom_bounds=None, coloring='true_color', 
-                          output_width=1280, output_height=720, rotation=0, algorithm='bottom_percentile'):
+                          output_width=1280, output_height=720, rotation=0, algorithm='bottom_percentile',
+                          return_grid=False):
     """Create ultra-fast CUDA-accelerated yard map with dynamic resolution.
     
     Args:
         algorithm: 'bottom_percentile' (default) or 'simple_average'
+        return_grid: Also return the RasterGrid georeferencing the image
     """
     
     if not CUDA_AVAILABLE:
@@ -734,6 +758,8 @@ def create_cuda_raster_map(vertices, colors=None, projection='xy', grid_resoluti
     print(f"Pixels per second: {total_pixels / total_time:.0f}")
     print(f"GPU Memory used: {cp.get_default_memory_pool().used_bytes() / 1024 / 1024:.1f} MB")
     
+    if return_grid:
+        return cpu_output, RasterGrid(x_min_adjusted, y_max_adjusted, pixel_size, RASTER_WIDTH, RASTER_HEIGHT)
     return cpu_output
 
 
@@ -786,6 +812,8 @@ def main():
     parser.add_argument('--y-max', type=float, help='Maximum Y coordinate')
     parser.add_argument('--max-points', type=int, default=20000000, 
                        help='Maximum points to process for performance (default: 20000000)')
+    parser.add_argument('--sampling', choices=SAMPLING_METHODS, default=DEFAULT_SAMPLING,
+                       help='How clouds above --max-points are subsampled (default: stratified)')
     parser.add_argument('--output-width', type=int, default=1280, 
                         help='Output image width (default: 1280)')
     parser.add_argument('--output-height', type=int, default=720, 
@@ -796,6 +824,10 @@ def main():
                        help='Rotation angle in degrees (default: 0)')
     parser.add_argument('--algorithm', choices=['bottom_percentile', 'simple_average'], default='bottom_percentile',
                        help='Algorithm: bottom_percentile=lowest 40%% points, simple_average=all points (default: bottom_percentile)')
+    parser.add_argument('--format', choices=['png', 'webp'],
+                       help='Image format (default: from the output extension, else png)')
+    parser.add_argument('--compression', type=int,
+                       help='PNG zlib level 0-9 (default: 1) or WebP quality 0-100 (default: lossless)')
     
     args = parser.parse_args()
     
@@ -805,7 +837,7 @@ def main():
     
     print(f"Loading mesh for CUDA processing: {args.input}")
     
-    vertices, colors = load_mesh_vertices(args.input, args.max_points)
+    vertices, colors = load_mesh_vertices(args.input, args.max_points, args.sampling)
     if vertices is None:
         print("Failed to load mesh vertices")
         return 1
@@ -839,13 +871,17 @@ def main():
             except Exception as e:
                 print(f"Warning: Could not parse bounds '{args.bounds}': {e}")
         
-        img = create_yard_map(
+        if len(vertices) == 0:
+            raise ValueError("No vertices to process!")
+        image, grid = create_cuda_raster_map(
             vertices, colors, args.projection, args.grid_resolution, args.height_window, custom_bounds, args.coloring,
-            args.output_width, args.output_height, args.rotation, args.algorithm
+            args.output_width, args.output_height, args.rotation, args.algorithm, return_grid=True
         )
         
         print(f"Saving {args.output_width}x{args.output_height} CUDA raster to: {args.output}")
-        img.save(args.output)
+        georef = grid_georeference(grid, args.projection, args.rotation,
+                                   algorithm=args.algorithm, coloring=args.coloring)
+        save_raster(image, args.output, args.format, args.compression, georef)
         
         # Verify file was created and get size
         if os.path.exists(args.output):
@@ -10,6 +10,7 @@ matplotlib.use('Agg')  # Use non-interactive backend for containers
 import matplotlib.pyplot as plt
 import argparse
 import os
+import sys
 
 try:
     import trimesh
@@ -17,8 +18,11 @@ try:
 except ImportError:
     TRIMESH_AVAILABLE = False
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from yard_map.sampling import DEFAULT_SAMPLING, sample_indices
 
-def load_mesh_vertices(ply_path, max_points=100000):
+
+def load_mesh_vertices(ply_path, max_points=100000, sampling=DEFAULT_SAMPLING):
     """Load mesh vertices, sampling if too large."""
     if TRIMESH_AVAILABLE:
         try:
@@ -27,8 +31,7 @@ def load_mesh_vertices(ply_path, max_points=100000):
             
             # Sample if too many points
             if len(vertices) > max_points:
-                indices = np.random.choice(len(vertices), max_points, replace=False)
-                vertices = vertices[indices]
+                vertices = vertices[sample_indices(vertices, max_points, sampling)]
                 print(f"Sampled {max_points} vertices from {len(mesh.vertices)} total")
             
             return vertices
@@ -5,17 +5,21 @@ Creates a fixed 640x360 pixel image with complete coverage.
 """
 
 import numpy as np
-import matplotlib
-matplotlib.use('Agg')  # Use non-interactive backend for containers
-import matplotlib.pyplot as plt
 import argparse
 import os
 import sys
 from PIL import Image
 import io
 import time
-from scipy.spatial import cKDTree
-from sklearn.cluster import KMeans
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from yard_map.raster_engine import (
+    RasterGrid, CellIndex, select_ground, reduce_cells, expand_empty_cells, colorize
+)
+from yard_map.sampling import DEFAULT_SAMPLING, subsample
+
+# Pixel radii approximating the ball search (half a pixel diagonal, doubled up to 5 times)
+KMEANS_EXPANSION_RADII = (1, 2, 3, 6, 12)
 
 try:
     import trimesh
@@ -24,7 +28,7 @@ except ImportError:
     TRIMESH_AVAILABLE = False
 
 
-def load_mesh_vertices(ply_path, max_points=100000):
+def load_mesh_vertices(ply_path, max_points=100000, sampling=DEFAULT_SAMPLING):
     """Load mesh vertices and colors, sampling if too large."""
     if TRIMESH_AVAILABLE:
         try:
@@ -43,10 +47,7 @@ def load_mesh_vertices(ply_path, max_points=100000):
             
             # Sample if too many points
             if len(vertices) > max_points:
-                indices = np.random.choice(len(vertices), max_points, replace=False)
-                vertices = vertices[indices]
-                if colors is not None:
-                    colors = colors[indices]
+                vertices, colors = subsample(vertices, colors, max_points, sampling)
                 print(f"Sampled {max_points} vertices from {len(mesh.vertices)} total")
             
             return vertices, colors
@@ -76,6 +77,9 @@ def create_kmeans_raster_map(vertices, colors=None, projection='xy', grid_resolu
     2. Use K-means (N=2) on height values to separate ground from foliage/sky
     3. Select the cluster with lower mean height (ground)
     4. Average colors of ground points
+    
+    The 1D 2-means split is solved exactly for all pixels at once from the
+    height-sorted cell segments (see raster_engine.two_means_split).
     """
     print(f"Creating K-means rasterized map: 640x360 pixels, grid resolution: {grid_resolution}m")
     
@@ -109,136 +113,54 @@ def create_kmeans_raster_map(vertices, colors=None, projection='xy', grid_resolu
     RASTER_WIDTH = 640
     RASTER_HEIGHT = 360
     
-    # Calculate pixel size in world units
-    pixel_width = (x_max - x_min) / RASTER_WIDTH
-    pixel_height = (y_max - y_min) / RASTER_HEIGHT
+    # Calculate pixel size in world units (widened a hair so max-edge points land inside)
+    pixel_width = (x_max - x_min) * (1 + 1e-9) / RASTER_WIDTH
+    pixel_height = (y_max - y_min) * (1 + 1e-9) / RASTER_HEIGHT
     
     print(f"Pixel size: {pixel_width:.4f}m x {pixel_height:.4f}m")
     
-    # Build spatial index for fast nearest neighbor queries
-    print("Building spatial index...")
-    start_index_time = time.time()
-    tree = cKDTree(vertices_2d)
-    print(f"Spatial index built in {time.time() - start_index_time:.2f} seconds")
-    
-    # Initialize output image
-    raster_image = np.zeros((RASTER_HEIGHT, RASTER_WIDTH, 3), dtype=np.uint8)
+    # Pixels are stretched to fill the raster; rescale Y so they are square for the engine
+    y_scale = pixel_width / pixel_height
+    grid = RasterGrid(x_min, y_min * y_scale + RASTER_HEIGHT * pixel_width, pixel_width, RASTER_WIDTH, RASTER_HEIGHT)
     
     print("Processing pixels with K-means clustering...")
     start_time = time.time()
     
-    pixels_processed = 0
-    total_pixels = RASTER_HEIGHT * RASTER_WIDTH
-    max_points_in_pixel = 0
-    total_points_found = 0
-    successful_kmeans = 0
+    index = CellIndex.build(vertices_2d[:, 0], vertices_2d[:, 1] * y_scale, depth_values, grid)
+    cell_ids = index.cell_ids()
+    counts = index.counts
     
-    for row in range(RASTER_HEIGHT):
-        for col in range(RASTER_WIDTH):
-            # Calculate pixel boundaries in world coordinates
-            pixel_x_min = x_min + col * pixel_width
-            pixel_x_max = x_min + (col + 1) * pixel_width
-            pixel_y_min = y_max - (row + 1) * pixel_height  # Image Y is flipped
-            pixel_y_max = y_max - row * pixel_height
-            
-            # Find points within the pixel cube (start with cube, expand if needed)
-            within_cube = ((vertices_2d[:, 0] >= pixel_x_min) & 
-                          (vertices_2d[:, 0] <= pixel_x_max) &
-                          (vertices_2d[:, 1] >= pixel_y_min) & 
-                          (vertices_2d[:, 1] <= pixel_y_max))
-            
-            cube_indices = np.where(within_cube)[0]
-            
-            # If no points in cube, expand search using spatial index
-            if len(cube_indices) == 0:
-                pixel_center = [(pixel_x_min + pixel_x_max) / 2, (pixel_y_min + pixel_y_max) / 2]
-                # Start with pixel diagonal distance
-                search_radius = np.sqrt(pixel_width**2 + pixel_height**2) / 2
-                
-                for expansion in range(5):  # Max 5 expansions
-                    cube_indices = tree.query_ball_point(pixel_center, search_radius)
-                    if len(cube_indices) > 0:
-                        break
-                    search_radius *= 2
-            
-            if len(cube_indices) > 0:
-                # Get heights for K-means clustering
-                cube_heights = depth_values[cube_indices]
-                
-                # Track statistics
-                num_points = len(cube_indices)
-                total_points_found += num_points
-                max_points_in_pixel = max(max_points_in_pixel, num_points)
-                
-                # Ground selection using K-means on height
-                if num_points >= 2:  # Need at least 2 points for K-means
-                    try:
-                        # Reshape heights for sklearn
-                        heights_2d = cube_heights.reshape(-1, 1)
-                        
-                        # K-means with N=2 clusters
-                        kmeans = KMeans(n_clusters=2, random_state=42, n_init=10)
-                        cluster_labels = kmeans.fit_predict(heights_2d)
-                        cluster_centers = kmeans.cluster_centers_.flatten()
-                        
-                        # Select cluster with lower mean height (ground)
-                        ground_cluster_id = np.argmin(cluster_centers)
-                        ground_mask = cluster_labels == ground_cluster_id
-                        ground_indices = np.array(cube_indices)[ground_mask]
-                        
-                        successful_kmeans += 1
-                        
-                    except Exception:
-                        # Fallback: use all points if K-means fails
-                        ground_indices = cube_indices
-                else:
-                    # Use the single point we have
-                    ground_indices = cube_indices
-                
-                # Set pixel color by averaging ground points
-                if len(ground_indices) > 0:
-                    if colors is not None:
-                        # Average colors of ground points
-                        ground_colors = colors[ground_indices]
-                        avg_color = np.mean(ground_colors, axis=0)
-                        # Ensure color values are in 0-255 range
-                        if avg_color.max() <= 1.0:
-                            avg_color *= 255
-                        raster_image[row, col] = avg_color.astype(np.uint8)
-                    else:
-                        # Use height-based coloring if no colors available
-                        avg_height = np.mean(depth_values[ground_indices])
-                        normalized_height = (avg_height - depth_values.min()) / (depth_values.max() - depth_values.min())
-                        color_val = int(normalized_height * 255)
-                        raster_image[row, col] = [color_val, color_val // 2, 100]  # Brown-ish terrain
-                else:
-                    # No ground points - use fallback
-                    raster_image[row, col] = [50, 50, 50]  # Dark gray
-            else:
-                # No points found - use fallback color
-                raster_image[row, col] = [50, 50, 50]  # Dark gray
-            
-            pixels_processed += 1
-            
-            # Progress update every 5000 pixels
-            if pixels_processed % 5000 == 0:
-                progress = (pixels_processed / total_pixels) * 100
-                elapsed = time.time() - start_time
-                pixels_per_sec = pixels_processed / elapsed if elapsed > 0 else 0
-                eta_seconds = (total_pixels - pixels_processed) / pixels_per_sec if pixels_per_sec > 0 else 0
-                print(f"K-means rasterizing: {progress:.1f}% complete, {pixels_per_sec:.0f} pixels/sec, ETA: {eta_seconds:.0f}s")
+    # Ground selection: lower cluster of a 2-means split on height, all pixels at once
+    selected = select_ground(index, 'kmeans', height_window=None, cell_ids=cell_ids)
+    stats = reduce_cells(index, colors, selected, cell_ids)
+    successful_kmeans = int(np.count_nonzero(selected < counts))
+    
+    # Empty pixels widen their search (half a pixel diagonal, doubled up to 5 times)
+    stats = expand_empty_cells(stats, grid, KMEANS_EXPANSION_RADII)
+    
+    if colors is not None:
+        color_scale = 255.0 if len(colors) and np.max(colors) <= 1.0 else 1.0
+        raster_image = colorize(stats, grid, 'true_color', 'kmeans', color_scale=color_scale)
+    else:
+        # Use height-based coloring if no colors available: brown-ish terrain
+        raster_image = np.full((grid.n_cells, 3), 50, dtype=np.uint8)
+        valid = stats['selected'] > 0
+        avg_height = stats['depth_sum'][valid] / stats['selected'][valid]
+        normalized_height = (avg_height - depth_values.min()) / (depth_values.max() - depth_values.min())
+        color_val = (normalized_height * 255).astype(int)
+        raster_image[valid] = np.column_stack([color_val, color_val // 2, np.full_like(color_val, 100)])
+        raster_image = raster_image.reshape(RASTER_HEIGHT, RASTER_WIDTH, 3)
     
     end_time = time.time()
     total_time = end_time - start_time
-    avg_points_per_pixel = total_points_found / pixels_processed if pixels_processed > 0 else 0
-    kmeans_success_rate = (successful_kmeans / pixels_processed) * 100
+    total_pixels = RASTER_HEIGHT * RASTER_WIDTH
     
     print(f"K-means rasterization complete!")
     print(f"Total time: {total_time:.1f} seconds")
-    print(f"Pixels per second: {pixels_processed / total_time:.0f}")
-    print(f"Average points per pixel: {avg_points_per_pixel:.1f}")
-    print(f"Maximum points in a single pixel: {max_points_in_pixel}")
-    print(f"K-means clustering success rate: {kmeans_success_rate:.1f}%")
+    print(f"Pixels per second: {total_pixels / max(total_time, 1e-9):.0f}")
+    print(f"Average points per pixel: {counts.sum() / total_pixels:.1f}")
+    print(f"Maximum points in a single pixel: {counts.max()}")
+    print(f"K-means clustering split rate: {(successful_kmeans / total_pixels) * 100:.1f}%")
     
     return raster_image
 
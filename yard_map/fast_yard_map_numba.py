@@ -0,0 +1,605 @@
+#!/usr/bin/env python3
+"""
+Numba CPU yard map generator mirroring the CUDA kernels in fast_yard_map_cuda.py.
+Same CLI and output; pixels are processed in parallel across all cores with prange,
+for machines without an NVIDIA GPU.
+"""
+
+import numpy as np
+import argparse
+import os
+import sys
+import time
+from PIL import Image
+
+try:
+    from numba import njit, prange
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+    print("Numba not available, using the tiled numpy raster engine")
+
+try:
+    import trimesh
+    TRIMESH_AVAILABLE = True
+except ImportError:
+    TRIMESH_AVAILABLE = False
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from yard_map.point_cache import load_cached_points
+from yard_map.raster_engine import RasterGrid
+from yard_map.raster_output import save_raster, grid_georeference, save_ground_rasters, ground_raster_path
+from yard_map.sampling import SAMPLING_METHODS, DEFAULT_SAMPLING, subsample
+
+# Same limits as the CUDA kernels
+MAX_POINTS_PER_CELL = 100
+MAX_POINTS_PER_PIXEL = 500
+MAX_EXPANSION = 5
+
+COLORING_MODES = {'true_color': 0, 'height': 1, 'path': 2}
+
+
+def load_mesh_vertices(ply_path, max_points=100000, sampling=DEFAULT_SAMPLING):
+    """Load mesh vertices and colors, sampling if too large."""
+    cached = load_cached_points(ply_path)
+    if cached is not None:
+        vertices, colors = cached.xyz, cached.rgb
+        print(f"Loaded {len(vertices):,} points from the point cache{' with colors' if colors is not None else ''}",
+              flush=True)
+        if len(vertices) > max_points:
+            bounds = (*cached.bounds['x'], *cached.bounds['y'])
+            vertices, colors = subsample(vertices, colors, max_points, sampling, bounds=bounds)
+            print(f"Sampled {max_points} vertices from {len(cached)} total points")
+        return vertices, colors
+
+    if TRIMESH_AVAILABLE:
+        try:
+            mesh = trimesh.load(ply_path)
+            vertices = mesh.vertices
+            colors = None
+
+            # Check if mesh has color data
+            if hasattr(mesh.visual, 'vertex_colors') and mesh.visual.vertex_colors is not None:
+                colors = mesh.visual.vertex_colors[:, :3]  # RGB only, drop alpha if present
+                print(f"Found color data: {colors.shape}", flush=True)
+            elif hasattr(mesh.visual, 'face_colors') and mesh.visual.face_colors is not None:
+                print("Found face colors but no vertex colors")
+            else:
+                print("No color data found in mesh")
+
+            print(f"Total points in dataset: {len(vertices):,}")
+
+            # Sample if too many points
+            if len(vertices) > max_points:
+                vertices, colors = subsample(vertices, colors, max_points, sampling)
+                print(f"Sampled {max_points} vertices from {len(mesh.vertices)} total points")
+
+            return vertices, colors
+        except Exception as e:
+            print(f"Trimesh failed: {e}")
+
+    return None, None
+
+
+def project_to_2d(vertices, projection='xy'):
+    """Project 3D vertices to 2D plane."""
+    if projection == 'xy':
+        return vertices[:, [0, 1]]  # Top-down view
+    elif projection == 'xz':
+        return vertices[:, [0, 2]]  # Side view
+    elif projection == 'yz':
+        return vertices[:, [1, 2]]  # Front view
+    else:
+        raise ValueError(f"Unknown projection: {projection}")
+
+
+if NUMBA_AVAILABLE:
+
+    @njit(parallel=True, cache=True)
+    def numba_build_spatial_grid(vertices_2d, x_min, y_min, cell_size, grid_width, grid_height):
+        """Build the spatial grid as CSR arrays (cell offsets + point indices in input order).
+
+        Points outside the grid are clamped into the border cells, as in the CUDA kernel.
+        """
+        num_points = vertices_2d.shape[0]
+        point_cell = np.empty(num_points, dtype=np.int64)
+        for idx in prange(num_points):
+            cell_x = int((vertices_2d[idx, 0] - x_min) / cell_size)
+            cell_y = int((vertices_2d[idx, 1] - y_min) / cell_size)
+            cell_x = min(max(cell_x, 0), grid_width - 1)
+            cell_y = min(max(cell_y, 0), grid_height - 1)
+            point_cell[idx] = cell_y * grid_width + cell_x
+
+        # Counting sort: a serial pass is memory-bound and cheaper than atomics
+        offsets = np.zeros(grid_width * grid_height + 1, dtype=np.int64)
+        for idx in range(num_points):
+            offsets[point_cell[idx] + 1] += 1
+        for cell in range(grid_width * grid_height):
+            offsets[cell + 1] += offsets[cell]
+        fill = offsets[:-1].copy()
+        cell_points = np.empty(num_points, dtype=np.int32)
+        for idx in range(num_points):
+            cell = point_cell[idx]
+            cell_points[fill[cell]] = idx
+            fill[cell] += 1
+        return offsets, cell_points
+
+    @njit(cache=True)
+    def _collect_points(vertices_2d, offsets, cell_points, bx_min, bx_max, by_min, by_max,
+                        x_min, y_min, cell_size, grid_width, grid_height, pixel_points, pixel_count):
+        """Append points inside the box to the pixel's local buffer (first 100 per cell, 500 total)"""
+        cell_x_min = max(int((bx_min - x_min) / cell_size), 0)
+        cell_x_max = min(int((bx_max - x_min) / cell_size), grid_width - 1)
+        cell_y_min = max(int((by_min - y_min) / cell_size), 0)
+        cell_y_max = min(int((by_max - y_min) / cell_size), grid_height - 1)
+
+        for cell_y in range(cell_y_min, cell_y_max + 1):
+            for cell_x in range(cell_x_min, cell_x_max + 1):
+                cell_idx = cell_y * grid_width + cell_x
+                start = offsets[cell_idx]
+                cell_point_count = min(offsets[cell_idx + 1] - start, MAX_POINTS_PER_CELL)
+                for i in range(cell_point_count):
+                    point_idx = cell_points[start + i]
+                    if (vertices_2d[point_idx, 0] >= bx_min and vertices_2d[point_idx, 0] <= bx_max and
+                            vertices_2d[point_idx, 1] >= by_min and vertices_2d[point_idx, 1] <= by_max):
+                        if pixel_count < MAX_POINTS_PER_PIXEL:
+                            pixel_points[pixel_count] = point_idx
+                            pixel_count += 1
+        return pixel_count
+
+    @njit(cache=True)
+    def _gather_pixel(vertices_2d, offsets, cell_points, row, col, x_min, y_min, y_max, pixel_size,
+                      cell_size, grid_width, grid_height, pixel_points):
+        """Points of one pixel, widening the search box (2, 6, 12, 20 pixels) while it is empty"""
+        pixel_x_min = x_min + col * pixel_size
+        pixel_x_max = x_min + (col + 1) * pixel_size
+        pixel_y_min = y_max - (row + 1) * pixel_size  # Image Y is flipped
+        pixel_y_max = y_max - row * pixel_size
+
+        pixel_count = _collect_points(vertices_2d, offsets, cell_points, pixel_x_min, pixel_x_max,
+                                      pixel_y_min, pixel_y_max, x_min, y_min, cell_size,
+                                      grid_width, grid_height, pixel_points, 0)
+        expansion = 1
+        while pixel_count == 0 and expansion <= MAX_EXPANSION:
+            margin = pixel_size * expansion * (expansion - 1)
+            pixel_count = _collect_points(vertices_2d, offsets, cell_points,
+                                          pixel_x_min - margin, pixel_x_max + margin,
+                                          pixel_y_min - margin, pixel_y_max + margin,
+                                          x_min, y_min, cell_size, grid_width, grid_height,
+                                          pixel_points, pixel_count)
+            expansion += 1
+        return pixel_count
+
+    @njit(cache=True)
+    def _write_average_color(output_image, row, col, color_r, color_g, color_b, count):
+        avg_r = color_r / count
+        avg_g = color_g / count
+        avg_b = color_b / count
+        # Ensure 0-255 range
+        if avg_r <= 1.0:
+            avg_r *= 255
+        if avg_g <= 1.0:
+            avg_g *= 255
+        if avg_b <= 1.0:
+            avg_b *= 255
+        output_image[row, col, 0] = int(avg_r)
+        output_image[row, col, 1] = int(avg_g)
+        output_image[row, col, 2] = int(avg_b)
+
+    @njit(cache=True)
+    def _write_terrain_gradient(output_image, row, col, normalized_height):
+        """Blue -> cyan -> green -> yellow -> red"""
+        if normalized_height < 0.25:
+            t = normalized_height * 4
+            output_image[row, col, 0] = 0
+            output_image[row, col, 1] = int((1-t) * 100 + t * 255)
+            output_image[row, col, 2] = int((1-t) * 255 + t * 255)
+        elif normalized_height < 0.5:
+            t = (normalized_height - 0.25) * 4
+            output_image[row, col, 0] = 0
+            output_image[row, col, 1] = int((1-t) * 255 + t * 255)
+            output_image[row, col, 2] = int((1-t) * 255 + t * 0)
+        elif normalized_height < 0.75:
+            t = (normalized_height - 0.5) * 4
+            output_image[row, col, 0] = int((1-t) * 0 + t * 255)
+            output_image[row, col, 1] = int((1-t) * 255 + t * 255)
+            output_image[row, col, 2] = 0
+        else:
+            t = (normalized_height - 0.75) * 4
+            output_image[row, col, 0] = int((1-t) * 255 + t * 255)
+            output_image[row, col, 1] = int((1-t) * 255 + t * 0)
+            output_image[row, col, 2] = 0
+
+    @njit(cache=True)
+    def _write_simple_gradient(output_image, row, col, normalized_height):
+        """Blue -> green -> brown -> white"""
+        if normalized_height <= 0.33:
+            t = normalized_height * 3
+            output_image[row, col, 0] = int((1-t) * 100 + t * 34)
+            output_image[row, col, 1] = int((1-t) * 150 + t * 139)
+            output_image[row, col, 2] = int((1-t) * 255 + t * 34)
+        elif normalized_height <= 0.67:
+            t = (normalized_height - 0.33) * 3
+            output_image[row, col, 0] = int((1-t) * 34 + t * 139)
+            output_image[row, col, 1] = int((1-t) * 139 + t * 90)
+            output_image[row, col, 2] = int((1-t) * 34 + t * 45)
+        else:
+            t = (normalized_height - 0.67) * 3
+            output_image[row, col, 0] = int((1-t) * 139 + t * 255)
+            output_image[row, col, 1] = int((1-t) * 90 + t * 255)
+            output_image[row, col, 2] = int((1-t) * 45 + t * 255)
+
+    @njit(parallel=True, cache=True)
+    def numba_process_pixels_with_grid(vertices_2d, vertices_z, colors, offsets, cell_points,
+                                       x_min, y_min, y_max, pixel_size, cell_size,
+                                       output_image, coloring_mode, z_min, z_max,
+                                       raster_width, raster_height, grid_width, grid_height):
+        """Bottom percentile kernel: average the lowest 40% of each pixel's points"""
+        for row in prange(raster_height):
+            # Per-row local buffers, reused for every pixel in the row
+            pixel_points = np.empty(MAX_POINTS_PER_PIXEL, dtype=np.int64)
+            pixel_heights = np.empty(MAX_POINTS_PER_PIXEL, dtype=np.float32)
+
+            for col in range(raster_width):
+                pixel_count = _gather_pixel(vertices_2d, offsets, cell_points, row, col, x_min, y_min, y_max,
+                                            pixel_size, cell_size, grid_width, grid_height, pixel_points)
+                if pixel_count == 0:
+                    # No points found - gray
+                    output_image[row, col, 0] = 50
+                    output_image[row, col, 1] = 50
+                    output_image[row, col, 2] = 50
+                    continue
+
+                for j in range(pixel_count):
+                    pixel_heights[j] = vertices_z[pixel_points[j]]
+                sorted_heights = np.sort(pixel_heights[:pixel_count])
+
+                # Take lowest 40% of points, but at least 1 point
+                percentile_count = max(1, int(pixel_count * 0.4))
+                height_threshold = sorted_heights[percentile_count - 1]
+
+                valid_points = 0
+                color_r = 0.0
+                color_g = 0.0
+                color_b = 0.0
+                max_height = sorted_heights[0]
+                for j in range(pixel_count):
+                    point_idx = pixel_points[j]
+                    point_height = vertices_z[point_idx]
+                    if point_height <= height_threshold:
+                        valid_points += 1
+                        if coloring_mode == 0:
+                            color_r += colors[point_idx, 0]
+                            color_g += colors[point_idx, 1]
+                            color_b += colors[point_idx, 2]
+                        if point_height > max_height:
+                            max_height = point_height
+
+                if coloring_mode == 0:  # true_color
+                    _write_average_color(output_image, row, col, color_r, color_g, color_b, valid_points)
+                elif coloring_mode == 1:  # height gradient of the highest ground point
+                    height_range = z_max - z_min
+                    normalized_height = (max_height - z_min) / height_range if height_range > 0 else 0.0
+                    _write_terrain_gradient(output_image, row, col, normalized_height)
+                else:  # path visualization: green if most points were kept
+                    if float(valid_points) / float(pixel_count) >= 0.7:
+                        output_image[row, col, 0] = 0
+                        output_image[row, col, 1] = 255
+                        output_image[row, col, 2] = 0
+                    else:
+                        output_image[row, col, 0] = 255
+                        output_image[row, col, 1] = 0
+                        output_image[row, col, 2] = 0
+
+    @njit(parallel=True, cache=True)
+    def numba_simple_average_pixels(vertices_2d, vertices_z, colors, offsets, cell_points,
+                                    x_min, y_min, y_max, pixel_size, cell_size,
+                                    output_image, coloring_mode, z_min, z_max,
+                                    raster_width, raster_height, grid_width, grid_height):
+        """Simple average kernel: average ALL points in each pixel"""
+        for row in prange(raster_height):
+            pixel_points = np.empty(MAX_POINTS_PER_PIXEL, dtype=np.int64)
+
+            for col in range(raster_width):
+                pixel_count = _gather_pixel(vertices_2d, offsets, cell_points, row, col, x_min, y_min, y_max,
+                                            pixel_size, cell_size, grid_width, grid_height, pixel_points)
+                if pixel_count == 0:
+                    # No points found - gray
+                    output_image[row, col, 0] = 128
+                    output_image[row, col, 1] = 128
+                    output_image[row, col, 2] = 128
+                    continue
+
+                color_r = 0.0
+                color_g = 0.0
+                color_b = 0.0
+                height_sum = 0.0
+                for j in range(pixel_count):
+                    point_idx = pixel_points[j]
+                    if coloring_mode == 0:
+                        color_r += colors[point_idx, 0]
+                        color_g += colors[point_idx, 1]
+                        color_b += colors[point_idx, 2]
+                    height_sum += vertices_z[point_idx]
+
+                if coloring_mode == 0:  # true_color
+                    _write_average_color(output_image, row, col, color_r, color_g, color_b, pixel_count)
+                elif coloring_mode == 1:  # height gradient of the average height
+                    height_range = z_max - z_min
+                    avg_height = height_sum / pixel_count
+                    normalized_height = (avg_height - z_min) / height_range if height_range > 0 else 0.0
+                    _write_simple_gradient(output_image, row, col, normalized_height)
+                else:  # simple average visualization: uniform forest green
+                    output_image[row, col, 0] = 34
+                    output_image[row, col, 1] = 139
+                    output_image[row, col, 2] = 34
+
+
+def create_numba_raster_map(vertices, colors=None, projection='xy', grid_resolution=0.1,
+                            height_window=0.5, custom_bounds=None, coloring='true_color',
+                            output_width=1280, output_height=720, rotation=0, algorithm='bottom_percentile',
+                            return_grid=False):
+    """Create a yard map on the CPU with the same view logic and kernels as the CUDA generator.
+
+    Args:
+        algorithm: 'bottom_percentile' (default) or 'simple_average'
+        return_grid: Also return the RasterGrid georeferencing the image
+    """
+    if not NUMBA_AVAILABLE:
+        from yard_map.raster_engine import prepare_view
+        from yard_map.tiled_raster import rasterize_tiled
+        image = rasterize_tiled(vertices, colors, projection, custom_bounds, output_width, output_height,
+                                rotation, algorithm, coloring, height_window)
+        if return_grid:
+            return image, prepare_view(vertices, projection, custom_bounds, output_width, output_height, rotation)[3]
+        return image
+
+    print(f"Creating Numba CPU raster map: {output_width}x{output_height} pixels")
+    start_time = time.time()
+
+    # Get 2D projection coordinates and depths
+    vertices_2d = np.array(project_to_2d(vertices, projection), dtype=np.float64)
+
+    # Apply rotation if specified
+    center = None
+    if rotation != 0:
+        print(f"Applying rotation: {rotation}°")
+        angle_rad = np.radians(rotation)
+        cos_a = np.cos(angle_rad)
+        sin_a = np.sin(angle_rad)
+
+        # Rotate around the centroid
+        center_x = vertices_2d[:, 0].mean()
+        center_y = vertices_2d[:, 1].mean()
+        x_centered = vertices_2d[:, 0] - center_x
+        y_centered = vertices_2d[:, 1] - center_y
+        vertices_2d[:, 0] = x_centered * cos_a - y_centered * sin_a + center_x
+        vertices_2d[:, 1] = x_centered * sin_a + y_centered * cos_a + center_y
+        center = (center_x, center_y)
+
+    depth_axis = {'xy': 2, 'xz': 1, 'yz': 0}[projection]
+    depth_values = np.ascontiguousarray(vertices[:, depth_axis], dtype=np.float32)
+
+    # Bounds are ONLY for setting the view window, NOT for filtering points
+    if custom_bounds:
+        x_min, x_max, y_min, y_max = custom_bounds
+        print(f"Using custom bounds for view window: X=[{x_min:.2f}, {x_max:.2f}], Y=[{y_min:.2f}, {y_max:.2f}] meters")
+    else:
+        # Use percentile bounds to exclude outliers from initial view
+        x_min, x_max = np.percentile(vertices_2d[:, 0], [1, 99])
+        y_min, y_max = np.percentile(vertices_2d[:, 1], [1, 99])
+        print(f"Using 99% bounds: X=[{x_min:.2f}, {x_max:.2f}], Y=[{y_min:.2f}, {y_max:.2f}] meters")
+
+    # Uniform pixel size for 1:1 sampling, padding the short axis evenly
+    data_width = x_max - x_min
+    data_height = y_max - y_min
+    if data_width / data_height > output_width / output_height:
+        pixel_size = data_width / output_width
+        height_padding = (output_height * pixel_size - data_height) / 2
+        x_min_adjusted, x_max_adjusted = x_min, x_max
+        y_min_adjusted, y_max_adjusted = y_min - height_padding, y_max + height_padding
+    else:
+        pixel_size = data_height / output_height
+        width_padding = (output_width * pixel_size - data_width) / 2
+        x_min_adjusted, x_max_adjusted = x_min - width_padding, x_max + width_padding
+        y_min_adjusted, y_max_adjusted = y_min, y_max
+
+    print(f"1:1 Pixel size: {pixel_size:.4f}m x {pixel_size:.4f}m")
+    print(f"Adjusted bounds: X=[{x_min_adjusted:.2f}, {x_max_adjusted:.2f}], Y=[{y_min_adjusted:.2f}, {y_max_adjusted:.2f}]")
+
+    coloring_mode = COLORING_MODES.get(coloring, 0)
+    if colors is not None:
+        point_colors = np.ascontiguousarray(colors, dtype=np.float32)
+    else:
+        point_colors = np.zeros((len(vertices), 3), dtype=np.float32)
+        if coloring_mode == 0:
+            coloring_mode = 1  # No colors - fall back to height gradient
+
+    z_min = float(depth_values.min())
+    z_max = float(depth_values.max())
+
+    # Spatial grid with pixel-sized cells
+    cell_size = pixel_size
+    grid_width = int((x_max_adjusted - x_min_adjusted) / cell_size) + 1
+    grid_height = int((y_max_adjusted - y_min_adjusted) / cell_size) + 1
+    print(f"Spatial grid: {grid_width}x{grid_height} cells, cell size: {cell_size:.4f}m")
+
+    offsets, cell_points = numba_build_spatial_grid(vertices_2d, x_min_adjusted, y_min_adjusted,
+                                                    cell_size, grid_width, grid_height)
+    print(f"Spatial grid built in {time.time() - start_time:.2f}s")
+
+    output_image = np.zeros((output_height, output_width, 3), dtype=np.uint8)
+    kernel = numba_simple_average_pixels if algorithm == 'simple_average' else numba_process_pixels_with_grid
+    print(f"Using algorithm: {algorithm}")
+    kernel(vertices_2d, depth_values, point_colors, offsets, cell_points,
+           x_min_adjusted, y_min_adjusted, y_max_adjusted, pixel_size, cell_size,
+           output_image, coloring_mode, z_min, z_max,
+           output_width, output_height, grid_width, grid_height)
+
+    total_time = time.time() - start_time
+    total_pixels = output_width * output_height
+    print(f"Numba rasterization complete!")
+    print(f"Total time: {total_time:.3f} seconds")
+    print(f"Pixels per second: {total_pixels / total_time:.0f}")
+
+    if return_grid:
+        return output_image, RasterGrid(x_min_adjusted, y_max_adjusted, pixel_size, output_width, output_height,
+                                        center)
+    return output_image
+
+
+def create_yard_map(vertices, colors=None, projection='xy', grid_resolution=0.1,
+                   height_window=0.5, custom_bounds=None, coloring='true_color',
+                   output_width=1280, output_height=720, rotation=0, algorithm='bottom_percentile'):
+    """Create rasterized yard map on the CPU with dynamic resolution."""
+    print(f"Creating Numba CPU yard map:")
+    print(f"  Output: {output_width}x{output_height} raster image")
+    print(f"  Projection: {projection}")
+    print(f"  Coloring: {coloring}")
+    print(f"  Colors available: {colors is not None}")
+    if custom_bounds:
+        print(f"  Custom bounds: X=[{custom_bounds[0]:.2f}, {custom_bounds[1]:.2f}], Y=[{custom_bounds[2]:.2f}, {custom_bounds[3]:.2f}]")
+
+    if len(vertices) == 0:
+        raise ValueError("No vertices to process!")
+
+    raster_image = create_numba_raster_map(
+        vertices, colors, projection, grid_resolution, height_window, custom_bounds, coloring,
+        output_width, output_height, rotation, algorithm
+    )
+
+    return Image.fromarray(raster_image, mode='RGB')
+
+
+def main():
+    print("Numba CPU Yard Map Generator", flush=True)
+
+    parser = argparse.ArgumentParser(description='Generate yard maps with Numba CPU parallel processing')
+    parser.add_argument('input', help='Input PLY mesh file path')
+    parser.add_argument('--output', '-o', default='yard_map_numba.png', help='Output image path')
+    parser.add_argument('--grid-resolution', type=float, default=0.1, help='Grid resolution in meters (default: 0.1m)')
+    parser.add_argument('--height-window', type=float, default=0.5, help='Height window in meters (default: 0.5m)')
+    parser.add_argument('--coloring', choices=['true_color', 'height', 'path'], default='true_color',
+                       help='Coloring mode: true_color=mesh colors, height=elevation gradient, path=algorithm visualization')
+    parser.add_argument('--bounds', type=str, help='Custom bounds as x_min,x_max,y_min,y_max for focused rendering')
+    parser.add_argument('--x-min', type=float, help='Minimum X coordinate')
+    parser.add_argument('--x-max', type=float, help='Maximum X coordinate')
+    parser.add_argument('--y-min', type=float, help='Minimum Y coordinate')
+    parser.add_argument('--y-max', type=float, help='Maximum Y coordinate')
+    parser.add_argument('--max-points', type=int, default=20000000,
+                       help='Maximum points to process for performance (default: 20000000)')
+    parser.add_argument('--sampling', choices=SAMPLING_METHODS, default=DEFAULT_SAMPLING,
+                       help='How clouds above --max-points are subsampled (default: stratified)')
+    parser.add_argument('--output-width', type=int, default=1280,
+                        help='Output image width (default: 1280)')
+    parser.add_argument('--output-height', type=int, default=720,
+                        help='Output image height (default: 720)')
+    parser.add_argument('--projection', '-p', choices=['xy', 'xz', 'yz'],
+                       default='xy', help='Projection plane: xy=top-down, xz=side, yz=front (default: xy)')
+    parser.add_argument('--rotation', type=float, default=0,
+                       help='Rotation angle in degrees (default: 0)')
+    parser.add_argument('--algorithm', choices=['bottom_percentile', 'simple_average'], default='bottom_percentile',
+                       help='Algorithm: bottom_percentile=lowest 40%% points, simple_average=all points (default: bottom_percentile)')
+    parser.add_argument('--stream', action='store_true',
+                        help='Stream the PLY vertex block in chunks instead of loading (and sampling) the cloud')
+    parser.add_argument('--chunk-size', type=int, default=2000000,
+                        help='Vertices per chunk when streaming (default: 2000000)')
+    parser.add_argument('--cell-index', action='store_true',
+                        help='Render from the point cache, reusing the persisted cell index of this view')
+    parser.add_argument('--format', choices=['png', 'webp'],
+                        help='Image format (default: from the output extension, else png)')
+    parser.add_argument('--compression', type=int,
+                        help='PNG zlib level 0-9 (default: 1) or WebP quality 0-100 (default: lossless)')
+    parser.add_argument('--ground-raster', action='store_true',
+                        help='Also save the float32 ground elevation and point count rasters of the render '
+                             '(<output>_ground.npz)')
+
+    args = parser.parse_args()
+
+    if not os.path.exists(args.input):
+        print(f"Error: Input file '{args.input}' not found")
+        return 1
+
+    try:
+        # Parse custom bounds if provided
+        custom_bounds = None
+        if args.x_min is not None and args.x_max is not None and args.y_min is not None and args.y_max is not None:
+            custom_bounds = [args.x_min, args.x_max, args.y_min, args.y_max]
+        elif args.bounds:
+            try:
+                bounds_values = [float(x.strip()) for x in args.bounds.split(',')]
+                if len(bounds_values) == 4:
+                    custom_bounds = bounds_values
+                else:
+                    print("Warning: Invalid bounds format, using full data bounds")
+            except Exception as e:
+                print(f"Warning: Could not parse bounds '{args.bounds}': {e}")
+
+        stats = None
+        cached = load_cached_points(args.input) if args.cell_index and not args.stream else None
+        if cached is not None:
+            from yard_map.cell_index_cache import rasterize_cached
+            print(f"Rendering {len(cached):,} cached points through the persisted cell index")
+            start_time = time.time()
+            image, grid, stats = rasterize_cached(
+                cached, args.projection, custom_bounds, args.output_width, args.output_height, args.rotation,
+                args.algorithm, args.coloring, args.height_window, return_stats=True
+            )
+            print(f"Indexed rasterization completed in {time.time() - start_time:.2f}s")
+        elif args.stream:
+            from yard_map.streaming_raster import rasterize_ply_streaming
+            print(f"Streaming point cloud in chunks of {args.chunk_size}: {args.input}")
+            start_time = time.time()
+            image, grid, stats = rasterize_ply_streaming(
+                args.input, args.projection, custom_bounds, args.output_width, args.output_height, args.rotation,
+                args.algorithm, args.coloring, args.height_window, chunk_size=args.chunk_size, return_stats=True
+            )
+            print(f"Streaming rasterization completed in {time.time() - start_time:.2f}s")
+        else:
+            print(f"Loading mesh for CPU processing: {args.input}")
+            vertices, colors = load_mesh_vertices(args.input, args.max_points, args.sampling)
+            if vertices is None:
+                print("Failed to load mesh vertices")
+                return 1
+            print(f"Loaded {len(vertices)} vertices")
+            if len(vertices) == 0:
+                raise ValueError("No vertices to process!")
+
+            if args.ground_raster:
+                # The per-cell statistics come from the vectorized engine (same algorithms as the kernels)
+                from yard_map.raster_engine import rasterize
+                image, grid, stats = rasterize(
+                    vertices, colors, args.projection, custom_bounds, args.output_width, args.output_height,
+                    args.rotation, args.algorithm, args.coloring, args.height_window, return_stats=True
+                )
+            else:
+                image, grid = create_numba_raster_map(
+                    vertices, colors, args.projection, args.grid_resolution, args.height_window, custom_bounds,
+                    args.coloring, args.output_width, args.output_height, args.rotation, args.algorithm,
+                    return_grid=True
+                )
+
+        print(f"Saving {args.output_width}x{args.output_height} raster to: {args.output}")
+        georef = grid_georeference(grid, args.projection, args.rotation,
+                                   algorithm=args.algorithm, coloring=args.coloring)
+        save_raster(image, args.output, args.format, args.compression, georef)
+        if args.ground_raster:
+            size = save_ground_rasters(stats, grid, ground_raster_path(args.output), georef)
+            print(f"Saved ground elevation raster ({size / 1024:.1f} KB) to {ground_raster_path(args.output)}")
+
+        if os.path.exists(args.output):
+            file_size = os.path.getsize(args.output) / 1024  # KB
+            print(f"Generated {args.output_width}x{args.output_height} raster map saved ({file_size:.1f} KB)")
+        else:
+            raise FileNotFoundError(f"Failed to save output file: {args.output}")
+
+        print("Done!")
+        return 0
+
+    except Exception as e:
+        print(f"Error: {e}")
+        return 1
+
+
+if __name__ == '__main__':
+    exit(main())
@@ -5,14 +5,12 @@ Creates a fixed 640x360 pixel image with complete coverage.
 """
 
 import numpy as np
-import matplotlib
-matplotlib.use('Agg')  # Use non-interactive backend for containers
-import matplotlib.pyplot as plt
 import argparse
 import os
 import sys
 from PIL import Image
 import io
+import itertools
 import time
 from scipy.spatial import cKDTree
 
@@ -22,8 +20,11 @@ try:
 except ImportError:
     TRIMESH_AVAILABLE = False
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from yard_map.sampling import DEFAULT_SAMPLING, subsample
 
-def load_mesh_vertices(ply_path, max_points=100000):
+
+def load_mesh_vertices(ply_path, max_points=100000, sampling=DEFAULT_SAMPLING):
     """Load mesh vertices and colors, sampling if too large."""
     if TRIMESH_AVAILABLE:
         try:
@@ -42,10 +43,7 @@ def load_mesh_vertices(ply_path, max_points=100000):
             
             # Sample if too many points
             if len(vertices) > max_points:
-                indices = np.random.choice(len(vertices), max_points, replace=False)
-                vertices = vertices[indices]
-                if colors is not None:
-                    colors = colors[indices]
+                vertices, colors = subsample(vertices, colors, max_points, sampling)
                 print(f"Sampled {max_points} vertices from {len(mesh.vertices)} total")
             
             return vertices, colors
@@ -116,99 +114,88 @@ def create_optimized_raster_map(vertices, colors=None, projection='xy', grid_res
     tree = cKDTree(vertices_2d)
     print(f"Spatial index built in {time.time() - start_index_time:.2f} seconds")
     
-    # Initialize output image
-    raster_image = np.zeros((RASTER_HEIGHT, RASTER_WIDTH, 3), dtype=np.uint8)
-    
-    # Pre-compute all pixel centers
-    pixel_centers = np.zeros((RASTER_HEIGHT * RASTER_WIDTH, 2))
-    for row in range(RASTER_HEIGHT):
-        for col in range(RASTER_WIDTH):
-            idx = row * RASTER_WIDTH + col
-            pixel_x = x_min + (col + 0.5) * pixel_width
-            pixel_y = y_max - (row + 0.5) * pixel_height  # Image Y is flipped
-            pixel_centers[idx] = [pixel_x, pixel_y]
+    # Pixel centers, row by row (image Y is flipped)
+    rows, cols = np.divmod(np.arange(RASTER_HEIGHT * RASTER_WIDTH), RASTER_WIDTH)
+    pixel_centers = np.column_stack([x_min + (cols + 0.5) * pixel_width, y_max - (rows + 0.5) * pixel_height])
     
     print("Processing pixels in batches...")
     start_time = time.time()
     
-    # Process pixels in batches for efficiency
-    batch_size = 1000
+    # Search radius per pixel: the first of up to 5 doublings that finds any points,
+    # decided with one batched count query per expansion over the pixels still empty
     total_pixels = RASTER_HEIGHT * RASTER_WIDTH
+    initial_radius = max(pixel_width, pixel_height) * 2
+    pixel_radius = np.full(total_pixels, np.nan)
+    pending = np.arange(total_pixels)
+    radius = initial_radius
+    for expansion in range(5):  # Max 5 expansions
+        found = tree.query_ball_point(pixel_centers[pending], radius, return_length=True, workers=-1) > 0
+        pixel_radius[pending[found]] = radius
+        pending = pending[~found]
+        if len(pending) == 0:
+            break
+        radius *= 2
+    
+    # No points found - use fallback color
+    raster_image = np.empty((total_pixels, 3), dtype=np.uint8)
+    raster_image[:] = [50, 50, 50]  # Dark gray
     pixels_processed = 0
     max_points_in_pixel = 0
     total_points_found = 0
+    depth_min, depth_max = depth_values.min(), depth_values.max()
     
-    for batch_start in range(0, total_pixels, batch_size):
-        batch_end = min(batch_start + batch_size, total_pixels)
-        batch_centers = pixel_centers[batch_start:batch_end]
-        
-        # Find nearest neighbors for the entire batch
-        # Start with a reasonable radius - we'll expand if needed
-        initial_radius = max(pixel_width, pixel_height) * 2
-        
-        for i, center in enumerate(batch_centers):
-            pixel_idx = batch_start + i
-            row = pixel_idx // RASTER_WIDTH
-            col = pixel_idx % RASTER_WIDTH
+    # Process pixels of one radius in batches; neighbour lists are flattened and
+    # ground-selected for the whole batch at once
+    batch_size = 4096
+    for radius in np.unique(pixel_radius[~np.isnan(pixel_radius)]):
+        pixels = np.flatnonzero(pixel_radius == radius)
+        for batch_start in range(0, len(pixels), batch_size):
+            batch = pixels[batch_start:batch_start + batch_size]
+            neighbours = tree.query_ball_point(pixel_centers[batch], radius, workers=-1)
+            lengths = np.fromiter(map(len, neighbours), dtype=np.int64, count=len(batch))
+            found_indices = np.fromiter(itertools.chain.from_iterable(neighbours), dtype=np.int64, count=lengths.sum())
+            owner = np.repeat(np.arange(len(batch)), lengths)
             
-            # Find points within expanding radius
-            radius = initial_radius
-            found_indices = []
+            # Track statistics
+            total_points_found += int(lengths.sum())
+            max_points_in_pixel = max(max_points_in_pixel, int(lengths.max()))
             
-            for expansion in range(5):  # Max 5 expansions
-                indices = tree.query_ball_point(center, radius)
-                if len(indices) > 0:
-                    found_indices = indices
-                    break
-                radius *= 2
+            # Simple ground selection: lowest 25% of points by depth, all points if 4 or fewer
+            order = np.lexsort((depth_values[found_indices], owner))
+            found_indices, owner = found_indices[order], owner[order]
+            rank = np.arange(len(owner)) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+            ground_count = np.where(lengths > 4, np.maximum(1, lengths // 4), lengths)
+            ground = rank < ground_count[owner]
+            ground_indices, ground_owner = found_indices[ground], owner[ground]
             
-            if found_indices:
-                # Get depths and apply height clustering
-                found_depths = depth_values[found_indices]
-                
-                # Track statistics
-                num_points = len(found_indices)
-                total_points_found += num_points
-                max_points_in_pixel = max(max_points_in_pixel, num_points)
-                
-                # Simple ground selection: take lowest 25% of points
-                if len(found_depths) > 4:
-                    # Sort by depth and take lowest quartile
-                    sorted_indices = np.argsort(found_depths)
-                    ground_count = max(1, len(sorted_indices) // 4)
-                    ground_indices = [found_indices[idx] for idx in sorted_indices[:ground_count]]
-                else:
-                    # Use all points if we have few
-                    ground_indices = found_indices
-                
-                # Set pixel color
-                if colors is not None:
-                    # Average colors of ground points
-                    ground_colors = colors[ground_indices]
-                    avg_color = np.mean(ground_colors, axis=0)
-                    # Ensure color values are in 0-255 range
-                    if avg_color.max() <= 1.0:
-                        avg_color *= 255
-                    raster_image[row, col] = avg_color.astype(np.uint8)
-                else:
-                    # Use height-based coloring if no colors available
-                    avg_depth = np.mean(depth_values[ground_indices])
-                    normalized_height = (avg_depth - depth_values.min()) / (depth_values.max() - depth_values.min())
-                    color_val = int(normalized_height * 255)
-                    raster_image[row, col] = [color_val, color_val // 2, 100]  # Brown-ish terrain
+            # Set pixel colors
+            if colors is not None:
+                # Average colors of ground points
+                avg_color = np.stack([
+                    np.bincount(ground_owner, weights=colors[ground_indices, c], minlength=len(batch))
+                    for c in range(3)
+                ], axis=1) / ground_count[:, None]
+                # Ensure color values are in 0-255 range
+                avg_color[avg_color.max(axis=1) <= 1.0] *= 255
+                raster_image[batch] = avg_color.astype(np.uint8)
             else:
-                # No points found - use fallback color
-                raster_image[row, col] = [50, 50, 50]  # Dark gray
+                # Use height-based coloring if no colors available
+                avg_depth = np.bincount(ground_owner, weights=depth_values[ground_indices],
+                                        minlength=len(batch)) / ground_count
+                color_val = ((avg_depth - depth_min) / (depth_max - depth_min) * 255).astype(np.int64)
+                raster_image[batch] = np.column_stack([color_val, color_val // 2, np.full(len(batch), 100)])
             
-            pixels_processed += 1
-        
-        # Progress update every batch
-        if batch_start % (batch_size * 10) == 0:
-            progress = (pixels_processed / total_pixels) * 100
-            elapsed = time.time() - start_time
-            pixels_per_sec = pixels_processed / elapsed if elapsed > 0 else 0
-            eta_seconds = (total_pixels - pixels_processed) / pixels_per_sec if pixels_per_sec > 0 else 0
-            print(f"Rasterizing: {progress:.1f}% complete, {pixels_per_sec:.0f} pixels/sec, ETA: {eta_seconds:.0f}s")
+            pixels_processed += len(batch)
+            
+            # Progress update every 10 batches
+            if batch_start % (batch_size * 10) == 0:
+                progress = (pixels_processed / total_pixels) * 100
+                elapsed = time.time() - start_time
+                pixels_per_sec = pixels_processed / elapsed if elapsed > 0 else 0
+                print(f"Rasterizing: {progress:.1f}% complete, {pixels_per_sec:.0f} pixels/sec")
+    
+    pixels_processed = total_pixels
+    raster_image = raster_image.reshape(RASTER_HEIGHT, RASTER_WIDTH, 3)
     
     end_time = time.time()
     total_time = end_time - start_time
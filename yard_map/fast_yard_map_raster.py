@@ -5,14 +5,9 @@ Creates a fixed 1280x720 pixel image with complete coverage.
 """
 
 import numpy as np
-import matplotlib
-matplotlib.use('Agg')  # Use non-interactive backend for containers
-import matplotlib.pyplot as plt
 import argparse
 import os
 import sys
-from PIL import Image
-import io
 
 try:
     import trimesh
@@ -20,8 +15,16 @@ try:
 except ImportError:
     TRIMESH_AVAILABLE = False
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from yard_map.raster_engine import RasterGrid, CellIndex, select_ground, reduce_cells, expand_empty_cells
+from yard_map.raster_output import save_raster, georeference
+from yard_map.sampling import DEFAULT_SAMPLING, subsample
 
-def load_mesh_vertices(ply_path, max_points=100000):
+# Cube expansion in pixels for empty pixels, one pixel at a time up to 10
+RASTER_EXPANSION_RADII = tuple(range(1, 11))
+
+
+def load_mesh_vertices(ply_path, max_points=100000, sampling=DEFAULT_SAMPLING):
     """Load mesh vertices and colors, sampling if too large."""
     if TRIMESH_AVAILABLE:
         try:
@@ -40,10 +43,7 @@ def load_mesh_vertices(ply_path, max_points=100000):
             
             # Sample if too many points
             if len(vertices) > max_points:
-                indices = np.random.choice(len(vertices), max_points, replace=False)
-                vertices = vertices[indices]
-                if colors is not None:
-                    colors = colors[indices]
+                vertices, colors = subsample(vertices, colors, max_points, sampling)
                 print(f"Sampled {max_points} vertices from {len(mesh.vertices)} total")
             
             return vertices, colors
@@ -75,6 +75,9 @@ def create_raster_map(vertices, colors=None, projection='xy', grid_resolution=0.
     4. Cluster points by height using grid_resolution as window
     5. Select lowest cluster (ground)
     6. Average colors within cluster
+    
+    Points are binned once and all pixels are processed together; empty pixels are
+    filled from the combined ground of the expanded cube's pixels.
     """
     print(f"Creating rasterized map: 640x360 pixels, grid resolution: {grid_resolution}m")
     
@@ -114,117 +117,47 @@ def create_raster_map(vertices, colors=None, projection='xy', grid_resolution=0.
     
     print(f"Pixel size: {pixel_width:.4f}m x {pixel_height:.4f}m")
     
-    # Initialize output image
-    raster_image = np.zeros((RASTER_HEIGHT, RASTER_WIDTH, 3), dtype=np.uint8)
-    
-    # Process each pixel
-    pixels_processed = 0
-    expansions_needed = 0
-    max_expansion = 0
-    total_points_found = 0
-    max_points_in_pixel = 0
-    
     import time
     start_time = time.time()
     
-    for row in range(RASTER_HEIGHT):
-        for col in range(RASTER_WIDTH):
-            # Calculate world coordinates for this pixel
-            pixel_x_min = x_min + col * pixel_width
-            pixel_x_max = x_min + (col + 1) * pixel_width
-            pixel_y_min = y_max - (row + 1) * pixel_height  # Image Y is flipped
-            pixel_y_max = y_max - row * pixel_height
-            
-            # Start with 1-pixel cube
-            expansion = 0
-            found_points = False
-            
-            while not found_points and expansion <= 10:  # Max 10 pixel expansion
-                # Calculate expanded cube bounds
-                expanded_x_min = pixel_x_min - expansion * pixel_width
-                expanded_x_max = pixel_x_max + expansion * pixel_width
-                expanded_y_min = pixel_y_min - expansion * pixel_height
-                expanded_y_max = pixel_y_max + expansion * pixel_height
-                
-                # Find points within expanded cube
-                within_cube = ((vertices_2d[:, 0] >= expanded_x_min) & 
-                              (vertices_2d[:, 0] <= expanded_x_max) &
-                              (vertices_2d[:, 1] >= expanded_y_min) & 
-                              (vertices_2d[:, 1] <= expanded_y_max))
-                
-                if np.any(within_cube):
-                    found_points = True
-                    if expansion > 0:
-                        expansions_needed += 1
-                        max_expansion = max(max_expansion, expansion)
-                else:
-                    expansion += 1
-            
-            if found_points:
-                # Get points and depths within cube
-                cube_indices = np.where(within_cube)[0]
-                cube_depths = depth_values[within_cube]
-                
-                # Track statistics
-                num_points = len(cube_indices)
-                total_points_found += num_points
-                max_points_in_pixel = max(max_points_in_pixel, num_points)
-                
-                # Cluster points by height windows using grid_resolution
-                depth_min, depth_max = cube_depths.min(), cube_depths.max()
-                if depth_max - depth_min <= grid_resolution:
-                    # All points in single cluster
-                    clusters = [cube_indices]
-                else:
-                    # Create overlapping windows with grid_resolution as window size
-                    clusters = []
-                    window_start = depth_min
-                    while window_start <= depth_max:
-                        window_end = window_start + grid_resolution
-                        in_window = (cube_depths >= window_start) & (cube_depths <= window_end)
-                        if np.any(in_window):
-                            clusters.append(cube_indices[in_window])
-                        window_start += grid_resolution / 2  # 50% overlap for better coverage
-                
-                # Select cluster with lowest minimum height (ground)
-                best_cluster = None
-                best_min_depth = float('inf')
-                
-                for cluster_indices in clusters:
-                    cluster_depths = depth_values[cluster_indices]
-                    cluster_min = cluster_depths.min()
-                    if cluster_min < best_min_depth:
-                        best_min_depth = cluster_min
-                        best_cluster = cluster_indices
-                
-                # Set pixel color from best cluster
-                if best_cluster is not None and len(best_cluster) > 0:
-                    if colors is not None:
-                        # Average colors in the cluster
-                        cluster_colors = colors[best_cluster]
-                        avg_color = np.mean(cluster_colors, axis=0)
-                        # Ensure color values are in 0-255 range
-                        if avg_color.max() <= 1.0:
-                            avg_color *= 255
-                        raster_image[row, col] = avg_color.astype(np.uint8)
-                    else:
-                        # Use height-based coloring if no colors available
-                        normalized_height = (best_min_depth - depth_values.min()) / (depth_values.max() - depth_values.min())
-                        color_val = int(normalized_height * 255)
-                        raster_image[row, col] = [color_val, color_val // 2, 100]  # Brown-ish terrain
-            else:
-                # No points found even with expansion - use fallback color
-                raster_image[row, col] = [50, 50, 50]  # Dark gray
-            
-            pixels_processed += 1
-            
-            # Progress update every 5000 pixels with timing info
-            if pixels_processed % 5000 == 0:
-                progress = (pixels_processed / (RASTER_WIDTH * RASTER_HEIGHT)) * 100
-                elapsed = time.time() - start_time
-                pixels_per_sec = pixels_processed / elapsed if elapsed > 0 else 0
-                eta_seconds = (RASTER_WIDTH * RASTER_HEIGHT - pixels_processed) / pixels_per_sec if pixels_per_sec > 0 else 0
-                print(f"Rasterizing: {progress:.1f}% complete, {pixels_per_sec:.0f} pixels/sec, ETA: {eta_seconds:.0f}s")
+    # Bin every point once into its pixel cube (max edges fall into the last row/column)
+    col = np.clip(np.floor((vertices_2d[:, 0] - x_min) / pixel_width).astype(np.int64), 0, RASTER_WIDTH - 1)
+    row = np.clip(np.floor((y_max - vertices_2d[:, 1]) / pixel_height).astype(np.int64), 0, RASTER_HEIGHT - 1)
+    grid = RasterGrid(x_min, y_max, pixel_width, RASTER_WIDTH, RASTER_HEIGHT)
+    index = CellIndex.from_cells(row * RASTER_WIDTH + col, depth_values, grid)
+    
+    # The overlapping height windows always pick the one starting at the cube's lowest
+    # point, i.e. the points within grid_resolution of it
+    selected = select_ground(index, 'height_window', grid_resolution)
+    stats = reduce_cells(index, colors, selected)
+    occupied = stats['count'] > 0
+    
+    # Empty pixels take the ground of the first expanded cube (1 to 10 pixels) with
+    # points, for all pixels at once with box filters over the cell grid
+    stats = expand_empty_cells(stats, grid, RASTER_EXPANSION_RADII)
+    ground = stats['selected'] > 0
+    
+    # No points found even with expansion - use fallback color
+    raster_image = np.empty((grid.n_cells, 3), dtype=np.uint8)
+    raster_image[:] = [50, 50, 50]  # Dark gray
+    if colors is not None:
+        # Average colors in the cluster, scaled to 0-255 for 0-1 colors
+        avg_color = stats['color_sum'][ground] / stats['selected'][ground, None]
+        avg_color[avg_color.max(axis=1) <= 1.0] *= 255
+        raster_image[ground] = avg_color.astype(np.uint8)
+    else:
+        # Height-based coloring from the cluster's lowest point (mean ground height for expanded pixels)
+        ground_depth = np.where(occupied, stats['depth_min'], stats['depth_sum'] / np.maximum(stats['selected'], 1))
+        normalized_height = (ground_depth[ground] - depth_values.min()) / (depth_values.max() - depth_values.min())
+        color_val = (normalized_height * 255).astype(np.int64)
+        raster_image[ground] = np.column_stack([color_val, color_val // 2, np.full(len(color_val), 100)])
+    raster_image = raster_image.reshape(RASTER_HEIGHT, RASTER_WIDTH, 3)
+    
+    # Statistics
+    pixels_processed = grid.n_cells
+    expansions_needed = int(np.count_nonzero(ground & ~occupied))
+    total_points_found = int(index.counts.sum())
+    max_points_in_pixel = int(index.counts.max())
     
     end_time = time.time()
     total_time = end_time - start_time
@@ -234,10 +167,8 @@ def create_raster_map(vertices, colors=None, projection='xy', grid_resolution=0.
     print(f"Total time: {total_time:.1f} seconds")
     print(f"Pixels per second: {pixels_processed / total_time:.0f}")
     print(f"Pixels requiring expansion: {expansions_needed}")
-    print(f"Maximum expansion needed: {max_expansion} pixels")
     print(f"Average points per pixel: {avg_points_per_pixel:.1f}")
     print(f"Maximum points in a single pixel: {max_points_in_pixel}")
-    print(f"Total point-pixel intersections: {total_points_found}")
     
     return raster_image
 
@@ -252,6 +183,10 @@ def main():
                        help='Maximum points to process for performance (default: 100000)')
     parser.add_argument('--projection', '-p', choices=['xy', 'xz', 'yz'], 
                        default='xy', help='Projection plane: xy=top-down, xz=side, yz=front (default: xy)')
+    parser.add_argument('--format', choices=['png', 'webp'],
+                       help='Image format (default: from the output extension, else png)')
+    parser.add_argument('--compression', type=int,
+                       help='PNG zlib level 0-9 (default: 1) or WebP quality 0-100 (default: lossless)')
     
     args = parser.parse_args()
     
@@ -284,9 +219,11 @@ def main():
     try:
         raster_image = create_raster_map(vertices, colors, args.projection, args.grid_resolution)
         
-        # Save as PNG using PIL
-        pil_image = Image.fromarray(raster_image, 'RGB')
-        pil_image.save(args.output, 'PNG')
+        # Encode the raster directly, with the data bounds it spans in a JSON sidecar
+        vertices_2d = project_to_2d(vertices, args.projection)
+        bounds = (vertices_2d[:, 0].min(), vertices_2d[:, 0].max(), vertices_2d[:, 1].min(), vertices_2d[:, 1].max())
+        georef = georeference(bounds, raster_image.shape[1], raster_image.shape[0], args.projection)
+        save_raster(raster_image, args.output, args.format, args.compression, georef)
         
         # Verify file was created and get size
         if os.path.exists(args.output):
@@ -5,9 +5,6 @@ Designed for speed - processes all pixels simultaneously using numpy vectorizati
 """
 
 import numpy as np
-import matplotlib
-matplotlib.use('Agg')  # Use non-interactive backend for containers
-import matplotlib.pyplot as plt
 import argparse
 import os
 import sys
@@ -21,8 +18,12 @@ try:
 except ImportError:
     TRIMESH_AVAILABLE = False
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from yard_map.raster_engine import nearest_occupied
+from yard_map.sampling import DEFAULT_SAMPLING, subsample
 
-def load_mesh_vertices(ply_path, max_points=100000):
+
+def load_mesh_vertices(ply_path, max_points=100000, sampling=DEFAULT_SAMPLING):
     """Load mesh vertices and colors, sampling if too large."""
     if TRIMESH_AVAILABLE:
         try:
@@ -41,10 +42,7 @@ def load_mesh_vertices(ply_path, max_points=100000):
             
             # Sample if too many points
             if len(vertices) > max_points:
-                indices = np.random.choice(len(vertices), max_points, replace=False)
-                vertices = vertices[indices]
-                if colors is not None:
-                    colors = colors[indices]
+                vertices, colors = subsample(vertices, colors, max_points, sampling)
                 print(f"Sampled {max_points} vertices from {len(mesh.vertices)} total")
             
             return vertices, colors
@@ -176,23 +174,10 @@ def create_ultra_fast_raster_map(vertices, colors=None, projection='xy', grid_re
     if np.any(empty_pixels):
         print(f"Filling {np.sum(empty_pixels)} empty pixels with nearest neighbors...")
         
-        # Create coordinate grids
-        y_coords, x_coords = np.mgrid[0:RASTER_HEIGHT, 0:RASTER_WIDTH]
-        empty_coords = np.column_stack([y_coords[empty_pixels], x_coords[empty_pixels]])
-        filled_coords = np.column_stack([y_coords[~empty_pixels], x_coords[~empty_pixels]])
-        
-        if len(filled_coords) > 0:
-            # Simple nearest neighbor assignment
-            from scipy.spatial.distance import cdist
-            distances = cdist(empty_coords, filled_coords)
-            nearest_indices = np.argmin(distances, axis=1)
-            
-            empty_linear = np.where(empty_pixels)[0]
-            filled_linear = np.where(~empty_pixels)[0]
-            
-            for i, empty_idx in enumerate(empty_linear):
-                nearest_filled_idx = filled_linear[nearest_indices[i]]
-                raster_image[empty_idx] = raster_image[nearest_filled_idx]
+        # Nearest filled pixel of every pixel in one distance transform
+        nearest = nearest_occupied(~empty_pixels.reshape(RASTER_HEIGHT, RASTER_WIDTH))
+        if not np.all(empty_pixels):
+            raster_image[empty_pixels] = raster_image[nearest[empty_pixels]]
     
     # Reshape back to 2D image
     raster_image = raster_image.reshape(RASTER_HEIGHT, RASTER_WIDTH, 3)
@@ -1,15 +1,21 @@
 #!/usr/bin/env python3
 """
 Convert a Poisson mesh to a top-down yard map image.
+Faces are rasterized with the vectorized triangle rasterizer (lowest surface per pixel,
+interpolated vertex colors); meshes without faces are rendered as point clouds.
 """
 
 import numpy as np
-import matplotlib.pyplot as plt
-from matplotlib.patches import Polygon
-from matplotlib.collections import PatchCollection
 import argparse
+import sys
 import os
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from yard_map.ply_reader import PlyPointCloud, read_faces
+from yard_map.raster_engine import project_points, rasterize
+from yard_map.raster_output import save_raster, grid_georeference
+from yard_map.triangle_raster import rasterize_triangles
+
 try:
     import trimesh
     TRIMESH_AVAILABLE = True
@@ -52,48 +58,18 @@ def load_ply_with_trimesh(ply_path):
     return mesh.vertices, mesh.faces
 
 
+def load_trimesh_colors(ply_path):
+    """Per-vertex RGB of a mesh as loaded by trimesh, or None"""
+    mesh = trimesh.load(ply_path)
+    if getattr(mesh.visual, 'kind', None) != 'vertex':
+        return None
+    return np.asarray(mesh.visual.vertex_colors)[:, :3]
+
+
 def load_ply_basic(ply_path):
-    """Basic PLY loader that reads vertex coordinates."""
-    vertices = []
-    faces = []
-    
-    with open(ply_path, 'r') as f:
-        lines = f.readlines()
-    
-    # Find header info
-    vertex_count = 0
-    face_count = 0
-    header_ended = False
-    
-    for i, line in enumerate(lines):
-        line = line.strip()
-        if line.startswith('element vertex'):
-            vertex_count = int(line.split()[-1])
-        elif line.startswith('element face'):
-            face_count = int(line.split()[-1])
-        elif line == 'end_header':
-            header_ended = True
-            data_start = i + 1
-            break
-    
-    if not header_ended:
-        raise ValueError("Could not find end_header in PLY file")
-    
-    # Read vertices
-    for i in range(data_start, data_start + vertex_count):
-        parts = lines[i].strip().split()
-        x, y, z = float(parts[0]), float(parts[1]), float(parts[2])
-        vertices.append([x, y, z])
-    
-    # Read faces
-    face_start = data_start + vertex_count
-    for i in range(face_start, face_start + face_count):
-        parts = lines[i].strip().split()
-        if len(parts) >= 4:  # At least: count + 3 vertices
-            face_vertices = [int(parts[j]) for j in range(1, int(parts[0]) + 1)]
-            faces.append(face_vertices)
-    
-    return np.array(vertices), np.array(faces) if faces else None
+    """Basic PLY loader (binary or ASCII) built on the shared memory-mapped reader."""
+    cloud = PlyPointCloud(ply_path)
+    return cloud.xyz().astype(np.float64), read_faces(ply_path, cloud.header)
 
 
 def project_to_2d(vertices, projection='xy'):
@@ -108,75 +84,40 @@ def project_to_2d(vertices, projection='xy'):
         raise ValueError(f"Unknown projection: {projection}")
 
 
-def create_yard_map(vertices, faces=None, resolution=1000, projection='xy'):
-    """Create a 2D yard map from 3D mesh data."""
-    
-    # Project to 2D
-    vertices_2d = project_to_2d(vertices, projection)
-    
-    # Get bounds
-    x_min, y_min = vertices_2d.min(axis=0)
-    x_max, y_max = vertices_2d.max(axis=0)
-    
-    print(f"Mesh bounds: X=[{x_min:.2f}, {x_max:.2f}], Y=[{y_min:.2f}, {y_max:.2f}]")
-    
-    # Create figure
-    fig, ax = plt.subplots(figsize=(12, 12))
-    
+def create_yard_map(vertices, faces=None, resolution=1000, projection='xy', colors=None, output_height=None,
+                    coloring='true_color', return_grid=False):
+    """Create a 2D yard map raster from 3D mesh data.
+
+    Args:
+        resolution: Output width in pixels
+        output_height: Output height in pixels (default: the mesh's aspect ratio)
+        colors: Optional per-vertex RGB (0-255 or 0-1); height coloring without
+
+    Returns:
+        uint8 RGB raster covering the mesh bounds, plus its RasterGrid when return_grid is True
+    """
+    x, y, _ = project_points(np.asarray(vertices), projection)
+    bounds = (float(x.min()), float(x.max()), float(y.min()), float(y.max()))
+    print(f"Mesh bounds: X=[{bounds[0]:.2f}, {bounds[1]:.2f}], Y=[{bounds[2]:.2f}, {bounds[3]:.2f}]")
+
+    width = int(resolution)
+    height = output_height or max(1, int(round(width * (bounds[3] - bounds[2]) / max(bounds[1] - bounds[0], 1e-9))))
+    if colors is None:
+        coloring = 'height'
+
     if faces is not None and len(faces) > 0:
-        # Render triangular faces
-        patches = []
-        face_colors = []
-        
-        for face in faces:
-            if len(face) >= 3:
-                # Get the 2D coordinates of the face vertices
-                face_vertices_2d = vertices_2d[face[:3]]  # Use first 3 vertices for triangle
-                patches.append(Polygon(face_vertices_2d, closed=True))
-                
-                # Color by average Z (height) if available
-                if vertices.shape[1] > 2:
-                    avg_z = np.mean(vertices[face[:3], 2])
-                    face_colors.append(avg_z)
-                else:
-                    face_colors.append(0.5)
-        
-        if patches:
-            p = PatchCollection(patches, alpha=0.7)
-            if face_colors:
-                p.set_array(np.array(face_colors))
-                p.set_cmap('terrain')
-            else:
-                p.set_facecolor('green')
-                p.set_alpha(0.5)
-            
-            ax.add_collection(p)
-            
-            if face_colors:
-                plt.colorbar(p, ax=ax, label='Height (Z)')
+        print(f"Rasterizing {len(faces):,} faces into {width}x{height} pixels")
+        image, grid, stats = rasterize_triangles(vertices, faces, colors, projection, bounds, width, height,
+                                                 coloring=coloring, return_stats=True)
+        print(f"Covered {np.count_nonzero(stats['count']):,} of {grid.n_cells:,} pixels")
     else:
-        # Render as point cloud with height coloring
-        if vertices.shape[1] > 2:
-            scatter = ax.scatter(vertices_2d[:, 0], vertices_2d[:, 1], 
-                               c=vertices[:, 2], cmap='terrain', s=0.5, alpha=0.6)
-            plt.colorbar(scatter, ax=ax, label='Height (Z)')
-        else:
-            ax.scatter(vertices_2d[:, 0], vertices_2d[:, 1], s=0.5, alpha=0.6, color='green')
-    
-    # Set equal aspect ratio and limits
-    ax.set_aspect('equal')
-    ax.set_xlim(x_min, x_max)
-    ax.set_ylim(y_min, y_max)
-    
-    # Labels and title
-    ax.set_xlabel('X (meters)')
-    ax.set_ylabel('Y (meters)')
-    ax.set_title('Yard Map - Top-Down View')
-    
-    # Grid
-    ax.grid(True, alpha=0.3)
-    
-    return fig, ax
+        print(f"No faces, rendering {len(vertices):,} vertices as points")
+        image, grid, _ = rasterize(vertices, colors, projection, bounds, width, height, coloring=coloring,
+                                   return_stats=True)
+
+    if return_grid:
+        return image, grid
+    return image
 
 
 def main():
@@ -187,8 +128,16 @@ def main():
                        help='Output resolution (default: 1000)')
     parser.add_argument('--projection', '-p', choices=['xy', 'xz', 'yz'], 
                        default='xy', help='Projection plane (default: xy for top-down)')
-    parser.add_argument('--dpi', type=int, default=150, 
-                       help='Output DPI (default: 150)')
+    parser.add_argument('--output-width', type=int, help='Output width in pixels (default: --resolution)')
+    parser.add_argument('--output-height', type=int, help='Output height in pixels (default: mesh aspect ratio)')
+    parser.add_argument('--coloring', choices=['true_color', 'height'], default='true_color',
+                       help='Vertex colors (default) or height coloring')
+    parser.add_argument('--format', choices=['png', 'webp'],
+                       help='Image format (default: from the output extension, else png)')
+    parser.add_argument('--compression', type=int,
+                       help='PNG zlib level 0-9 (default: 1) or WebP quality 0-100 (default: lossless)')
+    parser.add_argument('--dpi', type=int, default=150,
+                       help='DEPRECATED: the map is written as a raster')
     
     args = parser.parse_args()
     
@@ -200,13 +149,23 @@ def main():
     
     print(f"Loading mesh from: {args.input}")
     
-    # Try different loading methods
-    vertices = faces = None
+    # Try different loading methods: the memory-mapped reader first (keeps the file's
+    # vertex order and colors), then trimesh and plyfile
+    vertices = faces = colors = None
+    
+    try:
+        print("Trying basic PLY loader...")
+        vertices, faces = load_ply_basic(args.input)
+        colors = PlyPointCloud(args.input).colors()
+        print(f"Loaded with basic loader: {len(vertices)} vertices, {len(faces) if faces is not None else 0} faces")
+    except Exception as e:
+        print(f"Basic loader failed: {e}")
     
-    if TRIMESH_AVAILABLE:
+    if vertices is None and TRIMESH_AVAILABLE:
         try:
             print("Trying trimesh loader...")
             vertices, faces = load_ply_with_trimesh(args.input)
+            colors = load_trimesh_colors(args.input)
             print(f"Loaded with trimesh: {len(vertices)} vertices, {len(faces) if faces is not None else 0} faces")
         except Exception as e:
             print(f"Trimesh failed: {e}")
@@ -218,14 +177,6 @@ def main():
             print(f"Loaded with plyfile: {len(vertices)} vertices, {len(faces) if faces is not None else 0} faces")
         except Exception as e:
             print(f"Plyfile failed: {e}")
-    
-    if vertices is None:
-        try:
-            print("Trying basic PLY loader...")
-            vertices, faces = load_ply_basic(args.input)
-            print(f"Loaded with basic loader: {len(vertices)} vertices, {len(faces) if faces is not None else 0} faces")
-        except Exception as e:
-            print(f"Basic loader failed: {e}")
             return 1
     
     if vertices is None or len(vertices) == 0:
@@ -233,11 +184,12 @@ def main():
         return 1
     
     print(f"Creating yard map with {args.projection} projection...")
-    fig, ax = create_yard_map(vertices, faces, args.resolution, args.projection)
+    image, grid = create_yard_map(vertices, faces, args.output_width or args.resolution, args.projection, colors,
+                                  args.output_height, args.coloring, return_grid=True)
     
     print(f"Saving yard map to: {output_path}")
-    plt.savefig(output_path, dpi=args.dpi, bbox_inches='tight')
-    plt.close()
+    save_raster(image, output_path, args.format, args.compression,
+                grid_georeference(grid, args.projection, coloring=args.coloring))
     
     print("Done!")
     return 0
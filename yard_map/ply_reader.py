@@ -0,0 +1,270 @@
+#!/usr/bin/env python3
+"""
+Shared PLY reader for every point-cloud consumer.
+The header is parsed into a NumPy structured dtype and the binary vertex block is
+exposed as a read-only np.memmap, so strided samples and per-property columns are
+zero-copy views; the block can also be streamed in fixed-size chunks for clouds
+larger than RAM.
+"""
+
+import itertools
+
+import numpy as np
+
+# PLY scalar types -> numpy type codes (byte order added per file)
+PLY_TYPES = {
+    'char': 'i1', 'int8': 'i1', 'uchar': 'u1', 'uint8': 'u1',
+    'short': 'i2', 'int16': 'i2', 'ushort': 'u2', 'uint16': 'u2',
+    'int': 'i4', 'int32': 'i4', 'uint': 'u4', 'uint32': 'u4',
+    'float': 'f4', 'float32': 'f4', 'double': 'f8', 'float64': 'f8',
+}
+
+COLOR_PROPERTIES = (('red', 'green', 'blue'), ('diffuse_red', 'diffuse_green', 'diffuse_blue'))
+
+# Leading vertices that decide whether float colors are 0-1 (scaled by 255) or 0-255
+COLOR_SCALE_SAMPLE = 65536
+
+
+class PlyHeader:
+    """Parsed PLY header: format, elements and the vertex record layout"""
+
+    def __init__(self, path, format, elements, data_offset):
+        self.path = path
+        self.format = format
+        self.elements = elements  # [(name, count, [(property, type or ('list', count_type, item_type))])]
+        self.data_offset = data_offset
+
+        self.byte_order = '>' if format == 'binary_big_endian' else '<'
+        vertex = self.element('vertex')
+        if vertex is None:
+            raise ValueError(f"PLY file has no vertex element: {path}")
+        self.vertex_count = vertex[1]
+        if any(isinstance(t, tuple) for _, t in vertex[2]):
+            raise ValueError("List properties on vertices are not supported")
+        self.vertex_dtype = np.dtype([(name, self.byte_order + PLY_TYPES[t]) for name, t in vertex[2]])
+
+        self.color_fields = None
+        for names in COLOR_PROPERTIES:
+            if all(n in self.vertex_dtype.names for n in names):
+                self.color_fields = list(names)
+                break
+
+    def element(self, name):
+        return next((e for e in self.elements if e[0] == name), None)
+
+    @property
+    def binary(self):
+        return self.format != 'ascii'
+
+    def element_offset(self, element_name):
+        """Byte offset of an element's data block (binary files only)"""
+        offset = self.data_offset
+        for name, count, properties in self.elements:
+            if name == element_name:
+                return offset
+            if any(isinstance(t, tuple) for _, t in properties):
+                raise ValueError(f"Cannot seek past variable-length element '{name}' before '{element_name}'")
+            offset += count * np.dtype([(p, PLY_TYPES[t]) for p, t in properties]).itemsize
+        raise ValueError(f"PLY file has no '{element_name}' element")
+
+    @property
+    def vertex_offset(self):
+        return self.element_offset('vertex')
+
+    def lines_before(self, element_name):
+        """Number of data lines preceding an element (ascii files only)"""
+        return sum(count for name, count, _ in itertools.takewhile(lambda e: e[0] != element_name, self.elements))
+
+
+def read_header(path):
+    """Parse the PLY header of `path`"""
+    elements = []
+    format = None
+    with open(path, 'rb') as f:
+        if f.readline().strip() != b'ply':
+            raise ValueError(f"Not a PLY file: {path}")
+        while True:
+            line = f.readline()
+            if not line:
+                raise ValueError("Could not find end_header in PLY file")
+            parts = line.decode('ascii', errors='replace').split()
+            if not parts or parts[0] in ('comment', 'obj_info'):
+                continue
+            if parts[0] == 'format':
+                format = parts[1]
+            elif parts[0] == 'element':
+                elements.append((parts[1], int(parts[2]), []))
+            elif parts[0] == 'property':
+                if parts[1] == 'list':
+                    elements[-1][2].append((parts[4], ('list', parts[2], parts[3])))
+                else:
+                    elements[-1][2].append((parts[2], parts[1]))
+            elif parts[0] == 'end_header':
+                data_offset = f.tell()
+                break
+
+    if format not in ('ascii', 'binary_little_endian', 'binary_big_endian'):
+        raise ValueError(f"Unsupported PLY format: {format}")
+    return PlyHeader(path, format, elements, data_offset)
+
+
+def float_color_scale(records, header):
+    """Multiplier of float color channels: 255 when the file's first vertices are 0-1, else 1
+
+    Decided once per file from its leading records, so every chunk of a streamed
+    file is scaled alike.
+    """
+    if header.color_fields is None:
+        return 1.0
+    sample = records[:COLOR_SCALE_SAMPLE]
+    channels = [sample[field] for field in header.color_fields]
+    if not any(channel.dtype.kind == 'f' for channel in channels):
+        return 1.0
+    return 255.0 if max(channel.max(initial=0) for channel in channels) <= 1.0 else 1.0
+
+
+def split_vertex_records(records, header, color_scale=None):
+    """(xyz float32 N x 3, rgb uint8 N x 3 or None) from structured vertex records
+
+    Args:
+        color_scale: Multiplier of float color channels (default: float_color_scale of records)
+    """
+    xyz = np.empty((len(records), 3), dtype=np.float32)
+    for i, axis in enumerate('xyz'):
+        xyz[:, i] = records[axis]
+    colors = None
+    if header.color_fields is not None:
+        if color_scale is None:
+            color_scale = float_color_scale(records, header)
+        colors = np.empty((len(records), 3), dtype=np.uint8)
+        for i, field in enumerate(header.color_fields):
+            channel = records[field]
+            if channel.dtype.kind == 'f':
+                channel = np.clip(channel * color_scale, 0, 255)
+            colors[:, i] = channel
+    return xyz, colors
+
+
+def vertex_records(path, header=None):
+    """Structured vertex records: a read-only memmap for binary files, a parsed array for ascii"""
+    header = header or read_header(path)
+    if header.binary:
+        if header.vertex_count == 0:
+            return np.empty(0, dtype=header.vertex_dtype)
+        return np.memmap(path, dtype=header.vertex_dtype, mode='r',
+                         offset=header.vertex_offset, shape=(header.vertex_count,))
+
+    with open(path, 'rb') as f:
+        f.seek(header.data_offset)
+        lines = itertools.islice(f, header.lines_before('vertex'), None)
+        return np.loadtxt(lines, dtype=header.vertex_dtype.newbyteorder('='),
+                          max_rows=header.vertex_count, ndmin=1)
+
+
+def read_faces(path, header=None):
+    """Face vertex indices (F x k int array, or an object array for mixed polygons), None without faces"""
+    header = header or read_header(path)
+    face = header.element('face')
+    if face is None or face[1] == 0:
+        return None
+    _, count, properties = face
+    if len(properties) != 1 or not isinstance(properties[0][1], tuple):
+        raise ValueError("Only face elements with a single vertex index list are supported")
+    _, count_type, index_type = properties[0][1]
+
+    if header.binary:
+        count_dtype = np.dtype(header.byte_order + PLY_TYPES[count_type])
+        index_dtype = np.dtype(header.byte_order + PLY_TYPES[index_type])
+        offset = header.element_offset('face')
+        with open(path, 'rb') as f:
+            f.seek(offset)
+            arity = int(np.fromfile(f, dtype=count_dtype, count=1)[0])
+        # Triangle (or quad) meshes have a constant list length: one fixed-size record per face
+        record = np.dtype([('n', count_dtype), ('indices', index_dtype, (arity,))])
+        faces = np.memmap(path, dtype=record, mode='r', offset=offset, shape=(count,))
+        if np.any(faces['n'] != arity):
+            raise ValueError("Binary PLY faces with mixed vertex counts are not supported")
+        return np.asarray(faces['indices'], dtype=np.int64)
+
+    with open(path, 'rb') as f:
+        f.seek(header.data_offset)
+        lines = itertools.islice(f, header.lines_before('face'), header.lines_before('face') + count)
+        polygons = [[int(v) for v in line.split()[1:]] for line in lines]
+    if len({len(p) for p in polygons}) == 1:
+        return np.array(polygons, dtype=np.int64)
+    return np.array(polygons, dtype=object)
+
+
+class PlyPointCloud:
+    """Vertex access over the shared reader
+
+    `records` is the structured vertex array (memmapped for binary files); column
+    access and strided sampling return views, xyz/colors materialize float32/uint8.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.header = read_header(path)
+        self.records = vertex_records(path, self.header)
+        self._color_scale = None
+
+    def __len__(self):
+        return len(self.records)
+
+    @property
+    def has_colors(self):
+        return self.header.color_fields is not None
+
+    def column(self, name):
+        """Zero-copy view of one vertex property"""
+        return self.records[name]
+
+    def strided(self, max_points=None):
+        """Evenly strided view of at most max_points vertices (all vertices when None)"""
+        if max_points is None or len(self.records) <= max_points:
+            return self.records
+        stride = -(-len(self.records) // max_points)
+        return self.records[::stride]
+
+    @property
+    def color_scale(self):
+        """Float color multiplier of the whole file (see float_color_scale)"""
+        if self._color_scale is None:
+            self._color_scale = float_color_scale(self.records, self.header)
+        return self._color_scale
+
+    def xyz(self, records=None):
+        """float32 N x 3 coordinates of `records` (default: every vertex)"""
+        return split_vertex_records(self.records if records is None else records, self.header, self.color_scale)[0]
+
+    def colors(self, records=None):
+        """uint8 N x 3 colors of `records`, or None when the file has none"""
+        return split_vertex_records(self.records if records is None else records, self.header, self.color_scale)[1]
+
+
+def iter_vertex_chunks(path, chunk_size=2000000, header=None):
+    """Yield (xyz, rgb) chunks of at most `chunk_size` vertices in file order"""
+    header = header or read_header(path)
+    remaining = header.vertex_count
+
+    if header.binary:
+        records = vertex_records(path, header)
+        color_scale = float_color_scale(records, header)
+        for start in range(0, len(records), chunk_size):
+            yield split_vertex_records(records[start:start + chunk_size], header, color_scale)
+        return
+
+    color_scale = None
+
+    with open(path, 'rb') as f:
+        f.seek(header.data_offset)
+        lines = itertools.islice(f, header.lines_before('vertex'), None)
+        while remaining > 0:
+            chunk = list(itertools.islice(lines, min(chunk_size, remaining)))
+            if not chunk:
+                raise ValueError(f"PLY vertex block truncated: {remaining} vertices missing")
+            records = np.loadtxt(chunk, dtype=header.vertex_dtype.newbyteorder('='), ndmin=1)
+            remaining -= len(records)
+            if color_scale is None:
+                color_scale = float_color_scale(records, header)
+            yield split_vertex_records(records, header, color_scale)
@@ -0,0 +1,293 @@
+#!/usr/bin/env python3
+"""
+Columnar point-cloud cache.
+The first time a PLY (or other mesh) is used its vertices are converted into float32
+xyz / uint8 rgb .npy files plus precomputed bounds and percentiles. Later loads
+memory-map those files, so repeat jobs start in milliseconds instead of re-parsing
+the mesh. Entries are keyed by path, size and mtime and evicted least-recently-used
+once the cache exceeds its size budget. Bounds scans of clouds that are not converted
+yet use a fixed-size strided sample of the memory-mapped PLY, stored alongside.
+"""
+
+import hashlib
+import json
+import logging
+import math
+import os
+import shutil
+import time
+
+import numpy as np
+
+from yard_map.ply_reader import read_header, iter_vertex_chunks, PlyPointCloud
+
+logger = logging.getLogger(__name__)
+
+# Overridable per process with POINT_CACHE_DIR / POINT_CACHE_MAX_BYTES
+DEFAULT_CACHE_DIR = os.path.expanduser('~/.cache/yard_map/points')
+DEFAULT_MAX_BYTES = 8 * 1024 ** 3
+
+# Percentiles stored per axis (view bounds use 1-99, bounds scans 2-98)
+PERCENTILES = (1, 2, 5, 50, 95, 98, 99)
+
+META_FILE = 'meta.json'
+
+# Sampled bounds scans: vertices read, confidence of the reported error and where they are kept
+SCAN_SAMPLE_SIZE = 1000000
+SCAN_CONFIDENCE = 0.999
+SCAN_DIR = 'scans'
+
+
+def fingerprint(path):
+    """Cache key of a source file: absolute path, size and modification time"""
+    stat = os.stat(path)
+    source = f"{os.path.abspath(path)}|{stat.st_size}|{stat.st_mtime_ns}"
+    return hashlib.sha1(source.encode('utf-8')).hexdigest()[:20]
+
+
+def percentile_rank_error(sample_size, confidence=SCAN_CONFIDENCE):
+    """Largest percentile-rank error (in percentile points) of sample quantiles
+
+    Dvoretzky-Kiefer-Wolfowitz bound: with probability `confidence`, the empirical
+    CDF of `sample_size` draws is within this distance of the true one everywhere.
+    """
+    return 100 * math.sqrt(math.log(2 / (1 - confidence)) / (2 * sample_size))
+
+
+class CloudStats:
+    """Count, bounds and per-axis percentiles of a point cloud (meta.json layout)"""
+
+    def __init__(self, meta):
+        self.meta = meta
+
+    def __len__(self):
+        return self.meta['count']
+
+    @property
+    def bounds(self):
+        """{'x': (min, max), 'y': ..., 'z': ...}"""
+        return {axis: tuple(b) for axis, b in self.meta['bounds'].items()}
+
+    def percentiles(self, axis, percentiles=(1, 99)):
+        """Precomputed percentiles of one axis ('x', 'y' or 'z')"""
+        stored = self.meta['percentiles'][axis]
+        return tuple(stored[str(p)] for p in percentiles)
+
+
+class CachedPointCloud(CloudStats):
+    """Memory-mapped columns of one cache entry"""
+
+    def __init__(self, entry_dir, meta):
+        super().__init__(meta)
+        self.entry_dir = entry_dir
+        self.xyz = np.load(os.path.join(entry_dir, 'xyz.npy'), mmap_mode='r')
+        rgb_path = os.path.join(entry_dir, 'rgb.npy')
+        self.rgb = np.load(rgb_path, mmap_mode='r') if meta['has_colors'] else None
+
+
+def _axis_stats(xyz):
+    """meta.json 'bounds' and 'percentiles' of an N x 3 array"""
+    bounds, percentiles = {}, {}
+    for i, axis in enumerate('xyz'):
+        column = np.asarray(xyz[:, i])
+        values = np.percentile(column, PERCENTILES)
+        bounds[axis] = [float(column.min()), float(column.max())]
+        percentiles[axis] = {str(p): float(v) for p, v in zip(PERCENTILES, values)}
+    return bounds, percentiles
+
+
+def _convert_ply(source_path, build_dir, chunk_size):
+    header = read_header(source_path)
+    count = header.vertex_count
+    xyz = np.lib.format.open_memmap(os.path.join(build_dir, 'xyz.npy'), mode='w+',
+                                    dtype=np.float32, shape=(count, 3))
+    rgb = None
+    if header.color_fields is not None:
+        rgb = np.lib.format.open_memmap(os.path.join(build_dir, 'rgb.npy'), mode='w+',
+                                        dtype=np.uint8, shape=(count, 3))
+    start = 0
+    for chunk_xyz, chunk_rgb in iter_vertex_chunks(source_path, chunk_size, header):
+        xyz[start:start + len(chunk_xyz)] = chunk_xyz
+        if rgb is not None:
+            rgb[start:start + len(chunk_xyz)] = chunk_rgb
+        start += len(chunk_xyz)
+    xyz.flush()
+    if rgb is not None:
+        rgb.flush()
+    return xyz, rgb
+
+
+def _convert_mesh(source_path, build_dir):
+    import trimesh
+    mesh = trimesh.load(source_path)
+    xyz = np.asarray(mesh.vertices, dtype=np.float32)
+    np.save(os.path.join(build_dir, 'xyz.npy'), xyz)
+    rgb = None
+    colors = getattr(mesh.visual, 'vertex_colors', None)
+    if colors is not None and len(colors) == len(xyz):
+        rgb = np.asarray(colors[:, :3], dtype=np.uint8)
+        np.save(os.path.join(build_dir, 'rgb.npy'), rgb)
+    return xyz, rgb
+
+
+class PointCache:
+    """Directory of converted point clouds with size-bounded LRU eviction"""
+
+    def __init__(self, cache_dir=None, max_bytes=None):
+        self.cache_dir = cache_dir or os.environ.get('POINT_CACHE_DIR', DEFAULT_CACHE_DIR)
+        self.max_bytes = int(max_bytes or os.environ.get('POINT_CACHE_MAX_BYTES', DEFAULT_MAX_BYTES))
+
+    def entry_dir(self, key):
+        return os.path.join(self.cache_dir, key)
+
+    def contains(self, source_path):
+        return os.path.exists(os.path.join(self.entry_dir(fingerprint(source_path)), META_FILE))
+
+    def load(self, source_path, chunk_size=2000000):
+        """Cached columns of `source_path`, converting it on first use"""
+        key = fingerprint(source_path)
+        entry_dir = self.entry_dir(key)
+        meta_path = os.path.join(entry_dir, META_FILE)
+
+        if not os.path.exists(meta_path):
+            self._build(source_path, key, chunk_size)
+            self.evict(keep=key)
+        os.utime(meta_path)  # Access time for LRU eviction
+
+        with open(meta_path) as f:
+            meta = json.load(f)
+        return CachedPointCloud(entry_dir, meta)
+
+    def _build(self, source_path, key, chunk_size):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        build_dir = self.entry_dir(f"{key}.tmp-{os.getpid()}")
+        shutil.rmtree(build_dir, ignore_errors=True)
+        os.makedirs(build_dir)
+        start_time = time.time()
+        try:
+            if source_path.lower().endswith('.ply'):
+                xyz, rgb = _convert_ply(source_path, build_dir, chunk_size)
+            else:
+                xyz, rgb = _convert_mesh(source_path, build_dir)
+            if len(xyz) == 0:
+                raise ValueError(f"No vertices in {source_path}")
+
+            meta = {
+                'source': os.path.abspath(source_path),
+                'fingerprint': key,
+                'count': int(len(xyz)),
+                'has_colors': rgb is not None,
+                'created': time.time(),
+            }
+            meta['bounds'], meta['percentiles'] = _axis_stats(xyz)
+            del xyz, rgb
+
+            with open(os.path.join(build_dir, META_FILE), 'w') as f:
+                json.dump(meta, f, indent=2)
+            try:
+                os.rename(build_dir, self.entry_dir(key))
+            except OSError:
+                # Another process finished the same entry first
+                shutil.rmtree(build_dir, ignore_errors=True)
+        except BaseException:
+            shutil.rmtree(build_dir, ignore_errors=True)
+            raise
+        logger.info(f"Cached {source_path} as columnar arrays in {time.time() - start_time:.2f}s")
+
+    def scan(self, source_path, sample_size=SCAN_SAMPLE_SIZE):
+        """Count, bounds and percentiles of a cloud without converting it
+
+        Exact when the cloud is already cached. Otherwise computed from an evenly
+        strided sample of at most `sample_size` vertices of the memory-mapped PLY (time
+        proportional to the sample, not the cloud) and stored under scans/, so each
+        mesh is scanned once. Sampled scans carry 'rank_error': the percentile-rank
+        error bound at SCAN_CONFIDENCE, and sample bounds are the sample's extremes.
+
+        Returns:
+            CloudStats
+        """
+        key = fingerprint(source_path)
+        meta_path = os.path.join(self.entry_dir(key), META_FILE)
+        if os.path.exists(meta_path):
+            with open(meta_path) as f:
+                return CloudStats({**json.load(f), 'exact': True, 'sample_size': None, 'rank_error': 0.0})
+        if not source_path.lower().endswith('.ply'):
+            return self.scan_from_cache(source_path)
+
+        scan_path = os.path.join(self.cache_dir, SCAN_DIR, f"{key}.json")
+        if os.path.exists(scan_path):
+            with open(scan_path) as f:
+                meta = json.load(f)
+            if meta['exact'] or meta['sample_size'] >= sample_size:
+                return CloudStats(meta)
+
+        start_time = time.time()
+        cloud = PlyPointCloud(source_path)
+        if len(cloud) == 0:
+            raise ValueError(f"No vertices in {source_path}")
+        sample = cloud.xyz(cloud.strided(sample_size))
+        exact = len(sample) == len(cloud)
+        meta = {
+            'source': os.path.abspath(source_path),
+            'fingerprint': key,
+            'count': len(cloud),
+            'has_colors': cloud.has_colors,
+            'exact': exact,
+            'sample_size': len(sample),
+            'rank_error': 0.0 if exact else percentile_rank_error(len(sample)),
+            'created': time.time(),
+        }
+        meta['bounds'], meta['percentiles'] = _axis_stats(sample)
+
+        os.makedirs(os.path.dirname(scan_path), exist_ok=True)
+        tmp_path = f"{scan_path}.tmp-{os.getpid()}"
+        with open(tmp_path, 'w') as f:
+            json.dump(meta, f, indent=2)
+        os.replace(tmp_path, scan_path)
+        logger.info(f"Scanned {len(sample):,} of {len(cloud):,} vertices of {source_path} "
+                    f"in {time.time() - start_time:.2f}s (rank error {meta['rank_error']:.3f} percentile points)")
+        return CloudStats(meta)
+
+    def scan_from_cache(self, source_path):
+        """scan() of a non-PLY mesh, which has to be converted to be read"""
+        cached = self.load(source_path)
+        return CloudStats({**cached.meta, 'exact': True, 'sample_size': None, 'rank_error': 0.0})
+
+    def entries(self):
+        """[(key, last_used, size_bytes)] of complete entries"""
+        entries = []
+        if not os.path.isdir(self.cache_dir):
+            return entries
+        for key in os.listdir(self.cache_dir):
+            meta_path = os.path.join(self.entry_dir(key), META_FILE)
+            if '.tmp-' in key or not os.path.exists(meta_path):
+                continue
+            size = sum(os.path.getsize(os.path.join(folder, name))
+                       for folder, _, names in os.walk(self.entry_dir(key)) for name in names)
+            entries.append((key, os.path.getmtime(meta_path), size))
+        return entries
+
+    def evict(self, keep=None):
+        """Remove least recently used entries until the cache fits max_bytes"""
+        entries = sorted(self.entries(), key=lambda e: e[1])
+        total = sum(size for _, _, size in entries)
+        removed = []
+        for key, _, size in entries:
+            if total <= self.max_bytes:
+                break
+            if key == keep:
+                continue
+            shutil.rmtree(self.entry_dir(key), ignore_errors=True)
+            logger.info(f"Evicted point cache entry {key} ({size / 1024 ** 2:.1f} MB)")
+            total -= size
+            removed.append(key)
+        return removed
+
+
+def load_cached_points(source_path, cache=None):
+    """Cached point cloud for `source_path`, or None when the cache cannot be used"""
+    try:
+        return (cache or PointCache()).load(source_path)
+    except (OSError, ValueError, ImportError) as e:
+        logger.warning(f"Point cache unavailable for {source_path}: {e}")
+        return None
@@ -0,0 +1,589 @@
+#!/usr/bin/env python3
+"""
+Vectorized ground-surface rasterization engine for yard maps.
+Bins every point once into a raster cell, sorts the points by height inside each cell
+(a CSR layout: cell offsets plus a point permutation) and computes the per-cell ground
+selection with segmented reductions, so cost is O(points log points) instead of
+O(pixels x points).
+"""
+
+import json
+import os
+
+import numpy as np
+
+try:
+    from scipy import ndimage
+    from scipy.spatial import cKDTree
+    SCIPY_AVAILABLE = True
+except ImportError:
+    SCIPY_AVAILABLE = False
+
+# Projection plane -> (horizontal axis, vertical axis, depth axis)
+PROJECTION_AXES = {
+    'xy': (0, 1, 2),  # Top-down view, depth is Z
+    'xz': (0, 2, 1),  # Side view, depth is Y
+    'yz': (1, 2, 0),  # Front view, depth is X
+}
+
+ALGORITHMS = ('simple_average', 'bottom_percentile', 'height_window', 'kmeans')
+COLORINGS = ('true_color', 'height', 'path')
+
+# Empty-pixel colors used by the CUDA kernels
+EMPTY_COLOR = (50, 50, 50)
+EMPTY_COLOR_SIMPLE = (128, 128, 128)
+
+# Search expansion (in pixels) for empty pixels, matching the CUDA kernels' 5-step schedule
+CUDA_EXPANSION_RADII = (2, 6, 12, 20)
+
+
+class RasterGrid:
+    """Georeference of a raster: row 0 is the top (y_max) edge, pixels are square
+
+    `center` is the point the view was rotated around (None for unrotated views);
+    the grid itself lives in rotated view coordinates.
+    """
+
+    def __init__(self, x_min, y_max, pixel_size, width, height, center=None):
+        self.x_min = float(x_min)
+        self.y_max = float(y_max)
+        self.pixel_size = float(pixel_size)
+        self.width = int(width)
+        self.height = int(height)
+        self.center = None if center is None else (float(center[0]), float(center[1]))
+
+    @classmethod
+    def fit(cls, x_min, x_max, y_min, y_max, width, height, center=None):
+        """Fit bounds into a width x height raster with 1:1 pixels, padding the short axis evenly"""
+        data_width = x_max - x_min
+        data_height = y_max - y_min
+        if data_width / data_height > width / height:
+            pixel_size = data_width / width
+            padding = (height * pixel_size - data_height) / 2
+            return cls(x_min, y_max + padding, pixel_size, width, height, center)
+        pixel_size = data_height / height
+        padding = (width * pixel_size - data_width) / 2
+        return cls(x_min - padding, y_max, pixel_size, width, height, center)
+
+    @classmethod
+    def from_resolution(cls, x_min, x_max, y_min, y_max, resolution):
+        """Grid of `resolution`-sized cells covering the bounds"""
+        width = max(1, int(np.ceil((x_max - x_min) / resolution)))
+        height = max(1, int(np.ceil((y_max - y_min) / resolution)))
+        return cls(x_min, y_min + height * resolution, resolution, width, height)
+
+    @property
+    def n_cells(self):
+        return self.width * self.height
+
+    @property
+    def bounds(self):
+        """(x_min, x_max, y_min, y_max) of the full raster"""
+        return (self.x_min, self.x_min + self.width * self.pixel_size,
+                self.y_max - self.height * self.pixel_size, self.y_max)
+
+    def cell_of(self, x, y):
+        """Linear cell index (row * width + col) per point, -1 outside the raster"""
+        col = np.floor((x - self.x_min) / self.pixel_size)
+        row = np.floor((self.y_max - y) / self.pixel_size)
+        inside = (col >= 0) & (col < self.width) & (row >= 0) & (row < self.height)
+        cell = np.full(len(x), -1, dtype=np.int64)
+        cell[inside] = row[inside].astype(np.int64) * self.width + col[inside].astype(np.int64)
+        return cell
+
+    def cell_centers(self, cells):
+        """World coordinates of cell centers"""
+        rows, cols = np.divmod(np.asarray(cells, dtype=np.int64), self.width)
+        return (self.x_min + (cols + 0.5) * self.pixel_size,
+                self.y_max - (rows + 0.5) * self.pixel_size)
+
+    def to_dict(self):
+        x_min, x_max, y_min, y_max = self.bounds
+        data = {
+            'x_min': x_min, 'x_max': x_max, 'y_min': y_min, 'y_max': y_max,
+            'pixel_size': self.pixel_size, 'width': self.width, 'height': self.height
+        }
+        if self.center is not None:
+            data['center'] = list(self.center)
+        return data
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data['x_min'], data['y_max'], data['pixel_size'], data['width'], data['height'],
+                   data.get('center'))
+
+    def coarsen(self, factor):
+        """Grid of factor x factor blocks of this grid's cells (same origin and extent)"""
+        if self.width % factor or self.height % factor:
+            raise ValueError(f"{self.width}x{self.height} grid is not divisible by {factor}")
+        return RasterGrid(self.x_min, self.y_max, self.pixel_size * factor,
+                          self.width // factor, self.height // factor, self.center)
+
+
+def project_points(vertices, projection='xy'):
+    """Split vertices into horizontal, vertical and depth coordinate arrays"""
+    if projection not in PROJECTION_AXES:
+        raise ValueError(f"Unknown projection: {projection}")
+    h, v, d = PROJECTION_AXES[projection]
+    return vertices[:, h], vertices[:, v], vertices[:, d]
+
+
+def rotate_points(x, y, rotation, center=None):
+    """Rotate 2D coordinates by `rotation` degrees around `center` (default: centroid)"""
+    if not rotation:
+        return x, y
+    if center is None:
+        center = (float(x.mean()), float(y.mean()))
+    angle = np.radians(rotation)
+    cos_a, sin_a = np.cos(angle), np.sin(angle)
+    xc = x - center[0]
+    yc = y - center[1]
+    return xc * cos_a - yc * sin_a + center[0], xc * sin_a + yc * cos_a + center[1]
+
+
+def view_bounds(x, y, custom_bounds=None, percentiles=(1, 99)):
+    """View window: custom bounds, or 1-99 percentile bounds that ignore outliers"""
+    if custom_bounds is not None:
+        return tuple(float(b) for b in custom_bounds)
+    x_lo, x_hi = np.percentile(x, percentiles)
+    y_lo, y_hi = np.percentile(y, percentiles)
+    return float(x_lo), float(x_hi), float(y_lo), float(y_hi)
+
+
+def _sortable_bits(values):
+    """uint64 keys (< 2**32) that sort like the float32 values"""
+    bits = np.ascontiguousarray(values, dtype=np.float32).view(np.uint32)
+    flip = np.where(bits >> np.uint32(31), np.uint32(0xFFFFFFFF), np.uint32(0x80000000))
+    return (bits ^ flip).astype(np.uint64)
+
+
+class CellIndex:
+    """Points grouped by raster cell and sorted by height within each cell
+
+    `order` is the permutation of the input points (only those inside the raster),
+    `depth` holds their heights in that order and `offsets[c]:offsets[c + 1]` is
+    the segment of cell c.
+    """
+
+    def __init__(self, grid, offsets, order, depth):
+        self.grid = grid
+        self.offsets = offsets
+        self.order = order
+        self.depth = depth
+
+    @classmethod
+    def build(cls, x, y, depth, grid):
+        return cls.from_cells(grid.cell_of(x, y), depth, grid)
+
+    @classmethod
+    def from_cells(cls, cell, depth, grid):
+        """Index from precomputed linear cell ids (-1 for points outside the grid)"""
+        inside = np.flatnonzero(cell >= 0)
+        cell = cell[inside]
+        # Heights are kept as float32 so the stored order matches the sort key exactly
+        depth = np.asarray(depth, dtype=np.float32)[inside]
+
+        # One sort on a packed (cell, height) key: cell in the high 32 bits, the
+        # order-preserving bit pattern of the float32 height in the low 32 bits
+        permutation = np.argsort(cell.astype(np.uint64) << np.uint64(32) | _sortable_bits(depth))
+        order = inside[permutation]
+        counts = np.bincount(cell, minlength=grid.n_cells)
+        offsets = np.zeros(grid.n_cells + 1, dtype=np.int64)
+        np.cumsum(counts, out=offsets[1:])
+        return cls(grid, offsets, order, depth[permutation])
+
+    @property
+    def counts(self):
+        return np.diff(self.offsets)
+
+    def cell_ids(self):
+        """Cell of each point in sorted order"""
+        return np.repeat(np.arange(self.grid.n_cells, dtype=np.int64), self.counts)
+
+    def segment_minimum(self):
+        """Lowest height per cell (NaN for empty cells)"""
+        counts = self.counts
+        minimum = np.full(len(counts), np.nan)
+        occupied = counts > 0
+        minimum[occupied] = self.depth[self.offsets[:-1][occupied]]
+        return minimum
+
+    def coarsen(self, factor):
+        """Index of the grid coarsened by `factor`, without re-projecting the points"""
+        grid = self.grid.coarsen(factor)
+        rows, cols = np.divmod(self.cell_ids(), self.grid.width)
+        merged = CellIndex.from_cells((rows // factor) * grid.width + cols // factor, self.depth, grid)
+        return CellIndex(grid, merged.offsets, np.asarray(self.order)[merged.order], merged.depth)
+
+    def save(self, directory):
+        """Persist as .npy arrays plus the grid, reloadable with load(mmap_mode='r')"""
+        os.makedirs(directory, exist_ok=True)
+        np.save(os.path.join(directory, 'offsets.npy'), self.offsets)
+        np.save(os.path.join(directory, 'order.npy'), self.order)
+        np.save(os.path.join(directory, 'depth.npy'), self.depth)
+        with open(os.path.join(directory, 'grid.json'), 'w') as f:
+            json.dump(self.grid.to_dict(), f)
+
+    @classmethod
+    def load(cls, directory, mmap_mode='r'):
+        with open(os.path.join(directory, 'grid.json')) as f:
+            grid = RasterGrid.from_dict(json.load(f))
+        arrays = [np.load(os.path.join(directory, f'{name}.npy'), mmap_mode=mmap_mode)
+                  for name in ('offsets', 'order', 'depth')]
+        return cls(grid, *arrays)
+
+
+def _count_at_or_below(index, threshold, cell_ids):
+    """Per cell, how many sorted points have height <= that cell's threshold"""
+    below = index.depth <= threshold[cell_ids]
+    return np.bincount(cell_ids[below], minlength=index.grid.n_cells)
+
+
+def two_means_split(index, cell_ids=None):
+    """Size of the lower cluster of the optimal 1D 2-means split of every cell
+
+    In 1D the optimal 2-means clusters are contiguous in sorted order, so the
+    split is the prefix length t minimizing the within-cluster sum of squares.
+    With per-cell prefix sums S(t) of the heights that is the t maximizing
+    S(t)^2 / t + (S(n) - S(t))^2 / (n - t), evaluated for every point at once.
+    Splits between equal heights are not allowed (K-means assigns equal values
+    to the same cluster); cells with fewer than two distinct heights keep all.
+    """
+    counts = index.counts
+    if cell_ids is None:
+        cell_ids = index.cell_ids()
+    starts = index.offsets[:-1]
+
+    # Heights relative to each cell's minimum keep the prefix sums well conditioned
+    occupied = counts > 0
+    cell_minimum = np.zeros(len(counts), dtype=np.float32)
+    cell_minimum[occupied] = index.depth[starts[occupied]]
+    depth = index.depth.astype(np.float64) - cell_minimum[cell_ids]
+    cumulative = np.cumsum(depth)
+    before_cell = np.zeros(len(counts))
+    before_cell[occupied] = cumulative[starts[occupied]] - depth[starts[occupied]]
+    prefix = cumulative - before_cell[cell_ids]
+    total = prefix[np.maximum(index.offsets[1:] - 1, 0)]
+
+    # Candidate split after each point: lower cluster holds ranks 0..rank
+    rank = np.arange(len(depth), dtype=np.int64) - starts[cell_ids]
+    lower = rank + 1
+    upper = counts[cell_ids] - lower
+    valid = upper > 0
+    valid[:-1] &= index.depth[1:] > index.depth[:-1]
+
+    score = np.full(len(depth), -np.inf)
+    score[valid] = (prefix[valid] ** 2 / lower[valid]
+                    + (total[cell_ids][valid] - prefix[valid]) ** 2 / upper[valid])
+
+    # Segmented argmax: best score per cell, then the first position reaching it
+    split = counts.copy()
+    if not occupied.any():
+        return split
+    segment_starts = starts[occupied]
+    best = np.full(len(counts), -np.inf)
+    best[occupied] = np.maximum.reduceat(score, segment_starts)
+    splittable = np.isfinite(best)
+    at_best = np.where(valid & (score == best[cell_ids]), lower, np.iinfo(np.int64).max)
+    first = np.zeros(len(counts), dtype=np.int64)
+    first[occupied] = np.minimum.reduceat(at_best, segment_starts)
+    split[splittable] = first[splittable]
+    return split
+
+
+def select_ground(index, algorithm='bottom_percentile', height_window=0.5, percentile=0.4, cell_ids=None):
+    """Number of ground points per cell
+
+    Every algorithm keeps a lowest-first prefix of each cell's height-sorted
+    segment, so the selection is fully described by a per-cell count:
+      simple_average    - all points
+      bottom_percentile - points at or below the height of the lowest `percentile`
+                          fraction (at least one point), as in the CUDA kernel
+      height_window     - points within `height_window` of the cell's lowest point
+      kmeans            - lower cluster of a 2-means split on height, for cells whose
+                          spread exceeds `height_window` (None: every cell)
+    """
+    counts = index.counts
+    if algorithm == 'simple_average':
+        return counts.copy()
+
+    if cell_ids is None:
+        cell_ids = index.cell_ids()
+    occupied = counts > 0
+
+    if algorithm == 'kmeans':
+        selected = two_means_split(index, cell_ids)
+        if height_window is not None:
+            spread = np.zeros(len(counts))
+            spread[occupied] = index.depth[index.offsets[1:][occupied] - 1] - index.depth[index.offsets[:-1][occupied]]
+            within = spread <= height_window
+            selected[within] = counts[within]
+        return selected
+
+    threshold = np.full(len(counts), -np.inf)
+
+    if algorithm == 'bottom_percentile':
+        k = np.maximum(1, (counts * percentile).astype(np.int64))
+        threshold[occupied] = index.depth[index.offsets[:-1][occupied] + k[occupied] - 1]
+    elif algorithm == 'height_window':
+        threshold[occupied] = index.depth[index.offsets[:-1][occupied]] + height_window
+    else:
+        raise ValueError(f"Unknown algorithm: {algorithm}")
+
+    return _count_at_or_below(index, threshold, cell_ids)
+
+
+def reduce_cells(index, colors, selected, cell_ids=None):
+    """Segmented reductions over each cell's selected (ground) points
+
+    Returns a dict of per-cell arrays: count, selected, color_sum (N x 3, or None),
+    depth_sum, depth_max (highest selected point) and depth_min.
+    """
+    counts = index.counts
+    if cell_ids is None:
+        cell_ids = index.cell_ids()
+    n_cells = index.grid.n_cells
+
+    rank = np.arange(len(index.order), dtype=np.int64) - index.offsets[cell_ids]
+    keep = rank < selected[cell_ids]
+    kept_cells = cell_ids[keep]
+    kept_points = index.order[keep]
+
+    stats = {
+        'count': counts,
+        'selected': selected,
+        'depth_sum': np.bincount(kept_cells, weights=index.depth[keep], minlength=n_cells),
+        'depth_min': index.segment_minimum(),
+        'depth_max': np.full(n_cells, np.nan),
+        'color_sum': None
+    }
+    has_ground = selected > 0
+    stats['depth_max'][has_ground] = index.depth[index.offsets[:-1][has_ground] + selected[has_ground] - 1]
+
+    if colors is not None:
+        kept_colors = np.asarray(colors)[kept_points].astype(np.float64)
+        stats['color_sum'] = np.stack([
+            np.bincount(kept_cells, weights=kept_colors[:, c], minlength=n_cells) for c in range(3)
+        ], axis=1)
+    return stats
+
+
+def selected_means(index, values, selected, cell_ids=None):
+    """Per-cell mean of arbitrary per-point columns over each cell's selected points
+
+    Returns (occupied cell ids, means) where means has one row per occupied cell.
+    """
+    if cell_ids is None:
+        cell_ids = index.cell_ids()
+    values = np.asarray(values, dtype=np.float64)
+    values = values.reshape(len(values), -1)
+    rank = np.arange(len(index.order), dtype=np.int64) - index.offsets[cell_ids]
+    keep = rank < selected[cell_ids]
+    kept_cells = cell_ids[keep]
+    kept_values = values[index.order[keep]]
+    occupied = np.flatnonzero(selected > 0)
+    means = np.stack([
+        np.bincount(kept_cells, weights=kept_values[:, c], minlength=index.grid.n_cells)[occupied]
+        for c in range(values.shape[1])
+    ], axis=1) / selected[occupied, None]
+    return occupied, means
+
+
+def nearest_points(points_2d, queries, max_block=1 << 24):
+    """Index of the nearest point for each query location (one KD-tree query when scipy is available)"""
+    if SCIPY_AVAILABLE:
+        return cKDTree(points_2d).query(queries)[1]
+    nearest = np.empty(len(queries), dtype=np.int64)
+    chunk_size = max(1, max_block // max(len(points_2d), 1))
+    for start in range(0, len(queries), chunk_size):
+        block = queries[start:start + chunk_size]
+        distances = ((points_2d[None, :, :] - block[:, None, :]) ** 2).sum(axis=2)
+        nearest[start:start + chunk_size] = distances.argmin(axis=1)
+    return nearest
+
+
+def nearest_occupied(occupied):
+    """Flat index of the nearest occupied cell for every cell of a 2D occupancy grid
+
+    One Euclidean distance transform with nearest-index propagation when scipy is
+    available, instead of a distance search per empty cell; -1 when nothing is occupied.
+    """
+    occupied = np.asarray(occupied, dtype=bool)
+    if not occupied.any():
+        return np.full(occupied.size, -1, dtype=np.int64)
+    if SCIPY_AVAILABLE:
+        rows, cols = ndimage.distance_transform_edt(~occupied, return_distances=False, return_indices=True)
+        return (rows * occupied.shape[1] + cols).ravel().astype(np.int64)
+    cells = np.flatnonzero(occupied)
+    coordinates = np.column_stack(np.divmod(np.arange(occupied.size), occupied.shape[1])).astype(np.float64)
+    nearest = np.arange(occupied.size, dtype=np.int64)
+    empty = ~occupied.ravel()
+    nearest[empty] = cells[nearest_points(coordinates[cells], coordinates[empty])]
+    return nearest
+
+
+def _box_sum(values, radius):
+    """Sum over a (2r+1) x (2r+1) window using an integral image"""
+    pad = np.pad(values, [(radius + 1, radius)] * 2 + [(0, 0)] * (values.ndim - 2))
+    integral = pad.cumsum(axis=0).cumsum(axis=1)
+    size = 2 * radius + 1
+    return (integral[size:, size:] - integral[:-size, size:]
+            - integral[size:, :-size] + integral[:-size, :-size])
+
+
+def _box_max(values, radius):
+    """Maximum over a (2r+1) x (2r+1) window (separable), ignoring NaN"""
+    window = 2 * radius + 1
+    result = np.where(np.isnan(values), -np.inf, values)
+    for axis in (0, 1):
+        padded = np.pad(result, [(radius, radius) if a == axis else (0, 0) for a in range(2)],
+                        constant_values=-np.inf)
+        result = np.lib.stride_tricks.sliding_window_view(padded, window, axis=axis).max(axis=-1)
+    return np.where(np.isneginf(result), np.nan, result)
+
+
+def expand_empty_cells(stats, grid, radii=CUDA_EXPANSION_RADII):
+    """Fill empty cells from progressively larger neighbourhoods
+
+    Mirrors the kernels' search expansion: an empty pixel takes the combined
+    ground statistics of the occupied cells within the first radius that has any.
+    All empty pixels are handled per radius with box filters over the cell grid.
+    Adds 'fill_radius': 0 for occupied cells, the radius a cell was filled from,
+    -1 for cells left empty.
+    """
+    shape = (grid.height, grid.width)
+    filled = {k: (None if v is None else v.astype(np.float64)) for k, v in stats.items()}
+    empty = stats['count'] == 0
+    filled['fill_radius'] = np.where(empty, -1, 0).astype(np.int16)
+
+    for radius in radii:
+        if not empty.any():
+            break
+        grid_count = _box_sum(stats['count'].reshape(shape).astype(np.float64), radius).ravel()
+        take = empty & (grid_count > 0)
+        if not take.any():
+            continue
+        filled['count'][take] = grid_count[take]
+        for key in ('selected', 'depth_sum'):
+            box = _box_sum(stats[key].reshape(shape).astype(np.float64), radius).ravel()
+            filled[key][take] = box[take]
+        if stats['color_sum'] is not None:
+            box = _box_sum(stats['color_sum'].reshape(shape + (3,)), radius).reshape(-1, 3)
+            filled['color_sum'][take] = box[take]
+        filled['depth_max'][take] = _box_max(stats['depth_max'].reshape(shape), radius).ravel()[take]
+        filled['fill_radius'][take] = radius
+        empty &= ~take
+
+    return filled
+
+
+def _terrain_gradient(t):
+    """Blue -> cyan -> green -> yellow -> red gradient used by the bottom percentile kernel"""
+    t = np.clip(t, 0.0, 1.0)
+    rgb = np.zeros(t.shape + (3,))
+    stops = [(0.0, (0, 100, 255)), (0.25, (0, 255, 255)), (0.5, (0, 255, 0)),
+             (0.75, (255, 255, 0)), (1.0, (255, 0, 0))]
+    for (t0, c0), (t1, c1) in zip(stops, stops[1:]):
+        mask = (t >= t0) & (t <= t1)
+        u = ((t[mask] - t0) / (t1 - t0))[:, None]
+        rgb[mask] = (1 - u) * np.array(c0) + u * np.array(c1)
+    return rgb
+
+
+def _simple_gradient(t):
+    """Blue -> green -> brown -> white gradient used by the simple average kernel"""
+    t = np.clip(t, 0.0, 1.0)
+    rgb = np.zeros(t.shape + (3,))
+    stops = [(0.0, (100, 150, 255)), (0.33, (34, 139, 34)), (0.67, (139, 90, 45)), (1.0, (255, 255, 255))]
+    for (t0, c0), (t1, c1) in zip(stops, stops[1:]):
+        mask = (t >= t0) & (t <= t1)
+        u = ((t[mask] - t0) / (t1 - t0))[:, None]
+        rgb[mask] = (1 - u) * np.array(c0) + u * np.array(c1)
+    return rgb
+
+
+def colorize(stats, grid, coloring='true_color', algorithm='bottom_percentile', z_range=None, color_scale=1.0):
+    """Turn per-cell statistics into an RGB uint8 image (height x width x 3)"""
+    count = stats['count']
+    selected = np.asarray(stats['selected'], dtype=np.float64)
+    simple = algorithm == 'simple_average'
+    empty_color = EMPTY_COLOR_SIMPLE if simple else EMPTY_COLOR
+
+    image = np.empty((grid.n_cells, 3), dtype=np.float64)
+    image[:] = empty_color
+    valid = selected > 0
+
+    if coloring == 'true_color' and stats['color_sum'] is None:
+        coloring = 'height'
+
+    if coloring == 'true_color':
+        image[valid] = stats['color_sum'][valid] / selected[valid, None] * color_scale
+    elif coloring == 'height':
+        z_min, z_max = z_range if z_range is not None else (np.nanmin(stats['depth_min']), np.nanmax(stats['depth_max']))
+        span = (z_max - z_min) or 1.0
+        if simple:
+            heights = stats['depth_sum'][valid] / selected[valid]
+            image[valid] = _simple_gradient((heights - z_min) / span)
+        else:
+            image[valid] = _terrain_gradient((stats['depth_max'][valid] - z_min) / span)
+    elif coloring == 'path':
+        if simple:
+            image[valid] = (34, 139, 34)
+        else:
+            ratio = selected[valid] / np.maximum(count[valid], 1)
+            image[valid] = np.where((ratio >= 0.7)[:, None], (0, 255, 0), (255, 0, 0))
+    else:
+        raise ValueError(f"Unknown coloring: {coloring}")
+
+    return np.clip(image, 0, 255).astype(np.uint8).reshape(grid.height, grid.width, 3)
+
+
+def prepare_view(vertices, projection='xy', custom_bounds=None, output_width=1280, output_height=720, rotation=0):
+    """Projected (and rotated) coordinates plus the fitted raster grid, as the CUDA generator does it"""
+    x, y, depth = project_points(vertices, projection)
+    center = (float(x.mean()), float(y.mean())) if rotation else None
+    x, y = rotate_points(x, y, rotation, center)
+    grid = RasterGrid.fit(*view_bounds(x, y, custom_bounds), output_width, output_height, center)
+    return x, y, depth, grid
+
+
+def color_scale_for(colors):
+    """Colors stored as 0-1 floats are scaled to 0-255"""
+    return 255.0 if colors is not None and len(colors) and np.max(colors) <= 1.0 else 1.0
+
+
+def render_index(index, colors, algorithm='bottom_percentile', coloring='true_color', height_window=0.5,
+                 percentile=0.4, expansion_radii=CUDA_EXPANSION_RADII, z_range=None, color_scale=1.0):
+    """Ground selection, reductions, empty-pixel fill and coloring for an indexed grid"""
+    cell_ids = index.cell_ids()
+    selected = select_ground(index, algorithm, height_window, percentile, cell_ids)
+    stats = reduce_cells(index, colors, selected, cell_ids)
+    if expansion_radii:
+        stats = expand_empty_cells(stats, index.grid, expansion_radii)
+    return colorize(stats, index.grid, coloring, algorithm, z_range, color_scale), stats
+
+
+def rasterize(vertices, colors=None, projection='xy', custom_bounds=None, output_width=1280, output_height=720,
+              rotation=0, algorithm='bottom_percentile', coloring='true_color', height_window=0.5,
+              percentile=0.4, expansion_radii=CUDA_EXPANSION_RADII, return_stats=False):
+    """Rasterize a point cloud into a ground-surface yard map
+
+    Same view logic as the CUDA generator: optional rotation around the centroid,
+    custom or 1-99 percentile bounds, 1:1 pixels fitted to the output size. Bounds
+    only choose the view window; every point is still binned.
+
+    Returns:
+        uint8 RGB image, plus (grid, stats) when return_stats is True
+    """
+    if len(vertices) == 0:
+        raise ValueError("No vertices to process!")
+
+    x, y, depth, grid = prepare_view(vertices, projection, custom_bounds, output_width, output_height, rotation)
+    index = CellIndex.build(x, y, depth, grid)
+    z_range = (float(depth.min()), float(depth.max()))
+    image, stats = render_index(index, colors, algorithm, coloring, height_window, percentile,
+                                expansion_radii, z_range, color_scale_for(colors))
+
+    if return_stats:
+        return image, grid, stats
+    return image
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+Direct encoding of yard map rasters.
+The generators already produce the exact uint8 RGB image, so it is encoded as is
+(PNG or WebP through PIL) instead of being drawn into a plotting figure first. The
+world position of the raster is written next to the image as a JSON sidecar, and the
+per-cell ground heights of the same render can be saved as a float32 elevation raster.
+"""
+
+import io
+import json
+import os
+
+import numpy as np
+from PIL import Image
+
+IMAGE_FORMATS = ('png', 'webp')
+
+# PNG: zlib level 0-9 (lossless at every level; low levels encode fastest)
+DEFAULT_PNG_COMPRESSION = 1
+# WebP: quality 0-100 for lossy encoding; None encodes losslessly
+DEFAULT_WEBP_QUALITY = None
+
+
+def image_format(path, format=None):
+    """Explicit format, else the one implied by the file extension (default png)"""
+    if format is None:
+        format = os.path.splitext(str(path))[1].lstrip('.').lower() or 'png'
+    format = format.lower()
+    if format not in IMAGE_FORMATS:
+        raise ValueError(f"Unsupported image format: {format} (expected one of {IMAGE_FORMATS})")
+    return format
+
+
+def encode_image(image, format='png', compression=None):
+    """Encode a uint8 RGB array
+
+    Args:
+        image: (height, width, 3) uint8 array
+        format: 'png' or 'webp'
+        compression: PNG zlib level (0-9) or WebP quality (0-100, None for lossless)
+
+    Returns:
+        Encoded image bytes
+    """
+    format = image_format(None, format)
+    buffer = io.BytesIO()
+    pil_image = Image.fromarray(image, mode='RGB')
+    if format == 'png':
+        level = DEFAULT_PNG_COMPRESSION if compression is None else int(compression)
+        pil_image.save(buffer, format='PNG', compress_level=level)
+    else:
+        quality = DEFAULT_WEBP_QUALITY if compression is None else int(compression)
+        if quality is None:
+            pil_image.save(buffer, format='WEBP', lossless=True)
+        else:
+            pil_image.save(buffer, format='WEBP', quality=quality)
+    return buffer.getvalue()
+
+
+def georeference(bounds, width, height, projection='xy', rotation=0, **extra):
+    """World placement of a raster: row 0 is the max-y edge, column 0 the min-x edge
+
+    Args:
+        bounds: (x_min, x_max, y_min, y_max) of the full raster in (rotated) view coordinates
+        extra: Additional fields (e.g. algorithm, coloring)
+    """
+    x_min, x_max, y_min, y_max = (float(b) for b in bounds)
+    return {
+        'x_min': x_min, 'x_max': x_max, 'y_min': y_min, 'y_max': y_max,
+        'width': int(width), 'height': int(height),
+        'pixel_size_x': (x_max - x_min) / width,
+        'pixel_size_y': (y_max - y_min) / height,
+        'projection': projection,
+        'rotation_degrees': float(rotation),
+        **extra
+    }
+
+
+def grid_georeference(grid, projection='xy', rotation=0, **extra):
+    """georeference() of a raster_engine.RasterGrid (plus the rotation center of rotated views)"""
+    if rotation and grid.center is not None:
+        extra = {'rotation_center': list(grid.center), **extra}
+    return georeference(grid.bounds, grid.width, grid.height, projection, rotation, **extra)
+
+
+def sidecar_path(path):
+    """JSON sidecar next to an image (yard_map.png -> yard_map.json)"""
+    return os.path.splitext(str(path))[0] + '.json'
+
+
+def ground_raster_path(path):
+    """Ground elevation raster next to an image (yard_map.png -> yard_map_ground.npz)"""
+    return os.path.splitext(str(path))[0] + '_ground.npz'
+
+
+def ground_rasters(stats, grid):
+    """Per-cell ground rasters of a render, aligned with its image
+
+    Args:
+        stats: Per-cell statistics from raster_engine (after expand_empty_cells or not)
+
+    Returns:
+        Dict of (height, width) arrays:
+          elevation   - float32 mean height of the selected ground points, NaN without ground
+          count       - uint32 points binned into the cell itself (0 for filled cells)
+          fill_radius - int16 0 for measured cells, the expansion radius a cell was filled
+                        from, -1 for cells without ground
+    """
+    shape = (grid.height, grid.width)
+    selected = np.asarray(stats['selected'], dtype=np.float64)
+    has_ground = selected > 0
+    elevation = np.full(grid.n_cells, np.nan, dtype=np.float32)
+    elevation[has_ground] = stats['depth_sum'][has_ground] / selected[has_ground]
+
+    fill_radius = stats.get('fill_radius')
+    if fill_radius is None:
+        fill_radius = np.where(has_ground, 0, -1)
+    fill_radius = np.where(has_ground, fill_radius, -1).astype(np.int16)
+    count = np.where(fill_radius == 0, stats['count'], 0).astype(np.uint32)
+    return {
+        'elevation': elevation.reshape(shape),
+        'count': count.reshape(shape),
+        'fill_radius': fill_radius.reshape(shape)
+    }
+
+
+def save_ground_rasters(stats, grid, path, georef):
+    """Save ground_rasters() with the image's georeference as one .npz file
+
+    Returns:
+        Number of bytes written
+    """
+    rasters = ground_rasters(stats, grid)
+    with open(path, 'wb') as f:
+        np.savez(f, georef=np.array(json.dumps(georef)), **rasters)
+    return os.path.getsize(path)
+
+
+def load_ground_rasters(path):
+    """Arrays and georeference written by save_ground_rasters
+
+    Returns:
+        Dict with elevation, count, fill_radius and georef (a dict)
+    """
+    with np.load(path) as data:
+        rasters = {name: data[name] for name in ('elevation', 'count', 'fill_radius')}
+        rasters['georef'] = json.loads(str(data['georef']))
+    return rasters
+
+
+def save_raster(image, path, format=None, compression=None, georef=None):
+    """Encode a raster to `path`, plus its georeference sidecar when given
+
+    Returns:
+        Number of image bytes written
+    """
+    data = encode_image(image, image_format(path, format), compression)
+    with open(path, 'wb') as f:
+        f.write(data)
+    if georef is not None:
+        with open(sidecar_path(path), 'w') as f:
+            json.dump(georef, f, indent=2)
+    return len(data)
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Content-addressed cache of generated yard maps.
+A result is keyed by the source mesh fingerprint plus the canonicalized generation
+parameters, so regenerating the same view returns the stored image immediately.
+Entries are evicted least-recently-used once the cache exceeds its size budget.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import shutil
+import time
+
+from yard_map.point_cache import fingerprint
+
+logger = logging.getLogger(__name__)
+
+# Overridable per process with YARD_MAP_RESULT_CACHE_DIR / YARD_MAP_RESULT_CACHE_MAX_BYTES
+DEFAULT_CACHE_DIR = os.path.expanduser('~/.cache/yard_map/results')
+DEFAULT_MAX_BYTES = 1024 ** 3
+
+# Bumped whenever the generators change their output for the same parameters
+RESULT_VERSION = 3
+
+META_FILE = 'meta.json'
+IMAGE_FILE = 'image.png'
+
+
+def _canonical(value):
+    """JSON-stable form of a parameter: numbers as floats, sequences as lists"""
+    if isinstance(value, bool) or value is None or isinstance(value, str):
+        return value
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, dict):
+        return {str(k): _canonical(v) for k, v in sorted(value.items())}
+    if isinstance(value, (list, tuple)):
+        return [_canonical(v) for v in value]
+    return str(value)
+
+
+def result_key(source_path, **parameters):
+    """Cache key of a generated map: mesh fingerprint plus canonicalized parameters
+
+    Parameters set to None are dropped, so omitted and explicit defaults of None match.
+    """
+    parameters = {k: _canonical(v) for k, v in parameters.items() if v is not None}
+    source = json.dumps([RESULT_VERSION, fingerprint(source_path), parameters], sort_keys=True)
+    return hashlib.sha1(source.encode('utf-8')).hexdigest()[:24]
+
+
+class ResultCache:
+    """Directory of generated images with size-bounded LRU eviction"""
+
+    def __init__(self, cache_dir=None, max_bytes=None):
+        self.cache_dir = cache_dir or os.environ.get('YARD_MAP_RESULT_CACHE_DIR', DEFAULT_CACHE_DIR)
+        self.max_bytes = int(max_bytes or os.environ.get('YARD_MAP_RESULT_CACHE_MAX_BYTES', DEFAULT_MAX_BYTES))
+
+    def entry_dir(self, key):
+        return os.path.join(self.cache_dir, key)
+
+    def get(self, key):
+        """(image_data, meta) of a cached result, or None"""
+        entry_dir = self.entry_dir(key)
+        meta_path = os.path.join(entry_dir, META_FILE)
+        try:
+            with open(meta_path) as f:
+                meta = json.load(f)
+            with open(os.path.join(entry_dir, IMAGE_FILE), 'rb') as f:
+                image_data = f.read()
+            os.utime(meta_path)  # Access time for LRU eviction
+        except (OSError, ValueError):
+            return None
+        return image_data, meta
+
+    def put(self, key, image_data, **meta):
+        """Store a result (meta must be JSON-serializable), then evict down to max_bytes"""
+        os.makedirs(self.cache_dir, exist_ok=True)
+        build_dir = self.entry_dir(f"{key}.tmp-{os.getpid()}")
+        shutil.rmtree(build_dir, ignore_errors=True)
+        os.makedirs(build_dir)
+        try:
+            with open(os.path.join(build_dir, IMAGE_FILE), 'wb') as f:
+                f.write(image_data)
+            with open(os.path.join(build_dir, META_FILE), 'w') as f:
+                json.dump({**meta, 'key': key, 'created': time.time()}, f, indent=2)
+            shutil.rmtree(self.entry_dir(key), ignore_errors=True)
+            os.rename(build_dir, self.entry_dir(key))
+        except BaseException:
+            shutil.rmtree(build_dir, ignore_errors=True)
+            raise
+        self.evict(keep=key)
+
+    def entries(self):
+        """[(key, last_used, size_bytes)] of complete entries"""
+        entries = []
+        if not os.path.isdir(self.cache_dir):
+            return entries
+        for key in os.listdir(self.cache_dir):
+            meta_path = os.path.join(self.entry_dir(key), META_FILE)
+            if '.tmp-' in key or not os.path.exists(meta_path):
+                continue
+            size = sum(os.path.getsize(os.path.join(self.entry_dir(key), name))
+                       for name in os.listdir(self.entry_dir(key)))
+            entries.append((key, os.path.getmtime(meta_path), size))
+        return entries
+
+    def evict(self, keep=None):
+        """Remove least recently used entries until the cache fits max_bytes"""
+        entries = sorted(self.entries(), key=lambda e: e[1])
+        total = sum(size for _, _, size in entries)
+        removed = []
+        for key, _, size in entries:
+            if total <= self.max_bytes:
+                break
+            if key == keep:
+                continue
+            shutil.rmtree(self.entry_dir(key), ignore_errors=True)
+            logger.info(f"Evicted yard map result {key} ({size / 1024:.1f} KB)")
+            total -= size
+            removed.append(key)
+        return removed
@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""
+Deterministic subsampling of large point clouds.
+Replaces np.random.choice(n, k, replace=False), which materializes a permutation of
+all n points and gives a different map on every run. Both samplers here are seeded,
+return sorted indices and use memory proportional to the sample: the stratified
+sampler buckets the yard plane into a grid and caps every cell at the same quota, so
+dense foliage is thinned while sparse lawn keeps all of its points.
+"""
+
+import numpy as np
+
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+SAMPLING_METHODS = ('stratified', 'strided')
+DEFAULT_SAMPLING = 'stratified'
+
+# Stratification grid: about this many sampled points per cell of a uniform cloud
+POINTS_PER_CELL = 4
+# Points read per pass of the stratified sampler (bounds temporaries for memory-mapped clouds)
+CHUNK_SIZE = 1000000
+
+
+def strided_indices(n, max_points, seed=0):
+    """Evenly strided selection of max_points of n indices, with a seeded phase"""
+    if n <= max_points:
+        return np.arange(n, dtype=np.int64)
+    stride = n / max_points
+    phase = np.random.default_rng(seed).random() * stride
+    return (phase + np.arange(max_points) * stride).astype(np.int64)
+
+
+def _cell_quotas(counts, max_points):
+    """Per-cell sample sizes summing to max_points, capped uniformly (water-filling)
+
+    Every cell gets min(count, cap) for a single cap; the fractional remainder goes
+    to the cells with the largest fractional quotas.
+    """
+    ordered = np.sort(counts)
+    remaining = len(ordered) - np.arange(len(ordered))
+    # Total kept when the cap equals each sorted count: fully kept cells below, capped above
+    totals = np.concatenate([[0], np.cumsum(ordered)[:-1]]) + ordered * remaining
+    k = int(np.searchsorted(totals, max_points))
+    below = int(ordered[:k].sum())
+    cap = (max_points - below) / remaining[k]
+
+    quotas = np.minimum(counts, cap)
+    whole = np.floor(quotas).astype(np.int64)
+    short = max_points - int(whole.sum())
+    if short > 0:
+        whole[np.argpartition(whole - quotas, short - 1)[:short]] += 1
+    return whole
+
+
+def _cells_of(xy, lower, cell_size, shape):
+    """Stratification cell of each x-y point (row-major, clipped to the grid)"""
+    ij = np.clip(((np.asarray(xy, dtype=np.float64) - lower) / cell_size).astype(np.int64), 0, shape - 1)
+    return ij[:, 1] * shape[0] + ij[:, 0]
+
+
+if NUMBA_AVAILABLE:
+    @njit(cache=True)
+    def _cell_of(x, y, lower, cell_size, shape):
+        i = min(max(int((x - lower[0]) / cell_size), 0), shape[0] - 1)
+        j = min(max(int((y - lower[1]) / cell_size), 0), shape[1] - 1)
+        return j * shape[0] + i
+
+    @njit(cache=True)
+    def _count_cells(xy, lower, cell_size, shape, counts):
+        for k in range(len(xy)):
+            counts[_cell_of(xy[k, 0], xy[k, 1], lower, cell_size, shape)] += 1
+
+    @njit(cache=True)
+    def _select_points(xy, lower, cell_size, shape, seen, counts, quotas, offsets):
+        """keep mask of one chunk; advances the per-cell running ranks in `seen`"""
+        keep = np.zeros(len(xy), dtype=np.bool_)
+        for k in range(len(xy)):
+            cell = _cell_of(xy[k, 0], xy[k, 1], lower, cell_size, shape)
+            count, quota = counts[cell], quotas[cell]
+            shifted = (seen[cell] + offsets[cell]) % count
+            seen[cell] += 1
+            keep[k] = (shifted + 1) * quota // count > shifted * quota // count
+        return keep
+else:
+    def _count_cells(xy, lower, cell_size, shape, counts):
+        counts += np.bincount(_cells_of(xy, lower, cell_size, shape), minlength=len(counts))
+
+    def _select_points(xy, lower, cell_size, shape, seen, counts, quotas, offsets):
+        """keep mask of one chunk; advances the per-cell running ranks in `seen`"""
+        cells = _cells_of(xy, lower, cell_size, shape)
+        order = np.argsort(cells, kind='stable')
+        sorted_cells = cells[order]
+        first = np.searchsorted(sorted_cells, sorted_cells, side='left')
+        rank = np.empty(len(cells), dtype=np.int64)
+        rank[order] = np.arange(len(cells)) - first + seen[sorted_cells]
+        seen += np.bincount(cells, minlength=len(counts))
+
+        count, quota = counts[cells], quotas[cells]
+        shifted = (rank + offsets[cells]) % count
+        return (shifted + 1) * quota // count > shifted * quota // count
+
+
+def stratified_indices(xyz, max_points, seed=0, bounds=None, points_per_cell=POINTS_PER_CELL,
+                       chunk_size=CHUNK_SIZE):
+    """Sample indices spread uniformly over the x-y plane
+
+    The x-y bounding box is bucketed into about max_points / points_per_cell cells,
+    every cell is capped at the same quota and points are picked evenly by file order
+    within each cell (with a seeded per-cell offset). Reads `xyz` in chunks, so a
+    memory-mapped cloud is never copied as a whole.
+
+    Args:
+        xyz: N x 3 (or N x 2) array, may be memory-mapped
+        max_points: Sample size
+        bounds: Known (x_min, x_max, y_min, y_max) of the cloud, saves a pass over it
+
+    Returns:
+        Sorted int64 indices of exactly min(N, max_points) points
+    """
+    n = len(xyz)
+    if n <= max_points:
+        return np.arange(n, dtype=np.int64)
+
+    chunks = [(start, min(start + chunk_size, n)) for start in range(0, n, chunk_size)]
+    if bounds is not None:
+        lower, upper = np.array(bounds[0::2], dtype=np.float64), np.array(bounds[1::2], dtype=np.float64)
+    else:
+        lower = np.full(2, np.inf)
+        upper = np.full(2, -np.inf)
+        for start, end in chunks:
+            for axis in range(2):
+                column = xyz[start:end, axis]
+                lower[axis] = min(lower[axis], column.min())
+                upper[axis] = max(upper[axis], column.max())
+
+    extent = np.maximum(upper - lower, 1e-9)
+    n_cells = max(1, max_points // points_per_cell)
+    cell_size = float(np.sqrt(extent[0] * extent[1] / n_cells) if extent.min() > 1e-9 else extent.max() / n_cells)
+    shape = np.maximum(np.ceil(extent / cell_size).astype(np.int64), 1)
+
+    counts = np.zeros(shape[0] * shape[1], dtype=np.int64)
+    for start, end in chunks:
+        _count_cells(xyz[start:end, :2], lower, cell_size, shape, counts)
+    quotas = _cell_quotas(counts, max_points)
+    offsets = (np.random.default_rng(seed).random(len(counts)) * np.maximum(counts, 1)).astype(np.int64)
+
+    selected = []
+    seen = np.zeros(len(counts), dtype=np.int64)
+    for start, end in chunks:
+        # Of a cell's count ranks, exactly quota pass: those where floor(r * quota / count) steps
+        keep = _select_points(xyz[start:end, :2], lower, cell_size, shape, seen, counts, quotas, offsets)
+        selected.append(start + np.flatnonzero(keep))
+    return np.concatenate(selected)
+
+
+def sample_indices(xyz, max_points, method=DEFAULT_SAMPLING, seed=0, bounds=None):
+    """Sorted indices of at most max_points points of `xyz` ('stratified' or 'strided')"""
+    if method == 'stratified':
+        return stratified_indices(xyz, max_points, seed=seed, bounds=bounds)
+    if method == 'strided':
+        return strided_indices(len(xyz), max_points, seed=seed)
+    raise ValueError(f"Unknown sampling method: {method} (expected one of {SAMPLING_METHODS})")
+
+
+def subsample(vertices, colors, max_points, method=DEFAULT_SAMPLING, seed=0, bounds=None):
+    """(vertices, colors) reduced to at most max_points points; colors may be None"""
+    if len(vertices) <= max_points:
+        return vertices, colors
+    indices = sample_indices(vertices, max_points, method, seed, bounds)
+    return vertices[indices], (colors[indices] if colors is not None else None)
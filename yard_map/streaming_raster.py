@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+"""
+Out-of-core yard map rasterization straight from a PLY file.
+The vertex block is streamed in fixed-size chunks and per-cell statistics are
+accumulated incrementally, so memory is bounded by the raster size rather than the
+point count and no points are discarded:
+  pass 0 - centroid, height range and a strided sample for the view bounds
+  pass 1 - per-cell count, lowest height and a height reservoir (percentile/K-means sketch)
+  pass 2 - per-cell sums over the points at or below each cell's ground threshold
+"""
+
+import math
+
+import numpy as np
+
+from yard_map.ply_reader import read_header, iter_vertex_chunks
+from yard_map.raster_engine import (
+    CUDA_EXPANSION_RADII, RasterGrid, CellIndex, project_points, rotate_points, view_bounds,
+    two_means_split, expand_empty_cells, colorize
+)
+
+
+def _project_chunk(xyz, projection, rotation, center):
+    x, y, depth = project_points(xyz, projection)
+    x, y = rotate_points(x, y, rotation, center)
+    return x, y, depth
+
+
+def scan_view(path, projection='xy', chunk_size=2000000, sample_size=2000000, header=None):
+    """Pass 0: centroid, height range and an evenly strided (x, y) sample of the cloud"""
+    header = header or read_header(path)
+    stride = max(1, math.ceil(header.vertex_count / sample_size))
+    x_sum = y_sum = 0.0
+    z_min, z_max = np.inf, -np.inf
+    samples, seen = [], 0
+
+    for xyz, _ in iter_vertex_chunks(path, chunk_size, header):
+        x, y, depth = project_points(xyz, projection)
+        x_sum += float(x.sum(dtype=np.float64))
+        y_sum += float(y.sum(dtype=np.float64))
+        z_min = min(z_min, float(depth.min()))
+        z_max = max(z_max, float(depth.max()))
+        start = (-seen) % stride
+        samples.append(np.column_stack([x[start::stride], y[start::stride]]))
+        seen += len(xyz)
+
+    return {
+        'count': seen,
+        'center': (x_sum / seen, y_sum / seen),
+        'z_range': (z_min, z_max),
+        'sample': np.concatenate(samples),
+    }
+
+
+class StreamingCellStats:
+    """Per-cell statistics accumulated chunk by chunk
+
+    Heights are sketched with a fixed-size reservoir per cell: cells with at most
+    `reservoir_size` points keep every height, so their ground thresholds are
+    exact; denser cells get a uniform sample of their heights.
+    """
+
+    def __init__(self, grid, reservoir_size=32, seed=0):
+        self.grid = grid
+        self.reservoir_size = reservoir_size
+        self.rng = np.random.default_rng(seed)
+        n = grid.n_cells
+        self.count = np.zeros(n, dtype=np.int64)
+        self.depth_min = np.full(n, np.inf, dtype=np.float32)
+        self.height_max = np.full(n, -np.inf, dtype=np.float32)
+        self.reservoir = np.full((n, reservoir_size), np.nan, dtype=np.float32)
+
+        self.selected = np.zeros(n, dtype=np.int64)
+        self.depth_sum = np.zeros(n)
+        self.depth_max = np.full(n, -np.inf, dtype=np.float32)
+        self.color_sum = None
+
+    def add_heights(self, cell, depth):
+        """Pass 1: counts, minimum height and reservoir sampling of heights"""
+        inside = cell >= 0
+        cell, depth = cell[inside], np.asarray(depth, dtype=np.float32)[inside]
+        if len(cell) == 0:
+            return
+        order = np.argsort(cell, kind='stable')
+        cell, depth = cell[order], depth[order]
+
+        chunk_counts = np.bincount(cell, minlength=self.grid.n_cells)
+        starts = np.cumsum(chunk_counts) - chunk_counts
+        occupied = np.flatnonzero(chunk_counts)
+        self.depth_min[occupied] = np.minimum(self.depth_min[occupied],
+                                              np.minimum.reduceat(depth, starts[occupied]))
+        self.height_max[occupied] = np.maximum(self.height_max[occupied],
+                                               np.maximum.reduceat(depth, starts[occupied]))
+
+        # Position of each point in its cell's stream decides its reservoir slot
+        seen = self.count[cell] + np.arange(len(cell)) - starts[cell]
+        slot = np.where(seen < self.reservoir_size, seen, self.rng.integers(0, seen + 1))
+        keep = slot < self.reservoir_size
+        self.reservoir[cell[keep], slot[keep]] = depth[keep]
+        self.count += chunk_counts
+
+    def thresholds(self, algorithm='bottom_percentile', height_window=0.5, percentile=0.4):
+        """Per-cell ground threshold: points at or below it are ground"""
+        n = self.grid.n_cells
+        occupied = self.count > 0
+        if algorithm == 'simple_average':
+            return np.where(occupied, np.inf, -np.inf)
+        if algorithm == 'height_window':
+            return np.where(occupied, self.depth_min + height_window, -np.inf)
+
+        heights = np.sort(self.reservoir, axis=1)  # NaN (unused slots) sort last
+        sampled = np.minimum(self.count, self.reservoir_size)
+        threshold = np.full(n, -np.inf)
+        rows = np.flatnonzero(occupied)
+
+        if algorithm == 'bottom_percentile':
+            k = np.maximum(1, (sampled[rows] * percentile).astype(np.int64))
+            threshold[rows] = heights[rows, k - 1]
+        elif algorithm == 'kmeans':
+            # 2-means split of each cell's sampled heights (a CSR view of the reservoir)
+            offsets = np.zeros(n + 1, dtype=np.int64)
+            np.cumsum(sampled, out=offsets[1:])
+            valid = np.arange(self.reservoir_size)[None, :] < sampled[:, None]
+            index = CellIndex(self.grid, offsets, None, heights[valid])
+            lower = two_means_split(index)
+            threshold[rows] = heights[rows, lower[rows] - 1]
+            if height_window is not None:
+                spread = self.height_max - self.depth_min
+                within = occupied & (spread <= height_window)
+                threshold[within] = np.inf
+        else:
+            raise ValueError(f"Unknown algorithm: {algorithm}")
+        return threshold
+
+    def add_ground(self, cell, depth, colors, threshold):
+        """Pass 2: sums over each cell's ground points"""
+        depth = np.asarray(depth, dtype=np.float32)
+        ground = np.flatnonzero((cell >= 0) & (depth <= threshold[np.maximum(cell, 0)]))
+        cell, depth = cell[ground], depth[ground]
+        n = self.grid.n_cells
+
+        self.selected += np.bincount(cell, minlength=n)
+        self.depth_sum += np.bincount(cell, weights=depth, minlength=n)
+        np.maximum.at(self.depth_max, cell, depth)
+        if colors is not None:
+            if self.color_sum is None:
+                self.color_sum = np.zeros((n, 3))
+            ground_colors = colors[ground].astype(np.float64)
+            for c in range(3):
+                self.color_sum[:, c] += np.bincount(cell, weights=ground_colors[:, c], minlength=n)
+
+    def stats(self):
+        """Per-cell statistics in the layout of raster_engine.reduce_cells"""
+        empty = self.count == 0
+        no_ground = self.selected == 0
+        return {
+            'count': self.count,
+            'selected': self.selected,
+            'depth_sum': self.depth_sum,
+            'depth_min': np.where(empty, np.nan, self.depth_min.astype(np.float64)),
+            'depth_max': np.where(no_ground, np.nan, self.depth_max.astype(np.float64)),
+            'color_sum': self.color_sum,
+        }
+
+
+def rasterize_ply_streaming(path, projection='xy', custom_bounds=None, output_width=1280, output_height=720,
+                            rotation=0, algorithm='bottom_percentile', coloring='true_color', height_window=0.5,
+                            percentile=0.4, expansion_radii=CUDA_EXPANSION_RADII, chunk_size=2000000,
+                            reservoir_size=32, return_stats=False, progress=None):
+    """Rasterize a PLY point cloud of any size with memory bounded by the raster
+
+    Same view logic and result as raster_engine.rasterize on the full cloud (exact for
+    cells with at most `reservoir_size` points; denser cells use a sampled threshold).
+
+    Args:
+        progress: Optional callable(pass_name, vertices_done, vertices_total)
+    """
+    header = read_header(path)
+    if header.vertex_count == 0:
+        raise ValueError("No vertices to process!")
+
+    view = scan_view(path, projection, chunk_size, header=header)
+    center = view['center']
+    sample_x, sample_y = rotate_points(view['sample'][:, 0], view['sample'][:, 1], rotation, center)
+    grid = RasterGrid.fit(*view_bounds(sample_x, sample_y, custom_bounds), output_width, output_height,
+                          center if rotation else None)
+
+    cells = StreamingCellStats(grid, reservoir_size)
+    done = 0
+    for xyz, _ in iter_vertex_chunks(path, chunk_size, header):
+        x, y, depth = _project_chunk(xyz, projection, rotation, center)
+        cells.add_heights(grid.cell_of(x, y), depth)
+        done += len(xyz)
+        if progress:
+            progress('heights', done, header.vertex_count)
+
+    threshold = cells.thresholds(algorithm, height_window, percentile)
+    done = 0
+    for xyz, colors in iter_vertex_chunks(path, chunk_size, header):
+        x, y, depth = _project_chunk(xyz, projection, rotation, center)
+        cells.add_ground(grid.cell_of(x, y), depth, colors, threshold)
+        done += len(xyz)
+        if progress:
+            progress('ground', done, header.vertex_count)
+
+    stats = cells.stats()
+    if expansion_radii:
+        stats = expand_empty_cells(stats, grid, expansion_radii)
+    image = colorize(stats, grid, coloring, algorithm, view['z_range'])
+
+    if return_stats:
+        return image, grid, stats
+    return image
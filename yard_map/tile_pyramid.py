@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+"""
+XYZ tile pyramid of a yard map.
+The deepest zoom level is rasterized tile by tile from the cloud's tile-sorted point
+arrays (the tiled_raster layout, identical to one full-size raster) and every level
+above it is a 2x2 downsample of the one below, so the whole pyramid comes from one
+pass over the points. Tiles are written as {z}/{x}/{y}.png under the pyramid
+directory, next to a pyramid.json describing the georeference. A folder of pyramids is
+kept under a size budget by evicting the least recently used ones.
+"""
+
+import hashlib
+import json
+import logging
+import math
+import os
+import shutil
+import time
+
+import numpy as np
+from PIL import Image
+
+from yard_map.raster_engine import CUDA_EXPANSION_RADII, PROJECTION_AXES, prepare_view, color_scale_for
+from yard_map.tiled_raster import sort_points_by_tile, rasterize_tile
+
+logger = logging.getLogger(__name__)
+
+TILE_SIZE = 256
+MAX_ZOOM = 5  # 8192 x 8192 pixels at the deepest level
+
+METADATA_FILE = 'pyramid.json'
+
+
+def pyramid_id(fingerprint, **parameters):
+    """Content address of a pyramid: source cloud plus every rendering parameter"""
+    source = json.dumps([fingerprint, sorted(parameters.items())], default=str)
+    return hashlib.sha1(source.encode('utf-8')).hexdigest()[:20]
+
+
+def auto_max_zoom(point_count, tile_size=TILE_SIZE):
+    """Deepest zoom where the raster has about one pixel per two points"""
+    side = math.sqrt(max(point_count, 1) / 2)
+    return int(np.clip(math.ceil(math.log2(max(side / tile_size, 1))), 0, MAX_ZOOM))
+
+
+def tile_path(directory, z, x, y):
+    return os.path.join(directory, str(z), str(x), f"{y}.png")
+
+
+def _save_tile(image, directory, z, x, y):
+    path = tile_path(directory, z, x, y)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    Image.fromarray(image).save(path)
+
+
+def _downsample(children, tile_size):
+    """Parent tile from its 2x2 children (row-major: top-left, top-right, bottom-left, bottom-right)"""
+    block = np.empty((2 * tile_size, 2 * tile_size, 3), dtype=np.uint8)
+    for i, child in enumerate(children):
+        r, c = divmod(i, 2)
+        block[r * tile_size:(r + 1) * tile_size, c * tile_size:(c + 1) * tile_size] = child
+    means = block.reshape(tile_size, 2, tile_size, 2, 3).astype(np.uint16).sum(axis=(1, 3))
+    return ((means + 2) // 4).astype(np.uint8)
+
+
+def build_pyramid(vertices, colors, directory, projection='xy', custom_bounds=None, rotation=0,
+                  algorithm='bottom_percentile', coloring='true_color', height_window=0.5, percentile=0.4,
+                  expansion_radii=CUDA_EXPANSION_RADII, max_zoom=None, tile_size=TILE_SIZE, progress=None):
+    """Render a tile pyramid of a point cloud into `directory`
+
+    Zoom z covers the (square-padded) view with 2^z x 2^z tiles of tile_size pixels.
+
+    Args:
+        max_zoom: Deepest zoom level, clamped to 0..MAX_ZOOM (default: auto_max_zoom)
+        progress: Optional callable(tiles_done, tiles_total)
+
+    Returns:
+        Pyramid metadata dict (also written to pyramid.json)
+    """
+    if len(vertices) == 0:
+        raise ValueError("No vertices to process!")
+    if max_zoom is None:
+        max_zoom = auto_max_zoom(len(vertices), tile_size)
+    max_zoom = min(max(int(max_zoom), 0), MAX_ZOOM)
+    halo = max(expansion_radii) if expansion_radii else 0
+    if halo > tile_size:
+        raise ValueError(f"tile_size ({tile_size}) must be at least the largest expansion radius ({halo})")
+
+    start_time = time.time()
+    side = tile_size * 2 ** max_zoom
+    x, y, depth, grid = prepare_view(vertices, projection, custom_bounds, side, side, rotation)
+    options = {
+        'algorithm': algorithm, 'coloring': coloring, 'height_window': height_window,
+        'percentile': percentile, 'expansion_radii': expansion_radii,
+        'z_range': (float(depth.min()), float(depth.max())),
+        'color_scale': color_scale_for(colors)
+    }
+    cells = grid.cell_of(x, y)
+    del x, y
+    points, offsets = sort_points_by_tile(cells, depth, colors, grid, tile_size)
+    del cells, depth
+
+    build_dir = f"{directory.rstrip(os.sep)}.tmp-{os.getpid()}"
+    shutil.rmtree(build_dir, ignore_errors=True)
+    tiles_total = sum(4 ** z for z in range(max_zoom + 1))
+    tiles_done = 0
+    try:
+        n = 2 ** max_zoom
+        for tile_row in range(n):
+            for tile_col in range(n):
+                _, _, image = rasterize_tile(points, offsets, grid, tile_size, tile_row, tile_col, halo, options)
+                _save_tile(image, build_dir, max_zoom, tile_col, tile_row)
+                tiles_done += 1
+                if progress:
+                    progress(tiles_done, tiles_total)
+
+        for z in range(max_zoom - 1, -1, -1):
+            for tile_y in range(2 ** z):
+                for tile_x in range(2 ** z):
+                    children = [np.asarray(Image.open(tile_path(build_dir, z + 1, 2 * tile_x + dx, 2 * tile_y + dy)))
+                                for dy in (0, 1) for dx in (0, 1)]
+                    _save_tile(_downsample(children, tile_size), build_dir, z, tile_x, tile_y)
+                    tiles_done += 1
+                    if progress:
+                        progress(tiles_done, tiles_total)
+
+        metadata = {
+            'tile_size': tile_size,
+            'min_zoom': 0,
+            'max_zoom': max_zoom,
+            'grid': grid.to_dict(),
+            'bounds': list(grid.bounds),
+            'projection': projection,
+            'depth_axis': 'xyz'[PROJECTION_AXES[projection][2]],
+            'rotation': rotation,
+            'parameters': {
+                'custom_bounds': custom_bounds, 'algorithm': algorithm, 'coloring': coloring,
+                'height_window': height_window, 'percentile': percentile,
+            },
+            'point_count': int(len(vertices)),
+            'size_bytes': _directory_bytes(build_dir),
+            'created': time.time(),
+        }
+        with open(os.path.join(build_dir, METADATA_FILE), 'w') as f:
+            json.dump(metadata, f, indent=2)
+
+        shutil.rmtree(directory, ignore_errors=True)
+        os.rename(build_dir, directory)
+    except BaseException:
+        shutil.rmtree(build_dir, ignore_errors=True)
+        raise
+
+    metadata['build_seconds'] = round(time.time() - start_time, 2)
+    return metadata
+
+
+def load_metadata(directory):
+    """pyramid.json of a built pyramid, or None"""
+    path = os.path.join(directory, METADATA_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def _directory_bytes(directory):
+    return sum(os.path.getsize(os.path.join(root, name))
+               for root, _, names in os.walk(directory) for name in names)
+
+
+def touch(directory):
+    """Mark a pyramid as used now (its pyramid.json mtime orders eviction)"""
+    try:
+        os.utime(os.path.join(directory, METADATA_FILE))
+    except OSError:
+        pass
+
+
+def pyramid_entries(tiles_folder):
+    """[(pyramid_id, last_used, size_bytes)] of the complete pyramids in a folder"""
+    entries = []
+    if not os.path.isdir(tiles_folder):
+        return entries
+    for pid in os.listdir(tiles_folder):
+        directory = os.path.join(tiles_folder, pid)
+        metadata_path = os.path.join(directory, METADATA_FILE)
+        if '.tmp-' in pid or not os.path.exists(metadata_path):
+            continue
+        try:
+            with open(metadata_path) as f:
+                size = json.load(f).get('size_bytes')
+        except (OSError, ValueError):
+            size = None
+        if size is None:
+            size = _directory_bytes(directory)
+        entries.append((pid, os.path.getmtime(metadata_path), size))
+    return entries
+
+
+def evict_pyramids(tiles_folder, max_bytes, keep=None):
+    """Remove least recently used pyramids until the folder fits max_bytes
+
+    Returns:
+        Removed pyramid ids
+    """
+    entries = sorted(pyramid_entries(tiles_folder), key=lambda e: e[1])
+    total = sum(size for _, _, size in entries)
+    removed = []
+    for pid, _, size in entries:
+        if total <= max_bytes:
+            break
+        if pid == keep:
+            continue
+        shutil.rmtree(os.path.join(tiles_folder, pid), ignore_errors=True)
+        logger.info(f"Evicted tile pyramid {pid} ({size / 1024 ** 2:.1f} MB)")
+        total -= size
+        removed.append(pid)
+    return removed
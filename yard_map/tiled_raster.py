@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+"""
+Tiled multiprocess yard map rasterization.
+The projected cloud is sorted by output tile into multiprocessing.shared_memory once;
+worker processes rasterize their tile plus a halo (wide enough for the empty-pixel
+search) from zero-copy views of those arrays, and the parent stitches the tile cores.
+The result is identical to raster_engine.rasterize.
+"""
+
+import os
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from yard_map.raster_engine import (
+    CUDA_EXPANSION_RADII, RasterGrid, CellIndex, prepare_view, color_scale_for, render_index, rasterize
+)
+
+
+class SharedArrays:
+    """Named numpy arrays, each backed by its own shared-memory block"""
+
+    def __init__(self, blocks, arrays):
+        self._blocks = blocks
+        self.arrays = arrays
+
+    @classmethod
+    def empty(cls, layout):
+        """Uninitialized arrays from {name: (shape, dtype)}"""
+        blocks, views = {}, {}
+        for name, (shape, dtype) in layout.items():
+            dtype = np.dtype(dtype)
+            block = shared_memory.SharedMemory(create=True, size=max(int(np.prod(shape)) * dtype.itemsize, 1))
+            blocks[name], views[name] = block, np.ndarray(shape, dtype=dtype, buffer=block.buf)
+        return cls(blocks, views)
+
+    @classmethod
+    def create(cls, arrays):
+        shared = cls.empty({name: (array.shape, array.dtype) for name, array in arrays.items()})
+        for name, array in arrays.items():
+            shared.arrays[name][...] = array
+        return shared
+
+    @classmethod
+    def attach(cls, spec):
+        blocks, views = {}, {}
+        for name, (block_name, shape, dtype) in spec.items():
+            # Workers share the parent's resource tracker, which owns cleanup via unlink()
+            block = shared_memory.SharedMemory(name=block_name)
+            blocks[name] = block
+            views[name] = np.ndarray(shape, dtype=dtype, buffer=block.buf)
+        return cls(blocks, views)
+
+    def spec(self):
+        """Picklable description for attaching from another process"""
+        return {name: (self._blocks[name].name, view.shape, view.dtype.str) for name, view in self.arrays.items()}
+
+    def close(self):
+        self.arrays = {}
+        for block in self._blocks.values():
+            block.close()
+
+    def unlink(self):
+        for block in self._blocks.values():
+            block.unlink()
+
+
+def tile_layout(grid, tile_size):
+    """Number of tile rows and columns covering the raster"""
+    return -(-grid.height // tile_size), -(-grid.width // tile_size)
+
+
+def sort_points_by_tile(cells, depth, colors, grid, tile_size, allocate=None):
+    """Global pixel (row, col) of every in-view point, grouped by tile
+
+    Args:
+        cells: Grid cell of every point (grid.cell_of), -1 outside the view
+        allocate: Optional callable({name: (shape, dtype)}) -> {name: array} receiving the
+            sorted columns (e.g. shared memory); default: plain numpy arrays
+
+    Returns (arrays dict, tile offsets) where tile t owns arrays[offsets[t]:offsets[t + 1]].
+    """
+    inside = np.flatnonzero(cells >= 0)
+    row, col = np.divmod(cells[inside], grid.width)
+    tiles_y, tiles_x = tile_layout(grid, tile_size)
+    tile = (row // tile_size) * tiles_x + col // tile_size
+    row, col = row.astype(np.int32), col.astype(np.int32)
+    order = np.argsort(tile, kind='stable')
+    offsets = np.zeros(tiles_y * tiles_x + 1, dtype=np.int64)
+    np.cumsum(np.bincount(tile, minlength=tiles_y * tiles_x), out=offsets[1:])
+    del tile
+
+    n = len(inside)
+    layout = {'row': ((n,), np.int32), 'col': ((n,), np.int32), 'depth': ((n,), np.float32)}
+    if colors is not None:
+        colors = np.asarray(colors)
+        layout['colors'] = ((n,) + colors.shape[1:], colors.dtype)
+    if allocate is None:
+        arrays = {name: np.empty(shape, dtype=dtype) for name, (shape, dtype) in layout.items()}
+    else:
+        arrays = allocate(layout)
+
+    # Sorted columns are gathered straight into their destination, one at a time
+    np.take(row, order, out=arrays['row'])
+    np.take(col, order, out=arrays['col'])
+    del row, col
+    points = inside[order]
+    del inside, order
+    np.take(depth, points, out=arrays['depth'])
+    if colors is not None:
+        np.take(colors, points, axis=0, out=arrays['colors'])
+    return arrays, offsets
+
+
+def rasterize_tile(points, offsets, grid, tile_size, tile_row, tile_col, halo, options):
+    """Rasterize one tile core from the points of its 3x3 tile neighbourhood"""
+    tiles_y, tiles_x = tile_layout(grid, tile_size)
+    r0, c0 = tile_row * tile_size, tile_col * tile_size
+    r1, c1 = min(r0 + tile_size, grid.height), min(c0 + tile_size, grid.width)
+    hr0, hr1 = max(r0 - halo, 0), min(r1 + halo, grid.height)
+    hc0, hc1 = max(c0 - halo, 0), min(c1 + halo, grid.width)
+
+    segments = [slice(offsets[t], offsets[t + 1])
+                for tr in range(max(tile_row - 1, 0), min(tile_row + 2, tiles_y))
+                for tc in range(max(tile_col - 1, 0), min(tile_col + 2, tiles_x))
+                for t in [tr * tiles_x + tc]]
+
+    def gather(name):
+        return np.concatenate([points[name][s] for s in segments])
+
+    rows, cols = gather('row'), gather('col')
+    keep = np.flatnonzero((rows >= hr0) & (rows < hr1) & (cols >= hc0) & (cols < hc1))
+
+    sub_grid = RasterGrid(grid.x_min + hc0 * grid.pixel_size, grid.y_max - hr0 * grid.pixel_size,
+                          grid.pixel_size, hc1 - hc0, hr1 - hr0)
+    cells = (rows[keep].astype(np.int64) - hr0) * sub_grid.width + (cols[keep] - hc0)
+    index = CellIndex.from_cells(cells, gather('depth')[keep], sub_grid)
+    colors = gather('colors')[keep] if 'colors' in points else None
+
+    image, _ = render_index(index, colors, **options)
+    return r0, c0, image[r0 - hr0:r1 - hr0, c0 - hc0:c1 - hc0]
+
+
+# Worker state, set once per process by _init_worker
+_worker_points = None
+_worker_job = None
+
+
+def _init_worker(spec, offsets, grid, tile_size, halo, options):
+    global _worker_points, _worker_job
+    _worker_points = SharedArrays.attach(spec)
+    _worker_job = (offsets, grid, tile_size, halo, options)
+
+
+def _rasterize_tile_worker(tile_row, tile_col):
+    offsets, grid, tile_size, halo, options = _worker_job
+    return rasterize_tile(_worker_points.arrays, offsets, grid, tile_size, tile_row, tile_col, halo, options)
+
+
+def rasterize_tiled(vertices, colors=None, projection='xy', custom_bounds=None, output_width=1280, output_height=720,
+                    rotation=0, algorithm='bottom_percentile', coloring='true_color', height_window=0.5,
+                    percentile=0.4, expansion_radii=CUDA_EXPANSION_RADII, tile_size=256, workers=None):
+    """Rasterize with a process pool over output tiles; same arguments and result as rasterize()
+
+    Args:
+        tile_size: Tile edge in pixels; must be at least the largest expansion radius
+        workers: Worker processes (default: all cores). 1 runs rasterize() in-process.
+    """
+    if len(vertices) == 0:
+        raise ValueError("No vertices to process!")
+    workers = workers or os.cpu_count() or 1
+    halo = max(expansion_radii) if expansion_radii else 0
+    if halo > tile_size:
+        raise ValueError(f"tile_size ({tile_size}) must be at least the largest expansion radius ({halo})")
+
+    x, y, depth, grid = prepare_view(vertices, projection, custom_bounds, output_width, output_height, rotation)
+    tiles_y, tiles_x = tile_layout(grid, tile_size)
+    if workers == 1 or tiles_y * tiles_x == 1:
+        return rasterize(vertices, colors, projection, custom_bounds, output_width, output_height, rotation,
+                         algorithm, coloring, height_window, percentile, expansion_radii)
+
+    options = {
+        'algorithm': algorithm, 'coloring': coloring, 'height_window': height_window,
+        'percentile': percentile, 'expansion_radii': expansion_radii,
+        'z_range': (float(depth.min()), float(depth.max())), 'color_scale': color_scale_for(colors)
+    }
+    # Projections are dropped before the sorted columns are written into shared memory
+    cells = grid.cell_of(x, y)
+    del x, y
+    blocks = []
+
+    def allocate(layout):
+        blocks.append(SharedArrays.empty(layout))
+        return blocks[0].arrays
+
+    try:
+        _, offsets = sort_points_by_tile(cells, depth, colors, grid, tile_size, allocate)
+    except BaseException:
+        for shared in blocks:
+            shared.close()
+            shared.unlink()
+        raise
+    shared = blocks[0]
+    del cells, depth
+
+    image = np.empty((grid.height, grid.width, 3), dtype=np.uint8)
+    try:
+        # Spawned, not forked: forking after numba's threaded kernels ran hangs the parent at exit
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=min(workers, tiles_y * tiles_x), mp_context=context,
+                                 initializer=_init_worker,
+                                 initargs=(shared.spec(), offsets, grid, tile_size, halo, options)) as pool:
+            futures = [pool.submit(_rasterize_tile_worker, tr, tc)
+                       for tr in range(tiles_y) for tc in range(tiles_x)]
+            for future in as_completed(futures):
+                r0, c0, tile = future.result()
+                image[r0:r0 + tile.shape[0], c0:c0 + tile.shape[1]] = tile
+    finally:
+        shared.close()
+        shared.unlink()
+    return image
@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+Vectorized top-down rasterization of triangle meshes for yard maps.
+Faces are processed in batches: every triangle is expanded into the pixel centers of
+its bounding box, barycentric weights decide coverage and interpolate height and
+vertex color, and a per-pixel minimum over all candidates keeps the lowest surface
+(the ground under any canopy). Pixels between sparse vertices are filled wherever a
+triangle spans them, so meshes give hole-free ground rasters.
+"""
+
+import numpy as np
+
+from yard_map.raster_engine import prepare_view, colorize, color_scale_for
+
+# Candidate (triangle, pixel) pairs evaluated per batch; bounds the temporaries
+BATCH_PIXELS = 1 << 22
+# Faces whose bounding boxes are computed at once
+FACE_CHUNK = 1 << 20
+# Barycentric tolerance, so pixel centers on shared edges are covered by a neighbour
+EDGE_EPSILON = 1e-9
+
+
+def triangulate(faces):
+    """F x 3 triangle vertex indices from triangles, quads or mixed polygons (fan triangulation)"""
+    faces = np.asarray(faces)
+    if faces.dtype != object and faces.ndim == 2:
+        if faces.shape[1] < 3:
+            raise ValueError(f"Faces need at least 3 vertices, got {faces.shape[1]}")
+        return np.concatenate([faces[:, [0, k, k + 1]] for k in range(1, faces.shape[1] - 1)]).astype(np.int64)
+    triangles = [[face[0], face[k], face[k + 1]] for face in faces for k in range(1, len(face) - 1)]
+    return np.array(triangles, dtype=np.int64).reshape(-1, 3)
+
+
+def _pixel_boxes(u, v, width, height):
+    """Inclusive column/row ranges of the pixel centers inside each triangle's bounding box"""
+    c0 = np.maximum(np.ceil(u.min(axis=1) - 0.5), 0).astype(np.int64)
+    c1 = np.minimum(np.floor(u.max(axis=1) - 0.5), width - 1).astype(np.int64)
+    r0 = np.maximum(np.ceil(v.min(axis=1) - 0.5), 0).astype(np.int64)
+    r1 = np.minimum(np.floor(v.max(axis=1) - 0.5), height - 1).astype(np.int64)
+    n_pixels = np.maximum(c1 - c0 + 1, 0) * np.maximum(r1 - r0 + 1, 0)
+    return c0, r0, c1 - c0 + 1, n_pixels
+
+
+def _batches(n_pixels, batch_pixels):
+    """(start, end) triangle ranges with about batch_pixels candidates each"""
+    group = (np.cumsum(n_pixels) - 1) // batch_pixels
+    edges = np.concatenate([[0], np.flatnonzero(np.diff(group)) + 1, [len(n_pixels)]])
+    return zip(edges[:-1], edges[1:])
+
+
+def _rasterize_batch(u, v, z, c0, r0, box_width, n_pixels, grid_width):
+    """Lowest covering candidate per pixel of one batch
+
+    Returns (cell, depth, triangle, weights) of the winning candidates.
+    """
+    triangle = np.repeat(np.arange(len(n_pixels)), n_pixels)
+    local = np.arange(len(triangle)) - np.repeat(np.cumsum(n_pixels) - n_pixels, n_pixels)
+    row, col = np.divmod(local, box_width[triangle])
+    col += c0[triangle]
+    row += r0[triangle]
+
+    pc, pr = col + 0.5, row + 0.5
+    ut, vt = u[triangle], v[triangle]
+    area = (ut[:, 1] - ut[:, 0]) * (vt[:, 2] - vt[:, 0]) - (ut[:, 2] - ut[:, 0]) * (vt[:, 1] - vt[:, 0])
+    w0 = ((ut[:, 1] - pc) * (vt[:, 2] - pr) - (ut[:, 2] - pc) * (vt[:, 1] - pr)) / area
+    w1 = ((ut[:, 2] - pc) * (vt[:, 0] - pr) - (ut[:, 0] - pc) * (vt[:, 2] - pr)) / area
+    w2 = 1.0 - w0 - w1
+    inside = np.flatnonzero((w0 >= -EDGE_EPSILON) & (w1 >= -EDGE_EPSILON) & (w2 >= -EDGE_EPSILON))
+
+    weights = np.column_stack([w0[inside], w1[inside], w2[inside]])
+    triangle = triangle[inside]
+    cell = row[inside] * grid_width + col[inside]
+    depth = (weights * z[triangle]).sum(axis=1)
+
+    # Lowest surface per pixel: first candidate of each cell after sorting by (cell, depth)
+    order = np.lexsort((depth, cell))
+    first = order[np.flatnonzero(np.diff(cell[order], prepend=-1))]
+    return cell[first], depth[first], triangle[first], weights[first]
+
+
+def rasterize_triangles(vertices, faces, colors=None, projection='xy', custom_bounds=None, output_width=1280,
+                        output_height=720, rotation=0, coloring='true_color', batch_pixels=BATCH_PIXELS,
+                        return_stats=False):
+    """Rasterize a triangle mesh into a yard map, keeping the lowest surface per pixel
+
+    Same view logic as raster_engine.rasterize (rotation around the vertex centroid,
+    custom or 1-99 percentile bounds, 1:1 pixels). Height and vertex colors are
+    interpolated barycentrically at pixel centers; faces that are vertical in the
+    projection cover no pixel.
+
+    Args:
+        faces: Triangle, quad or polygon vertex indices (see triangulate)
+        batch_pixels: Candidate pixels evaluated per vectorized batch
+
+    Returns:
+        uint8 RGB image, plus (grid, stats) when return_stats is True
+    """
+    if len(vertices) == 0:
+        raise ValueError("No vertices to process!")
+
+    x, y, depth, grid = prepare_view(vertices, projection, custom_bounds, output_width, output_height, rotation)
+    u = (np.asarray(x, dtype=np.float64) - grid.x_min) / grid.pixel_size
+    v = (grid.y_max - np.asarray(y, dtype=np.float64)) / grid.pixel_size
+    depth = np.asarray(depth, dtype=np.float64)
+    triangles = triangulate(faces)
+
+    surface = np.full(grid.n_cells, np.inf)
+    winner = np.full(grid.n_cells, -1, dtype=np.int64)
+    winner_weights = np.zeros((grid.n_cells, 3))
+
+    for chunk_start in range(0, len(triangles), FACE_CHUNK):
+        chunk = triangles[chunk_start:chunk_start + FACE_CHUNK]
+        tu, tv = u[chunk], v[chunk]
+        c0, r0, box_width, n_pixels = _pixel_boxes(tu, tv, grid.width, grid.height)
+        area = (tu[:, 1] - tu[:, 0]) * (tv[:, 2] - tv[:, 0]) - (tu[:, 2] - tu[:, 0]) * (tv[:, 1] - tv[:, 0])
+        keep = np.flatnonzero((n_pixels > 0) & (np.abs(area) > 1e-12))
+        if len(keep) == 0:
+            continue
+        tu, tv, tz = tu[keep], tv[keep], depth[chunk[keep]]
+        c0, r0, box_width, n_pixels = c0[keep], r0[keep], box_width[keep], n_pixels[keep]
+
+        for start, end in _batches(n_pixels, batch_pixels):
+            cell, cell_depth, triangle, weights = _rasterize_batch(
+                tu[start:end], tv[start:end], tz[start:end], c0[start:end], r0[start:end],
+                box_width[start:end], n_pixels[start:end], grid.width)
+            lower = cell_depth < surface[cell]
+            cell = cell[lower]
+            surface[cell] = cell_depth[lower]
+            winner[cell] = chunk_start + keep[start + triangle[lower]]
+            winner_weights[cell] = weights[lower]
+
+    covered = winner >= 0
+    depth_map = np.where(covered, surface, np.nan)
+    stats = {
+        'count': covered.astype(np.int64),
+        'selected': covered.astype(np.int64),
+        'depth_sum': np.where(covered, surface, 0.0),
+        'depth_min': depth_map,
+        'depth_max': depth_map,
+        'color_sum': None
+    }
+    if colors is not None:
+        # Interpolated in 0-255 and rounded, so flat-colored faces keep their exact color
+        corner_colors = np.asarray(colors, dtype=np.float64)[triangles[winner[covered]]] * color_scale_for(colors)
+        stats['color_sum'] = np.zeros((grid.n_cells, 3))
+        stats['color_sum'][covered] = np.rint((winner_weights[covered, :, None] * corner_colors).sum(axis=1))
+
+    image = colorize(stats, grid, coloring, 'bottom_percentile', (float(depth.min()), float(depth.max())), 1.0)
+    if return_stats:
+        return image, grid, stats
+    return image
@@ -8,9 +8,13 @@ import matplotlib.pyplot as plt
 from matplotlib.patches import Polygon
 from matplotlib.collections import PatchCollection
 import argparse
+import sys
 import json
 import os
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from yard_map.ply_reader import PlyPointCloud, read_faces
+
 try:
     import trimesh
     TRIMESH_AVAILABLE = True
@@ -172,46 +176,9 @@ def load_ply_with_trimesh(ply_path):
 
 
 def load_ply_basic(ply_path):
-    """Basic PLY loader that reads vertex coordinates."""
-    vertices = []
-    faces = []
-    
-    with open(ply_path, 'r') as f:
-        lines = f.readlines()
-    
-    vertex_count = 0
-    face_count = 0
-    header_ended = False
-    
-    for i, line in enumerate(lines):
-        line = line.strip()
-        if line.startswith('element vertex'):
-            vertex_count = int(line.split()[-1])
-        elif line.startswith('element face'):
-            face_count = int(line.split()[-1])
-        elif line == 'end_header':
-            header_ended = True
-            data_start = i + 1
-            break
-    
-    if not header_ended:
-        raise ValueError("Could not find end_header in PLY file")
-    
-    # Read vertices
-    for i in range(data_start, data_start + vertex_count):
-        parts = lines[i].strip().split()
-        x, y, z = float(parts[0]), float(parts[1]), float(parts[2])
-        vertices.append([x, y, z])
-    
-    # Read faces
-    face_start = data_start + vertex_count
-    for i in range(face_start, face_start + face_count):
-        parts = lines[i].strip().split()
-        if len(parts) >= 4:
-            face_vertices = [int(parts[j]) for j in range(1, int(parts[0]) + 1)]
-            faces.append(face_vertices)
-    
-    return np.array(vertices), np.array(faces) if faces else None
+    """Basic PLY loader (binary or ASCII) built on the shared memory-mapped reader."""
+    cloud = PlyPointCloud(ply_path)
+    return cloud.xyz().astype(np.float64), read_faces(ply_path, cloud.header)
 
 
 def filter_vertices_by_z(vertices, faces=None, z_min=None, z_max=None):